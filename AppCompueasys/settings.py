@@ -53,6 +53,7 @@ MIDDLEWARE = [
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'core.middleware.ProfilingMiddleware',  # Server-Timing y presupuestos de consultas (lee request.user)
     'contable.middleware.ContableAuthMiddleware',  # Middleware personalizado para contable
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
@@ -86,11 +87,147 @@ ASGI_APPLICATION = 'AppCompueasys.asgi.application'
 WSGI_APPLICATION = 'AppCompueasys.wsgi.application'
 
 # Channel layers (por defecto en memoria, para producción usar Redis)
+# Con REDIS_URL los workers de gunicorn pueden enviar a los websockets del
+# dashboard (indicadores en vivo, core.services.dashboard_metrics)
 CHANNEL_LAYERS = {
     'default': {
         'BACKEND': 'channels.layers.InMemoryChannelLayer',
     },
 }
+if os.getenv('REDIS_URL'):
+    CHANNEL_LAYERS['default'] = {
+        'BACKEND': 'channels_redis.core.RedisChannelLayer',
+        'CONFIG': {'hosts': [os.getenv('REDIS_URL')]},
+    }
+
+# Caché (shared.services.cache_service.CacheService)
+# CACHE_BACKEND: 'redis' (producción, requiere REDIS_URL), 'file' (compartido
+# entre los workers de gunicorn de una misma máquina) o 'locmem' (un caché por
+# proceso; solo para desarrollo). Con REDIS_URL definido se usa Redis por defecto.
+REDIS_URL = os.getenv('REDIS_URL', '')
+CACHE_BACKEND = os.getenv('CACHE_BACKEND', 'redis' if REDIS_URL else 'file')
+CACHE_KEY_PREFIX = os.getenv('CACHE_KEY_PREFIX', 'compueasys')
+CACHE_DEFAULT_TIMEOUT = int(os.getenv('CACHE_DEFAULT_TIMEOUT', 300))
+
+if CACHE_BACKEND == 'redis':
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_URL or 'redis://127.0.0.1:6379/1',
+            'KEY_PREFIX': CACHE_KEY_PREFIX,
+            'TIMEOUT': CACHE_DEFAULT_TIMEOUT,
+        },
+    }
+elif CACHE_BACKEND == 'file':
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': os.getenv('CACHE_LOCATION', os.path.join(BASE_DIR, '.cache', 'django')),
+            'KEY_PREFIX': CACHE_KEY_PREFIX,
+            'TIMEOUT': CACHE_DEFAULT_TIMEOUT,
+            'OPTIONS': {'MAX_ENTRIES': int(os.getenv('CACHE_MAX_ENTRIES', 5000))},
+        },
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'compueasys-default',
+            'KEY_PREFIX': CACHE_KEY_PREFIX,
+            'TIMEOUT': CACHE_DEFAULT_TIMEOUT,
+            'OPTIONS': {'MAX_ENTRIES': int(os.getenv('CACHE_MAX_ENTRIES', 5000))},
+        },
+    }
+
+# Registro de visitas en lote (core.services.visit_service)
+# Las visitas se encolan en memoria y se escriben con bulk_create cada
+# BATCH_SIZE eventos o cada FLUSH_INTERVAL_MS milisegundos
+VISIT_BUFFER = {
+    'ENABLED': os.getenv('VISIT_BUFFER_ENABLED', 'True') == 'True',
+    'BATCH_SIZE': int(os.getenv('VISIT_BUFFER_BATCH_SIZE', 50)),
+    'FLUSH_INTERVAL_MS': int(os.getenv('VISIT_BUFFER_FLUSH_INTERVAL_MS', 2000)),
+    'MAX_SIZE': int(os.getenv('VISIT_BUFFER_MAX_SIZE', 5000)),
+}
+
+# Retención de visitas (core.services.visit_retention)
+# StoreVisit se particiona por mes en PostgreSQL (`manage.py partition_visits`
+# una sola vez tras la migración 0040); `manage.py prune_visits`
+# (cron diario) crea las particiones de los próximos PARTITIONS_AHEAD meses y
+# archiva en ARCHIVE_DIR (CSV gzip) los meses anteriores a RETENTION_MONTHS.
+# Los contadores del dashboard (VisitRollup) se conservan.
+VISIT_RETENTION = {
+    'RETENTION_MONTHS': int(os.getenv('VISIT_RETENTION_MONTHS', 6)),
+    'PARTITIONS_AHEAD': int(os.getenv('VISIT_PARTITIONS_AHEAD', 2)),
+    'ARCHIVE_DIR': os.getenv('VISIT_ARCHIVE_DIR', os.path.join(BASE_DIR, 'backups_archive', 'visits')),
+}
+
+# Reservas de stock durante el pago con Wompi (core.services.stock_reservation)
+# TTL_SECONDS: tiempo que se aparta el stock antes de devolverlo si el pago
+# no se completa (`manage.py release_expired_reservations` en cron)
+STOCK_RESERVATION = {
+    'TTL_SECONDS': int(os.getenv('STOCK_RESERVATION_TTL_SECONDS', 900)),
+}
+
+# Cola de tareas en segundo plano (core.services.job_queue)
+# Correos, WhatsApp y avisos de stock se guardan en BackgroundJob y los envía
+# el worker `manage.py run_jobs --concurrency 4`, no el request.
+# EAGER: ejecutar la tarea al confirmar la transacción en el mismo proceso
+# (desarrollo sin worker); MAX_ATTEMPTS: intentos antes de pasar a 'dead';
+# BACKOFF_BASE/BACKOFF_MAX: espera entre reintentos (base * 2^intento, con
+# jitter); LOCK_TIMEOUT: segundos tras los que una tarea 'running' de un worker
+# caído vuelve a la cola; RETENTION_DAYS: limpieza de tareas completadas
+JOB_QUEUE = {
+    'EAGER': os.getenv('JOB_QUEUE_EAGER', 'False') == 'True',
+    'MAX_ATTEMPTS': int(os.getenv('JOB_QUEUE_MAX_ATTEMPTS', 5)),
+    'BACKOFF_BASE': int(os.getenv('JOB_QUEUE_BACKOFF_BASE', 30)),
+    'BACKOFF_MAX': int(os.getenv('JOB_QUEUE_BACKOFF_MAX', 3600)),
+    'LOCK_TIMEOUT': int(os.getenv('JOB_QUEUE_LOCK_TIMEOUT', 600)),
+    'RETENTION_DAYS': int(os.getenv('JOB_QUEUE_RETENTION_DAYS', 14)),
+    'TASK_MODULES': ['core.services.background_tasks'],
+}
+
+# Geolocalización por IP (core.geolocation_helper)
+# DATABASE_PATH: archivo de rangos generado con `manage.py build_geoip_database`
+# NETWORK_LOOKUPS: consultar ipapi.co / ip-api.com cuando no hay dato local
+GEOLOCATION = {
+    'DATABASE_PATH': os.getenv('GEOIP_DATABASE_PATH', os.path.join(BASE_DIR, 'geoip', 'ip_ranges.bin')),
+    'NETWORK_LOOKUPS': os.getenv('GEOIP_NETWORK_LOOKUPS', 'True') == 'True',
+    'CACHE_SIZE': 10000,
+    'CACHE_TTL': 7 * 24 * 3600,  # 7 días
+}
+
+# Perfilado de requests (core.middleware.ProfilingMiddleware)
+# ENABLED: perfilar todos los requests; si no, solo los que envían el header
+# HEADER con el valor de TOKEN o desde una sesión de superusuario (DEBUG no
+# habilita el perfilado)
+# QUERY_BUDGETS: máximo de consultas SQL por vista (nombre de la URL);
+# con ENFORCE_BUDGETS superar el presupuesto lanza QueryBudgetExceeded
+# (activo al correr las pruebas para que fallen)
+import sys
+RUNNING_TESTS = len(sys.argv) > 1 and sys.argv[1] == 'test' or 'pytest' in sys.modules
+
+PROFILING = {
+    'ENABLED': os.getenv('PROFILING_ENABLED', 'False') == 'True' or RUNNING_TESTS,
+    'HEADER': 'X-Profile',
+    'TOKEN': os.getenv('PROFILING_TOKEN', ''),
+    'ENFORCE_BUDGETS': os.getenv('PROFILING_ENFORCE_BUDGETS', 'False') == 'True' or RUNNING_TESTS,
+    'DUPLICATE_THRESHOLD': 3,
+    'MAX_STORED_QUERIES': 500,
+    'QUERY_BUDGETS': {
+        'home': 10,
+        'store': 15,
+        'store_products_api': 10,
+        'filter_products_ajax': 10,
+        'search_suggestions': 8,
+        'product_detail': 15,
+        'cart': 12,
+        'checkout': 10,
+        'dashboard_home': 40,
+        'visitas_live_data': 8,
+        'ventas_por_periodo': 8,
+        'productos_mas_visitados': 8,
+    },
+}
 
 # Base de datos principal: configuración flexible
 import dj_database_url
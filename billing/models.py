@@ -357,7 +357,8 @@ class Invoice(models.Model):
         if not self.invoice_number:
             # Obtener configuración para el prefijo
             try:
-                config = MatiasConfiguration.objects.first()
+                from core.services.config_registry import get_matias_config
+                config = get_matias_config()
                 prefix = config.prefix if config and config.prefix else 'FV'
             except:
                 prefix = 'FV'
@@ -13,6 +13,8 @@ import json
 
 from .models import Invoice, InvoiceItem, MatiasConfiguration, MatiasSyncLog
 from core.models import ProductStore
+from core.services.config_registry import get_matias_config
+from core.services.search_service import filter_by_search
 from .services.matias_client import matias_client
 
 
@@ -144,7 +146,7 @@ def invoice_create(request):
     if request.method == 'POST':
         try:
             # Obtener configuración
-            config = MatiasConfiguration.objects.first()
+            config = get_matias_config()
             
             # Calcular consecutive
             last_invoice = Invoice.objects.order_by('-consecutive').first()
@@ -239,7 +241,7 @@ def invoice_create(request):
             return redirect('billing:invoice_list')
     
     # GET - Mostrar formulario
-    config = MatiasConfiguration.objects.first()
+    config = get_matias_config()
     
     context = {
         'config': config,
@@ -314,7 +316,7 @@ def send_invoice_matias(request, invoice_id):
         })
     
     # Obtener configuración
-    config = MatiasConfiguration.objects.first()
+    config = get_matias_config()
     if not config or not config.is_active:
         return JsonResponse({
             'success': False,
@@ -544,12 +546,9 @@ def search_products_ajax(request):
     if len(query) < 2:
         return JsonResponse({'products': []})
     
-    products = ProductStore.objects.filter(
-        models.Q(name__icontains=query) |
-        models.Q(description__icontains=query)
-    ).filter(
+    products = filter_by_search(ProductStore.objects.all(), query).filter(
         stock__gt=0  # Solo productos con stock
-    )[:20]
+    ).order_by('search_rank')[:20]
     
     results = []
     for product in products:
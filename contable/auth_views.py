@@ -1,7 +1,6 @@
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth import authenticate, login, logout
 from django.contrib import messages
-from django.core.mail import send_mail
 from django.conf import settings
 from django.http import JsonResponse
 from django.views.decorators.http import require_http_methods
@@ -11,6 +10,8 @@ from datetime import timedelta
 import uuid
 import secrets
 
+from core.services.background_tasks import enqueue_email
+
 from .models import (
     ContableUser, Plan, Company, UserProfile, CompanyMembership,
     AuditLog
@@ -416,16 +417,11 @@ def send_verification_email(user, token, request):
     Equipo de CompuEasys
     '''
     
+    # Lo envía el worker de la cola (core.services.job_queue), no el request
     try:
-        send_mail(
-            subject,
-            message,
-            settings.DEFAULT_FROM_EMAIL,
-            [user.email],
-            fail_silently=False,
-        )
+        enqueue_email(subject, message, [user.email], from_email=settings.DEFAULT_FROM_EMAIL)
     except Exception as e:
-        print(f"Error sending verification email: {e}")
+        print(f"Error queueing verification email: {e}")
 
 
 def send_password_reset_email(user, token, request):
@@ -450,13 +446,8 @@ def send_password_reset_email(user, token, request):
     Equipo de CompuEasys
     '''
     
+    # Lo envía el worker de la cola (core.services.job_queue), no el request
     try:
-        send_mail(
-            subject,
-            message,
-            settings.DEFAULT_FROM_EMAIL,
-            [user.email],
-            fail_silently=False,
-        )
+        enqueue_email(subject, message, [user.email], from_email=settings.DEFAULT_FROM_EMAIL)
     except Exception as e:
-        print(f"Error sending password reset email: {e}")
+        print(f"Error queueing password reset email: {e}")
@@ -1,7 +1,7 @@
 from django.contrib import admin
 
 # Register your models here.
-from .models import ProductStore, Galeria, Category, Type, Pedido, SimpleUser, ProductVariant, proveedor, Project
+from .models import ProductStore, Galeria, Category, Type, Pedido, SimpleUser, ProductVariant, proveedor, Project, BackgroundJob
 
 admin.site.register(ProductVariant)
 admin.site.register(Galeria)   
@@ -21,6 +21,26 @@ class ProjectAdmin(admin.ModelAdmin):
     ordering = ('-order', '-created_at')
 
 
+@admin.register(BackgroundJob)
+class BackgroundJobAdmin(admin.ModelAdmin):
+    """Tareas en segundo plano; las 'dead' son el dead-letter de la cola"""
+    list_display = ('task', 'status', 'attempts', 'max_attempts', 'run_at', 'created_at', 'finished_at')
+    list_filter = ('status', 'task')
+    search_fields = ('task', 'idempotency_key', 'last_error')
+    readonly_fields = ('locked_at', 'locked_by', 'last_error', 'created_at', 'finished_at')
+    ordering = ('-created_at',)
+    actions = ['retry_jobs']
+
+    @admin.action(description='Reintentar las tareas seleccionadas')
+    def retry_jobs(self, request, queryset):
+        from django.utils import timezone
+
+        count = queryset.exclude(status='running').update(
+            status='queued', attempts=0, run_at=timezone.now(), finished_at=None
+        )
+        self.message_user(request, f'{count} tareas reencoladas')
+
+
 
 
 class GaleriaInline(admin.TabularInline):
@@ -26,17 +26,23 @@ class StoreVisitConsumer(AsyncWebsocketConsumer):
 
     @database_sync_to_async
     def save_visit(self):
-        # Importar modelos aquí para evitar AppRegistryNotReady
-        from .models import StoreVisit, SimpleUser
-        user = None
+        # Importar servicios aquí para evitar AppRegistryNotReady
+        from .services.visit_service import enqueue_visit
         try:
             user_id = self.scope.get('user').id if self.scope.get('user') and self.scope.get('user').is_authenticated else None
-            if user_id:
-                user = SimpleUser.objects.filter(id=user_id).first()
         except Exception:
-            user = None
+            user_id = None
         session_key = self.scope.get('session').session_key if self.scope.get('session') else None
-        StoreVisit.objects.create(session_key=session_key, user=user, visit_type='store')
+        headers = dict(self.scope.get('headers') or [])
+        client = self.scope.get('client') or [None]
+        # El usuario se valida al escribir el lote, igual que antes con filter().first()
+        enqueue_visit(
+            session_key=session_key,
+            visit_type='store',
+            user_id=user_id,
+            ip_address=client[0],
+            user_agent=headers.get(b'user-agent', b'').decode('latin-1'),
+        )
 
     async def disconnect(self, close_code):
         pass
@@ -58,3 +64,11 @@ class DashboardAdminConsumer(AsyncWebsocketConsumer):
             'message': event['message'],
             'timestamp': event['timestamp']
         }))
+
+    async def dashboard_stats(self, event):
+        # Solo los indicadores que cambiaron (core.services.dashboard_metrics)
+        await self.send(json.dumps({
+            'message': 'stats_delta',
+            'delta': event['delta'],
+            'timestamp': event['timestamp']
+        }))
@@ -2,87 +2,374 @@
 Helper modular para geolocalización por IP
 Este archivo puede ser eliminado sin afectar el funcionamiento del sistema
 """
+import ipaddress
+import mmap
+import os
+import struct
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
 import requests
-from typing import Optional, Dict
+from django.conf import settings
+
+
+DEFAULT_GEOLOCATION = {
+    'DATABASE_PATH': None,
+    'NETWORK_LOOKUPS': True,
+    'CACHE_SIZE': 10000,
+    'CACHE_TTL': 7 * 24 * 3600,
+}
+
+EMPTY_LOCATION = {
+    'city': None,
+    'country': None,
+    'latitude': None,
+    'longitude': None
+}
+
+
+def get_geolocation_settings() -> Dict:
+    """Configuración de geolocalización con valores por defecto"""
+    return {**DEFAULT_GEOLOCATION, **getattr(settings, 'GEOLOCATION', {})}
+
+
+def is_public_ip(ip_address: str) -> bool:
+    """Indica si vale la pena geolocalizar la IP (no local, privada ni inválida)"""
+    if not ip_address or ip_address == 'localhost':
+        return False
+    try:
+        ip = ipaddress.ip_address(ip_address)
+    except ValueError:
+        return False
+    return ip.is_global
+
+
+def ip_prefix(ip_address: str) -> Optional[str]:
+    """Prefijo /24 de una IPv4 (las IPs vecinas casi siempre comparten ubicación)"""
+    try:
+        ip = ipaddress.ip_address(ip_address)
+    except ValueError:
+        return None
+    if ip.version != 4:
+        return None
+    return str(ipaddress.ip_network(f"{ip_address}/24", strict=False))
+
+
+class LocationCache:
+    """Caché LRU con expiración por entrada, segura entre hilos"""
+
+    def __init__(self, max_size: int, ttl: int):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._data: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[Dict]:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            expires_at, location = entry
+            if expires_at < time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return location
+
+    def set(self, key: str, location: Dict) -> None:
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, location)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+
+class GeoBackend:
+    """Interfaz de un origen de geolocalización"""
+    name = 'base'
+
+    def lookup(self, ip_address: str) -> Optional[Dict]:
+        raise NotImplementedError
 
 
-def get_location_from_ip(ip_address: str) -> Dict[str, Optional[str]]:
+class OfflineRangeDatabase(GeoBackend):
     """
-    Obtiene la ubicación geográfica de una IP usando múltiples APIs
+    Base de datos local de rangos IPv4, leída con mmap y búsqueda binaria
+
+    Formato del archivo (generado con `manage.py build_geoip_database`):
+        cabecera: MAGIC (8 bytes) + número de rangos (uint32)
+        rangos:   N registros de (inicio uint32, fin uint32, índice uint32), ordenados
+        lugares:  líneas "país\tciudad" referenciadas por índice
+    """
+    name = 'offline'
+    MAGIC = b'CEGEOIP1'
+    HEADER = struct.Struct('<8sI')
+    RECORD = struct.Struct('<III')
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, 'rb') as handle:
+            self._mmap = mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self.count = self.HEADER.unpack_from(self._mmap, 0)
+        if magic != self.MAGIC:
+            raise ValueError(f"{path} no es una base de datos de geolocalización válida")
+        places_offset = self.HEADER.size + self.count * self.RECORD.size
+        self._places = self._mmap[places_offset:].decode('utf-8').split('\n')
+
+    def _record(self, index: int):
+        return self.RECORD.unpack_from(self._mmap, self.HEADER.size + index * self.RECORD.size)
+
+    def lookup(self, ip_address: str) -> Optional[Dict]:
+        try:
+            ip = ipaddress.ip_address(ip_address)
+        except ValueError:
+            return None
+        if ip.version != 4:
+            return None
+
+        value = int(ip)
+        low, high = 0, self.count
+        # Último rango cuyo inicio es <= value
+        while low < high:
+            middle = (low + high) // 2
+            if self._record(middle)[0] <= value:
+                low = middle + 1
+            else:
+                high = middle
+        if low == 0:
+            return None
+
+        start, end, place_index = self._record(low - 1)
+        if value > end or place_index >= len(self._places):
+            return None
+
+        country, _, city = self._places[place_index].partition('\t')
+        return {**EMPTY_LOCATION, 'country': country or None, 'city': city or None}
+
+    @classmethod
+    def write(cls, path: str, ranges: List[tuple]) -> int:
+        """
+        Escribe un archivo de rangos
+
+        Args:
+            path: Ruta de destino
+            ranges: Lista de (inicio, fin, país, ciudad) con IPs como enteros
+
+        Returns:
+            Número de rangos escritos
+        """
+        ranges = sorted(ranges)
+        places: Dict[str, int] = {}
+        records = bytearray()
+        for start, end, country, city in ranges:
+            place = f"{country or ''}\t{city or ''}"
+            index = places.setdefault(place, len(places))
+            records += cls.RECORD.pack(start, end, index)
+
+        with open(path, 'wb') as handle:
+            handle.write(cls.HEADER.pack(cls.MAGIC, len(ranges)))
+            handle.write(records)
+            handle.write('\n'.join(places).encode('utf-8'))
+        return len(ranges)
+
+
+class NetworkBackend(GeoBackend):
+    """Consulta APIs públicas (ipapi.co, luego ip-api.com)"""
+    name = 'network'
+
+    def lookup(self, ip_address: str) -> Optional[Dict]:
+        # Lista de APIs para intentar (en orden de prioridad)
+        apis = [
+            {
+                'url': f'https://ipapi.co/{ip_address}/json/',
+                'timeout': 3,
+                'extract': lambda data: {
+                    'city': data.get('city'),
+                    'country': data.get('country_name'),
+                    'latitude': data.get('latitude'),
+                    'longitude': data.get('longitude')
+                }
+            },
+            {
+                'url': f'http://ip-api.com/json/{ip_address}',
+                'timeout': 3,
+                'extract': lambda data: {
+                    'city': data.get('city'),
+                    'country': data.get('country'),
+                    'latitude': data.get('lat'),
+                    'longitude': data.get('lon')
+                }
+            }
+        ]
+
+        # Intentar con cada API hasta que una funcione
+        for api in apis:
+            try:
+                response = requests.get(api['url'], timeout=api['timeout'])
+
+                if response.status_code == 200:
+                    result = api['extract'](response.json())
+
+                    # Si obtuvimos al menos ciudad o país, retornar
+                    if result.get('city') or result.get('country'):
+                        return result
+
+            except requests.RequestException:
+                continue
+            except Exception:
+                continue
+
+        return None
+
+
+class GeoLocator:
+    """
+    Resuelve ubicaciones combinando caché en memoria, caché persistente
+    (tabla IPLocation), base de datos local y, opcionalmente, la red
+    """
+
+    def __init__(self, config: Dict):
+        self.config = config
+        self.cache = LocationCache(config['CACHE_SIZE'], config['CACHE_TTL'])
+        self.offline = None
+        path = config.get('DATABASE_PATH')
+        if path and os.path.exists(path):
+            try:
+                self.offline = OfflineRangeDatabase(str(path))
+            except (OSError, ValueError):
+                self.offline = None
+        self.network = NetworkBackend()
+
+    def _from_table(self, keys: List[str]) -> Optional[Dict]:
+        from datetime import timedelta
+        from django.utils import timezone
+        from core.models import IPLocation
+
+        fresh_since = timezone.now() - timedelta(seconds=self.config['CACHE_TTL'])
+        rows = {
+            row.key: row for row in IPLocation.objects.filter(key__in=keys, updated_at__gte=fresh_since)
+        }
+        for key in keys:
+            row = rows.get(key)
+            if row is not None:
+                return row.as_location()
+        return None
+
+    def _store(self, ip_address: str, prefix: Optional[str], location: Dict, source: str) -> None:
+        from core.models import IPLocation
+
+        found = bool(location.get('city') or location.get('country'))
+        # Los resultados vacíos solo se guardan para la IP exacta
+        keys = [ip_address] + ([prefix] if prefix and found else [])
+        for key in keys:
+            self.cache.set(key, location)
+            try:
+                IPLocation.objects.update_or_create(
+                    key=key,
+                    defaults={
+                        'city': location.get('city'),
+                        'country': location.get('country'),
+                        'latitude': location.get('latitude'),
+                        'longitude': location.get('longitude'),
+                        'source': source,
+                    }
+                )
+            except Exception:
+                pass  # La caché persistente es opcional
+
+    def locate(self, ip_address: str, allow_network: bool = True) -> Dict:
+        if not is_public_ip(ip_address):
+            return dict(EMPTY_LOCATION)
+
+        prefix = ip_prefix(ip_address)
+        keys = [ip_address] + ([prefix] if prefix else [])
+
+        for key in keys:
+            location = self.cache.get(key)
+            if location is not None:
+                return dict(location)
+
+        try:
+            location = self._from_table(keys)
+        except Exception:
+            location = None
+        if location is not None:
+            self.cache.set(ip_address, location)
+            return dict(location)
+
+        if self.offline is not None:
+            location = self.offline.lookup(ip_address)
+            if location:
+                self._store(ip_address, prefix, location, self.offline.name)
+                return dict(location)
+
+        if allow_network and self.config['NETWORK_LOOKUPS']:
+            location = self.network.lookup(ip_address) or dict(EMPTY_LOCATION)
+            self._store(ip_address, prefix, location, self.network.name)
+            return dict(location)
+
+        # Sin red no se guarda nada: el enriquecedor en segundo plano lo intentará luego
+        return dict(EMPTY_LOCATION)
+
+
+_locator: Optional[GeoLocator] = None
+_locator_lock = threading.Lock()
+
+
+def get_locator() -> GeoLocator:
+    """Instancia única por proceso del localizador"""
+    global _locator
+    if _locator is None:
+        with _locator_lock:
+            if _locator is None:
+                _locator = GeoLocator(get_geolocation_settings())
+    return _locator
+
+
+def reset_locator() -> None:
+    """Descarta el localizador (p. ej. tras regenerar la base de datos local)"""
+    global _locator
+    with _locator_lock:
+        _locator = None
+
+
+def get_location_from_ip(ip_address: str, allow_network: bool = True) -> Dict[str, Optional[str]]:
+    """
+    Obtiene la ubicación geográfica de una IP
+    
+    Consulta en orden la caché en memoria (IP y prefijo /24), la caché
+    persistente, la base de datos local de rangos y, si se permite, las APIs
+    públicas.
     
     Args:
         ip_address: Dirección IP a consultar
+        allow_network: Si es False nunca se hacen peticiones HTTP
         
     Returns:
         Diccionario con 'city' y 'country', o valores None si falla
         
     Nota: Esta función es completamente opcional y segura de eliminar
     """
-    # Valores por defecto si falla
-    result = {
-        'city': None,
-        'country': None,
-        'latitude': None,
-        'longitude': None
-    }
-    
-    # No consultar IPs locales o privadas
-    if not ip_address or ip_address in ['127.0.0.1', 'localhost'] or ip_address.startswith('192.168.'):
-        return result
-    
-    # Lista de APIs para intentar (en orden de prioridad)
-    apis = [
-        {
-            'url': f'https://ipapi.co/{ip_address}/json/',
-            'timeout': 3,
-            'extract': lambda data: {
-                'city': data.get('city'),
-                'country': data.get('country_name'),
-                'latitude': data.get('latitude'),
-                'longitude': data.get('longitude')
-            }
-        },
-        {
-            'url': f'http://ip-api.com/json/{ip_address}',
-            'timeout': 3,
-            'extract': lambda data: {
-                'city': data.get('city'),
-                'country': data.get('country'),
-                'latitude': data.get('lat'),
-                'longitude': data.get('lon')
-            }
-        }
-    ]
-    
-    # Intentar con cada API hasta que una funcione
-    for api in apis:
-        try:
-            response = requests.get(api['url'], timeout=api['timeout'])
-            
-            if response.status_code == 200:
-                data = response.json()
-                result = api['extract'](data)
-                
-                # Si obtuvimos al menos ciudad o país, retornar
-                if result.get('city') or result.get('country'):
-                    return result
-                    
-        except requests.RequestException:
-            continue
-        except Exception:
-            continue
-    
-    # Si todas las APIs fallaron, retornar resultado vacío
-    return result
+    try:
+        return get_locator().locate(ip_address, allow_network=allow_network)
+    except Exception:
+        return dict(EMPTY_LOCATION)
 
 
-def enrich_visit_with_location(visit_data: dict, ip_address: str) -> dict:
+def enrich_visit_with_location(visit_data: dict, ip_address: str, allow_network: bool = True) -> dict:
     """
     Enriquece los datos de una visita con información de geolocalización
     
     Args:
         visit_data: Diccionario con datos de la visita
         ip_address: IP del visitante
+        allow_network: Si es False solo se usan cachés y la base de datos local
         
     Returns:
         Diccionario con datos actualizados (incluye city y country si se obtuvieron)
@@ -90,7 +377,7 @@ def enrich_visit_with_location(visit_data: dict, ip_address: str) -> dict:
     Nota: Esta función es segura - si falla, devuelve los datos originales
     """
     try:
-        location = get_location_from_ip(ip_address)
+        location = get_location_from_ip(ip_address, allow_network=allow_network)
         
         # Solo agregar si se obtuvo información válida
         if location.get('city'):
@@ -139,6 +426,7 @@ def create_visit_with_location(request, visit_type, user_obj=None, product_id=No
     Nota: Esta función es modular - si se elimina el archivo, usar el código directo
     """
     from core.models import StoreVisit
+    from core.services.visit_service import resolve_user_agents
     
     # Obtener o crear session_key
     if not request.session.session_key:
@@ -179,7 +467,7 @@ def create_visit_with_location(request, visit_type, user_obj=None, product_id=No
         'user': user_obj,
         'visit_type': visit_type,
         'ip_address': ip_address,
-        'user_agent': user_agent
+        'user_agent_id': resolve_user_agents([user_agent]).get(user_agent)
     }
     
     # Agregar product_id si se proporcionó
@@ -188,7 +476,7 @@ def create_visit_with_location(request, visit_type, user_obj=None, product_id=No
     
     # Intentar agregar geolocalización (opcional, falla silenciosamente)
     try:
-        visit_data = enrich_visit_with_location(visit_data, ip_address)
+        visit_data = enrich_visit_with_location(visit_data, ip_address, allow_network=False)
     except:
         pass  # Continuar sin ubicación si falla
     
@@ -0,0 +1,31 @@
+"""
+Enlaza las visitas anteriores a la migración 0039 con VisitUserAgent
+Ejecutar una vez después del despliegue (se puede interrumpir y reanudar):
+
+    python manage.py backfill_visit_user_agents
+    python manage.py backfill_visit_user_agents --batch-size 5000
+
+Ejecutarlo antes de `partition_visits`: los cambios a visitas ya copiadas a la
+tabla particionada no se trasladan.
+"""
+from django.core.management.base import BaseCommand, CommandError
+
+from core.services.visit_service import USER_AGENT_BACKFILL_BATCH, backfill_user_agents
+
+
+class Command(BaseCommand):
+    help = 'Pasa el user agent de texto de las visitas antiguas a VisitUserAgent por lotes de ids'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=USER_AGENT_BACKFILL_BATCH, help='Ids por lote')
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size debe ser mayor que 0')
+
+        total = 0
+        for linked, last_id in backfill_user_agents(options['batch_size']):
+            total += linked
+            self.stdout.write(f'   🔗 {total} visitas enlazadas (hasta el id {last_id})')
+
+        self.stdout.write(self.style.SUCCESS(f'✅ {total} visitas enlazadas con su user agent'))
@@ -0,0 +1,371 @@
+"""
+Benchmark de las consultas calientes del dashboard y de la tienda
+Siembra datos sintéticos (10k / 100k / 1M filas de visitas), mide cada
+consulta sin y con los índices de core.0034 y guarda el plan (EXPLAIN) y los
+tiempos de ambas corridas.
+
+Usar sobre una base de datos de pruebas: para la corrida "antes" se eliminan
+temporalmente los índices de los modelos medidos (se vuelven a crear al
+terminar, incluso si hay un error).
+
+    python manage.py benchmark_queries --rows 100000 --output bench-100k.json
+    python manage.py benchmark_queries --cleanup
+
+Con --budgets solo verifica que los listados de visitas no superen su máximo
+de consultas (core.services.visit_products.LISTING_QUERY_BUDGETS) sin importar
+cuántas filas devuelven; termina con error si alguno lo supera.
+
+    python manage.py benchmark_queries --rows 10000 --budgets
+"""
+import json
+import random
+import statistics
+import time
+from datetime import timedelta
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Sum
+from django.db.models.functions import Mod
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from core.models import (
+    Category, Conversation, ConversationMessage, Pedido, ProductStore, SimpleUser, StockNotification, StoreVisit,
+)
+from core.services.catalog_pagination import filter_store_products, get_sort_keys, order_expressions, seek
+from core.services.visit_products import LISTING_QUERY_BUDGETS, hydrate_products, with_visit_products
+from core.services.visit_rollups import get_top_visited_products
+
+PREFIX = 'bench-'
+EMAIL_DOMAIN = '@bench.invalid'
+BATCH_SIZE = 5000
+DAYS = 180
+
+# Modelos cuyos índices se comparan
+BENCH_MODELS = [StoreVisit, Pedido, ProductStore, StockNotification, ConversationMessage]
+
+
+class Command(BaseCommand):
+    help = 'Siembra datos sintéticos y mide (EXPLAIN + tiempos) las consultas calientes sin y con índices'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=10000,
+                            help='Visitas a sembrar (10000, 100000, 1000000); el resto escala a partir de este número')
+        parser.add_argument('--repeat', type=int, default=5, help='Repeticiones por consulta (se reporta la mediana)')
+        parser.add_argument('--output', help='Archivo JSON donde guardar planes y tiempos')
+        parser.add_argument('--skip-seed', action='store_true', help='Usar los datos sintéticos ya sembrados')
+        parser.add_argument('--no-compare', action='store_true', help='Medir solo con los índices actuales')
+        parser.add_argument('--keep', action='store_true', help='No borrar los datos sintéticos al terminar')
+        parser.add_argument('--cleanup', action='store_true', help='Solo borrar los datos sintéticos')
+        parser.add_argument('--seed', type=int, default=42, help='Semilla del generador aleatorio')
+        parser.add_argument('--budgets', action='store_true',
+                            help='Solo verificar el máximo de consultas de los listados de visitas')
+
+    def handle(self, *args, **options):
+        if options['cleanup']:
+            self.cleanup()
+            return
+
+        if not options['skip_seed']:
+            self.cleanup()
+            self.seed(options['rows'], random.Random(options['seed']))
+
+        if options['budgets']:
+            try:
+                self.check_budgets()
+            finally:
+                if not options['keep'] and not options['skip_seed']:
+                    self.cleanup()
+            return
+
+        queries = self.build_queries()
+        report = {
+            'vendor': connection.vendor,
+            'rows': options['rows'],
+            'repeat': options['repeat'],
+            'results': {},
+        }
+
+        if not options['no_compare']:
+            self.stdout.write('⏱️  Midiendo sin índices...')
+            with self.indexes_removed():
+                for name, queryset in queries.items():
+                    report['results'].setdefault(name, {})['before'] = self.measure(queryset, options['repeat'])
+
+        self.stdout.write('⏱️  Midiendo con índices...')
+        for name, queryset in queries.items():
+            report['results'].setdefault(name, {})['after'] = self.measure(queryset, options['repeat'])
+
+        self.print_report(report, options['verbosity'])
+
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as handle:
+                json.dump(report, handle, indent=2, ensure_ascii=False)
+            self.stdout.write(self.style.SUCCESS(f"✅ Reporte guardado en {options['output']}"))
+
+        if not options['keep'] and not options['skip_seed']:
+            self.cleanup()
+
+    # ------------------------------------------------------------------
+    # Datos sintéticos
+    # ------------------------------------------------------------------
+
+    def seed(self, rows, rng):
+        """Inserta en lote (bulk_create no dispara signals de índices ni resúmenes)"""
+        started = time.monotonic()
+        now = timezone.now()
+
+        def moment():
+            return now - timedelta(seconds=rng.randint(0, DAYS * 86400))
+
+        categories = Category.objects.bulk_create([
+            Category(nombre=f'{PREFIX}categoria {i}', slug=f'{PREFIX}categoria-{i}') for i in range(20)
+        ])
+        users = SimpleUser.objects.bulk_create([
+            SimpleUser(email=f'usuario{i}{EMAIL_DOMAIN}', telefono='3000000000', name=f'{PREFIX}usuario {i}',
+                       username=f'{PREFIX}usuario{i}', password='!')
+            for i in range(max(rows // 1000, 20))
+        ])
+
+        product_count = max(rows // 100, 50)
+        self.bulk_insert(ProductStore, (
+            ProductStore(
+                name=f'{PREFIX}producto {i}', description='Producto sintético',
+                price_buy=Decimal(rng.randint(10, 900) * 1000), price=Decimal(rng.randint(20, 1000) * 1000),
+                stock=0 if rng.random() < 0.2 else rng.randint(1, 50), category=rng.choice(categories),
+            )
+            for i in range(product_count)
+        ))
+        product_ids = list(ProductStore.objects.filter(name__startswith=PREFIX).values_list('id', flat=True))
+
+        visit_types = ['home', 'store', 'product_detail', 'cart', 'checkout']
+        self.bulk_insert(StoreVisit, (
+            StoreVisit(
+                timestamp=moment(), session_key=f'{PREFIX}{rng.randint(0, rows // 5)}',
+                user=rng.choice(users) if rng.random() < 0.3 else None,
+                visit_type=visit_type,
+                product_id=rng.choice(product_ids) if visit_type == 'product_detail' else None,
+                ip_address=f'10.{rng.randint(0, 255)}.{rng.randint(0, 255)}.{rng.randint(1, 254)}',
+            )
+            for visit_type in (rng.choice(visit_types) for _ in range(rows))
+        ))
+
+        estados = [choice for choice, _ in Pedido.ESTADO_CHOICES]
+        metodos = [choice for choice, _ in Pedido.METODO_PAGO_CHOICES]
+        pagos = [choice for choice, _ in Pedido.ESTADO_PAGO_CHOICES]
+        self.bulk_insert(Pedido, (
+            Pedido(
+                user=rng.choice(users), nombre=f'{PREFIX}cliente', direccion='Calle 1', ciudad='Bogotá',
+                departamento='Cundinamarca', total=Decimal(rng.randint(20, 3000) * 1000), detalles='[]',
+                estado=rng.choice(estados), metodo_pago=rng.choice(metodos), estado_pago=rng.choice(pagos),
+                transaction_id=f'{PREFIX}tx-{i}',
+            )
+            for i in range(rows // 10)
+        ))
+        self.spread_dates(Pedido.objects.filter(nombre=f'{PREFIX}cliente'), 'fecha', now)
+
+        notification_types = [choice for choice, _ in StockNotification.NOTIFICATION_TYPES]
+        statuses = [choice for choice, _ in StockNotification.STATUS_CHOICES]
+        self.bulk_insert(StockNotification, (
+            StockNotification(
+                product_id=rng.choice(product_ids), email=f'aviso{i}{EMAIL_DOMAIN}',
+                notification_type=rng.choice(notification_types), status=rng.choice(statuses),
+            )
+            for i in range(rows // 20)
+        ))
+        self.spread_dates(StockNotification.objects.filter(email__endswith=EMAIL_DOMAIN), 'created_at', now)
+
+        conversations = Conversation.objects.bulk_create([
+            Conversation(user=rng.choice(users), subject=f'{PREFIX}consulta {i}') for i in range(max(rows // 100, 10))
+        ])
+        self.bulk_insert(ConversationMessage, (
+            ConversationMessage(
+                conversation=rng.choice(conversations), message='Mensaje sintético',
+                is_admin=rng.random() < 0.5, is_read=rng.random() < 0.7,
+            )
+            for _ in range(rows // 10)
+        ))
+        self.spread_dates(
+            ConversationMessage.objects.filter(conversation__subject__startswith=PREFIX), 'created_at', now
+        )
+
+        self.stdout.write(self.style.SUCCESS(
+            f'✅ Datos sintéticos sembrados ({rows} visitas) en {time.monotonic() - started:.1f}s'
+        ))
+
+    def bulk_insert(self, model, objects):
+        batch = []
+        for obj in objects:
+            batch.append(obj)
+            if len(batch) >= BATCH_SIZE:
+                model.objects.bulk_create(batch)
+                batch = []
+        if batch:
+            model.objects.bulk_create(batch)
+
+    def spread_dates(self, queryset, field, now):
+        """Reparte un campo auto_now_add en los últimos DAYS días (un UPDATE por día)"""
+        buckets = queryset.annotate(day_bucket=Mod('id', DAYS))
+        for day in range(DAYS):
+            buckets.filter(day_bucket=day).update(**{field: now - timedelta(days=day, minutes=day * 7)})
+
+    def cleanup(self):
+        """
+        Borra los datos sintéticos con DELETE directos: el borrado normal del ORM
+        dispararía por fila las signals de búsqueda, resúmenes y recomendaciones
+        """
+        users = SimpleUser.objects.filter(email__endswith=EMAIL_DOMAIN)
+        products = ProductStore.objects.filter(name__startswith=PREFIX)
+        steps = [
+            ConversationMessage.objects.filter(conversation__user__in=users),
+            Conversation.objects.filter(user__in=users),
+            StockNotification.objects.filter(product__in=products),
+            StockNotification.objects.filter(email__endswith=EMAIL_DOMAIN),
+            Pedido.objects.filter(user__in=users),
+            StoreVisit.objects.filter(session_key__startswith=PREFIX),
+            products,
+            Category.objects.filter(nombre__startswith=PREFIX),
+            users,
+        ]
+        deleted = 0
+        for queryset in steps:
+            deleted += queryset._raw_delete(queryset.db)
+        if deleted:
+            self.stdout.write(self.style.SUCCESS(f'🧹 {deleted} filas sintéticas eliminadas'))
+
+    # ------------------------------------------------------------------
+    # Consultas medidas
+    # ------------------------------------------------------------------
+
+    def build_queries(self):
+        """Las consultas de las vistas, con parámetros tomados de los datos sembrados"""
+        now = timezone.now()
+        month_start = now - timedelta(days=30)
+        today_start = timezone.localtime(now).replace(hour=0, minute=0, second=0, microsecond=0)
+
+        user = SimpleUser.objects.filter(email__endswith=EMAIL_DOMAIN).first() or SimpleUser.objects.first()
+        product = ProductStore.objects.filter(name__startswith=PREFIX).first() or ProductStore.objects.first()
+        category_id = product.category_id if product else None
+        conversation = Conversation.objects.filter(user=user).first() if user else None
+
+        store_filters = {
+            'q': '', 'category': '', 'price_min': '', 'price_max': '',
+            'in_stock': True, 'out_of_stock': False, 'sort': 'price_desc',
+        }
+        store_keys = get_sort_keys(store_filters)
+        store_page = filter_store_products(store_filters).order_by(*order_expressions(store_keys))
+
+        queries = {
+            # Dashboard: visitas
+            'visitas_recientes': StoreVisit.objects.select_related('user').order_by('-timestamp')[:20],
+            'visitas_por_tipo_mes': StoreVisit.objects.filter(
+                visit_type='product_detail', timestamp__gte=month_start
+            ).order_by('-timestamp')[:50],
+            'visitas_de_usuario': StoreVisit.objects.filter(user=user).order_by('-timestamp')[:50],
+            'co_visitas_producto': StoreVisit.objects.filter(
+                product_id=product.id if product else 0, visit_type='product_detail', timestamp__gte=month_start
+            ).values('session_key'),
+            # Dashboard: pedidos
+            'pedidos_por_estado': Pedido.objects.filter(estado='pendiente').order_by('-fecha')[:50],
+            'pedidos_por_metodo': Pedido.objects.filter(metodo_pago='wompi').order_by('-fecha')[:50],
+            'ingresos_por_estado_pago': Pedido.objects.filter(
+                estado_pago__in=['pendiente', 'procesando']
+            ).values('estado_pago').annotate(total_sum=Sum('total')),
+            'pedidos_hoy': Pedido.objects.filter(fecha__gte=today_start).exclude(estado='cancelado'),
+            'mis_pedidos': Pedido.objects.filter(user=user).order_by('-fecha'),
+            'pedido_por_transaccion': Pedido.objects.filter(transaction_id=f'{PREFIX}tx-1'),
+            # Tienda
+            'tienda_categoria_con_stock': ProductStore.objects.filter(
+                category_id=category_id, stock__gt=0
+            ).order_by('name', 'id')[:25],
+            'tienda_precio_desc_pagina_1': store_page[:25],
+            'tienda_precio_desc_cursor': seek(store_page, store_keys, [500000, 0])[:25],
+            'productos_stock_bajo': ProductStore.objects.filter(stock__lte=5, stock__gt=0),
+            'productos_nuevos': ProductStore.objects.order_by('-created_at')[:12],
+            # Notificaciones y mensajes
+            'avisos_pendientes_producto': StockNotification.objects.filter(
+                product=product, status='pending', notification_type='stock_available'
+            ),
+            'avisos_por_estado': StockNotification.objects.filter(status='pending').order_by('-created_at')[:50],
+            'mensajes_conversacion': ConversationMessage.objects.filter(conversation=conversation).order_by('created_at'),
+            'mensajes_no_leidos': ConversationMessage.objects.filter(
+                conversation=conversation, is_admin=True, is_read=False
+            ),
+        }
+        return queries
+
+    def build_listings(self):
+        """Los listados de visitas del dashboard tal como los arman las vistas"""
+        return {
+            'visitas_recientes': lambda: [
+                (visita.user, visita.product)
+                for visita in with_visit_products(StoreVisit.objects.order_by('-timestamp'))[:1000]
+            ],
+            'productos_mas_visitados': lambda: hydrate_products(
+                get_top_visited_products('all', 100), ProductStore.objects.select_related('category')
+            ),
+        }
+
+    def check_budgets(self):
+        exceeded = []
+        for name, listing in self.build_listings().items():
+            with CaptureQueriesContext(connection) as captured:
+                rows = listing()
+            budget = LISTING_QUERY_BUDGETS[name]
+            within = len(captured) <= budget
+            icon = '✅' if within else '❌'
+            self.stdout.write(f'{icon} {name}: {len(captured)} consultas para {len(rows)} filas (máximo {budget})')
+            if not within:
+                exceeded.append(name)
+        if exceeded:
+            raise CommandError(f"Listados por encima de su máximo de consultas: {', '.join(exceeded)}")
+        self.stdout.write(self.style.SUCCESS('✅ Todos los listados dentro de su máximo de consultas'))
+
+    def measure(self, queryset, repeat):
+        plan = queryset.explain()
+        timings = []
+        for _ in range(max(repeat, 1)):
+            started = time.perf_counter()
+            list(queryset.all())
+            timings.append((time.perf_counter() - started) * 1000)
+        return {'median_ms': round(statistics.median(timings), 3), 'plan': plan}
+
+    def indexes_removed(self):
+        command = self
+
+        class _IndexesRemoved:
+            """Elimina los índices de BENCH_MODELS y los recrea al salir"""
+
+            def __enter__(self):
+                self.removed = []
+                with connection.schema_editor() as editor:
+                    for model in BENCH_MODELS:
+                        for index in model._meta.indexes:
+                            editor.remove_index(model, index)
+                            self.removed.append((model, index))
+                command.stdout.write(f'   {len(self.removed)} índices eliminados temporalmente')
+
+            def __exit__(self, *exc):
+                with connection.schema_editor() as editor:
+                    for model, index in self.removed:
+                        editor.add_index(model, index)
+                command.stdout.write(f'   {len(self.removed)} índices restaurados')
+                return False
+
+        return _IndexesRemoved()
+
+    def print_report(self, report, verbosity):
+        self.stdout.write(f"\n📊 {report['vendor']} - {report['rows']} visitas")
+        self.stdout.write(f"{'consulta':32} {'antes (ms)':>12} {'después (ms)':>13} {'mejora':>8}")
+        for name, result in report['results'].items():
+            after = result['after']['median_ms']
+            before = result.get('before', {}).get('median_ms')
+            speedup = f'{before / after:.1f}x' if before is not None and after else '-'
+            before_text = f'{before:.3f}' if before is not None else '-'
+            self.stdout.write(f'{name:32} {before_text:>12} {after:>13.3f} {speedup:>8}')
+            if verbosity >= 2:
+                if 'before' in result:
+                    self.stdout.write(f"   antes:   {result['before']['plan']}")
+                self.stdout.write(f"   después: {result['after']['plan']}")
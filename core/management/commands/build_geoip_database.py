@@ -0,0 +1,57 @@
+"""
+Genera la base de datos local de geolocalización a partir de un CSV de rangos
+Ejecutar: python manage.py build_geoip_database rangos.csv
+Columnas esperadas: ip_inicio, ip_fin, país, ciudad (IPs en formato punto o entero)
+"""
+import csv
+import ipaddress
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core.geolocation_helper import OfflineRangeDatabase, get_geolocation_settings, reset_locator
+
+
+def _to_int(value):
+    value = value.strip()
+    if value.isdigit():
+        return int(value)
+    ip = ipaddress.ip_address(value)
+    if ip.version != 4:
+        raise ValueError('solo IPv4')
+    return int(ip)
+
+
+class Command(BaseCommand):
+    help = 'Genera el archivo binario de rangos IP usado para geolocalizar sin red'
+
+    def add_arguments(self, parser):
+        parser.add_argument('csv_path', type=str, help='CSV con ip_inicio, ip_fin, país, ciudad')
+        parser.add_argument('--output', type=str, help='Ruta de salida (por defecto GEOLOCATION["DATABASE_PATH"])')
+
+    def handle(self, *args, **options):
+        output = options.get('output') or get_geolocation_settings().get('DATABASE_PATH')
+        if not output:
+            raise CommandError('Configura GEOLOCATION["DATABASE_PATH"] o usa --output')
+
+        ranges = []
+        skipped = 0
+        with open(options['csv_path'], newline='', encoding='utf-8') as handle:
+            for row in csv.reader(handle):
+                if len(row) < 3:
+                    skipped += 1
+                    continue
+                try:
+                    start, end = _to_int(row[0]), _to_int(row[1])
+                except ValueError:
+                    skipped += 1  # Cabecera, IPv6 o fila inválida
+                    continue
+                ranges.append((start, end, row[2].strip(), row[3].strip() if len(row) > 3 else ''))
+
+        os.makedirs(os.path.dirname(str(output)) or '.', exist_ok=True)
+        count = OfflineRangeDatabase.write(str(output), ranges)
+        reset_locator()
+
+        self.stdout.write(self.style.SUCCESS(f'✅ {count} rangos escritos en {output}'))
+        if skipped:
+            self.stdout.write(self.style.WARNING(f'⚠️  {skipped} filas omitidas'))
@@ -0,0 +1,41 @@
+"""
+Completa ciudad y país de las visitas que se registraron sin ubicación
+Ejecutar periódicamente (cron): python manage.py enrich_visit_locations
+"""
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from core.geolocation_helper import get_location_from_ip
+from core.models import StoreVisit
+
+
+class Command(BaseCommand):
+    help = 'Geolocaliza en segundo plano las visitas sin ciudad ni país (una consulta por IP)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=7, help='Antigüedad máxima de las visitas a revisar')
+        parser.add_argument('--limit', type=int, default=500, help='Máximo de IPs distintas por ejecución')
+        parser.add_argument('--offline', action='store_true', help='No consultar APIs externas')
+
+    def handle(self, *args, **options):
+        since = timezone.now() - timedelta(days=options['days'])
+        pending = StoreVisit.objects.filter(
+            timestamp__gte=since,
+            country__isnull=True,
+            ip_address__isnull=False,
+        )
+        ips = list(pending.values_list('ip_address', flat=True).distinct()[:options['limit']])
+
+        updated = 0
+        for ip in ips:
+            location = get_location_from_ip(ip, allow_network=not options['offline'])
+            if not (location.get('city') or location.get('country')):
+                continue
+            updated += pending.filter(ip_address=ip).update(
+                city=location.get('city'),
+                country=location.get('country'),
+            )
+
+        self.stdout.write(self.style.SUCCESS(f'✅ {updated} visitas geolocalizadas ({len(ips)} IPs revisadas)'))
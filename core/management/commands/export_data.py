@@ -0,0 +1,46 @@
+"""
+Exporta pedidos, visitas o ventas a un archivo CSV o XLSX
+Mismo formato que /dashboard/exportar/<dataset>/<formato>/, pensado para
+rangos grandes (p. ej. un año de visitas) que superan el timeout de gunicorn:
+
+    python manage.py export_data visitas --format xlsx --desde 2025-01-01 --hasta 2025-12-31
+    python manage.py export_data pedidos --desde 2025-06-01 --despues-de 4512 --output pedidos-resto.csv
+"""
+from django.core.management.base import BaseCommand, CommandError
+
+from core.services.exports import EXPORT_DATASETS, export_filename, parse_export_range, stream_export
+
+
+class Command(BaseCommand):
+    help = 'Exporta pedidos, visitas o ventas a CSV/XLSX leyendo las filas por partes'
+
+    def add_arguments(self, parser):
+        parser.add_argument('dataset', choices=sorted(EXPORT_DATASETS), help='Datos a exportar')
+        parser.add_argument('--format', choices=['csv', 'xlsx'], default='csv', help='Formato del archivo')
+        parser.add_argument('--periodo', help="Atajo para --desde: 'today', 'week' o 'month'")
+        parser.add_argument('--desde', help='Fecha inicial incluida (AAAA-MM-DD o AAAA-MM-DDTHH:MM:SS)')
+        parser.add_argument('--hasta', help='Fecha final (un día sin hora se incluye completo)')
+        parser.add_argument('--despues-de', dest='despues_de', help='Reanudar después de este id')
+        parser.add_argument('--output', help='Archivo de salida (por defecto <dataset>_<desde>_<hasta>.<formato>)')
+
+    def handle(self, *args, **options):
+        try:
+            export_range = parse_export_range(options)
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        fmt = options['format']
+        output = options['output'] or export_filename(options['dataset'], fmt, export_range)
+        written = 0
+        if fmt == 'csv':
+            with open(output, 'w', encoding='utf-8', newline='') as handle:
+                for chunk in stream_export(options['dataset'], fmt, export_range):
+                    written += len(chunk)
+                    handle.write(chunk)
+        else:
+            with open(output, 'wb') as handle:
+                for chunk in stream_export(options['dataset'], fmt, export_range):
+                    written += len(chunk)
+                    handle.write(chunk)
+
+        self.stdout.write(self.style.SUCCESS(f'✅ {options["dataset"]} exportado a {output} ({written / 1024:.0f} KB)'))
@@ -0,0 +1,81 @@
+"""
+Convierte StoreVisit en tabla particionada por mes (solo PostgreSQL)
+Copia las visitas por lotes a la tabla creada por la migración 0040 mientras la
+tienda sigue funcionando y luego cambia las tablas con un bloqueo corto:
+
+    python manage.py partition_visits                 # copia y cambia las tablas
+    python manage.py partition_visits --copy-only     # solo copia (se puede reanudar)
+    python manage.py partition_visits --undo          # vuelve a una tabla sin particiones
+
+Durante la copia no deben correr prune_visits, enrich_visit_locations ni
+backfill_visit_user_agents: los cambios a visitas ya copiadas no se trasladan
+a la tabla nueva.
+"""
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from core.services.visit_retention import (
+    COPY_BATCH_SIZE,
+    SWAP_TABLE,
+    copy_to_swap_table,
+    create_swap_table,
+    drop_swap_table,
+    get_swap_table,
+    is_partitioned,
+    swap_visit_table,
+)
+
+
+class Command(BaseCommand):
+    help = 'Particiona StoreVisit por mes copiando las visitas por lotes y cambiando las tablas al final'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=COPY_BATCH_SIZE, help='Ids por lote de copia')
+        parser.add_argument('--copy-only', action='store_true', help='Copiar sin cambiar las tablas')
+        parser.add_argument('--undo', action='store_true', help='Volver a una tabla sin particiones')
+        parser.add_argument('--discard', action='store_true', help=f'Eliminar {SWAP_TABLE} sin cambiar nada')
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            self.stdout.write('ℹ️ Solo PostgreSQL: en SQLite la retención trabaja por rangos de fecha')
+            return
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size debe ser mayor que 0')
+
+        if options['discard']:
+            drop_swap_table()
+            self.stdout.write(self.style.SUCCESS(f'✅ {SWAP_TABLE} eliminada'))
+            return
+
+        partitioned = not options['undo']
+        swap = get_swap_table()
+        if is_partitioned() == partitioned:
+            if swap:
+                drop_swap_table()
+            self.stdout.write(self.style.SUCCESS(
+                '✅ StoreVisit ya está ' + ('particionada' if partitioned else 'sin particiones')
+            ))
+            return
+
+        if swap is None:
+            create_swap_table(partitioned)
+            self.stdout.write(f'🆕 {SWAP_TABLE} creada')
+        elif swap['partitioned'] != partitioned:
+            raise CommandError(f'{SWAP_TABLE} es de otro tipo: elimínala con --discard y vuelve a ejecutar')
+        else:
+            self.stdout.write(f'↪️ Reanudando desde el id {swap["last_id"]} ({swap["rows"]} visitas ya copiadas)')
+
+        total = 0
+        for copied, last_id in copy_to_swap_table(options['batch_size']):
+            total += copied
+            self.stdout.write(f'   📋 {total} visitas copiadas (hasta el id {last_id})')
+
+        if options['copy_only']:
+            self.stdout.write(self.style.SUCCESS(f'✅ {total} visitas copiadas a {SWAP_TABLE}; falta el cambio de tablas'))
+            return
+
+        remaining = swap_visit_table()
+        mode = 'particionada por mes' if partitioned else 'sin particiones'
+        self.stdout.write(self.style.SUCCESS(
+            f'✅ StoreVisit {mode}: {total + remaining} visitas copiadas ({remaining} con la tabla bloqueada)'
+        ))
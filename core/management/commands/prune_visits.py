@@ -0,0 +1,56 @@
+"""
+Retención de visitas (core.services.visit_retention)
+Ejecutar a diario (cron): python manage.py prune_visits
+Ver los meses y qué se archivaría: python manage.py prune_visits --dry-run
+"""
+from django.core.management.base import BaseCommand, CommandError
+
+from core.services.visit_retention import (
+    archive_partition,
+    ensure_partitions,
+    get_expired_partitions,
+    get_retention_settings,
+    is_partitioned,
+    list_partitions,
+)
+
+
+class Command(BaseCommand):
+    help = 'Crea las particiones de visitas de los próximos meses y archiva los meses fuera de la retención'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--months', type=int, default=None,
+                            help='Meses completos que se conservan además del actual (por defecto VISIT_RETENTION)')
+        parser.add_argument('--archive-dir', default=None, help='Carpeta de los archivos .csv.gz')
+        parser.add_argument('--dry-run', action='store_true', help='Solo mostrar los meses y cuántas visitas se archivarían')
+
+    def handle(self, *args, **options):
+        config = get_retention_settings()
+        months = config['RETENTION_MONTHS'] if options['months'] is None else options['months']
+        if months < 0:
+            raise CommandError('--months no puede ser negativo')
+        archive_dir = options['archive_dir'] or config['ARCHIVE_DIR']
+        mode = 'particiones de PostgreSQL' if is_partitioned() else 'tabla sin particiones'
+
+        if options['dry_run']:
+            expired = {partition.label for partition in get_expired_partitions(months)}
+            self.stdout.write(f'📅 Retención: {months} meses + el actual ({mode})')
+            for partition in list_partitions():
+                action = '📦 archivar' if partition.label in expired else '✅ conservar'
+                self.stdout.write(f'   {partition.label}: {partition.visits().count()} visitas → {action}')
+            return
+
+        created = ensure_partitions(config['PARTITIONS_AHEAD'])
+        if created:
+            self.stdout.write(self.style.SUCCESS(f'✅ {len(created)} particiones creadas: {", ".join(created)}'))
+
+        archived = 0
+        for partition in get_expired_partitions(months):
+            try:
+                rows, path = archive_partition(partition, archive_dir)
+            except RuntimeError as e:
+                raise CommandError(str(e))
+            archived += rows
+            self.stdout.write(f'   📦 {partition.label}: {rows} visitas' + (f' → {path}' if path else ' (vacío)'))
+
+        self.stdout.write(self.style.SUCCESS(f'✅ {archived} visitas archivadas en {archive_dir} ({mode})'))
@@ -0,0 +1,16 @@
+"""
+Recalcula los productos relacionados de todo el catálogo
+Ejecutar periódicamente (cron nocturno) para incorporar compras y visitas
+recientes: python manage.py rebuild_related_products
+"""
+from django.core.management.base import BaseCommand
+
+from core.services.related_products import rebuild_related_products
+
+
+class Command(BaseCommand):
+    help = 'Precalcula los productos relacionados (nombre, categoría, compras y visitas conjuntas)'
+
+    def handle(self, *args, **options):
+        total = rebuild_related_products()
+        self.stdout.write(self.style.SUCCESS(f'✅ {total} relaciones de productos calculadas'))
@@ -0,0 +1,27 @@
+"""
+Reconstruye los resúmenes diarios de ventas (VentaDiaria / VentaDiariaCategoria)
+Ejecutar una vez tras migrar o si se editaron pedidos con queryset.update():
+python manage.py rebuild_sales_summary
+"""
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from core.services.sales_summary import rebuild_sales_summary
+
+
+class Command(BaseCommand):
+    help = 'Recalcula los resúmenes diarios de ventas desde Pedido y PedidoDetalle'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=None,
+                            help='Solo los últimos N días (por defecto todo el historial)')
+
+    def handle(self, *args, **options):
+        since = None
+        if options['days'] is not None:
+            since = timezone.localdate() - timedelta(days=options['days'])
+
+        days = rebuild_sales_summary(since)
+        self.stdout.write(self.style.SUCCESS(f'✅ {days} días de ventas reconstruidos'))
@@ -0,0 +1,16 @@
+"""
+Regenera el índice de búsqueda de productos (ProductSearchDocument + GIN/FTS5)
+El índice se mantiene solo con los signals; usar tras cargas masivas
+con queryset.update() o bulk_create: python manage.py rebuild_search_index
+"""
+from django.core.management.base import BaseCommand
+
+from core.services.search_service import get_backend, index_products
+
+
+class Command(BaseCommand):
+    help = 'Regenera el índice de texto completo de los productos de la tienda'
+
+    def handle(self, *args, **options):
+        total = index_products()
+        self.stdout.write(self.style.SUCCESS(f'✅ {total} productos indexados (motor: {get_backend()})'))
@@ -0,0 +1,23 @@
+"""
+Devuelve al stock las reservas de pago con Wompi que vencieron
+Cron (cada pocos minutos): python manage.py release_expired_reservations
+"""
+from django.core.management.base import BaseCommand
+
+from core.services.stock_reservation import release_expired_reservations
+
+
+class Command(BaseCommand):
+    help = 'Libera las reservas de stock vencidas (pagos con Wompi no completados)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--limit', type=int, default=200, help='Máximo de referencias por lote')
+
+    def handle(self, *args, **options):
+        total = 0
+        while True:
+            released = release_expired_reservations(limit=options['limit'])
+            total += released
+            if released < options['limit']:
+                break
+        self.stdout.write(self.style.SUCCESS(f'✅ {total} reservas vencidas liberadas'))
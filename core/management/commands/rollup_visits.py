@@ -0,0 +1,47 @@
+"""
+Mantenimiento de los contadores pre-agregados de visitas (VisitRollup)
+Backfill inicial: python manage.py rollup_visits --backfill
+(solo desde el mes de la visita más antigua que sigue en StoreVisit: los
+buckets diarios de los meses archivados se conservan)
+Compactación diaria (cron): python manage.py rollup_visits --compact
+"""
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+
+from core.services.visit_rollups import (
+    compact_visit_rollups,
+    day_bucket,
+    rebuild_visit_rollups,
+)
+from django.utils import timezone
+
+
+class Command(BaseCommand):
+    help = 'Reconstruye y compacta los contadores de visitas del dashboard'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--backfill', action='store_true', help='Reconstruir los buckets por hora desde StoreVisit')
+        parser.add_argument('--days', type=int, default=None,
+                            help='Con --backfill: solo los últimos N días (por defecto todo lo que sigue en StoreVisit)')
+        parser.add_argument('--compact', action='store_true', help='Fusionar buckets por hora antiguos en buckets diarios')
+        parser.add_argument('--keep-hours', type=int, default=2,
+                            help='Con --compact: días recientes que conservan el detalle por hora')
+
+    def handle(self, *args, **options):
+        if not options['backfill'] and not options['compact']:
+            self.stdout.write(self.style.WARNING('⚠️ Indica --backfill y/o --compact'))
+            return
+
+        if options['backfill']:
+            since = None
+            if options['days'] is not None:
+                since = day_bucket(timezone.now()) - timedelta(days=options['days'])
+            created = rebuild_visit_rollups(since)
+            self.stdout.write(self.style.SUCCESS(f'✅ {created} buckets por hora reconstruidos'))
+
+        if options['compact']:
+            written, deleted = compact_visit_rollups(options['keep_hours'])
+            self.stdout.write(self.style.SUCCESS(
+                f'✅ {deleted} buckets por hora compactados en {written} buckets diarios'
+            ))
@@ -0,0 +1,81 @@
+"""
+Worker de la cola de tareas en segundo plano (core.services.job_queue)
+Servicio aparte de gunicorn: python manage.py run_jobs --concurrency 4
+Revisar el dead-letter: python manage.py run_jobs --retry-dead
+"""
+import signal
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from core.services.job_queue import (
+    claim_jobs, execute, get_worker_id, load_tasks, purge_finished_jobs, requeue_stale_jobs, retry_dead_jobs,
+)
+
+
+def _execute(job):
+    # Cada hilo usa su propia conexión; se cierra al terminar la tarea
+    try:
+        return execute(job)
+    finally:
+        close_old_connections()
+
+
+class Command(BaseCommand):
+    help = 'Ejecuta las tareas en segundo plano (correos, WhatsApp, avisos) con reintentos'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--concurrency', type=int, default=2, help='Tareas ejecutándose a la vez (hilos)')
+        parser.add_argument('--sleep', type=float, default=2.0, help='Segundos de espera con la cola vacía')
+        parser.add_argument('--task', action='append', dest='tasks', help='Solo estas tareas (repetible)')
+        parser.add_argument('--once', action='store_true', help='Vaciar la cola una vez y salir')
+        parser.add_argument('--retry-dead', action='store_true', help='Reencolar las tareas del dead-letter y salir')
+        parser.add_argument('--purge', action='store_true', help='Borrar tareas completadas antiguas y salir')
+
+    def handle(self, *args, **options):
+        if options['retry_dead']:
+            for name in options['tasks'] or [None]:
+                count = retry_dead_jobs(name)
+                self.stdout.write(self.style.SUCCESS(f'🔁 {count} tareas reencoladas desde el dead-letter'))
+            return
+
+        if options['purge']:
+            deleted = purge_finished_jobs()
+            self.stdout.write(self.style.SUCCESS(f'🧹 {deleted} tareas completadas eliminadas'))
+            return
+
+        load_tasks()
+        concurrency = max(options['concurrency'], 1)
+        worker_id = get_worker_id()
+        stopping = threading.Event()
+
+        def stop(signum, frame):
+            stopping.set()
+
+        signal.signal(signal.SIGTERM, stop)
+        signal.signal(signal.SIGINT, stop)
+
+        self.stdout.write(self.style.SUCCESS(f'🚀 Worker {worker_id} con {concurrency} hilos'))
+
+        succeeded = failed = 0
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            while not stopping.is_set():
+                requeue_stale_jobs()
+                jobs = claim_jobs(worker_id, limit=concurrency, tasks=options['tasks'])
+                close_old_connections()
+                if not jobs:
+                    if options['once']:
+                        break
+                    stopping.wait(options['sleep'])
+                    continue
+
+                # Se reclaman tantas tareas como hilos: nunca quedan reclamadas esperando
+                for ok in pool.map(_execute, jobs):
+                    if ok:
+                        succeeded += 1
+                    else:
+                        failed += 1
+
+        self.stdout.write(self.style.SUCCESS(f'✅ {succeeded} tareas completadas, {failed} con error'))
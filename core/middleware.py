@@ -0,0 +1,86 @@
+import hmac
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+
+from .services.request_profiling import (
+    check_query_budget, get_profiling_settings, install_on_open_connections, install_profiling, profile_stats,
+    server_timing_header, start_profile, stop_profile,
+)
+
+
+class ProfilingMiddleware:
+    """
+    Perfilado por request: número y tiempo de consultas SQL, consultas
+    duplicadas, tiempo de plantillas y de Python (core.services.request_profiling)
+
+    Se activa para todos los requests con PROFILING['ENABLED'] o para uno solo
+    con el header PROFILING['HEADER'] si trae PROFILING['TOKEN'] o el request es
+    de un superusuario (request.user o la sesión del dashboard); DEBUG no lo
+    habilita. Va después de AuthenticationMiddleware para poder leer request.user. Los números salen en el header Server-Timing
+    y se acumulan por vista en /dashboard/profiling/.
+
+    Funciona con WSGI y con la app ASGI de Channels (sync y async).
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+        install_profiling()
+
+    def should_profile(self, request) -> bool:
+        config = get_profiling_settings()
+        if config['ENABLED']:
+            return True
+        value = request.headers.get(config['HEADER'])
+        if not value:
+            return False
+        if config['TOKEN'] and hmac.compare_digest(value, config['TOKEN']):
+            return True
+        user = getattr(request, 'user', None)
+        if user is not None and user.is_superuser:
+            return True
+        session = getattr(request, 'session', None)
+        return bool(session is not None and session.get('superuser_id'))
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        if not self.should_profile(request):
+            return self.get_response(request)
+
+        install_on_open_connections()
+        profile = start_profile()
+        try:
+            response = self.get_response(request)
+        finally:
+            stop_profile(profile)
+        return self.process_profile(request, response, profile)
+
+    async def __acall__(self, request):
+        if not await sync_to_async(self.should_profile)(request):
+            return await self.get_response(request)
+
+        await sync_to_async(install_on_open_connections)()
+        profile = start_profile()
+        try:
+            response = await self.get_response(request)
+        finally:
+            stop_profile(profile)
+        return self.process_profile(request, response, profile)
+
+    def process_profile(self, request, response, profile):
+        config = get_profiling_settings()
+        summary = profile.summary(config['DUPLICATE_THRESHOLD'])
+        response['Server-Timing'] = server_timing_header(summary)
+
+        match = getattr(request, 'resolver_match', None)
+        view_name = match.view_name if match else 'sin_resolver'
+
+        budget = config['QUERY_BUDGETS'].get(view_name)
+        profile_stats.record(view_name, request.path, summary, budget is not None and summary['queries'] > budget)
+        check_query_budget(view_name, summary)
+        return response
@@ -0,0 +1,19 @@
+# Generated by Django 4.2.24 on 2026-10-18 15:18
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0027_whatsappconfig'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='storevisit',
+            name='timestamp',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+    ]
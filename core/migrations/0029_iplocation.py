@@ -0,0 +1,30 @@
+# Generated by Django 4.2.24 on 2026-10-18 15:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0028_storevisit_timestamp_default'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='IPLocation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(help_text='IP exacta o prefijo, ej: 181.50.10.0/24', max_length=64, unique=True)),
+                ('city', models.CharField(blank=True, max_length=100, null=True)),
+                ('country', models.CharField(blank=True, max_length=100, null=True)),
+                ('latitude', models.FloatField(blank=True, null=True)),
+                ('longitude', models.FloatField(blank=True, null=True)),
+                ('source', models.CharField(default='network', max_length=20)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Ubicación de IP',
+                'verbose_name_plural': 'Ubicaciones de IP',
+            },
+        ),
+    ]
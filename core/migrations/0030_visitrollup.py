@@ -0,0 +1,31 @@
+# Generated by Django 4.2.24 on 2026-10-18 15:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0029_iplocation'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VisitRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('granularity', models.CharField(choices=[('hour', 'Hora'), ('day', 'Día')], default='hour', max_length=4)),
+                ('bucket', models.DateTimeField(help_text='Inicio de la hora o del día (hora local)')),
+                ('visit_type', models.CharField(max_length=20)),
+                ('is_authenticated', models.BooleanField(default=False)),
+                ('product_id', models.IntegerField(default=0, help_text='0 si la visita no es de un producto')),
+                ('count', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'verbose_name': 'Resumen de Visitas',
+                'verbose_name_plural': 'Resúmenes de Visitas',
+                'indexes': [models.Index(fields=['bucket', 'visit_type'], name='core_visitr_bucket_874faa_idx'), models.Index(fields=['product_id', 'bucket'], name='core_visitr_product_cf3c72_idx')],
+                'unique_together': {('granularity', 'bucket', 'visit_type', 'is_authenticated', 'product_id')},
+            },
+        ),
+    ]
@@ -0,0 +1,45 @@
+# Generated by Django 4.2.24 on 2026-10-18 15:24
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0030_visitrollup'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VentaDiaria',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha', models.DateField(help_text='Día en hora local', unique=True)),
+                ('pedidos', models.PositiveIntegerField(default=0)),
+                ('total_ingresos', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('cantidad_productos', models.PositiveIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Venta Diaria',
+                'verbose_name_plural': 'Ventas Diarias',
+                'ordering': ['-fecha'],
+            },
+        ),
+        migrations.CreateModel(
+            name='VentaDiariaCategoria',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha', models.DateField(help_text='Día en hora local')),
+                ('categoria', models.CharField(help_text='Nombre de la categoría al momento de la venta', max_length=100)),
+                ('total_ingresos', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('cantidad_productos', models.PositiveIntegerField(default=0)),
+                ('cantidad_pedidos', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'verbose_name': 'Venta Diaria por Categoría',
+                'verbose_name_plural': 'Ventas Diarias por Categoría',
+                'unique_together': {('fecha', 'categoria')},
+            },
+        ),
+    ]
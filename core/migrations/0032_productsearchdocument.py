@@ -0,0 +1,119 @@
+# Generated by Django 4.2.24 on 2026-10-18 15:26
+
+import re
+import unicodedata
+
+from django.db import migrations, models
+import django.db.models.deletion
+from django.utils.html import strip_tags
+
+# Copia congelada de la normalización y del DDL de core.services.search_service
+# al crear la migración: cambios posteriores del servicio no alteran lo que
+# hace. `manage.py rebuild_search_index` regenera el índice con la versión actual.
+_NON_WORD = re.compile(r'[^a-z0-9ñ]+')
+PG_VECTOR = ' || '.join(
+    f"setweight(to_tsvector('spanish', coalesce({column}, '')), '{weight}')"
+    for column, weight in (('name_text', 'A'), ('category_text', 'B'), ('body_text', 'C'))
+)
+
+
+def normalize_text(text):
+    """Minúsculas, sin tildes ni signos; conserva la ñ"""
+    if not text:
+        return ''
+    text = strip_tags(str(text)).lower().replace('ñ', '\x00')
+    text = unicodedata.normalize('NFKD', text)
+    text = ''.join(char for char in text if not unicodedata.combining(char))
+    text = text.replace('\x00', 'ñ')
+    return _NON_WORD.sub(' ', text).strip()
+
+
+def stem_word(word):
+    if len(word) > 4 and word.endswith('es') and word[-3] not in 'aeiou':
+        word = word[:-2]
+    elif len(word) > 3 and word.endswith('s'):
+        word = word[:-1]
+    if len(word) > 4 and word[-1] in 'aeo':
+        word = word[:-1]
+    return word
+
+
+def stem_text(text):
+    return ' '.join(stem_word(word) for word in text.split())
+
+
+def build_search_index(apps, schema_editor):
+    """Crea el índice del motor (GIN o FTS5) y lo llena con el catálogo actual"""
+    ProductStore = apps.get_model('core', 'ProductStore')
+    ProductSearchDocument = apps.get_model('core', 'ProductSearchDocument')
+    connection = schema_editor.connection
+
+    documents = [
+        ProductSearchDocument(
+            product_id=product.id,
+            name_text=normalize_text(product.name),
+            category_text=normalize_text(product.category.nombre if product.category else ''),
+            body_text=normalize_text(product.description),
+        )
+        for product in ProductStore.objects.select_related('category').iterator()
+    ]
+    ProductSearchDocument.objects.bulk_create(documents, batch_size=500)
+
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            cursor.execute("ALTER TABLE core_productsearchdocument ADD COLUMN IF NOT EXISTS search_vector tsvector")
+            cursor.execute(
+                "CREATE INDEX IF NOT EXISTS core_productsearch_vector_gin "
+                "ON core_productsearchdocument USING gin(search_vector)"
+            )
+            cursor.execute(f"UPDATE core_productsearchdocument SET search_vector = {PG_VECTOR}")
+        elif connection.vendor == 'sqlite':
+            try:
+                cursor.execute(
+                    "CREATE VIRTUAL TABLE IF NOT EXISTS core_productsearch_fts "
+                    "USING fts5(name, category, body, tokenize='unicode61 remove_diacritics 2')"
+                )
+            except Exception:
+                return  # SQLite sin FTS5: la búsqueda usa el modo básico
+            cursor.executemany(
+                "INSERT INTO core_productsearch_fts (rowid, name, category, body) VALUES (%s, %s, %s, %s)",
+                [
+                    (doc.product_id, stem_text(doc.name_text), stem_text(doc.category_text), stem_text(doc.body_text))
+                    for doc in documents
+                ],
+            )
+
+
+def drop_search_index(apps, schema_editor):
+    connection = schema_editor.connection
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            cursor.execute("DROP INDEX IF EXISTS core_productsearch_vector_gin")
+            cursor.execute("ALTER TABLE core_productsearchdocument DROP COLUMN IF EXISTS search_vector")
+        elif connection.vendor == 'sqlite':
+            cursor.execute("DROP TABLE IF EXISTS core_productsearch_fts")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0031_ventadiaria'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductSearchDocument',
+            fields=[
+                ('product', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='search_document', serialize=False, to='core.productstore')),
+                ('name_text', models.TextField(blank=True, default='')),
+                ('category_text', models.TextField(blank=True, default='')),
+                ('body_text', models.TextField(blank=True, default='')),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Documento de Búsqueda',
+                'verbose_name_plural': 'Documentos de Búsqueda',
+            },
+        ),
+        migrations.RunPython(build_search_index, drop_search_index),
+    ]
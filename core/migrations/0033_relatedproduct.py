@@ -0,0 +1,30 @@
+# Generated by Django 4.2.24 on 2026-10-18 15:29
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0032_productsearchdocument'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RelatedProduct',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('score', models.FloatField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='related_links', to='core.productstore')),
+                ('related', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='core.productstore')),
+            ],
+            options={
+                'verbose_name': 'Producto Relacionado',
+                'verbose_name_plural': 'Productos Relacionados',
+                'indexes': [models.Index(fields=['product', '-score'], name='core_relate_product_9f965d_idx')],
+                'unique_together': {('product', 'related')},
+            },
+        ),
+    ]
@@ -0,0 +1,89 @@
+# Generated by Django 4.2.24 on 2026-10-18 15:37
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0033_relatedproduct'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='conversationmessage',
+            index=models.Index(fields=['conversation', 'created_at'], name='convmsg_conv_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='conversationmessage',
+            index=models.Index(condition=models.Q(('is_read', False)), fields=['conversation', 'is_admin'], name='convmsg_unread_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='pedido',
+            index=models.Index(fields=['-fecha'], name='pedido_fecha_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='pedido',
+            index=models.Index(fields=['estado', '-fecha'], name='pedido_estado_fecha_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='pedido',
+            index=models.Index(fields=['metodo_pago', '-fecha'], name='pedido_metodo_fecha_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='pedido',
+            index=models.Index(fields=['estado_pago', '-fecha'], name='pedido_pago_fecha_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='pedido',
+            index=models.Index(fields=['user', '-fecha'], name='pedido_user_fecha_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='pedido',
+            index=models.Index(fields=['transaction_id'], name='pedido_transaction_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='productstore',
+            index=models.Index(fields=['name', 'id'], name='product_name_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='productstore',
+            index=models.Index(fields=['price', 'id'], name='product_price_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='productstore',
+            index=models.Index(condition=models.Q(('stock__gt', 0)), fields=['category', 'name'], name='product_in_stock_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='productstore',
+            index=models.Index(fields=['stock'], name='product_stock_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='productstore',
+            index=models.Index(fields=['-created_at'], name='product_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='stocknotification',
+            index=models.Index(condition=models.Q(('status', 'pending')), fields=['product', 'notification_type'], name='stocknotif_pending_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='stocknotification',
+            index=models.Index(fields=['status', '-created_at'], name='stocknotif_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='storevisit',
+            index=models.Index(fields=['-timestamp'], name='storevisit_ts_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='storevisit',
+            index=models.Index(fields=['visit_type', '-timestamp'], name='storevisit_type_ts_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='storevisit',
+            index=models.Index(fields=['user', '-timestamp'], name='storevisit_user_ts_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='storevisit',
+            index=models.Index(condition=models.Q(('product_id__isnull', False)), fields=['product_id', 'timestamp'], name='storevisit_product_ts_idx'),
+        ),
+    ]
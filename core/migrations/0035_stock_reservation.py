@@ -0,0 +1,32 @@
+# Generated by Django 4.2.24 on 2026-10-18 15:45
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0034_hot_path_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StockReservation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('reference', models.CharField(help_text='Referencia de la transacción Wompi', max_length=100)),
+                ('quantity', models.PositiveIntegerField()),
+                ('status', models.CharField(choices=[('active', 'Activa'), ('committed', 'Confirmada'), ('released', 'Liberada'), ('expired', 'Vencida')], default='active', max_length=10)),
+                ('expires_at', models.DateTimeField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='stock_reservations', to='core.productstore')),
+                ('variant', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to='core.productvariant')),
+            ],
+            options={
+                'verbose_name': 'Reserva de Stock',
+                'verbose_name_plural': 'Reservas de Stock',
+                'indexes': [models.Index(fields=['reference', 'status'], name='stockres_reference_idx'), models.Index(condition=models.Q(('status', 'active')), fields=['expires_at'], name='stockres_active_exp_idx')],
+            },
+        ),
+    ]
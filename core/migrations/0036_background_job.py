@@ -0,0 +1,36 @@
+# Generated by Django 4.2.24 on 2026-10-18 15:51
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0035_stock_reservation'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BackgroundJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('task', models.CharField(help_text='Nombre registrado de la tarea', max_length=100)),
+                ('kwargs', models.JSONField(blank=True, default=dict)),
+                ('idempotency_key', models.CharField(blank=True, help_text='Evita encolar dos veces el mismo envío', max_length=200, null=True, unique=True)),
+                ('status', models.CharField(choices=[('queued', 'En cola'), ('running', 'Ejecutando'), ('succeeded', 'Completada'), ('dead', 'Fallida (sin más reintentos)')], default='queued', max_length=10)),
+                ('attempts', models.PositiveIntegerField(default=0)),
+                ('max_attempts', models.PositiveIntegerField(default=5)),
+                ('run_at', models.DateTimeField(help_text='No se ejecuta antes de esta fecha (reintentos)')),
+                ('locked_at', models.DateTimeField(blank=True, null=True)),
+                ('locked_by', models.CharField(blank=True, max_length=100)),
+                ('last_error', models.TextField(blank=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'verbose_name': 'Tarea en Segundo Plano',
+                'verbose_name_plural': 'Tareas en Segundo Plano',
+                'indexes': [models.Index(condition=models.Q(('status', 'queued')), fields=['run_at'], name='bgjob_queued_run_at_idx'), models.Index(fields=['status', 'finished_at'], name='bgjob_status_finished_idx')],
+            },
+        ),
+    ]
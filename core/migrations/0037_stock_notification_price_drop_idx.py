@@ -0,0 +1,17 @@
+# Generated by Django 4.2.24 on 2026-10-18 15:56
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0036_background_job'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='stocknotification',
+            index=models.Index(condition=models.Q(('notify_price_drop', True), ('status', 'pending')), fields=['product', 'target_price'], name='stocknotif_price_drop_idx'),
+        ),
+    ]
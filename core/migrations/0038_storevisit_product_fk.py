@@ -0,0 +1,34 @@
+# Generated by Django 4.2.24 on 2026-10-18 17:10
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+    """
+    StoreVisit.product_id (IntegerField) pasa a ser un FK sin constraint a
+    ProductStore sobre la misma columna. Solo cambia el estado de Django: la
+    columna sigue siendo integer (select_related une integer con la PK bigint
+    sin problema) y ampliarla reescribiría toda la tabla de visitas
+    """
+
+    dependencies = [
+        ('core', '0037_stock_notification_price_drop_idx'),
+    ]
+
+    operations = [
+        migrations.SeparateDatabaseAndState(
+            database_operations=[],
+            state_operations=[
+                migrations.RemoveField(
+                    model_name='storevisit',
+                    name='product_id',
+                ),
+                migrations.AddField(
+                    model_name='storevisit',
+                    name='product',
+                    field=models.ForeignKey(blank=True, db_constraint=False, db_index=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='core.productstore'),
+                ),
+            ],
+        ),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 4.2.24 on 2026-10-18 18:02
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+# Solo esquema: en PostgreSQL renombrar la columna y agregar una FK nula no
+# reescriben core_storevisit. Las visitas existentes conservan el texto en
+# user_agent_text y `manage.py backfill_visit_user_agents` las enlaza por
+# lotes de ids después del despliegue.
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0038_storevisit_product_fk'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VisitUserAgent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('digest', models.CharField(max_length=64, unique=True)),
+                ('text', models.TextField()),
+            ],
+            options={
+                'verbose_name': 'User Agent de Visitas',
+                'verbose_name_plural': 'User Agents de Visitas',
+            },
+        ),
+        migrations.RenameField(
+            model_name='storevisit',
+            old_name='user_agent',
+            new_name='user_agent_text',
+        ),
+        migrations.AddField(
+            model_name='storevisit',
+            name='user_agent',
+            field=models.ForeignKey(blank=True, db_constraint=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='core.visituseragent'),
+        ),
+    ]
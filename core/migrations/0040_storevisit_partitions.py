@@ -0,0 +1,63 @@
+# Generated by Django 4.2.24 on 2026-10-18 18:10
+
+from django.db import migrations
+
+# DDL congelado de StoreVisit tal como queda en 0039. Solo crea la tabla
+# particionada vacía al lado de la actual: las visitas se copian por lotes y las
+# tablas se cambian con `manage.py partition_visits`, sin bloquear la tienda
+# durante la migración.
+CREATE_PARTITIONED_TABLE = [
+    'CREATE TABLE core_storevisit_swap (LIKE core_storevisit INCLUDING CONSTRAINTS) '
+    'PARTITION BY RANGE ("timestamp")',
+    'CREATE TABLE core_storevisit_default PARTITION OF core_storevisit_swap DEFAULT',
+    'ALTER TABLE core_storevisit_swap ADD CONSTRAINT core_storevisit_swap_pkey PRIMARY KEY (id, "timestamp")',
+    'CREATE INDEX storevisit_ts_idx_swap ON core_storevisit_swap ("timestamp" DESC)',
+    'CREATE INDEX storevisit_type_ts_idx_swap ON core_storevisit_swap (visit_type, "timestamp" DESC)',
+    'CREATE INDEX storevisit_user_ts_idx_swap ON core_storevisit_swap (user_id, "timestamp" DESC)',
+    'CREATE INDEX storevisit_product_ts_idx_swap ON core_storevisit_swap (product_id, "timestamp") '
+    'WHERE product_id IS NOT NULL',
+    'CREATE INDEX core_storevisit_swap_tenant_id ON core_storevisit_swap (tenant_id)',
+    'CREATE INDEX core_storevisit_swap_user_id ON core_storevisit_swap (user_id)',
+    'CREATE INDEX core_storevisit_swap_user_agent_id ON core_storevisit_swap (user_agent_id)',
+    'ALTER TABLE core_storevisit_swap ADD CONSTRAINT core_storevisit_swap_tenant_id_fk '
+    'FOREIGN KEY (tenant_id) REFERENCES core_tenant (id) DEFERRABLE INITIALLY DEFERRED',
+    'ALTER TABLE core_storevisit_swap ADD CONSTRAINT core_storevisit_swap_user_id_fk '
+    'FOREIGN KEY (user_id) REFERENCES core_simpleuser (id) DEFERRABLE INITIALLY DEFERRED',
+]
+
+
+def create_partitioned_table(apps, schema_editor):
+    """
+    PostgreSQL: crea core_storevisit_swap (particionada por mes, vacía).
+    SQLite: sin cambios, la retención trabaja por rangos de fecha.
+    """
+    connection = schema_editor.connection
+    if connection.vendor != 'postgresql':
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT to_regclass('core_storevisit_swap') IS NOT NULL "
+            "OR EXISTS (SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass('core_storevisit'))"
+        )
+        if cursor.fetchone()[0]:
+            return
+        for statement in CREATE_PARTITIONED_TABLE:
+            cursor.execute(statement)
+
+
+def drop_partitioned_table(apps, schema_editor):
+    """Descarta la tabla sin copiar; una tabla ya cambiada se revierte con `partition_visits --undo`"""
+    if schema_editor.connection.vendor == 'postgresql':
+        with schema_editor.connection.cursor() as cursor:
+            cursor.execute('DROP TABLE IF EXISTS core_storevisit_swap')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0039_visituseragent'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_partitioned_table, drop_partitioned_table),
+    ]
@@ -1,6 +1,9 @@
 
 from django.db import models
 from django.contrib.auth.models import User
+from django.utils import timezone
+
+from shared.core.mixins import FieldTrackerMixin
 
 class Tenant(models.Model):
     nombre = models.CharField(max_length=100)
@@ -15,9 +18,34 @@ class Tenant(models.Model):
 
 
 
+class VisitUserAgent(models.Model):
+    """
+    User agents distintos de las visitas
+    Cada visita guarda el id en lugar del texto completo (unos pocos cientos
+    de valores distintos frente a una fila por página vista). `digest` es el
+    sha256 del texto: el índice único no depende del largo del user agent.
+    """
+    digest = models.CharField(max_length=64, unique=True)
+    text = models.TextField()
+
+    class Meta:
+        verbose_name = "User Agent de Visitas"
+        verbose_name_plural = "User Agents de Visitas"
+
+    def __str__(self):
+        return self.text
+
+
 class StoreVisit(models.Model):
+    """
+    Una fila por página vista (escritas en lote por core.services.visit_service)
+    En PostgreSQL la tabla se particiona por mes (`manage.py partition_visits`);
+    `manage.py prune_visits` archiva y elimina los meses fuera de la retención
+    (core.services.visit_retention).
+    """
     tenant = models.ForeignKey('Tenant', on_delete=models.CASCADE, null=True, blank=True)
-    timestamp = models.DateTimeField(auto_now_add=True)
+    # default en lugar de auto_now_add: las visitas se escriben en lote y conservan la hora del request
+    timestamp = models.DateTimeField(default=timezone.now)
     session_key = models.CharField(max_length=40, blank=True, null=True)
     user = models.ForeignKey('SimpleUser', blank=True, null=True, on_delete=models.SET_NULL)
     visit_type = models.CharField(max_length=20, default='store', choices=[
@@ -27,11 +55,88 @@ class StoreVisit(models.Model):
         ('cart', 'Carrito'),
         ('checkout', 'Checkout/Pago')
     ])
-    product_id = models.IntegerField(blank=True, null=True)
+    # FK sin constraint: se escriben en lote sin validar el producto y las
+    # visitas de productos eliminados conservan el id (select_related devuelve None)
+    product = models.ForeignKey('ProductStore', blank=True, null=True, on_delete=models.DO_NOTHING,
+                                db_constraint=False, db_index=False, related_name='+')
     ip_address = models.GenericIPAddressField(blank=True, null=True)
     country = models.CharField(max_length=100, blank=True, null=True)
     city = models.CharField(max_length=100, blank=True, null=True)
-    user_agent = models.TextField(blank=True, null=True)
+    user_agent = models.ForeignKey(VisitUserAgent, blank=True, null=True, on_delete=models.DO_NOTHING,
+                                   db_constraint=False, related_name='+')
+    # Texto de las visitas anteriores a VisitUserAgent; `manage.py
+    # backfill_visit_user_agents` lo pasa a user_agent por lotes y lo deja en NULL
+    user_agent_text = models.TextField(blank=True, null=True)
+
+    class Meta:
+        # Listados del dashboard (más recientes primero, filtrados por tipo o
+        # usuario) y co-visualizaciones de productos relacionados
+        indexes = [
+            models.Index(fields=['-timestamp'], name='storevisit_ts_idx'),
+            models.Index(fields=['visit_type', '-timestamp'], name='storevisit_type_ts_idx'),
+            models.Index(fields=['user', '-timestamp'], name='storevisit_user_ts_idx'),
+            models.Index(fields=['product_id', 'timestamp'], name='storevisit_product_ts_idx',
+                         condition=models.Q(product_id__isnull=False)),
+        ]
+
+class VisitRollup(models.Model):
+    """
+    Contadores pre-agregados de visitas
+    Se incrementan al escribir cada lote de visitas (buckets por hora) y el
+    comando `rollup_visits --compact` fusiona las horas de días pasados en un
+    bucket diario. El dashboard lee estos contadores en lugar de StoreVisit.
+    """
+    GRANULARITY_CHOICES = [
+        ('hour', 'Hora'),
+        ('day', 'Día'),
+    ]
+
+    granularity = models.CharField(max_length=4, choices=GRANULARITY_CHOICES, default='hour')
+    bucket = models.DateTimeField(help_text="Inicio de la hora o del día (hora local)")
+    visit_type = models.CharField(max_length=20)
+    is_authenticated = models.BooleanField(default=False)
+    product_id = models.IntegerField(default=0, help_text="0 si la visita no es de un producto")
+    count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        verbose_name = "Resumen de Visitas"
+        verbose_name_plural = "Resúmenes de Visitas"
+        unique_together = ['granularity', 'bucket', 'visit_type', 'is_authenticated', 'product_id']
+        indexes = [
+            models.Index(fields=['bucket', 'visit_type']),
+            models.Index(fields=['product_id', 'bucket']),
+        ]
+
+    def __str__(self):
+        return f"{self.bucket:%Y-%m-%d %H:%M} {self.visit_type} ({self.count})"
+
+class IPLocation(models.Model):
+    """
+    Caché persistente de geolocalización por IP o por prefijo /24
+    Evita repetir consultas a APIs externas entre reinicios y workers
+    """
+    key = models.CharField(max_length=64, unique=True, help_text="IP exacta o prefijo, ej: 181.50.10.0/24")
+    city = models.CharField(max_length=100, blank=True, null=True)
+    country = models.CharField(max_length=100, blank=True, null=True)
+    latitude = models.FloatField(blank=True, null=True)
+    longitude = models.FloatField(blank=True, null=True)
+    source = models.CharField(max_length=20, default='network')
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = "Ubicación de IP"
+        verbose_name_plural = "Ubicaciones de IP"
+
+    def __str__(self):
+        return f"{self.key} - {self.city or '?'}, {self.country or '?'}"
+
+    def as_location(self):
+        return {
+            'city': self.city,
+            'country': self.country,
+            'latitude': self.latitude,
+            'longitude': self.longitude,
+        }
 
 class Category(models.Model):
     tenant = models.ForeignKey('Tenant', on_delete=models.CASCADE, null=True, blank=True)
@@ -60,7 +165,10 @@ class proveedor(models.Model):
     def __str__(self):
         return self.nombre
 
-class ProductStore(models.Model):
+class ProductStore(FieldTrackerMixin, models.Model):
+    # Valores originales para detectar cambios al guardar (core.services.product_events)
+    TRACKED_FIELDS = ('name', 'price', 'stock', 'category_id')
+
     tenant = models.ForeignKey('Tenant', on_delete=models.CASCADE, null=True, blank=True)
     name = models.CharField(max_length=100)
     description = models.TextField()
@@ -76,6 +184,19 @@ class ProductStore(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        # Orden + id para la paginación por cursor de /store; el índice parcial
+        # cubre el filtro por defecto "solo con stock" agrupado por categoría
+        # (con "todos" el filtro por categoría usa el índice de la FK)
+        indexes = [
+            models.Index(fields=['name', 'id'], name='product_name_id_idx'),
+            models.Index(fields=['price', 'id'], name='product_price_id_idx'),
+            models.Index(fields=['category', 'name'], name='product_in_stock_idx',
+                         condition=models.Q(stock__gt=0)),
+            models.Index(fields=['stock'], name='product_stock_idx'),
+            models.Index(fields=['-created_at'], name='product_created_idx'),
+        ]
+
     def __str__(self):
         return self.name
     
@@ -93,6 +214,47 @@ class ProductVariant(models.Model):
     def __str__(self):
         return f"{self.product.name} - {self.nombre}"
 
+class ProductSearchDocument(models.Model):
+    """
+    Documento de búsqueda precalculado por producto (texto normalizado sin tildes)
+    Lo mantiene core.services.search_service; en PostgreSQL la tabla tiene además
+    una columna tsvector con índice GIN y en SQLite se replica en una tabla FTS5.
+    """
+    product = models.OneToOneField(ProductStore, on_delete=models.CASCADE, primary_key=True, related_name='search_document')
+    name_text = models.TextField(blank=True, default='')
+    category_text = models.TextField(blank=True, default='')
+    body_text = models.TextField(blank=True, default='')
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = 'Documento de Búsqueda'
+        verbose_name_plural = 'Documentos de Búsqueda'
+
+    def __str__(self):
+        return f"Búsqueda: {self.name_text}"
+
+class RelatedProduct(models.Model):
+    """
+    Vecinos precalculados de un producto para la sección "productos relacionados"
+    El puntaje combina similitud de nombre, categoría, compras conjuntas y
+    visitas en la misma sesión (ver core.services.related_products).
+    """
+    product = models.ForeignKey(ProductStore, on_delete=models.CASCADE, related_name='related_links')
+    related = models.ForeignKey(ProductStore, on_delete=models.CASCADE, related_name='+')
+    score = models.FloatField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ['product', 'related']
+        indexes = [
+            models.Index(fields=['product', '-score']),
+        ]
+        verbose_name = 'Producto Relacionado'
+        verbose_name_plural = 'Productos Relacionados'
+
+    def __str__(self):
+        return f"{self.product_id} -> {self.related_id} ({self.score:.2f})"
+
 class Galeria(models.Model):
     tenant = models.ForeignKey('Tenant', on_delete=models.CASCADE, null=True, blank=True)
     galeria = models.ImageField(upload_to='galeria/')
@@ -120,7 +282,10 @@ class SimpleUser(models.Model):
     def __str__(self):
         return self.email
 
-class Pedido(models.Model):
+class Pedido(FieldTrackerMixin, models.Model):
+    # Valores originales para recalcular el resumen de ventas solo si cambian (core.signals)
+    TRACKED_FIELDS = ('estado', 'fecha')
+
     tenant = models.ForeignKey('Tenant', on_delete=models.CASCADE, null=True, blank=True)
     # Estados del pedido
     ESTADO_CHOICES = [
@@ -202,6 +367,15 @@ class Pedido(models.Model):
         ordering = ['-fecha']
         verbose_name = 'Pedido'
         verbose_name_plural = 'Pedidos'
+        # Filtros del listado de pedidos y de las estadísticas del dashboard
+        indexes = [
+            models.Index(fields=['-fecha'], name='pedido_fecha_idx'),
+            models.Index(fields=['estado', '-fecha'], name='pedido_estado_fecha_idx'),
+            models.Index(fields=['metodo_pago', '-fecha'], name='pedido_metodo_fecha_idx'),
+            models.Index(fields=['estado_pago', '-fecha'], name='pedido_pago_fecha_idx'),
+            models.Index(fields=['user', '-fecha'], name='pedido_user_fecha_idx'),
+            models.Index(fields=['transaction_id'], name='pedido_transaction_idx'),
+        ]
 
     def __str__(self):
         return f"Pedido #{self.id} - {self.user.email} - {self.get_estado_display()}"
@@ -230,7 +404,9 @@ class Pedido(models.Model):
         return pago_classes.get(self.estado_pago, 'badge-secondary')
 
 
-class PedidoDetalle(models.Model):
+class PedidoDetalle(FieldTrackerMixin, models.Model):
+    TRACKED_FIELDS = ('pedido_id', 'producto_id', 'cantidad', 'precio')
+
     pedido = models.ForeignKey(Pedido, on_delete=models.CASCADE)
     producto = models.ForeignKey(ProductStore, on_delete=models.CASCADE)
     variante = models.ForeignKey('ProductVariant', on_delete=models.SET_NULL, null=True, blank=True)
@@ -238,6 +414,119 @@ class PedidoDetalle(models.Model):
     precio = models.DecimalField(max_digits=10, decimal_places=2)
 
 
+class StockReservation(models.Model):
+    """
+    Unidades apartadas mientras se completa un pago con Wompi
+    El stock se descuenta al reservar (core.services.stock_reservation); si el
+    pago falla o la reserva vence, se devuelve.
+    """
+    STATUS_CHOICES = [
+        ('active', 'Activa'),
+        ('committed', 'Confirmada'),
+        ('released', 'Liberada'),
+        ('expired', 'Vencida'),
+    ]
+
+    reference = models.CharField(max_length=100, help_text="Referencia de la transacción Wompi")
+    product = models.ForeignKey(ProductStore, on_delete=models.CASCADE, related_name='stock_reservations')
+    variant = models.ForeignKey('ProductVariant', on_delete=models.CASCADE, null=True, blank=True)
+    quantity = models.PositiveIntegerField()
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='active')
+    expires_at = models.DateTimeField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name = 'Reserva de Stock'
+        verbose_name_plural = 'Reservas de Stock'
+        # Búsqueda por referencia y barrido de reservas vencidas
+        indexes = [
+            models.Index(fields=['reference', 'status'], name='stockres_reference_idx'),
+            models.Index(fields=['expires_at'], name='stockres_active_exp_idx', condition=models.Q(status='active')),
+        ]
+
+    def __str__(self):
+        return f"{self.reference} - {self.product_id} x{self.quantity} ({self.status})"
+
+
+class BackgroundJob(models.Model):
+    """
+    Tarea en segundo plano (correos, WhatsApp, avisos de stock)
+    La encola core.services.job_queue.enqueue y la ejecuta el worker
+    `manage.py run_jobs`. Los reintentos esperan con backoff exponencial y las
+    que agotan sus intentos quedan como 'dead' (dead-letter) para revisarlas.
+    """
+    STATUS_CHOICES = [
+        ('queued', 'En cola'),
+        ('running', 'Ejecutando'),
+        ('succeeded', 'Completada'),
+        ('dead', 'Fallida (sin más reintentos)'),
+    ]
+
+    task = models.CharField(max_length=100, help_text="Nombre registrado de la tarea")
+    kwargs = models.JSONField(default=dict, blank=True)
+    idempotency_key = models.CharField(max_length=200, unique=True, null=True, blank=True,
+                                       help_text="Evita encolar dos veces el mismo envío")
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='queued')
+    attempts = models.PositiveIntegerField(default=0)
+    max_attempts = models.PositiveIntegerField(default=5)
+    run_at = models.DateTimeField(help_text="No se ejecuta antes de esta fecha (reintentos)")
+    locked_at = models.DateTimeField(null=True, blank=True)
+    locked_by = models.CharField(max_length=100, blank=True)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        verbose_name = 'Tarea en Segundo Plano'
+        verbose_name_plural = 'Tareas en Segundo Plano'
+        # El worker solo recorre las tareas en cola listas para ejecutarse
+        indexes = [
+            models.Index(fields=['run_at'], name='bgjob_queued_run_at_idx', condition=models.Q(status='queued')),
+            models.Index(fields=['status', 'finished_at'], name='bgjob_status_finished_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.task} #{self.pk} ({self.status}, intento {self.attempts}/{self.max_attempts})"
+
+
+class VentaDiaria(models.Model):
+    """
+    Resumen diario de ventas (pedidos no cancelados)
+    Se recalcula el día afectado cada vez que se crea, modifica o cancela
+    un pedido; el dashboard suma estas filas en lugar de recorrer PedidoDetalle.
+    """
+    fecha = models.DateField(unique=True, help_text="Día en hora local")
+    pedidos = models.PositiveIntegerField(default=0)
+    total_ingresos = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    cantidad_productos = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['-fecha']
+        verbose_name = 'Venta Diaria'
+        verbose_name_plural = 'Ventas Diarias'
+
+    def __str__(self):
+        return f"{self.fecha} - {self.pedidos} pedidos - ${self.total_ingresos}"
+
+
+class VentaDiariaCategoria(models.Model):
+    """Resumen diario de ventas por categoría de producto"""
+    fecha = models.DateField(help_text="Día en hora local")
+    categoria = models.CharField(max_length=100, help_text="Nombre de la categoría al momento de la venta")
+    total_ingresos = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    cantidad_productos = models.PositiveIntegerField(default=0)
+    cantidad_pedidos = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        unique_together = ['fecha', 'categoria']
+        verbose_name = 'Venta Diaria por Categoría'
+        verbose_name_plural = 'Ventas Diarias por Categoría'
+
+    def __str__(self):
+        return f"{self.fecha} - {self.categoria} - ${self.total_ingresos}"
+
+
 class BonoDescuento(models.Model):
     """Modelo para gestionar bonos de descuento con códigos promocionales"""
     
@@ -440,6 +729,12 @@ class ConversationMessage(models.Model):
         verbose_name = "Mensaje de Conversación"
         verbose_name_plural = "Mensajes de Conversación"
         ordering = ['created_at']
+        # Mensajes de una conversación en orden y contador de no leídos
+        indexes = [
+            models.Index(fields=['conversation', 'created_at'], name='convmsg_conv_created_idx'),
+            models.Index(fields=['conversation', 'is_admin'], name='convmsg_unread_idx',
+                         condition=models.Q(is_read=False)),
+        ]
     
     def __str__(self):
         sender = "Admin" if self.is_admin else self.user.email if self.user else "Usuario"
@@ -482,6 +777,15 @@ class StockNotification(models.Model):
         verbose_name = "Notificación de Stock"
         verbose_name_plural = "Notificaciones de Stock"
         ordering = ['-created_at']
+        # Pendientes por producto (envío al reponer stock) y listado por estado
+        indexes = [
+            models.Index(fields=['product', 'notification_type'], name='stocknotif_pending_idx',
+                         condition=models.Q(status='pending')),
+            models.Index(fields=['status', '-created_at'], name='stocknotif_status_idx'),
+            # Suscriptores a bajadas de precio: target_price >= precio nuevo
+            models.Index(fields=['product', 'target_price'], name='stocknotif_price_drop_idx',
+                         condition=models.Q(status='pending', notify_price_drop=True)),
+        ]
     
     def __str__(self):
         return f"{self.get_notification_type_display()} - {self.product.name} para {self.email}"
@@ -0,0 +1,145 @@
+"""
+Autocompletado de búsqueda en memoria
+Cada proceso mantiene un arreglo ordenado de claves normalizadas (el nombre
+completo y cada sufijo que empieza en una palabra) y responde por prefijo con
+bisect, sin consultar la base de datos. Los resultados se ordenan por
+popularidad (visitas + ventas). El índice se reconstruye cuando cambia la
+versión del catálogo o cuando supera MAX_AGE segundos.
+"""
+import threading
+import time
+from bisect import bisect_left
+from typing import Dict, List, Optional, Tuple
+
+from .catalog_version import get_catalog_version
+from .popularity import get_product_popularity
+from .search_service import normalize_text
+
+# Prefijos cortos con resultados precalculados (los más consultados y los de
+# rangos más grandes); los prefijos largos recorren un rango pequeño
+SHORT_PREFIX_LENGTH = 3
+TOP_PER_PREFIX = 10
+
+# Tope de antigüedad: cubre cambios hechos por otros workers cuando el caché
+# de Django no es compartido
+MAX_AGE = 300
+
+PRODUCT = 0
+CATEGORY = 1
+
+
+class AutocompleteIndex:
+    """Índice inmutable de nombres de productos y categorías"""
+
+    def __init__(self, entries: List[Tuple[int, str, int]], version: Optional[int] = None):
+        """
+        Args:
+            entries: Tuplas (tipo, nombre visible, popularidad)
+            version: Versión del catálogo con la que se construyó
+        """
+        self.version = version
+        self.built_at = time.monotonic()
+        self.entries = entries
+
+        pairs = []
+        for index, (_kind, label, _score) in enumerate(entries):
+            words = normalize_text(label).split()
+            for position in range(len(words)):
+                pairs.append((' '.join(words[position:]), index))
+        pairs.sort()
+        self.keys = [key for key, _ in pairs]
+        self.refs = [ref for _, ref in pairs]
+
+        buckets: Dict[str, set] = {}
+        for key, ref in pairs:
+            for length in range(1, min(SHORT_PREFIX_LENGTH, len(key)) + 1):
+                buckets.setdefault(key[:length], set()).add(ref)
+
+        # Se guardan los mejores de cada tipo para no perder las categorías
+        self.top: Dict[str, List[int]] = {}
+        for prefix, refs in buckets.items():
+            ranked = sorted(refs, key=self._rank)
+            self.top[prefix] = (
+                [ref for ref in ranked if entries[ref][0] == PRODUCT][:TOP_PER_PREFIX]
+                + [ref for ref in ranked if entries[ref][0] == CATEGORY][:TOP_PER_PREFIX]
+            )
+
+    def _rank(self, ref: int):
+        kind, label, score = self.entries[ref]
+        return (-score, len(label), label)
+
+    def _matches(self, prefix: str) -> List[int]:
+        if len(prefix) <= SHORT_PREFIX_LENGTH:
+            return self.top.get(prefix, [])
+
+        refs = []
+        seen = set()
+        position = bisect_left(self.keys, prefix)
+        while position < len(self.keys) and self.keys[position].startswith(prefix):
+            ref = self.refs[position]
+            if ref not in seen:
+                seen.add(ref)
+                refs.append(ref)
+            position += 1
+        refs.sort(key=self._rank)
+        return refs
+
+    def suggest(self, query: str, products: int = 5, categories: int = 3) -> List[str]:
+        """Nombres de productos y luego de categorías que empiezan por la consulta"""
+        prefix = normalize_text(query)
+        if not prefix:
+            return []
+
+        product_names, category_names = [], []
+        for ref in self._matches(prefix):
+            kind, label, _score = self.entries[ref]
+            if kind == PRODUCT and len(product_names) < products and label not in product_names:
+                product_names.append(label)
+            elif kind == CATEGORY and len(category_names) < categories and label not in category_names:
+                category_names.append(label)
+            if len(product_names) >= products and len(category_names) >= categories:
+                break
+        return product_names + category_names
+
+
+def build_autocomplete_index(version: Optional[int] = None) -> AutocompleteIndex:
+    """Carga nombres y popularidad del catálogo (tres consultas)"""
+    from core.models import Category, ProductStore
+
+    popularity = get_product_popularity()
+    entries: List[Tuple[int, str, int]] = []
+    category_scores: Dict[int, int] = {}
+    for product_id, name, category_id in ProductStore.objects.values_list('id', 'name', 'category_id'):
+        score = popularity.get(product_id, 0)
+        entries.append((PRODUCT, name, score))
+        if category_id:
+            category_scores[category_id] = category_scores.get(category_id, 0) + score
+
+    for category_id, nombre in Category.objects.values_list('id', 'nombre'):
+        entries.append((CATEGORY, nombre, category_scores.get(category_id, 0)))
+
+    return AutocompleteIndex(entries, version)
+
+
+_index: Optional[AutocompleteIndex] = None
+_lock = threading.Lock()
+
+
+def get_autocomplete_index() -> AutocompleteIndex:
+    """Índice del proceso, reconstruido si el catálogo cambió"""
+    global _index
+    version = get_catalog_version()
+    index = _index
+    if index is not None and index.version == version and time.monotonic() - index.built_at < MAX_AGE:
+        return index
+
+    with _lock:
+        index = _index
+        if index is None or index.version != version or time.monotonic() - index.built_at >= MAX_AGE:
+            index = _index = build_autocomplete_index(version)
+    return index
+
+
+def suggest(query: str, limit: int = 8) -> List[str]:
+    """Sugerencias para la caja de búsqueda (máximo 5 productos y 3 categorías)"""
+    return get_autocomplete_index().suggest(query)[:limit]
@@ -0,0 +1,223 @@
+"""
+Tareas en segundo plano de la tienda y helpers para encolarlas
+Las vistas y señales llaman a los enqueue_*; el worker (`manage.py run_jobs`)
+ejecuta las funciones @task. Una tarea que lanza una excepción se reintenta
+con backoff (core.services.job_queue), por eso aquí los errores no se silencian.
+"""
+import datetime
+import logging
+from typing import List, Optional
+
+from django.conf import settings
+from django.core.mail import EmailMultiAlternatives, send_mail
+from django.template.loader import render_to_string
+
+from core.models import ProductStore, StockNotification
+
+from .job_queue import enqueue, task
+from .notification_fanout import fan_out_stock_available
+
+logger = logging.getLogger(__name__)
+
+
+def get_from_email() -> str:
+    # Remitente seguro: DEFAULT_FROM_EMAIL o EMAIL_HOST_USER
+    return getattr(settings, 'DEFAULT_FROM_EMAIL', None) or getattr(settings, 'EMAIL_HOST_USER', None) \
+        or 'noreply@compueasys.com'
+
+
+# ---------------------------------------------------------------------------
+# Tareas
+# ---------------------------------------------------------------------------
+
+@task('email.send')
+def deliver_email(subject: str, message: str, recipient_list: List[str],
+                  from_email: Optional[str] = None, html_message: Optional[str] = None) -> None:
+    """Correo de texto (con HTML opcional) ya redactado por quien lo encola"""
+    send_mail(
+        subject,
+        message,
+        from_email or get_from_email(),
+        recipient_list,
+        html_message=html_message,
+        fail_silently=False,
+    )
+    logger.info("📧 Correo '%s' enviado a %s", subject, ', '.join(recipient_list))
+
+
+@task('email.welcome')
+def deliver_welcome_email(email: str, username: str) -> None:
+    """Email de bienvenida a usuarios recién registrados"""
+    # En producción será https://compueasys.onrender.com
+    # En desarrollo será http://127.0.0.1:8000
+    base_url = getattr(settings, 'BASE_URL', 'https://compueasys.onrender.com')
+
+    context = {
+        'username': username,
+        'email': email,
+        'site_name': 'CompuEasys',
+        'year': datetime.datetime.now().year,
+        'base_url': base_url
+    }
+    html_content = render_to_string('emails/welcome.html', context)
+
+    subject = f'¡Bienvenido a CompuEasys, {username}! 🎉'
+
+    # Mensaje de texto plano como fallback
+    text_content = f"""
+        ¡Hola {username}!
+
+        ¡Bienvenido a CompuEasys! Tu cuenta ha sido creada exitosamente.
+
+        Ahora puedes:
+        • Explorar nuestros productos tecnológicos
+        • Recibir notificaciones cuando los productos estén disponibles
+        • Realizar compras de forma segura
+        • Acceder a ofertas exclusivas
+
+        ¡Gracias por unirte a nuestra comunidad!
+
+        El equipo de CompuEasys
+        """
+
+    msg = EmailMultiAlternatives(
+        subject=subject,
+        body=text_content,
+        from_email=getattr(settings, 'DEFAULT_FROM_EMAIL', 'noreply@compueasys.com'),
+        to=[email]
+    )
+    msg.attach_alternative(html_content, "text/html")
+    msg.send()
+
+    logger.info(f"✅ Welcome email sent to {email}")
+
+
+@task('notifications.back_in_stock')
+def deliver_back_in_stock_notifications(product_id: int) -> None:
+    """
+    Avisa a los suscriptores pendientes de un producto que volvió a tener stock
+
+    Se envían en lote (core.services.notification_fanout). Las notificaciones
+    que fallan siguen 'pending' y la tarea lanza un error para que el
+    reintento las vuelva a intentar (las enviadas ya no se repiten). Si el
+    producto se agotó antes de que corra el worker también se reintenta: los
+    suscriptores siguen pendientes hasta que haya stock.
+    """
+    product = ProductStore.objects.select_related('category').filter(pk=product_id).first()
+    if product is None:
+        logger.info("ℹ️ Producto %s eliminado, avisos descartados", product_id)
+        return
+    if product.stock <= 0:
+        raise RuntimeError(f'{product.name} se agotó antes de enviar los avisos de stock')
+
+    result = fan_out_stock_available(product)
+    if result.failed:
+        raise RuntimeError(f'{result.failed} avisos de stock de {product.name} no se pudieron enviar')
+
+
+@task('notifications.price_drop')
+def deliver_price_drop_notification(notification_id: int) -> None:
+    """Avisa de una bajada de precio si el precio sigue en el objetivo del suscriptor"""
+    from core.signals import send_price_drop_notification_email
+
+    notification = StockNotification.objects.select_related('product').filter(
+        pk=notification_id, notify_price_drop=True, target_price__isnull=False
+    ).first()
+    if notification is None or notification.product.price > notification.target_price:
+        return
+
+    send_price_drop_notification_email(notification)
+
+    # Desactivar solo la notificación de precio, mantener stock si aplica
+    notification.notify_price_drop = False
+    notification.target_price = None
+    notification.save(update_fields=['notify_price_drop', 'target_price'])
+
+    logger.info(f"💰 Price drop notification sent to {notification.email}")
+
+
+@task('catalog.related_products')
+def refresh_related(product_id: int) -> None:
+    """Recalcula los productos relacionados de un producto y su puntaje en las listas vecinas"""
+    from .related_products import refresh_related_products
+
+    refresh_related_products([product_id])
+
+
+@task('dashboard.metrics_push', max_attempts=1)
+def deliver_metrics_push() -> None:
+    """Envía a los dashboards abiertos los indicadores que cambiaron (un envío fallido no se reintenta)"""
+    from .dashboard_metrics import push_metrics_delta
+
+    push_metrics_delta()
+
+
+@task('whatsapp.send')
+def deliver_whatsapp_message(phone: str, message: str, organization_id: Optional[int] = None) -> None:
+    """Mensaje de WhatsApp por el servidor Baileys"""
+    from shared.utils.helpers import send_whatsapp_message
+
+    result = send_whatsapp_message(phone, message, organization_id)
+    if not result['success']:
+        raise RuntimeError(f"WhatsApp a {phone} no enviado: {result['error']}")
+
+
+# ---------------------------------------------------------------------------
+# Helpers para encolar
+# ---------------------------------------------------------------------------
+
+def enqueue_email(subject: str, message: str, recipient_list: List[str], from_email: Optional[str] = None,
+                  html_message: Optional[str] = None, idempotency_key: Optional[str] = None):
+    return enqueue(
+        'email.send',
+        idempotency_key=idempotency_key,
+        subject=subject,
+        message=message,
+        recipient_list=list(recipient_list),
+        from_email=from_email,
+        html_message=html_message,
+    )
+
+
+def enqueue_welcome_email(email: str, username: str):
+    return enqueue('email.welcome', idempotency_key=f'welcome:{email}', email=email, username=username)
+
+
+def enqueue_back_in_stock_notifications(product: ProductStore):
+    """
+    Una tarea por reposición; la clave incluye la última suscripción pendiente
+    para no duplicar el envío si el stock cambia varias veces antes del worker.
+    Solo deduplica contra la tarea en cola o en ejecución: una reposición
+    posterior a una tarea terminada (p. ej. agotada y reintentada hasta 'dead')
+    vuelve a encolar los avisos.
+    """
+    last_id = StockNotification.objects.filter(
+        product=product, status='pending', notification_type='stock_available'
+    ).order_by('-pk').values_list('pk', flat=True).first()
+    if last_id is None:
+        return None
+    return enqueue(
+        'notifications.back_in_stock',
+        idempotency_key=f'back-in-stock:{product.pk}:{last_id}',
+        requeue_finished=True,
+        product_id=product.pk,
+    )
+
+
+def enqueue_price_drop_notification(notification: StockNotification, price):
+    return enqueue(
+        'notifications.price_drop',
+        idempotency_key=f'price-drop:{notification.pk}:{price}',
+        notification_id=notification.pk,
+    )
+
+
+def enqueue_whatsapp_message(phone: str, message: str, organization_id: Optional[int] = None,
+                             idempotency_key: Optional[str] = None):
+    return enqueue(
+        'whatsapp.send',
+        idempotency_key=idempotency_key,
+        phone=phone,
+        message=message,
+        organization_id=organization_id,
+    )
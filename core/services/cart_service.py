@@ -0,0 +1,145 @@
+"""
+Servicio de hidratación del carrito de compras
+Convierte el carrito guardado en sesión en un resumen tipado usando
+dos consultas en lote (productos y variantes) sin importar cuántos items tenga
+"""
+from dataclasses import dataclass, field
+from decimal import Decimal
+from typing import Dict, List, Optional, Tuple
+
+from core.models import ProductStore, ProductVariant
+
+
+@dataclass(frozen=True)
+class CartLine:
+    """Línea del carrito con su producto y variante ya cargados"""
+    key: str
+    product: ProductStore
+    variant: Optional[ProductVariant]
+    quantity: int
+    price: Decimal
+
+    @property
+    def subtotal(self) -> Decimal:
+        return self.price * self.quantity
+
+
+@dataclass
+class CartSummary:
+    """Resumen del carrito listo para vistas y templates"""
+    items: List[CartLine] = field(default_factory=list)
+    count: int = 0
+    total: Decimal = Decimal(0)
+    missing_keys: List[str] = field(default_factory=list)
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def __len__(self):
+        return len(self.items)
+
+
+def _to_int(value) -> Optional[int]:
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def parse_cart_entry(key, item) -> Tuple[Optional[int], Optional[int], int]:
+    """
+    Normaliza una entrada del carrito de sesión
+
+    Soporta el formato antiguo (clave "17" o "17-1" con cantidad entera) y
+    el formato nuevo (dict con product_id, variant_id y quantity).
+
+    Returns:
+        Tupla (product_id, variant_id, quantity)
+    """
+    key = str(key)
+    if '-' in key:
+        key_product_id, key_variant_id = key.split('-', 1)
+    else:
+        key_product_id, key_variant_id = key, None
+
+    if isinstance(item, dict):
+        product_id = item.get('product_id') or key_product_id
+        variant_id = item.get('variant_id') or key_variant_id
+        quantity = item.get('quantity', 1)
+    else:
+        product_id = key_product_id
+        variant_id = key_variant_id
+        quantity = item
+
+    return _to_int(product_id), _to_int(variant_id), _to_int(quantity) or 0
+
+
+def count_cart_items(cart: Dict) -> int:
+    """Suma las cantidades de todas las entradas del carrito"""
+    return sum(parse_cart_entry(key, item)[2] for key, item in cart.items())
+
+
+def hydrate_cart(cart: Dict) -> CartSummary:
+    """
+    Construye el resumen del carrito con dos consultas en total
+
+    Args:
+        cart: Diccionario del carrito tal como se guarda en la sesión
+
+    Returns:
+        CartSummary con las líneas válidas, el conteo y el total.
+        Las claves cuyo producto ya no existe quedan en missing_keys.
+    """
+    summary = CartSummary()
+    if not cart:
+        return summary
+
+    entries = [(str(key), *parse_cart_entry(key, item)) for key, item in cart.items()]
+
+    product_ids = {product_id for _, product_id, _, _ in entries if product_id is not None}
+    variant_ids = {variant_id for _, _, variant_id, _ in entries if variant_id is not None}
+
+    products = ProductStore.objects.in_bulk(product_ids) if product_ids else {}
+    variants = ProductVariant.objects.in_bulk(variant_ids) if variant_ids else {}
+
+    for key, product_id, variant_id, quantity in entries:
+        summary.count += quantity
+
+        product = products.get(product_id)
+        if product is None:
+            summary.missing_keys.append(key)
+            continue
+
+        variant = variants.get(variant_id) if variant_id is not None else None
+        price = variant.precio if variant else product.price
+        line = CartLine(key=key, product=product, variant=variant, quantity=quantity, price=price)
+        summary.items.append(line)
+        summary.total += line.subtotal
+
+    return summary
+
+
+def get_request_cart(request, prune_missing: bool = False) -> CartSummary:
+    """
+    Hidrata el carrito de la sesión del request
+
+    Args:
+        request: Django request object
+        prune_missing: Si es True, elimina de la sesión las entradas cuyo
+            producto ya no existe y las descuenta del conteo
+
+    Returns:
+        CartSummary del carrito actual
+    """
+    cart = request.session.get('cart', {})
+    summary = hydrate_cart(cart)
+
+    if prune_missing and summary.missing_keys:
+        for key in summary.missing_keys:
+            item = cart.pop(key, None)
+            if item is not None:
+                summary.count -= parse_cart_entry(key, item)[2]
+        request.session['cart'] = cart
+        request.session.modified = True
+
+    return summary
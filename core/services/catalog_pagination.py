@@ -0,0 +1,219 @@
+"""
+Paginación del catálogo de la tienda
+Paginación por cursor (keyset / seek) sobre la clave de orden más el id: cada
+página es un `WHERE (clave, id) > (última clave, último id) LIMIT n`, así que
+el costo no depende de la posición ni del tamaño del catálogo.
+
+La vista agrupada por categorías usa `category_previews`: los primeros N de
+cada categoría en una sola consulta (ROW_NUMBER() por categoría) más un cursor
+por categoría para el botón "Ver más".
+
+Los cursores son opacos para el cliente (base64 de JSON con los valores de la
+clave de orden del último producto de la página).
+"""
+import base64
+import binascii
+import json
+from typing import Any, Dict, List, Optional, Tuple
+
+from django.db.models import Count, F, Q
+from django.db.models.functions import RowNumber
+from django.db.models.expressions import Window
+
+from .search_service import filter_by_search
+
+PAGE_SIZE = 24
+MAX_PAGE_SIZE = 60
+CATEGORY_PREVIEW = 8
+
+# Valor del parámetro `category` para los productos sin categoría
+NO_CATEGORY = 'none'
+
+# Clave de orden de cada opción: [(campo, descendente)]; el id se agrega al
+# final como desempate para que la clave sea única
+SORT_KEYS = {
+    'price_asc': [('price', False)],
+    'price_desc': [('price', True)],
+    'name': [('name', False)],
+    'newest': [],
+    'stock': [('stock', True)],
+}
+
+
+def parse_store_filters(params, out_of_stock_default: str = 'true') -> Dict[str, Any]:
+    """Filtros de la tienda normalizados desde request.GET"""
+    return {
+        'q': params.get('q', '').strip(),
+        'category': params.get('category', ''),
+        'price_min': params.get('price_min', ''),
+        'price_max': params.get('price_max', ''),
+        'in_stock': params.get('in_stock', 'true') == 'true',
+        'out_of_stock': params.get('out_of_stock', out_of_stock_default) == 'true',
+        'sort': params.get('sort', 'relevance'),
+    }
+
+
+def filters_querystring(filters: Dict[str, Any]) -> Dict[str, str]:
+    """Parámetros GET que reproducen los filtros (para las URLs de "Ver más")"""
+    params = {
+        'in_stock': 'true' if filters['in_stock'] else 'false',
+        'out_of_stock': 'true' if filters['out_of_stock'] else 'false',
+        'sort': filters['sort'],
+    }
+    for name in ('q', 'category', 'price_min', 'price_max'):
+        if filters[name]:
+            params[name] = filters[name]
+    return params
+
+
+def get_sort_keys(filters: Dict[str, Any]) -> List[Tuple[str, bool]]:
+    sort_by = filters['sort']
+    if sort_by == 'newest':
+        return [('id', True)]
+    if sort_by == 'relevance' or sort_by not in SORT_KEYS:
+        # Relevancia solo aplica cuando hay búsqueda
+        keys = [('search_rank', False)] if filters['q'] else [('name', False)]
+    else:
+        keys = list(SORT_KEYS[sort_by])
+    return keys + [('id', False)]
+
+
+def order_expressions(keys: List[Tuple[str, bool]]) -> List[str]:
+    return [f'-{field}' if descending else field for field, descending in keys]
+
+
+def filter_store_products(filters: Dict[str, Any], queryset=None):
+    """Queryset de productos con los filtros de la tienda (sin ordenar)"""
+    from core.models import ProductStore
+
+    products = queryset if queryset is not None else ProductStore.objects.all()
+
+    if filters['q']:
+        # Índice de texto completo con ranking (core.services.search_service)
+        products = filter_by_search(products, filters['q'])
+
+    if filters['category'] == NO_CATEGORY:
+        products = products.filter(category__isnull=True)
+    elif filters['category']:
+        try:
+            products = products.filter(category_id=int(filters['category']))
+        except (ValueError, TypeError):
+            return products.none()
+
+    if filters['price_min']:
+        try:
+            products = products.filter(price__gte=int(filters['price_min']))
+        except (ValueError, TypeError):
+            pass
+
+    if filters['price_max']:
+        try:
+            products = products.filter(price__lte=int(filters['price_max']))
+        except (ValueError, TypeError):
+            pass
+
+    # Filtro de stock - Respetar selecciones del usuario
+    if filters['in_stock'] and not filters['out_of_stock']:
+        products = products.filter(stock__gt=0)
+    elif filters['out_of_stock'] and not filters['in_stock']:
+        products = products.filter(stock=0)
+    elif not filters['in_stock'] and not filters['out_of_stock']:
+        products = products.none()
+
+    return products
+
+
+def encode_cursor(product, keys: List[Tuple[str, bool]]) -> str:
+    values = [getattr(product, field) for field, _ in keys]
+    raw = json.dumps(values, default=str, separators=(',', ':'))
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor: str, keys: List[Tuple[str, bool]]) -> Optional[list]:
+    """Valores del cursor o None si no es válido para esta clave de orden"""
+    if not cursor:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        values = json.loads(raw.decode('utf-8'))
+    except (binascii.Error, ValueError, UnicodeDecodeError):
+        return None
+    if not isinstance(values, list) or len(values) != len(keys):
+        return None
+    return values
+
+
+def seek(queryset, keys: List[Tuple[str, bool]], values: list):
+    """Filas estrictamente después de `values` en el orden de `keys`"""
+    condition = Q()
+    equal = Q()
+    for (field, descending), value in zip(keys, values):
+        lookup = 'lt' if descending else 'gt'
+        condition |= equal & Q(**{f'{field}__{lookup}': value})
+        equal &= Q(**{field: value})
+    return queryset.filter(condition)
+
+
+def get_page(queryset, filters: Dict[str, Any], cursor: str = '',
+             size: int = PAGE_SIZE) -> Tuple[list, Optional[str]]:
+    """
+    Una página de productos por cursor
+
+    Returns:
+        (productos, cursor de la página siguiente o None si es la última)
+    """
+    keys = get_sort_keys(filters)
+    queryset = queryset.order_by(*order_expressions(keys))
+
+    values = decode_cursor(cursor, keys)
+    if values is not None:
+        queryset = seek(queryset, keys, values)
+
+    # Un producto extra indica si hay más páginas sin hacer COUNT
+    products = list(queryset[:size + 1])
+    if len(products) > size:
+        products = products[:size]
+        return products, encode_cursor(products[-1], keys)
+    return products, None
+
+
+def category_previews(queryset, filters: Dict[str, Any],
+                      per_category: int = CATEGORY_PREVIEW) -> List[Dict[str, Any]]:
+    """
+    Los primeros `per_category` productos de cada categoría (dos consultas)
+
+    Returns:
+        Lista de grupos en el orden en que aparece su primer producto:
+        {'category_id', 'name', 'products', 'total', 'next_cursor'}
+    """
+    keys = get_sort_keys(filters)
+    ordering = order_expressions(keys)
+
+    totals = {
+        row['category_id']: row['total']
+        for row in queryset.order_by().values('category_id').annotate(total=Count('id'))
+    }
+    if not totals:
+        return []
+
+    ranked = queryset.annotate(
+        category_position=Window(RowNumber(), partition_by=[F('category_id')], order_by=ordering)
+    ).filter(category_position__lte=per_category).order_by(*ordering)
+
+    groups: Dict[Optional[int], Dict[str, Any]] = {}
+    for product in ranked:
+        group = groups.get(product.category_id)
+        if group is None:
+            group = groups[product.category_id] = {
+                'category_id': product.category_id,
+                'name': product.category.nombre if product.category else 'Sin categoría',
+                'products': [],
+                'total': totals.get(product.category_id, 0),
+                'next_cursor': None,
+            }
+        group['products'].append(product)
+
+    for group in groups.values():
+        if group['total'] > len(group['products']):
+            group['next_cursor'] = encode_cursor(group['products'][-1], keys)
+    return list(groups.values())
@@ -0,0 +1,33 @@
+"""
+Versión del catálogo de la tienda
+Un contador en el caché de Django que se incrementa cada vez que cambia un
+producto, variante o categoría. Los índices en memoria y los fragmentos
+cacheados comparan su versión con esta para saber si deben regenerarse.
+"""
+from django.db import transaction
+
+from shared.services import CacheService
+
+CATALOG_VERSION_KEY = 'catalog:version'
+
+
+def get_version(key: str) -> int:
+    """Contador de versión guardado en el caché"""
+    return CacheService.get_version(key)
+
+
+def bump_version(key: str) -> int:
+    return CacheService.bump_version(key)
+
+
+def get_catalog_version() -> int:
+    return get_version(CATALOG_VERSION_KEY)
+
+
+def bump_catalog_version() -> int:
+    return bump_version(CATALOG_VERSION_KEY)
+
+
+def schedule_catalog_bump() -> None:
+    """Incrementa la versión al confirmar la transacción en curso"""
+    transaction.on_commit(bump_catalog_version)
@@ -0,0 +1,158 @@
+"""
+Registro de configuraciones singleton
+WompiConfig, WhatsAppConfig y MatiasConfiguration se leen en checkout,
+cambios de estado de pedidos y envío de facturas. En vez de consultarlas en
+cada request, cada proceso guarda una copia inmutable (dataclass congelada)
+y la recarga solo cuando cambia su versión en el caché.
+
+- Al guardar o eliminar una configuración (core.signals) se incrementa su
+  versión al confirmar la transacción: los demás workers la recargan en su
+  siguiente lectura
+- La versión se consulta en el caché como máximo cada CHECK_INTERVAL segundos
+- Para editar una configuración se sigue usando el modelo (get_config() /
+  objects.first()); los snapshots son solo de lectura
+"""
+import dataclasses
+import datetime
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from django.apps import apps
+from django.db import transaction
+
+from shared.services import CacheService
+
+# Segundos entre verificaciones de la versión compartida
+CHECK_INTERVAL = 2.0
+
+
+@dataclass(frozen=True)
+class WompiSettings:
+    public_key: str
+    private_key: str
+    integrity_secret: Optional[str]
+    environment: str
+    base_url: str
+    is_active: bool
+
+
+@dataclass(frozen=True)
+class WhatsAppSettings:
+    admin_phone: str
+    notify_new_order: bool
+    notify_status_change: bool
+    notify_low_stock: bool
+    message_template: str
+    is_active: bool
+
+
+@dataclass(frozen=True)
+class MatiasSettings:
+    is_active: bool
+    test_mode: bool
+    auto_send_email: bool
+    generate_graphic_representation: bool
+    default_payment_method_id: int
+    default_means_payment_id: int
+    resolution_number: str
+    prefix: str
+    resolution_date: Optional[datetime.date]
+    technical_key: str
+    from_number: Optional[int]
+    to_number: Optional[int]
+    type_document_id: int
+
+
+def _snapshot(snapshot_class, instance):
+    """Copia los campos del dataclass desde la instancia del modelo"""
+    values = {}
+    for field in dataclasses.fields(snapshot_class):
+        values[field.name] = getattr(instance, field.name)
+    return snapshot_class(**values)
+
+
+def _load_wompi():
+    instance = apps.get_model('dashboard', 'WompiConfig').objects.first()
+    return _snapshot(WompiSettings, instance) if instance else None
+
+
+def _load_whatsapp():
+    model = apps.get_model('core', 'WhatsAppConfig')
+    return _snapshot(WhatsAppSettings, model.get_config())
+
+
+def _load_matias():
+    instance = apps.get_model('billing', 'MatiasConfiguration').objects.first()
+    return _snapshot(MatiasSettings, instance) if instance else None
+
+
+class ConfigRegistry:
+    """Snapshots por proceso de las configuraciones singleton"""
+
+    def __init__(self):
+        self._loaders: Dict[str, Callable[[], Any]] = {}
+        # nombre -> (versión, momento de la última verificación, snapshot)
+        self._entries: Dict[str, Tuple[int, float, Any]] = {}
+        self._lock = threading.Lock()
+
+    def register(self, name: str, loader: Callable[[], Any]) -> None:
+        self._loaders[name] = loader
+
+    @staticmethod
+    def version_key(name: str) -> str:
+        return f'config:{name}:version'
+
+    def get(self, name: str):
+        """Snapshot de la configuración (None si no existe el registro)"""
+        now = time.monotonic()
+        entry = self._entries.get(name)
+        if entry is not None and now - entry[1] < CHECK_INTERVAL:
+            return entry[2]
+
+        version = CacheService.get_version(self.version_key(name))
+        if entry is not None and entry[0] == version:
+            self._entries[name] = (version, now, entry[2])
+            return entry[2]
+
+        with self._lock:
+            snapshot = self._loaders[name]()
+            self._entries[name] = (version, now, snapshot)
+        return snapshot
+
+    def invalidate(self, name: str) -> None:
+        """Descarta la copia local y avisa a los demás workers"""
+        self._entries.pop(name, None)
+        CacheService.bump_version(self.version_key(name))
+
+    def schedule_invalidation(self, name: str) -> None:
+        transaction.on_commit(lambda: self.invalidate(name))
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+
+config_registry = ConfigRegistry()
+config_registry.register('wompi', _load_wompi)
+config_registry.register('whatsapp', _load_whatsapp)
+config_registry.register('matias', _load_matias)
+
+# Modelo -> nombre en el registro (lo usan los receivers de core.signals)
+CONFIG_MODELS = {
+    'dashboard.WompiConfig': 'wompi',
+    'core.WhatsAppConfig': 'whatsapp',
+    'billing.MatiasConfiguration': 'matias',
+}
+
+
+def get_wompi_config() -> Optional[WompiSettings]:
+    return config_registry.get('wompi')
+
+
+def get_whatsapp_config() -> WhatsAppSettings:
+    return config_registry.get('whatsapp')
+
+
+def get_matias_config() -> Optional[MatiasSettings]:
+    return config_registry.get('matias')
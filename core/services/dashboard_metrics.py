@@ -0,0 +1,196 @@
+"""
+Indicadores del inicio del dashboard (tarjetas de pedidos, ventas, productos
+y usuarios)
+Todos los contadores de un modelo salen de un solo aggregate con
+agregación condicional (`Count(filter=Q(...))`, `Sum(filter=Q(...))`): cuatro
+consultas en total en lugar de una por tarjeta. El resultado se guarda en el
+caché METRICS_TTL segundos.
+
+Cuando cambia un pedido, producto o cliente se encola la tarea
+`dashboard.metrics_push` (a lo sumo una cada METRICS_TTL segundos): el worker
+recalcula los indicadores y envía al grupo de websockets `dashboard_admins`
+solo los valores que cambiaron (DashboardAdminConsumer.dashboard_stats), así
+los admins con el dashboard abierto no necesitan consultar periódicamente y
+el checkout o el registro no pagan las cuatro consultas.
+"""
+import logging
+import time
+from datetime import datetime
+from decimal import Decimal
+from typing import Dict, Optional
+
+from django.db import transaction
+from django.db.models import Count, Q, Sum
+from django.utils import timezone
+
+from core.models import BackgroundJob, Pedido, PedidoDetalle, ProductStore, SimpleUser
+from shared.services import CacheService
+
+from .job_queue import enqueue
+from .product_events import LOW_STOCK_THRESHOLD
+
+logger = logging.getLogger(__name__)
+
+METRICS_NAMESPACE = 'dashboard_metrics'
+METRICS_TTL = 5
+# Datos de las pestañas del dashboard (dashboard.tabs), expiran con su TTL
+TABS_NAMESPACE = 'dashboard_tabs'
+PUSHED_NAMESPACE = 'dashboard_pushed'
+DASHBOARD_GROUP = 'dashboard_admins'
+PUSH_TASK = 'dashboard.metrics_push'
+
+PAGO_PENDIENTE = Q(estado_pago__in=['pendiente', 'procesando'])
+VENTA_CONFIRMADA = Q(estado_pago='completado') | Q(estado='entregado')
+ESTADOS_ACTIVOS = ['pendiente', 'confirmado', 'enviado', 'llegando', 'entregado']
+
+
+def get_day_start() -> datetime:
+    hoy = timezone.now().date()
+    inicio_dia = datetime.combine(hoy, datetime.min.time())
+    if timezone.is_aware(timezone.now()):
+        inicio_dia = timezone.make_aware(inicio_dia)
+    return inicio_dia
+
+
+def _number(value) -> float:
+    return float(value or Decimal(0))
+
+
+def compute_metrics() -> Dict[str, Dict]:
+    """Indicadores con el formato de /dashboard/api/dashboard-stats/ (cuatro consultas)"""
+    inicio_dia = get_day_start()
+    hoy = Q(fecha__gte=inicio_dia)
+    activo = ~Q(estado='cancelado')
+
+    pedidos = Pedido.objects.aggregate(
+        cantidad=Count('pk'),
+        activos=Count('pk', filter=activo),
+        pendientes=Count('pk', filter=Q(estado='pendiente')),
+        completados=Count('pk', filter=Q(estado='entregado')),
+        ingresos_totales=Sum('total', filter=Q(estado_pago='completado')),
+        ingresos_pendientes=Sum('total', filter=PAGO_PENDIENTE),
+        pedidos_hoy=Count('pk', filter=hoy & activo),
+        ventas_hoy=Sum('total', filter=hoy & activo & VENTA_CONFIRMADA),
+        ingresos_pendientes_hoy=Sum('total', filter=hoy & PAGO_PENDIENTE),
+    )
+    vendidos = PedidoDetalle.objects.filter(
+        pedido__fecha__gte=inicio_dia, pedido__estado__in=ESTADOS_ACTIVOS
+    ).aggregate(total=Sum('cantidad'))
+    productos = ProductStore.objects.aggregate(
+        total=Count('pk'),
+        sin_stock=Count('pk', filter=Q(stock=0)),
+        bajo_stock=Count('pk', filter=Q(stock__gt=0, stock__lte=LOW_STOCK_THRESHOLD)),
+    )
+    usuarios = SimpleUser.objects.aggregate(
+        total=Count('pk'),
+        nuevos_hoy=Count('pk', filter=Q(created_at__gte=inicio_dia)),
+    )
+
+    return {
+        'pedidos': {
+            'total': pedidos['cantidad'],
+            'activos': pedidos['activos'],
+            'pendientes': pedidos['pendientes'],
+            'completados': pedidos['completados'],
+        },
+        'finanzas': {
+            'ingresos_totales': _number(pedidos['ingresos_totales']),
+            'ingresos_pendientes': _number(pedidos['ingresos_pendientes']),
+        },
+        'diarias': {
+            'pedidos_hoy': pedidos['pedidos_hoy'],
+            'ventas_hoy': _number(pedidos['ventas_hoy']),
+            'productos_vendidos_hoy': vendidos['total'] or 0,
+            'ingresos_pendientes_hoy': _number(pedidos['ingresos_pendientes_hoy']),
+            'nuevos_clientes_hoy': usuarios['nuevos_hoy'],
+        },
+        'productos': {
+            'total': productos['total'],
+            'sin_stock': productos['sin_stock'],
+            'bajo_stock': productos['bajo_stock'],
+        },
+        'usuarios': {
+            'total': usuarios['total'],
+        },
+    }
+
+
+def get_metrics() -> Dict[str, Dict]:
+    """Indicadores cacheados METRICS_TTL segundos (compartidos entre workers)"""
+    return CacheService.get_or_set(METRICS_NAMESPACE, 'kpis', builder=compute_metrics, timeout=METRICS_TTL)
+
+
+def diff_metrics(previous: Optional[Dict], current: Dict) -> Dict[str, Dict]:
+    """Solo los valores que cambiaron, agrupados por sección"""
+    if not previous:
+        return current
+    delta = {}
+    for section, values in current.items():
+        changed = {key: value for key, value in values.items() if previous.get(section, {}).get(key) != value}
+        if changed:
+            delta[section] = changed
+    return delta
+
+
+def push_metrics_delta() -> Optional[Dict]:
+    """Recalcula los indicadores y envía los cambios a los dashboards abiertos"""
+    CacheService.invalidate(METRICS_NAMESPACE)
+    current = get_metrics()
+    delta = diff_metrics(CacheService.get(PUSHED_NAMESPACE, 'last'), current)
+    CacheService.set(PUSHED_NAMESPACE, 'last', value=current, timeout=24 * 3600)
+    if not delta:
+        return None
+
+    try:
+        from asgiref.sync import async_to_sync
+        from channels.layers import get_channel_layer
+
+        channel_layer = get_channel_layer()
+        if channel_layer is not None:
+            async_to_sync(channel_layer.group_send)(DASHBOARD_GROUP, {
+                'type': 'dashboard.stats',
+                'delta': delta,
+                'timestamp': timezone.now().isoformat(),
+            })
+    except Exception as e:
+        logger.warning(f"⚠️ No se pudo enviar la actualización del dashboard: {e}")
+    return delta
+
+
+def queue_metrics_push() -> Optional[BackgroundJob]:
+    """
+    Encola el envío de la ventana de METRICS_TTL segundos en curso
+
+    La tarea corre METRICS_TTL segundos después del primer cambio de la
+    ventana, así cubre también los siguientes; esos solo hacen un `add` en el
+    caché (y la idempotency_key evita duplicados entre workers sin caché
+    compartido).
+
+    Returns:
+        La tarea encolada, o None si la ventana ya tenía una
+    """
+    window = int(time.time() // METRICS_TTL)
+    key = CacheService.make_key(PUSHED_NAMESPACE, 'ventana', window)
+    if not CacheService.backend().add(key, 1, timeout=METRICS_TTL * 2):
+        return None
+    return enqueue(PUSH_TASK, idempotency_key=f'dashboard-metrics:{window}', delay=METRICS_TTL)
+
+
+def _queue_pending_push() -> None:
+    connection = transaction.get_connection()
+    if not getattr(connection, 'pending_metrics_push', False):
+        return
+    connection.pending_metrics_push = False
+    queue_metrics_push()
+
+
+def schedule_metrics_push() -> None:
+    """
+    Encola el envío de los indicadores al confirmar la transacción en curso
+
+    Un pedido guarda cliente, stock y pedido en la misma transacción: se
+    encola un solo envío aunque lo pidan varias señales (el primer callback
+    baja la marca de la conexión y los demás no hacen nada).
+    """
+    transaction.get_connection().pending_metrics_push = True
+    transaction.on_commit(_queue_pending_push)
@@ -0,0 +1,349 @@
+"""
+Exportaciones del dashboard (pedidos, visitas y ventas) en CSV y XLSX
+Las filas se leen con `.values_list().iterator(chunk_size=CHUNK_SIZE)` (cursor
+del lado del servidor en PostgreSQL) y se escriben a medida que llegan, así la
+memoria del worker no crece con el número de filas:
+
+- CSV: csv.writer sobre un buffer de una línea (patrón de StreamingHttpResponse);
+  los textos que empiezan como una fórmula (=, +, -, @) llevan un apóstrofo
+- XLSX: el libro se arma con zipfile sobre un stream que no admite seek; la
+  hoja se comprime fila por fila y cada trozo se entrega en cuanto se escribe
+  (textos inline, sin tabla de strings compartidos ni estilos; una celda
+  inlineStr nunca se evalúa como fórmula)
+
+Cada exportación acepta un rango de fechas (`desde` incluido, `hasta`
+excluido). Pedidos y visitas salen en orden de id, así una descarga cortada se
+reanuda con el mismo rango y `despues_de=<id de la última fila recibida>`.
+"""
+import csv
+import io
+import re
+import zipfile
+from dataclasses import dataclass
+from datetime import date, datetime, time, timedelta
+from decimal import Decimal
+from typing import Callable, Dict, Iterable, Iterator, Optional, Sequence, Tuple
+from xml.sax.saxutils import escape
+
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+from core.models import Pedido, StoreVisit, VentaDiariaCategoria
+
+from .visit_rollups import get_period_starts
+
+CHUNK_SIZE = 2000
+# Filas de la hoja XLSX entre cada entrega al cliente
+XLSX_FLUSH_ROWS = 200
+
+CONTENT_TYPES = {
+    'csv': 'text/csv; charset=utf-8',
+    'xlsx': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+}
+
+
+@dataclass(frozen=True)
+class ExportRange:
+    start: Optional[datetime] = None
+    end: Optional[datetime] = None
+    after_id: Optional[int] = None
+
+    def filter(self, field: str) -> Q:
+        """Rango sobre un campo de fecha más el cursor de id (filas ordenadas por id)"""
+        query = Q()
+        if self.start is not None:
+            query &= Q(**{f'{field}__gte': self.start})
+        if self.end is not None:
+            query &= Q(**{f'{field}__lt': self.end})
+        if self.after_id is not None:
+            query &= Q(id__gt=self.after_id)
+        return query
+
+    def filter_dates(self, field: str) -> Q:
+        """Rango sobre un DateField (días en hora local)"""
+        query = Q()
+        if self.start is not None:
+            query &= Q(**{f'{field}__gte': timezone.localtime(self.start).date()})
+        if self.end is not None:
+            query &= Q(**{f'{field}__lt': timezone.localtime(self.end).date()})
+        return query
+
+
+@dataclass(frozen=True)
+class ExportDataset:
+    name: str
+    title: str
+    headers: Tuple[str, ...]
+    rows: Callable[[ExportRange], Iterable[Sequence]]
+
+
+EXPORT_DATASETS: Dict[str, ExportDataset] = {}
+
+
+def export_dataset(name: str, title: str, headers: Sequence[str]):
+    """Registra la función que genera las filas de una exportación"""
+    def decorator(func):
+        EXPORT_DATASETS[name] = ExportDataset(name, title, tuple(headers), func)
+        return func
+    return decorator
+
+
+# ---------------------------------------------------------------------------
+# Rango de fechas
+# ---------------------------------------------------------------------------
+
+def _parse_moment(value: str, end_of_day: bool = False) -> datetime:
+    moment = parse_datetime(value)
+    if moment is None:
+        day = parse_date(value)
+        if day is None:
+            raise ValueError(f'Fecha inválida: "{value}" (usa AAAA-MM-DD o AAAA-MM-DDTHH:MM:SS)')
+        # `hasta` con solo fecha incluye ese día completo
+        moment = datetime.combine(day + timedelta(days=1) if end_of_day else day, time.min)
+    if timezone.is_naive(moment):
+        moment = timezone.make_aware(moment)
+    return moment
+
+
+def parse_export_range(params) -> ExportRange:
+    """
+    Rango desde los parámetros GET (o las opciones del comando)
+
+    - periodo: 'today', 'week' o 'month' (atajo para `desde`)
+    - desde / hasta: fecha o fecha y hora
+    - despues_de: id de la última fila exportada, para reanudar
+    """
+    start = end = after_id = None
+
+    periodo = params.get('periodo')
+    if periodo and periodo != 'all':
+        start = get_period_starts().get(periodo)
+        if start is None:
+            raise ValueError(f'Período inválido: "{periodo}"')
+    if params.get('desde'):
+        start = _parse_moment(params['desde'])
+    if params.get('hasta'):
+        end = _parse_moment(params['hasta'], end_of_day=True)
+    if params.get('despues_de'):
+        try:
+            after_id = int(params['despues_de'])
+        except (TypeError, ValueError):
+            raise ValueError(f'despues_de inválido: "{params["despues_de"]}"')
+    if start is not None and end is not None and end <= start:
+        raise ValueError('hasta debe ser posterior a desde')
+
+    return ExportRange(start=start, end=end, after_id=after_id)
+
+
+def export_filename(dataset: str, fmt: str, export_range: ExportRange) -> str:
+    start = timezone.localtime(export_range.start).strftime('%Y%m%d') if export_range.start else 'inicio'
+    end = timezone.localtime(export_range.end).strftime('%Y%m%d') if export_range.end else 'hoy'
+    return f'{dataset}_{start}_{end}.{fmt}'
+
+
+# ---------------------------------------------------------------------------
+# Datasets
+# ---------------------------------------------------------------------------
+
+def _local(moment):
+    return timezone.localtime(moment).strftime('%Y-%m-%d %H:%M:%S') if moment else None
+
+
+@export_dataset('pedidos', 'Pedidos', (
+    'Pedido', 'Fecha', 'Cliente', 'Email', 'Teléfono', 'Ciudad', 'Departamento', 'Estado', 'Estado pago',
+    'Método pago', 'Subtotal', 'Envío', 'Descuento', 'Total', 'Producto', 'Variante', 'Cantidad',
+    'Precio unitario', 'Subtotal línea',
+))
+def pedidos_rows(export_range: ExportRange) -> Iterator[Sequence]:
+    """
+    Una fila por línea de pedido (los pedidos sin líneas salen una vez con el
+    producto vacío). Si la descarga se cortó a mitad de un pedido, reanudar con
+    despues_de = el pedido anterior a ese.
+    """
+    rows = Pedido.objects.filter(export_range.filter('fecha')).order_by('id', 'pedidodetalle__id').values_list(
+        'id', 'fecha', 'nombre', 'email', 'user__email', 'telefono', 'ciudad', 'departamento', 'estado',
+        'estado_pago', 'metodo_pago', 'subtotal', 'envio', 'descuento', 'total',
+        'pedidodetalle__producto__name', 'pedidodetalle__variante__nombre', 'pedidodetalle__cantidad',
+        'pedidodetalle__precio',
+    )
+    for (pk, fecha, nombre, email, user_email, telefono, ciudad, departamento, estado, estado_pago, metodo_pago,
+         subtotal, envio, descuento, total, producto, variante, cantidad, precio) in rows.iterator(chunk_size=CHUNK_SIZE):
+        yield (
+            pk, _local(fecha), nombre, email or user_email, telefono, ciudad, departamento, estado, estado_pago,
+            metodo_pago, subtotal, envio, descuento, total, producto, variante, cantidad, precio,
+            precio * cantidad if precio is not None and cantidad is not None else None,
+        )
+
+
+@export_dataset('visitas', 'Visitas', (
+    'Visita', 'Fecha', 'Tipo', 'Producto ID', 'Producto', 'Usuario', 'Sesión', 'IP', 'Ciudad', 'País',
+))
+def visitas_rows(export_range: ExportRange) -> Iterator[Sequence]:
+    rows = StoreVisit.objects.filter(export_range.filter('timestamp')).order_by('id').values_list(
+        'id', 'timestamp', 'visit_type', 'product_id', 'product__name', 'user__email', 'session_key',
+        'ip_address', 'city', 'country',
+    )
+    for pk, timestamp, visit_type, product_id, product, user, session, ip, city, country in \
+            rows.iterator(chunk_size=CHUNK_SIZE):
+        yield pk, _local(timestamp), visit_type, product_id, product, user, session, ip, city, country
+
+
+@export_dataset('ventas', 'Ventas', (
+    'Fecha', 'Categoría', 'Pedidos', 'Productos vendidos', 'Ingresos',
+))
+def ventas_rows(export_range: ExportRange) -> Iterator[Sequence]:
+    """Ventas por día y categoría desde los resúmenes diarios (core.services.sales_summary)"""
+    rows = VentaDiariaCategoria.objects.filter(export_range.filter_dates('fecha')).order_by(
+        'fecha', 'categoria'
+    ).values_list('fecha', 'categoria', 'cantidad_pedidos', 'cantidad_productos', 'total_ingresos')
+    for fecha, categoria, pedidos, productos, ingresos in rows.iterator(chunk_size=CHUNK_SIZE):
+        yield fecha.isoformat(), categoria, pedidos, productos, ingresos
+
+
+# ---------------------------------------------------------------------------
+# Formatos
+# ---------------------------------------------------------------------------
+
+class _LineBuffer:
+    """csv.writer escribe aquí y writerow devuelve la línea en lugar de guardarla"""
+
+    def write(self, value):
+        return value
+
+
+# Textos que Excel o LibreOffice evaluarían como fórmula al abrir el CSV
+_FORMULA_PREFIXES = ('=', '+', '-', '@', '\t', '\r')
+
+
+def _csv_value(value):
+    if value is None:
+        return ''
+    if isinstance(value, str) and value.startswith(_FORMULA_PREFIXES):
+        # Un apóstrofo inicial hace que la hoja lo muestre como texto
+        return "'" + value
+    return value
+
+
+def stream_csv(headers: Sequence[str], rows: Iterable[Sequence]) -> Iterator[str]:
+    writer = csv.writer(_LineBuffer())
+    # BOM para que Excel abra el archivo como UTF-8
+    yield '\ufeff' + writer.writerow(headers)
+    for row in rows:
+        yield writer.writerow([_csv_value(value) for value in row])
+
+
+class _ChunkStream(io.RawIOBase):
+    """Destino de zipfile sin seek: acumula los bytes hasta que se entregan"""
+
+    def __init__(self):
+        self._chunks = []
+        self._offset = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        self._offset += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._offset
+
+    def drain(self) -> bytes:
+        data = b''.join(self._chunks)
+        self._chunks = []
+        return data
+
+
+_XML_INVALID = re.compile('[\x00-\x08\x0b\x0c\x0e-\x1f]')
+_XML_HEADER = '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+_SPREADSHEET_NS = 'http://schemas.openxmlformats.org/spreadsheetml/2006/main'
+_RELATIONSHIPS_NS = 'http://schemas.openxmlformats.org/package/2006/relationships'
+_OFFICE_RELS = 'http://schemas.openxmlformats.org/officeDocument/2006/relationships'
+
+
+def _column_letter(index: int) -> str:
+    letters = ''
+    index += 1
+    while index:
+        index, remainder = divmod(index - 1, 26)
+        letters = chr(65 + remainder) + letters
+    return letters
+
+
+def _xlsx_row(number: int, values: Sequence, columns: Sequence[str]) -> str:
+    cells = []
+    for column, value in zip(columns, values):
+        ref = f'{column}{number}'
+        if value is None or value == '':
+            continue
+        if isinstance(value, bool):
+            cells.append(f'<c r="{ref}" t="b"><v>{int(value)}</v></c>')
+        elif isinstance(value, (int, float, Decimal)):
+            cells.append(f'<c r="{ref}"><v>{value}</v></c>')
+        else:
+            if isinstance(value, (datetime, date)):
+                value = value.isoformat()
+            text = escape(_XML_INVALID.sub('', str(value)))
+            cells.append(f'<c r="{ref}" t="inlineStr"><is><t xml:space="preserve">{text}</t></is></c>')
+    return f'<row r="{number}">{"".join(cells)}</row>'
+
+
+def stream_xlsx(title: str, headers: Sequence[str], rows: Iterable[Sequence]) -> Iterator[bytes]:
+    stream = _ChunkStream()
+    columns = [_column_letter(index) for index in range(len(headers))]
+
+    with zipfile.ZipFile(stream, 'w', compression=zipfile.ZIP_DEFLATED) as book:
+        book.writestr('[Content_Types].xml', (
+            f'{_XML_HEADER}<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+            '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+            '<Default Extension="xml" ContentType="application/xml"/>'
+            '<Override PartName="/xl/workbook.xml" '
+            'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+            '<Override PartName="/xl/worksheets/sheet1.xml" '
+            'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+            '</Types>'
+        ))
+        book.writestr('_rels/.rels', (
+            f'{_XML_HEADER}<Relationships xmlns="{_RELATIONSHIPS_NS}">'
+            f'<Relationship Id="rId1" Type="{_OFFICE_RELS}/officeDocument" Target="xl/workbook.xml"/>'
+            '</Relationships>'
+        ))
+        book.writestr('xl/workbook.xml', (
+            f'{_XML_HEADER}<workbook xmlns="{_SPREADSHEET_NS}" xmlns:r="{_OFFICE_RELS}">'
+            f'<sheets><sheet name="{escape(title[:31])}" sheetId="1" r:id="rId1"/></sheets></workbook>'
+        ))
+        book.writestr('xl/_rels/workbook.xml.rels', (
+            f'{_XML_HEADER}<Relationships xmlns="{_RELATIONSHIPS_NS}">'
+            f'<Relationship Id="rId1" Type="{_OFFICE_RELS}/worksheet" Target="worksheets/sheet1.xml"/>'
+            '</Relationships>'
+        ))
+        yield stream.drain()
+
+        with book.open('xl/worksheets/sheet1.xml', 'w', force_zip64=True) as sheet:
+            sheet.write(f'{_XML_HEADER}<worksheet xmlns="{_SPREADSHEET_NS}"><sheetData>'.encode('utf-8'))
+            sheet.write(_xlsx_row(1, headers, columns).encode('utf-8'))
+            for number, row in enumerate(rows, start=2):
+                sheet.write(_xlsx_row(number, row, columns).encode('utf-8'))
+                if number % XLSX_FLUSH_ROWS == 0:
+                    chunk = stream.drain()
+                    if chunk:
+                        yield chunk
+            sheet.write(b'</sheetData></worksheet>')
+        yield stream.drain()
+
+    # Directorio central del zip (se escribe al cerrar)
+    yield stream.drain()
+
+
+def stream_export(dataset: str, fmt: str, export_range: ExportRange) -> Iterator:
+    """Trozos (str para CSV, bytes para XLSX) de una exportación"""
+    spec = EXPORT_DATASETS[dataset]
+    rows = spec.rows(export_range)
+    if fmt == 'csv':
+        return stream_csv(spec.headers, rows)
+    if fmt == 'xlsx':
+        return stream_xlsx(spec.title, spec.headers, rows)
+    raise ValueError(f'Formato no soportado: "{fmt}"')
@@ -0,0 +1,131 @@
+"""
+Caché de fragmentos HTML del catálogo
+Los grids de productos de /store y /api/filter-products/ se guardan ya
+renderizados, por combinación de (filtros, orden, página), en un LRU en
+memoria del proceso. Debajo, cada tarjeta de producto se cachea por separado
+para que un grid nuevo reutilice las tarjetas ya renderizadas en otros.
+
+Todas las claves incluyen la versión del catálogo (core.services.catalog_version),
+que se incrementa al guardar o eliminar productos, variantes, imágenes de
+galería y categorías: al cambiar la versión las entradas viejas dejan de
+usarse y salen por LRU.
+
+Las tarjetas no incluyen {% csrf_token %}: el HTML es compartido entre
+usuarios y el JS de la tienda toma el token de la cookie.
+"""
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional
+
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
+
+from .catalog_version import get_catalog_version
+
+GRID_MAX_ENTRIES = 256
+CARD_MAX_ENTRIES = 4000
+
+# Tope de antigüedad: cubre cambios hechos por otros workers cuando el caché
+# de Django (donde vive la versión) no es compartido
+MAX_AGE = 300
+
+
+class LRUCache:
+    """Diccionario acotado con expulsión del menos usado (thread-safe)"""
+
+    def __init__(self, max_entries: int, max_age: Optional[float] = MAX_AGE):
+        self.max_entries = max_entries
+        self.max_age = max_age
+        self.hits = 0
+        self.misses = 0
+        self._data: 'OrderedDict[Any, tuple]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None and self.max_age is not None and time.monotonic() - entry[1] >= self.max_age:
+                del self._data[key]
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def set(self, key, value) -> None:
+        with self._lock:
+            self._data[key] = (value, time.monotonic())
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+_grids = LRUCache(GRID_MAX_ENTRIES)
+_cards = LRUCache(CARD_MAX_ENTRIES)
+
+
+def params_key(params: Dict[str, Any]) -> str:
+    """Huella estable de los parámetros de filtro/orden/página"""
+    raw = json.dumps(params, sort_keys=True, default=str)
+    return hashlib.sha1(raw.encode('utf-8')).hexdigest()
+
+
+def cached_grid(template_name: str, params: Dict[str, Any],
+                builder: Callable[[int], Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Resultado cacheado de un grid de productos
+
+    Args:
+        template_name: Plantilla del grid (parte de la clave)
+        params: Filtros, orden y página normalizados
+        builder: Recibe la versión del catálogo y devuelve el payload a
+            cachear (p. ej. {'html': ..., 'count': ...}); solo se llama en
+            un fallo de caché, así que ahí va la consulta a la base de datos
+    """
+    version = get_catalog_version()
+    key = (version, template_name, params_key(params))
+    payload = _grids.get(key)
+    if payload is None:
+        payload = builder(version)
+        _grids.set(key, payload)
+    return payload
+
+
+def render_product_card(template_name: str, product, version: Optional[int] = None) -> str:
+    """HTML de la tarjeta de un producto, cacheado por versión del catálogo"""
+    if version is None:
+        version = get_catalog_version()
+    key = (version, template_name, product.pk)
+    html = _cards.get(key)
+    if html is None:
+        html = render_to_string(template_name, {'product': product})
+        _cards.set(key, html)
+    return mark_safe(html)
+
+
+def get_stats() -> Dict[str, int]:
+    return {
+        'grid_entries': len(_grids),
+        'grid_hits': _grids.hits,
+        'grid_misses': _grids.misses,
+        'card_entries': len(_cards),
+        'card_hits': _cards.hits,
+        'card_misses': _cards.misses,
+    }
+
+
+def clear_fragment_cache() -> None:
+    _grids.clear()
+    _cards.clear()
@@ -0,0 +1,225 @@
+"""
+Cola de tareas en segundo plano respaldada por la base de datos
+Los envíos lentos (SMTP, WhatsApp) se guardan como BackgroundJob dentro de la
+transacción del request y los ejecuta el worker `manage.py run_jobs`, así un
+servidor de correo lento no retiene un worker de gunicorn.
+
+- Las tareas se registran con @task('nombre') (core.services.background_tasks)
+- enqueue() acepta una idempotency_key: encolar dos veces la misma clave
+  devuelve la tarea existente en lugar de duplicar el envío (con
+  requeue_finished, solo mientras esa tarea no haya terminado)
+- Cada worker reclama tareas con un UPDATE condicional (status='queued'), así
+  dos workers nunca ejecutan la misma
+- Un error programa un reintento con backoff exponencial y jitter; al agotar
+  max_attempts la tarea queda como 'dead' con el último error (dead-letter)
+"""
+import logging
+import os
+import random
+import socket
+import traceback
+from datetime import timedelta
+from importlib import import_module
+from typing import Callable, Dict, List, Optional
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from core.models import BackgroundJob
+
+logger = logging.getLogger(__name__)
+
+_TASKS: Dict[str, Callable] = {}
+_tasks_loaded = False
+
+
+def get_queue_settings() -> dict:
+    defaults = {
+        'EAGER': False,
+        'MAX_ATTEMPTS': 5,
+        'BACKOFF_BASE': 30,
+        'BACKOFF_MAX': 3600,
+        'LOCK_TIMEOUT': 600,
+        'RETENTION_DAYS': 14,
+        'TASK_MODULES': ['core.services.background_tasks'],
+    }
+    return {**defaults, **getattr(settings, 'JOB_QUEUE', {})}
+
+
+def task(name: str, max_attempts: Optional[int] = None):
+    """Registra una función como tarea; recibe los kwargs guardados en la BackgroundJob"""
+    def decorator(func):
+        func.task_name = name
+        func.max_attempts = max_attempts
+        _TASKS[name] = func
+        return func
+    return decorator
+
+
+def load_tasks() -> None:
+    """Importa los módulos de TASK_MODULES para que sus @task queden registradas"""
+    global _tasks_loaded
+    if _tasks_loaded:
+        return
+    for module in get_queue_settings()['TASK_MODULES']:
+        import_module(module)
+    _tasks_loaded = True
+
+
+def get_task(name: str) -> Callable:
+    load_tasks()
+    try:
+        return _TASKS[name]
+    except KeyError:
+        raise LookupError(f'Tarea no registrada: {name}')
+
+
+def enqueue(name: str, *, idempotency_key: Optional[str] = None, delay: int = 0,
+            max_attempts: Optional[int] = None, requeue_finished: bool = False, **kwargs) -> BackgroundJob:
+    """
+    Encola una tarea (los kwargs deben ser serializables en JSON)
+
+    La fila se escribe en la transacción actual: si el request se revierte, la
+    tarea desaparece con él. En modo EAGER se ejecuta al confirmar la transacción.
+
+    Con requeue_finished, la clave solo deduplica contra tareas en cola o en
+    ejecución: si la existente ya terminó ('succeeded' o 'dead') se le quita
+    la clave y se encola una nueva.
+
+    Returns:
+        La tarea creada o, si la idempotency_key ya existía, la existente
+    """
+    func = get_task(name)
+    config = get_queue_settings()
+
+    if idempotency_key:
+        existing = BackgroundJob.objects.filter(idempotency_key=idempotency_key).first()
+        if existing is not None:
+            if not requeue_finished or existing.status in ('queued', 'running'):
+                return existing
+            released = BackgroundJob.objects.filter(
+                pk=existing.pk, status__in=('succeeded', 'dead')
+            ).update(idempotency_key=None)
+            if not released:
+                # El worker la reintentó o la reclamó entre la consulta y el UPDATE
+                return BackgroundJob.objects.get(pk=existing.pk)
+
+    job = BackgroundJob(
+        task=name,
+        kwargs=kwargs,
+        idempotency_key=idempotency_key or None,
+        max_attempts=max_attempts or func.max_attempts or config['MAX_ATTEMPTS'],
+        run_at=timezone.now() + timedelta(seconds=delay),
+    )
+    try:
+        with transaction.atomic():
+            job.save()
+    except IntegrityError:
+        # Otro request encoló la misma clave entre la consulta y el INSERT
+        return BackgroundJob.objects.get(idempotency_key=idempotency_key)
+
+    if config['EAGER']:
+        transaction.on_commit(lambda: run_job_now(job.pk))
+    return job
+
+
+def run_job_now(job_id: int) -> bool:
+    """Reclama y ejecuta una tarea concreta (modo EAGER)"""
+    if not _claim(job_id, 'eager'):
+        return False
+    return execute(BackgroundJob.objects.get(pk=job_id))
+
+
+def get_worker_id() -> str:
+    return f'{socket.gethostname()}:{os.getpid()}'
+
+
+def _claim(job_id: int, worker_id: str) -> bool:
+    return BackgroundJob.objects.filter(pk=job_id, status='queued').update(
+        status='running',
+        locked_at=timezone.now(),
+        locked_by=worker_id,
+        attempts=F('attempts') + 1,
+    ) > 0
+
+
+def claim_jobs(worker_id: str, limit: int = 10, tasks: Optional[List[str]] = None) -> List[BackgroundJob]:
+    """
+    Reclama hasta `limit` tareas listas (run_at vencido), las más antiguas primero
+
+    Las que otro worker reclamó entre la consulta y el UPDATE se descartan.
+    """
+    candidates = BackgroundJob.objects.filter(status='queued', run_at__lte=timezone.now())
+    if tasks:
+        candidates = candidates.filter(task__in=tasks)
+    job_ids = list(candidates.order_by('run_at').values_list('pk', flat=True)[:limit])
+    claimed = [job_id for job_id in job_ids if _claim(job_id, worker_id)]
+    return list(BackgroundJob.objects.filter(pk__in=claimed).order_by('run_at'))
+
+
+def get_backoff(attempts: int) -> int:
+    """Segundos antes del siguiente intento: base * 2^(intentos-1), con tope y jitter"""
+    config = get_queue_settings()
+    delay = min(config['BACKOFF_BASE'] * (2 ** max(attempts - 1, 0)), config['BACKOFF_MAX'])
+    return int(delay * random.uniform(0.8, 1.2))
+
+
+def execute(job: BackgroundJob) -> bool:
+    """
+    Ejecuta una tarea ya reclamada y registra el resultado
+
+    Returns:
+        True si la tarea terminó bien
+    """
+    try:
+        get_task(job.task)(**job.kwargs)
+    except Exception as e:
+        error = ''.join(traceback.format_exception_only(type(e), e)).strip()
+        if job.attempts >= job.max_attempts:
+            BackgroundJob.objects.filter(pk=job.pk).update(
+                status='dead',
+                last_error=traceback.format_exc()[-4000:],
+                finished_at=timezone.now(),
+                locked_at=None,
+            )
+            logger.error("💀 Tarea %s #%s sin más reintentos: %s", job.task, job.pk, error)
+        else:
+            delay = get_backoff(job.attempts)
+            BackgroundJob.objects.filter(pk=job.pk).update(
+                status='queued',
+                last_error=traceback.format_exc()[-4000:],
+                run_at=timezone.now() + timedelta(seconds=delay),
+                locked_at=None,
+            )
+            logger.warning("🔁 Tarea %s #%s falló (intento %s/%s), reintento en %ss: %s",
+                           job.task, job.pk, job.attempts, job.max_attempts, delay, error)
+        return False
+
+    BackgroundJob.objects.filter(pk=job.pk).update(status='succeeded', finished_at=timezone.now(), locked_at=None)
+    return True
+
+
+def requeue_stale_jobs() -> int:
+    """Devuelve a la cola las tareas 'running' de un worker que se cayó a mitad"""
+    cutoff = timezone.now() - timedelta(seconds=get_queue_settings()['LOCK_TIMEOUT'])
+    return BackgroundJob.objects.filter(status='running', locked_at__lt=cutoff).update(
+        status='queued', locked_at=None, run_at=timezone.now()
+    )
+
+
+def retry_dead_jobs(task_name: Optional[str] = None) -> int:
+    """Vuelve a encolar las tareas del dead-letter con sus intentos a cero"""
+    dead = BackgroundJob.objects.filter(status='dead')
+    if task_name:
+        dead = dead.filter(task=task_name)
+    return dead.update(status='queued', attempts=0, run_at=timezone.now(), finished_at=None)
+
+
+def purge_finished_jobs(days: Optional[int] = None) -> int:
+    """Borra las tareas completadas más antiguas que RETENTION_DAYS (las 'dead' se conservan)"""
+    days = get_queue_settings()['RETENTION_DAYS'] if days is None else days
+    cutoff = timezone.now() - timedelta(days=days)
+    deleted, _ = BackgroundJob.objects.filter(status='succeeded', finished_at__lt=cutoff).delete()
+    return deleted
@@ -0,0 +1,146 @@
+"""
+Envío en lote de los avisos "ya está disponible" de un producto
+Lo ejecuta la tarea notifications.back_in_stock (core.services.background_tasks)
+al reponer stock. En lugar de renderizar, enviar, guardar y registrar cada
+suscripción por separado:
+
+- La plantilla se renderiza una vez por producto (no usa datos del destinatario)
+- Cada lote de BATCH_SIZE correos sale por una sola conexión SMTP
+  (get_connection + send_messages)
+- Los enviados se marcan con un UPDATE y los NotificationLog se escriben con
+  bulk_create por lote; así un fallo a mitad no reenvía los lotes anteriores
+"""
+import datetime
+import logging
+from dataclasses import dataclass
+from typing import List, Tuple
+
+from django.conf import settings
+from django.core.mail import EmailMultiAlternatives, get_connection
+from django.template.loader import render_to_string
+from django.utils import timezone
+
+from core.models import NotificationLog, ProductStore, StockNotification
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = 100
+
+
+@dataclass(frozen=True)
+class RenderedEmail:
+    subject: str
+    text: str
+    html: str
+
+
+@dataclass
+class FanoutResult:
+    sent: int = 0
+    failed: int = 0
+
+
+def render_stock_available(product: ProductStore) -> RenderedEmail:
+    """Correo de stock disponible de un producto, igual para todos los suscriptores"""
+    base_url = getattr(settings, 'BASE_URL', 'http://127.0.0.1:8000')
+    context = {
+        'product': product,
+        'site_name': 'CompuEasys',
+        'year': datetime.datetime.now().year,
+        'base_url': base_url,
+        'product_url': f"{base_url}/product_detail/{product.id}/",
+    }
+    return RenderedEmail(
+        subject=f'¡{product.name} ya está disponible! 🎉',
+        text=f'El producto {product.name} ya está disponible en CompuEasys.',
+        html=render_to_string('emails/stock_available.html', context),
+    )
+
+
+def _build_message(email: RenderedEmail, to: str, connection) -> EmailMultiAlternatives:
+    msg = EmailMultiAlternatives(
+        subject=email.subject,
+        body=email.text,
+        from_email=getattr(settings, 'DEFAULT_FROM_EMAIL', 'noreply@compueasys.com'),
+        to=[to],
+        connection=connection,
+    )
+    msg.attach_alternative(email.html, "text/html")
+    return msg
+
+
+def _send_batch(email: RenderedEmail, recipients: List[Tuple[int, str]]):
+    """
+    Envía un lote por una conexión y devuelve (ids enviados, [(id, error)])
+
+    Cada mensaje va en su propio send_messages para saber cuál falló sin
+    abortar el resto; la conexión se reabre si el servidor la cortó. Si no se
+    puede abrir o reabrir, el resto del lote se da por fallido (sigue
+    'pending') y los ya enviados se devuelven igual para no reenviarlos.
+    """
+    sent, failed = [], []
+    connection = get_connection(fail_silently=False)
+    try:
+        connection.open()
+    except Exception as e:
+        logger.error(f"❌ SMTP connection failed: {e}")
+        return sent, [(notification_id, f'SMTP: {e}') for notification_id, _ in recipients]
+
+    try:
+        for index, (notification_id, to) in enumerate(recipients):
+            try:
+                connection.send_messages([_build_message(email, to, connection)])
+            except Exception as e:
+                failed.append((notification_id, str(e)))
+                logger.error(f"❌ Failed to send notification to {to}: {e}")
+            else:
+                sent.append(notification_id)
+                continue
+
+            try:
+                connection.close()
+                connection.open()
+            except Exception as e:
+                logger.error(f"❌ SMTP reconnection failed: {e}")
+                failed.extend((pk, f'SMTP: {e}') for pk, _ in recipients[index + 1:])
+                break
+    finally:
+        try:
+            connection.close()
+        except Exception as e:
+            logger.warning(f"⚠️ SMTP close failed: {e}")
+    return sent, failed
+
+
+def fan_out_stock_available(product: ProductStore, batch_size: int = BATCH_SIZE) -> FanoutResult:
+    """
+    Envía los avisos pendientes de stock disponible de un producto
+
+    Las suscripciones que fallan siguen 'pending' (la tarea se reintenta) y
+    quedan registradas en NotificationLog.
+    """
+    email = render_stock_available(product)
+    pending = list(
+        StockNotification.objects.filter(product=product, status='pending', notification_type='stock_available')
+        .order_by('pk').values_list('pk', 'email')
+    )
+
+    result = FanoutResult()
+    for start in range(0, len(pending), batch_size):
+        sent, failed = _send_batch(email, pending[start:start + batch_size])
+
+        if sent:
+            StockNotification.objects.filter(pk__in=sent, status='pending').update(
+                status='sent', sent_at=timezone.now()
+            )
+        NotificationLog.objects.bulk_create(
+            [NotificationLog(stock_notification_id=pk, success=True, email_subject=email.subject) for pk in sent]
+            + [NotificationLog(stock_notification_id=pk, success=False, error_message=error,
+                               email_subject=f'Error: {product.name}') for pk, error in failed]
+        )
+        result.sent += len(sent)
+        result.failed += len(failed)
+
+    if pending:
+        logger.info(f"🔔 {product.name}: {result.sent} stock notifications sent, {result.failed} failed")
+    return result
@@ -0,0 +1,163 @@
+"""
+Escritura del pedido del checkout (pago_exitoso)
+Todo en una sola transacción: cliente, stock, pedido, detalles y bono. Si algo
+falla no queda un pedido a medias ni stock descontado.
+
+- El carrito se valida una vez (ya viene hidratado en lote por cart_service)
+- El stock se descuenta con UPDATE condicionales (core.services.stock_reservation)
+- Los detalles se insertan con un solo bulk_create; el resumen diario de
+  ventas lo recalcula una vez el post_save del Pedido al confirmar
+- Los efectos externos (correos, avisos) se registran con on_commit: solo
+  corren si el pedido quedó guardado
+"""
+import logging
+from dataclasses import dataclass
+from functools import partial
+from typing import Callable, Iterable, List, Optional
+
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models import F
+
+from core.models import BonoDescuento, Pedido, PedidoDetalle, SimpleUser
+
+from .cart_service import CartLine, CartSummary
+from .stock_reservation import commit_reservation, consume_stock, lines_from_cart
+
+logger = logging.getLogger(__name__)
+
+
+class EmptyCart(Exception):
+    """El carrito no tiene productos válidos para crear un pedido"""
+
+
+@dataclass(frozen=True)
+class CustomerData:
+    """Datos de contacto y envío del formulario de checkout"""
+    email: str
+    telefono: str
+    nombre: str
+    direccion: str
+    ciudad: str
+    departamento: str
+    codigo_postal: str
+
+
+def validate_cart(cart: CartSummary) -> List[CartLine]:
+    """
+    Líneas del carrito que pueden convertirse en detalles del pedido
+
+    Raises:
+        EmptyCart: Si no queda ninguna línea con cantidad positiva
+    """
+    items = [item for item in cart.items if item.quantity > 0]
+    if not items:
+        raise EmptyCart('Tu carrito está vacío')
+    return items
+
+
+def upsert_customer(customer: CustomerData) -> SimpleUser:
+    """Crea o actualiza el SimpleUser (y su User de Django) con los datos del checkout"""
+    user, created = SimpleUser.objects.get_or_create(
+        email=customer.email,
+        defaults={
+            'telefono': customer.telefono,
+            'name': customer.nombre,
+            'username': customer.email,
+            'password': customer.telefono,  # Temporal
+            'address': customer.direccion,
+            'city': customer.ciudad,
+            'departamento': customer.departamento,
+            'codigo_postal': customer.codigo_postal,
+        }
+    )
+
+    # Si el usuario ya existe, actualizar sus datos con la info del checkout
+    if not created:
+        user.telefono = customer.telefono
+        user.name = customer.nombre
+        user.address = customer.direccion
+        user.city = customer.ciudad
+        user.departamento = customer.departamento
+        user.codigo_postal = customer.codigo_postal
+        user.save(update_fields=['telefono', 'name', 'address', 'city', 'departamento', 'codigo_postal'])
+
+    if not User.objects.filter(username=customer.email).exists():
+        User.objects.create_user(
+            username=customer.email,
+            email=customer.email,
+            password=customer.telefono,  # El celular como contraseña temporal
+            first_name=customer.nombre,
+        )
+    return user
+
+
+def redeem_bono(bono: BonoDescuento) -> bool:
+    """Registra un uso del bono sin pasarse de usos_maximos aunque haya compras simultáneas"""
+    return BonoDescuento.objects.filter(
+        pk=bono.pk, usos_realizados__lt=F('usos_maximos')
+    ).update(usos_realizados=F('usos_realizados') + 1) > 0
+
+
+def place_order(*, cart: CartSummary, customer: CustomerData, order_fields: dict,
+                wompi_reference: str = '', paid: bool = False, bono: Optional[BonoDescuento] = None,
+                on_commit: Iterable[Callable[[Pedido], None]] = ()) -> Pedido:
+    """
+    Crea el pedido completo en una transacción
+
+    Args:
+        order_fields: Campos del Pedido además de los del cliente (totales,
+            detalles, nota, método de pago...)
+        wompi_reference: Referencia (de la sesión) cuya reserva de stock se
+            confirma; sin reserva activa, o si no coincide con el carrito, el
+            stock se descuenta ahora
+        paid: El pago se verificó con la API de Wompi: el pedido se registra
+            aunque falte stock
+        on_commit: Funciones que reciben el pedido tras confirmar la transacción
+
+    Raises:
+        EmptyCart: Si el carrito no tiene productos
+        InsufficientStock: Si falta stock (y no está pagado); no se guarda nada
+    """
+    items = validate_cart(cart)
+
+    with transaction.atomic():
+        user = upsert_customer(customer)
+
+        lines = lines_from_cart(items)
+        if not commit_reservation(wompi_reference, lines):
+            consume_stock(lines, allow_oversell=paid)
+
+        pedido = Pedido.objects.create(
+            user=user,
+            nombre=customer.nombre,
+            email=customer.email,
+            telefono=customer.telefono,
+            direccion=customer.direccion,
+            ciudad=customer.ciudad,
+            departamento=customer.departamento,
+            codigo_postal=customer.codigo_postal,
+            **order_fields,
+        )
+
+        PedidoDetalle.objects.bulk_create([
+            PedidoDetalle(
+                pedido=pedido,
+                producto=item.product,
+                variante=item.variant,
+                cantidad=item.quantity,
+                precio=item.price,
+            )
+            for item in items
+        ])
+
+        if bono is not None:
+            if redeem_bono(bono):
+                logger.info("✅ Bono %s usado en el pedido %s", bono.codigo, pedido.pk)
+            else:
+                logger.warning("⚠️ Bono %s sin usos disponibles al crear el pedido %s", bono.codigo, pedido.pk)
+
+        for callback in on_commit:
+            transaction.on_commit(partial(callback, pedido))
+
+    return pedido
@@ -0,0 +1,37 @@
+"""
+Popularidad de productos (visitas + ventas)
+La usan el pool de recomendaciones del carrito y el orden del autocompletado.
+Las visitas salen de los acumulados de VisitRollup (no de StoreVisit) y las
+ventas de las líneas de pedidos no cancelados.
+"""
+from typing import Dict
+
+from django.db.models import Sum
+
+# Peso de una unidad vendida frente a una visita al producto
+SALES_WEIGHT = 5
+
+
+def get_product_popularity() -> Dict[int, int]:
+    """
+    Puntaje por producto en dos consultas agregadas
+
+    Returns:
+        {product_id: visitas al detalle + unidades vendidas * SALES_WEIGHT}
+        (los productos sin visitas ni ventas no aparecen)
+    """
+    from core.models import PedidoDetalle, VisitRollup
+
+    popularity: Dict[int, int] = {}
+    visits = VisitRollup.objects.filter(visit_type='product_detail', product_id__gt=0).values(
+        'product_id'
+    ).annotate(total=Sum('count'))
+    for row in visits:
+        popularity[row['product_id']] = row['total'] or 0
+
+    sales = PedidoDetalle.objects.exclude(pedido__estado='cancelado').values('producto_id').annotate(
+        total=Sum('cantidad')
+    )
+    for row in sales:
+        popularity[row['producto_id']] = popularity.get(row['producto_id'], 0) + (row['total'] or 0) * SALES_WEIGHT
+    return popularity
@@ -0,0 +1,101 @@
+"""
+Eventos de cambio de ProductStore al guardarlo desde el admin o el dashboard
+Los valores originales los captura FieldTrackerMixin al cargar el producto,
+así el post_save compara sin volver a consultar la fila. Cada cambio
+relevante se traduce en un evento tipado y sus efectos se encolan en la cola
+de tareas (core.services.background_tasks):
+
+- stock_crossed_zero: pasó de 0 a tener stock (avisos "ya está disponible")
+  o se agotó
+- price_changed: si bajó, una sola consulta indexada busca los suscriptores
+  con target_price >= precio nuevo
+- low_stock: bajó a LOW_STOCK_THRESHOLD o menos (aviso por WhatsApp al admin
+  si WhatsAppConfig.notify_low_stock está activo)
+"""
+import logging
+from dataclasses import dataclass
+from decimal import Decimal
+from typing import List
+
+from django.db.models import QuerySet
+
+from core.models import ProductStore, StockNotification
+
+from .background_tasks import enqueue_back_in_stock_notifications, enqueue_price_drop_notification, \
+    enqueue_whatsapp_message
+from .config_registry import get_whatsapp_config
+
+logger = logging.getLogger(__name__)
+
+PRICE_CHANGED = 'price_changed'
+STOCK_CROSSED_ZERO = 'stock_crossed_zero'
+LOW_STOCK = 'low_stock'
+
+# Mismo umbral que "productos con bajo stock" del dashboard
+LOW_STOCK_THRESHOLD = 5
+
+
+@dataclass(frozen=True)
+class ProductChange:
+    kind: str
+    old: object
+    new: object
+
+
+def detect_changes(product: ProductStore) -> List[ProductChange]:
+    """Eventos de un producto recién guardado según sus valores originales"""
+    changes = []
+
+    if product.has_changed('price'):
+        changes.append(ProductChange(PRICE_CHANGED, product.get_original('price'), product.price))
+
+    if product.has_changed('stock'):
+        old_stock = product.get_original('stock')
+        if (old_stock > 0) != (product.stock > 0):
+            changes.append(ProductChange(STOCK_CROSSED_ZERO, old_stock, product.stock))
+        if 0 < product.stock <= LOW_STOCK_THRESHOLD < old_stock:
+            changes.append(ProductChange(LOW_STOCK, old_stock, product.stock))
+
+    return changes
+
+
+def match_price_drops(product: ProductStore, new_price) -> QuerySet:
+    """Suscriptores cuyo precio objetivo ya se alcanzó (índice stocknotif_price_drop_idx)"""
+    return StockNotification.objects.filter(
+        product=product,
+        status='pending',
+        notify_price_drop=True,
+        target_price__gte=new_price,
+    )
+
+
+def queue_price_drop_notifications(product: ProductStore, new_price) -> int:
+    queued = 0
+    for notification in match_price_drops(product, new_price).only('pk'):
+        enqueue_price_drop_notification(notification, new_price)
+        queued += 1
+    if queued:
+        logger.info(f"💰 {queued} price drop notifications queued for {product.name}")
+    return queued
+
+
+def notify_low_stock(product: ProductStore) -> None:
+    config = get_whatsapp_config()
+    if not (config.is_active and config.notify_low_stock and config.admin_phone):
+        return
+    enqueue_whatsapp_message(
+        config.admin_phone,
+        f"⚠️ *Stock bajo*\n\n📦 {product.name}\nQuedan {product.stock} unidades",
+        idempotency_key=f'low-stock:{product.pk}:{product.updated_at.timestamp():.0f}',
+    )
+
+
+def handle_changes(product: ProductStore, changes: List[ProductChange]) -> None:
+    for change in changes:
+        if change.kind == STOCK_CROSSED_ZERO and change.new > 0:
+            logger.info(f"📦 Stock restored for {product.name}: {change.old} → {change.new}")
+            enqueue_back_in_stock_notifications(product)
+        elif change.kind == PRICE_CHANGED and Decimal(change.new) < Decimal(change.old):
+            queue_price_drop_notifications(product, change.new)
+        elif change.kind == LOW_STOCK:
+            notify_low_stock(product)
@@ -0,0 +1,98 @@
+"""
+Pool de recomendaciones para el carrito
+Reemplaza ORDER BY RANDOM(): se guarda en el caché de Django la lista de
+productos con stock por categoría junto con su peso (popularidad y margen),
+se muestrea en Python y la muestra se hidrata con un solo in_bulk.
+
+El pool se invalida (nueva versión) cuando un producto entra o sale de
+stock, se crea, se elimina o cambia de categoría; el TTL cubre los cambios
+de popularidad.
+"""
+import heapq
+import math
+import random
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from django.db import transaction
+
+from shared.services import CacheService
+
+from .popularity import get_product_popularity
+
+POOL_NAMESPACE = 'recommendations'
+POOL_TTL = 3600
+
+
+def invalidate_pool() -> None:
+    CacheService.invalidate(POOL_NAMESPACE)
+
+
+def schedule_pool_invalidation() -> None:
+    transaction.on_commit(invalidate_pool)
+
+
+def product_weight(price, price_buy, popularity: int) -> float:
+    """Más visitas/ventas y mayor margen => más probabilidad de aparecer"""
+    margin = 0.0
+    if price and price > 0 and price_buy is not None:
+        margin = min(max(float(price - price_buy) / float(price), 0.0), 1.0)
+    return (1.0 + math.log1p(popularity)) * (1.0 + margin)
+
+
+def build_pool() -> Dict[Optional[int], List[Tuple[int, float]]]:
+    """
+    Productos con stock agrupados por categoría
+
+    Returns:
+        {category_id: [(product_id, peso), ...]}
+    """
+    from core.models import ProductStore
+
+    popularity = get_product_popularity()
+    pool: Dict[Optional[int], List[Tuple[int, float]]] = {}
+    eligible = ProductStore.objects.filter(stock__gt=0).values_list('id', 'category_id', 'price', 'price_buy')
+    for product_id, category_id, price, price_buy in eligible:
+        weight = product_weight(price, price_buy, popularity.get(product_id, 0))
+        pool.setdefault(category_id, []).append((product_id, weight))
+    return pool
+
+
+def get_pool() -> Dict[Optional[int], List[Tuple[int, float]]]:
+    # Un solo worker reconstruye el pool cuando expira o se invalida
+    return CacheService.get_or_set(POOL_NAMESPACE, 'pool', builder=build_pool, timeout=POOL_TTL)
+
+
+def sample_product_ids(count: int, exclude: Iterable[int] = (), rng: Optional[random.Random] = None) -> List[int]:
+    """
+    Muestra ponderada sin reemplazo (Efraimidis-Spirakis), priorizando que
+    los productos sean de categorías distintas
+    """
+    rng = rng or random
+    excluded = set(exclude)
+
+    keyed = []
+    for category_id, products in get_pool().items():
+        for product_id, weight in products:
+            if product_id not in excluded:
+                keyed.append((rng.random() ** (1.0 / weight), product_id, category_id))
+
+    sample = heapq.nlargest(count * 2, keyed)
+
+    chosen, repeated, seen_categories = [], [], set()
+    for _key, product_id, category_id in sample:
+        if category_id not in seen_categories:
+            seen_categories.add(category_id)
+            chosen.append(product_id)
+        else:
+            repeated.append(product_id)
+    return (chosen + repeated)[:count]
+
+
+def get_recommended_products(count: int = 12, exclude: Iterable[int] = ()) -> list:
+    """Productos recomendados hidratados con una sola consulta"""
+    from core.models import ProductStore
+
+    ids = sample_product_ids(count, exclude)
+    products = ProductStore.objects.select_related('category').in_bulk(ids)
+    # Un producto pudo quedarse sin stock después de armar el pool
+    return [products[pid] for pid in ids if pid in products and products[pid].stock > 0]
@@ -0,0 +1,319 @@
+"""
+Motor de productos relacionados
+Precalcula para cada producto una lista ordenada de vecinos (RelatedProduct)
+combinando similitud de nombre, misma categoría, compras en el mismo pedido y
+visitas en la misma sesión. La vista de detalle solo lee la lista.
+
+- Al crear un producto o cambiar su nombre/categoría se encola el recálculo
+  de su lista y de su puntaje en las listas de sus vecinos (signals)
+- `manage.py rebuild_related_products` recalcula todo el catálogo (cron
+  nocturno) para incorporar nuevas compras y visitas
+"""
+import logging
+import math
+from collections import Counter, defaultdict
+from datetime import timedelta
+from itertools import combinations
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from django.db import transaction
+from django.db.models import Count
+from django.utils import timezone
+
+from .search_service import normalize_text, stem_word
+
+logger = logging.getLogger(__name__)
+
+RELATED_LIMIT = 30
+
+NAME_WEIGHT = 3.0
+CATEGORY_WEIGHT = 1.0
+CO_PURCHASE_WEIGHT = 2.0
+CO_VIEW_WEIGHT = 1.0
+
+# Visitas consideradas para co-visualización y tope de productos por sesión/pedido
+CO_VIEW_DAYS = 90
+MAX_GROUP_PRODUCTS = 30
+
+# Los productos de relleno (sin relación real) van al final con puntaje negativo
+FILLER_STEP = 0.001
+
+
+def name_tokens(name: str) -> frozenset:
+    """Palabras significativas del nombre (más de 3 letras, derivadas)"""
+    return frozenset(stem_word(word) for word in normalize_text(name).split() if len(word) > 3)
+
+
+class CatalogSnapshot:
+    """Nombres, categorías e índices invertidos del catálogo (una consulta)"""
+
+    def __init__(self):
+        from core.models import ProductStore
+
+        self.tokens: Dict[int, frozenset] = {}
+        self.category: Dict[int, Optional[int]] = {}
+        self.by_token: Dict[str, set] = defaultdict(set)
+        self.by_category: Dict[int, set] = defaultdict(set)
+
+        rows = list(ProductStore.objects.values_list('id', 'name', 'category_id', 'stock', 'created_at'))
+        for product_id, name, category_id, _stock, _created in rows:
+            tokens = name_tokens(name)
+            self.tokens[product_id] = tokens
+            self.category[product_id] = category_id
+            for token in tokens:
+                self.by_token[token].add(product_id)
+            if category_id:
+                self.by_category[category_id].add(product_id)
+
+        # Relleno: con stock primero, agrupados por categoría, más nuevos primero
+        rows.sort(key=lambda row: (row[3] == 0, row[2] or 0, -row[4].timestamp() if row[4] else 0))
+        self.fillers = [row[0] for row in rows[:RELATED_LIMIT * 2]]
+
+    def __contains__(self, product_id):
+        return product_id in self.tokens
+
+
+def score_candidates(product_id: int, snapshot: CatalogSnapshot,
+                     co_purchase: Counter, co_view: Counter) -> Dict[int, float]:
+    """Puntaje (simétrico) de cada producto relacionado con `product_id`"""
+    tokens = snapshot.tokens[product_id]
+    category_id = snapshot.category[product_id]
+
+    candidates = set(co_purchase) | set(co_view)
+    for token in tokens:
+        candidates |= snapshot.by_token[token]
+    if category_id:
+        candidates |= snapshot.by_category[category_id]
+    candidates.discard(product_id)
+
+    scores = {}
+    for candidate in candidates:
+        if candidate not in snapshot:
+            continue
+        score = 0.0
+        other = snapshot.tokens[candidate]
+        if tokens and other:
+            score += NAME_WEIGHT * len(tokens & other) / len(tokens | other)
+        if category_id and snapshot.category[candidate] == category_id:
+            score += CATEGORY_WEIGHT
+        if co_purchase.get(candidate):
+            score += CO_PURCHASE_WEIGHT * math.log1p(co_purchase[candidate])
+        if co_view.get(candidate):
+            score += CO_VIEW_WEIGHT * math.log1p(co_view[candidate])
+        if score > 0:
+            scores[candidate] = score
+    return scores
+
+
+def top_neighbors(product_id: int, scores: Dict[int, float], snapshot: CatalogSnapshot) -> List[Tuple[int, float]]:
+    """Los RELATED_LIMIT mejores; si faltan se completa con productos de relleno"""
+    # En empate gana el producto más nuevo (id mayor)
+    neighbors = sorted(scores.items(), key=lambda item: (-item[1], -item[0]))[:RELATED_LIMIT]
+    used = {related_id for related_id, _ in neighbors}
+    used.add(product_id)
+
+    position = 0
+    for filler_id in snapshot.fillers:
+        if len(neighbors) >= RELATED_LIMIT:
+            break
+        if filler_id in used:
+            continue
+        position += 1
+        neighbors.append((filler_id, -FILLER_STEP * position))
+    return neighbors
+
+
+def _pair_counts(groups: Iterable[Iterable[int]]) -> Dict[int, Counter]:
+    """Cuenta cuántos grupos (pedidos o sesiones) comparte cada par de productos"""
+    counts: Dict[int, Counter] = defaultdict(Counter)
+    for group in groups:
+        members = sorted(set(group))[:MAX_GROUP_PRODUCTS]
+        for first, second in combinations(members, 2):
+            counts[first][second] += 1
+            counts[second][first] += 1
+    return counts
+
+
+def _grouped(rows) -> Iterable[List[int]]:
+    current, members = None, []
+    for key, product_id in rows:
+        if key != current:
+            if members:
+                yield members
+            current, members = key, []
+        members.append(product_id)
+    if members:
+        yield members
+
+
+def _co_view_visits():
+    from core.models import StoreVisit
+
+    return StoreVisit.objects.filter(
+        visit_type='product_detail',
+        timestamp__gte=timezone.now() - timedelta(days=CO_VIEW_DAYS),
+        session_key__isnull=False,
+        product_id__isnull=False,
+    )
+
+
+def rebuild_related_products() -> int:
+    """
+    Recalcula los vecinos de todo el catálogo
+
+    Returns:
+        Número de filas RelatedProduct escritas
+    """
+    from core.models import PedidoDetalle, RelatedProduct
+
+    snapshot = CatalogSnapshot()
+
+    purchases = PedidoDetalle.objects.exclude(pedido__estado='cancelado').order_by('pedido_id').values_list(
+        'pedido_id', 'producto_id'
+    )
+    co_purchase = _pair_counts(_grouped(purchases.iterator()))
+
+    views = _co_view_visits().order_by('session_key').values_list('session_key', 'product_id').distinct()
+    co_view = _pair_counts(_grouped(views.iterator()))
+
+    rows = []
+    for product_id in snapshot.tokens:
+        scores = score_candidates(
+            product_id, snapshot, co_purchase.get(product_id, Counter()), co_view.get(product_id, Counter())
+        )
+        rows.extend(
+            RelatedProduct(product_id=product_id, related_id=related_id, score=score)
+            for related_id, score in top_neighbors(product_id, scores, snapshot)
+        )
+
+    with transaction.atomic():
+        RelatedProduct.objects.all().delete()
+        RelatedProduct.objects.bulk_create(rows, batch_size=1000)
+    return len(rows)
+
+
+def refresh_related_products(product_ids: Iterable[int]) -> None:
+    """
+    Recalcula la lista de los productos indicados y su puntaje dentro de
+    las listas de sus vecinos (el puntaje es simétrico)
+    """
+    from core.models import PedidoDetalle, RelatedProduct
+
+    snapshot = CatalogSnapshot()
+
+    for product_id in product_ids:
+        if product_id not in snapshot:
+            continue
+
+        orders = PedidoDetalle.objects.filter(producto_id=product_id).values('pedido_id')
+        co_purchase = Counter({
+            row['producto_id']: row['total']
+            for row in PedidoDetalle.objects.filter(pedido_id__in=orders).exclude(
+                pedido__estado='cancelado'
+            ).exclude(producto_id=product_id).values('producto_id').annotate(total=Count('pedido_id', distinct=True))
+        })
+
+        sessions = _co_view_visits().filter(product_id=product_id).values('session_key')
+        co_view = Counter({
+            row['product_id']: row['total']
+            for row in _co_view_visits().filter(session_key__in=sessions).exclude(
+                product_id=product_id
+            ).values('product_id').annotate(total=Count('session_key', distinct=True))
+        })
+
+        scores = score_candidates(product_id, snapshot, co_purchase, co_view)
+        neighbors = top_neighbors(product_id, scores, snapshot)
+
+        with transaction.atomic():
+            RelatedProduct.objects.filter(product_id=product_id).delete()
+            RelatedProduct.objects.bulk_create([
+                RelatedProduct(product_id=product_id, related_id=related_id, score=score)
+                for related_id, score in neighbors
+            ])
+
+            # Lado inverso: actualizar o retirar este producto de las listas de otros
+            reverse = {
+                related_id: scores[related_id] for related_id, score in neighbors if score > 0
+            }
+            stale = RelatedProduct.objects.filter(related_id=product_id, score__gt=0).exclude(
+                product_id__in=reverse
+            )
+            for link in stale:
+                if link.product_id in scores:
+                    reverse[link.product_id] = scores[link.product_id]
+                else:
+                    link.delete()
+            RelatedProduct.objects.bulk_create(
+                [RelatedProduct(product_id=other_id, related_id=product_id, score=score)
+                 for other_id, score in reverse.items()],
+                update_conflicts=True,
+                unique_fields=['product', 'related'],
+                update_fields=['score', 'updated_at'],
+            )
+            _trim_lists(reverse)
+
+
+def _trim_lists(product_ids: Iterable[int]) -> int:
+    """Deja cada lista con sus RELATED_LIMIT mejores vecinos (el relleno sale primero)"""
+    from core.models import RelatedProduct
+
+    links = RelatedProduct.objects.filter(product_id__in=list(product_ids)).order_by(
+        'product_id', '-score', '-related_id'
+    ).values_list('pk', 'product_id')
+    sizes = Counter()
+    overflow = []
+    for pk, owner_id in links:
+        sizes[owner_id] += 1
+        if sizes[owner_id] > RELATED_LIMIT:
+            overflow.append(pk)
+    if overflow:
+        RelatedProduct.objects.filter(pk__in=overflow).delete()
+    return len(overflow)
+
+
+def schedule_related_refresh(product_id: int, idempotency_key: Optional[str] = None) -> None:
+    """
+    Encola el recálculo para el worker (`manage.py run_jobs`): ni el guardado
+    ni la vista de detalle esperan el cálculo, y un fallo no rompe el guardado
+    """
+    from .job_queue import enqueue
+
+    try:
+        enqueue('catalog.related_products', idempotency_key=idempotency_key, product_id=product_id)
+    except Exception:
+        logger.exception("Error encolando el recálculo de productos relacionados de %s", product_id)
+
+
+def _category_fallback(product, limit: int) -> list:
+    from core.models import ProductStore
+
+    if not product.category_id:
+        return []
+    return list(
+        ProductStore.objects.filter(category_id=product.category_id, stock__gt=0)
+        .exclude(pk=product.pk)
+        .select_related('category')
+        .order_by('-created_at')[:limit]
+    )
+
+
+def get_related_products(product, limit: int = RELATED_LIMIT) -> list:
+    """
+    Productos relacionados listos para la plantilla (una consulta)
+    Primero los que tienen stock; los de relleno siempre al final.
+    """
+    from core.models import RelatedProduct
+
+    links = list(
+        RelatedProduct.objects.filter(product_id=product.id)
+        .select_related('related__category')
+        .order_by('-score', '-related_id')[:limit]
+    )
+    if not links:
+        # Producto aún sin calcular (p. ej. antes del primer rebuild): se
+        # muestran productos de su categoría y el worker calcula la lista
+        schedule_related_refresh(product.id, idempotency_key=f'related-products:{product.id}')
+        return _category_fallback(product, limit)
+
+    links.sort(key=lambda link: (link.score <= 0, link.related.stock == 0))
+    return [link.related for link in links]
@@ -0,0 +1,287 @@
+"""
+Perfilado de requests: consultas SQL, tiempo de plantillas y presupuestos
+Lo usa core.middleware.ProfilingMiddleware. El perfil del request en curso
+vive en una ContextVar, así que las consultas hechas por vistas síncronas
+bajo ASGI (sync_to_async copia el contexto) se cuentan igual que en WSGI.
+
+- SQL: un execute_wrapper instalado en cada conexión (signal connection_created)
+- Plantillas: Template.render envuelto una sola vez; solo mide el render de
+  nivel superior para no contar dos veces los {% include %}
+- Estadísticas: agregadas por vista en memoria del proceso (cada worker de
+  gunicorn tiene las suyas)
+"""
+import logging
+import os
+import threading
+import time
+from collections import Counter
+from contextvars import ContextVar
+from typing import Any, Dict, List, Optional
+
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+
+logger = logging.getLogger(__name__)
+
+
+class QueryBudgetExceeded(Exception):
+    """Una vista superó su presupuesto de consultas (PROFILING['QUERY_BUDGETS'])"""
+
+
+def get_profiling_settings() -> Dict[str, Any]:
+    config = {
+        'ENABLED': False,
+        'HEADER': 'X-Profile',
+        'TOKEN': '',
+        'ENFORCE_BUDGETS': False,
+        'QUERY_BUDGETS': {},
+        'DUPLICATE_THRESHOLD': 2,
+        'MAX_STORED_QUERIES': 500,
+    }
+    config.update(getattr(settings, 'PROFILING', {}))
+    return config
+
+
+class RequestProfile:
+    """Métricas de un request"""
+
+    def __init__(self, max_queries: int = 500):
+        self.started = time.perf_counter()
+        self.finished: Optional[float] = None
+        self.max_queries = max_queries
+        self.query_count = 0
+        self.sql_time = 0.0
+        self.template_sql_time = 0.0
+        self.template_time = 0.0
+        self.template_depth = 0
+        self.queries: List[tuple] = []
+
+    def record_query(self, sql: str, params, duration: float) -> None:
+        self.query_count += 1
+        self.sql_time += duration
+        if self.template_depth:
+            self.template_sql_time += duration
+        if len(self.queries) < self.max_queries:
+            self.queries.append((sql, repr(params), duration))
+
+    def finish(self) -> None:
+        self.finished = time.perf_counter()
+
+    @property
+    def total_time(self) -> float:
+        return (self.finished or time.perf_counter()) - self.started
+
+    def duplicates(self, threshold: int = 2) -> Dict[str, Any]:
+        """
+        Consultas repetidas: idénticas (mismo SQL y parámetros) y similares
+        (mismo SQL con parámetros distintos, típico de un N+1)
+        """
+        exact = Counter((sql, params) for sql, params, _ in self.queries)
+        similar = Counter(sql for sql, _, _ in self.queries)
+        return {
+            'exact': sum(count - 1 for count in exact.values() if count > 1),
+            'similar': [
+                {'sql': sql[:300], 'count': count}
+                for sql, count in similar.most_common() if count >= threshold
+            ][:5],
+        }
+
+    def summary(self, threshold: int = 2) -> Dict[str, Any]:
+        total = self.total_time
+        # Tiempo propio de plantillas: sin las consultas perezosas que disparan
+        template_time = max(self.template_time - self.template_sql_time, 0.0)
+        return {
+            'queries': self.query_count,
+            'sql_ms': round(self.sql_time * 1000, 2),
+            'template_ms': round(template_time * 1000, 2),
+            'python_ms': round(max(total - self.sql_time - template_time, 0.0) * 1000, 2),
+            'total_ms': round(total * 1000, 2),
+            'duplicates': self.duplicates(threshold),
+        }
+
+
+_current_profile: ContextVar[Optional[RequestProfile]] = ContextVar('request_profile', default=None)
+
+
+def start_profile() -> RequestProfile:
+    profile = RequestProfile(get_profiling_settings()['MAX_STORED_QUERIES'])
+    profile.token = _current_profile.set(profile)
+    return profile
+
+
+def stop_profile(profile: RequestProfile) -> None:
+    profile.finish()
+    _current_profile.reset(profile.token)
+
+
+def get_current_profile() -> Optional[RequestProfile]:
+    return _current_profile.get()
+
+
+# ----------------------------------------------------------------------
+# Instrumentación
+# ----------------------------------------------------------------------
+
+def _sql_wrapper(execute, sql, params, many, context):
+    profile = _current_profile.get()
+    if profile is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        profile.record_query(sql, params, time.perf_counter() - started)
+
+
+def install_sql_wrapper(connection) -> None:
+    if _sql_wrapper not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_sql_wrapper)
+
+
+def install_on_open_connections() -> None:
+    """Conexiones ya abiertas en este hilo (las nuevas llegan por connection_created)"""
+    for connection in connections.all(initialized_only=True):
+        install_sql_wrapper(connection)
+
+
+def _on_connection_created(sender, connection, **kwargs):
+    install_sql_wrapper(connection)
+
+
+_installed = False
+_install_lock = threading.Lock()
+
+
+def install_profiling() -> None:
+    """Instala los hooks de SQL y plantillas (idempotente)"""
+    global _installed
+    with _install_lock:
+        if _installed:
+            return
+        connection_created.connect(_on_connection_created, dispatch_uid='core.request_profiling')
+
+        from django.template.base import Template
+
+        original_render = Template.render
+
+        def timed_render(self, context):
+            profile = _current_profile.get()
+            if profile is None:
+                return original_render(self, context)
+            profile.template_depth += 1
+            started = time.perf_counter()
+            try:
+                return original_render(self, context)
+            finally:
+                profile.template_depth -= 1
+                if not profile.template_depth:
+                    profile.template_time += time.perf_counter() - started
+
+        Template.render = timed_render
+        _installed = True
+
+
+# ----------------------------------------------------------------------
+# Presupuestos y estadísticas agregadas
+# ----------------------------------------------------------------------
+
+def check_query_budget(view_name: str, summary: Dict[str, Any]) -> Optional[int]:
+    """
+    Compara las consultas del request con el presupuesto de la vista
+
+    Returns:
+        El presupuesto si se superó, None si no hay presupuesto o se cumplió
+
+    Raises:
+        QueryBudgetExceeded: Si se superó y PROFILING['ENFORCE_BUDGETS'] está activo
+    """
+    config = get_profiling_settings()
+    budget = config['QUERY_BUDGETS'].get(view_name)
+    if budget is None or summary['queries'] <= budget:
+        return None
+
+    message = f"{view_name}: {summary['queries']} consultas (presupuesto {budget})"
+    similar = summary['duplicates']['similar']
+    if similar:
+        message += f"; la más repetida ({similar[0]['count']}x): {similar[0]['sql']}"
+    if config['ENFORCE_BUDGETS']:
+        raise QueryBudgetExceeded(message)
+    logger.warning("⚠️ Presupuesto de consultas superado - %s", message)
+    return budget
+
+
+def server_timing_header(summary: Dict[str, Any]) -> str:
+    duplicates = summary['duplicates']['exact']
+    return ', '.join([
+        f'sql;dur={summary["sql_ms"]};desc="{summary["queries"]} queries, {duplicates} dup"',
+        f'tpl;dur={summary["template_ms"]};desc="templates"',
+        f'py;dur={summary["python_ms"]};desc="python"',
+        f'total;dur={summary["total_ms"]}',
+    ])
+
+
+class ProfileStats:
+    """Acumulado por vista desde que arrancó el proceso"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._views: Dict[str, Dict[str, Any]] = {}
+        self.started_at = time.time()
+
+    def record(self, view_name: str, path: str, summary: Dict[str, Any], over_budget: bool) -> None:
+        with self._lock:
+            stats = self._views.setdefault(view_name, {
+                'view': view_name, 'requests': 0, 'queries': 0, 'max_queries': 0, 'sql_ms': 0.0,
+                'template_ms': 0.0, 'python_ms': 0.0, 'total_ms': 0.0, 'max_ms': 0.0,
+                'duplicates': 0, 'over_budget': 0, 'last_path': '',
+            })
+            stats['requests'] += 1
+            stats['queries'] += summary['queries']
+            stats['max_queries'] = max(stats['max_queries'], summary['queries'])
+            stats['sql_ms'] += summary['sql_ms']
+            stats['template_ms'] += summary['template_ms']
+            stats['python_ms'] += summary['python_ms']
+            stats['total_ms'] += summary['total_ms']
+            stats['max_ms'] = max(stats['max_ms'], summary['total_ms'])
+            stats['duplicates'] += summary['duplicates']['exact']
+            stats['over_budget'] += int(over_budget)
+            stats['last_path'] = path
+
+    def snapshot(self) -> List[Dict[str, Any]]:
+        """Promedios por vista, las más lentas primero"""
+        budgets = get_profiling_settings()['QUERY_BUDGETS']
+        rows = []
+        with self._lock:
+            for stats in self._views.values():
+                count = stats['requests']
+                row = dict(stats)
+                for field in ('queries', 'sql_ms', 'template_ms', 'python_ms', 'total_ms', 'duplicates'):
+                    row[f'avg_{field}'] = round(stats[field] / count, 2)
+                row['budget'] = budgets.get(stats['view'])
+                rows.append(row)
+        rows.sort(key=lambda row: row['total_ms'], reverse=True)
+        return rows
+
+    def reset(self) -> None:
+        with self._lock:
+            self._views.clear()
+            self.started_at = time.time()
+
+
+profile_stats = ProfileStats()
+
+
+def get_stats_context() -> Dict[str, Any]:
+    from shared.services import CacheService
+
+    return {
+        'cache': sorted(
+            ({'namespace': namespace, **metrics} for namespace, metrics in CacheService.stats().items()),
+            key=lambda row: row['namespace'],
+        ),
+        'views': profile_stats.snapshot(),
+        'started_at': profile_stats.started_at,
+        'pid': os.getpid(),
+        'enabled': get_profiling_settings()['ENABLED'],
+    }
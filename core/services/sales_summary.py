@@ -0,0 +1,234 @@
+"""
+Servicio de resúmenes diarios de ventas (VentaDiaria / VentaDiariaCategoria)
+Las agregaciones se calculan en la base de datos y se materializan por día,
+así las estadísticas del dashboard no dependen del tamaño del historial
+"""
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+from typing import Dict, List, Tuple
+
+from django.db import transaction
+from django.db.models import Count, DecimalField, ExpressionWrapper, F, Sum, Value, Window
+from django.db.models.functions import Coalesce, RowNumber, TruncDate
+from django.utils import timezone
+
+from .visit_rollups import get_period_starts
+
+SIN_CATEGORIA = 'Sin Categoría'
+
+_LINE_TOTAL = ExpressionWrapper(F('precio') * F('cantidad'), output_field=DecimalField(max_digits=14, decimal_places=2))
+
+
+def _day_range(day) -> Tuple:
+    """Inicio y fin (exclusivo) del día local como datetimes con zona horaria"""
+    start = timezone.make_aware(datetime.combine(day, time.min))
+    return start, start + timedelta(days=1)
+
+
+def _sales_details(start=None, end=None):
+    from core.models import PedidoDetalle
+
+    details = PedidoDetalle.objects.exclude(pedido__estado='cancelado')
+    if start is not None:
+        details = details.filter(pedido__fecha__gte=start)
+    if end is not None:
+        details = details.filter(pedido__fecha__lt=end)
+    return details
+
+
+def _sales_orders(start=None, end=None):
+    from core.models import Pedido
+
+    orders = Pedido.objects.exclude(estado='cancelado')
+    if start is not None:
+        orders = orders.filter(fecha__gte=start)
+    if end is not None:
+        orders = orders.filter(fecha__lt=end)
+    return orders
+
+
+def _build_rows(details, orders):
+    """Agrupa detalles y pedidos por día local y arma las filas de resumen"""
+    from core.models import VentaDiaria, VentaDiariaCategoria
+
+    daily = {}
+    for row in orders.annotate(dia=TruncDate('fecha')).values('dia').annotate(total=Count('id')):
+        daily[row['dia']] = VentaDiaria(fecha=row['dia'], pedidos=row['total'])
+
+    by_category = details.annotate(
+        dia=TruncDate('pedido__fecha'),
+        nombre=Coalesce('producto__category__nombre', Value(SIN_CATEGORIA)),
+    ).values('dia', 'nombre').annotate(
+        ingresos=Sum(_LINE_TOTAL),
+        productos=Sum('cantidad'),
+        num_pedidos=Count('pedido', distinct=True),
+    )
+
+    categories = []
+    for row in by_category:
+        categories.append(VentaDiariaCategoria(
+            fecha=row['dia'],
+            categoria=row['nombre'],
+            total_ingresos=row['ingresos'] or 0,
+            cantidad_productos=row['productos'] or 0,
+            cantidad_pedidos=row['num_pedidos'],
+        ))
+        summary = daily.setdefault(row['dia'], VentaDiaria(fecha=row['dia']))
+        summary.total_ingresos += row['ingresos'] or 0
+        summary.cantidad_productos += row['productos'] or 0
+
+    return list(daily.values()), categories
+
+
+def refresh_sales_day(day) -> None:
+    """Recalcula el resumen de un día local a partir de sus pedidos"""
+    from core.models import VentaDiaria, VentaDiariaCategoria
+
+    start, end = _day_range(day)
+    daily, categories = _build_rows(_sales_details(start, end), _sales_orders(start, end))
+
+    with transaction.atomic():
+        VentaDiaria.objects.filter(fecha=day).delete()
+        VentaDiariaCategoria.objects.filter(fecha=day).delete()
+        VentaDiaria.objects.bulk_create(daily)
+        VentaDiariaCategoria.objects.bulk_create(categories)
+
+
+def rebuild_sales_summary(since=None) -> int:
+    """
+    Recalcula todos los resúmenes diarios (o desde una fecha) en una pasada
+
+    Args:
+        since: date local desde la cual reconstruir (None = todo el historial)
+
+    Returns:
+        Número de días con ventas reconstruidos
+    """
+    from core.models import VentaDiaria, VentaDiariaCategoria
+
+    start = _day_range(since)[0] if since else None
+    daily, categories = _build_rows(_sales_details(start), _sales_orders(start))
+
+    summaries = VentaDiaria.objects.all()
+    category_summaries = VentaDiariaCategoria.objects.all()
+    if since:
+        summaries = summaries.filter(fecha__gte=since)
+        category_summaries = category_summaries.filter(fecha__gte=since)
+
+    with transaction.atomic():
+        summaries.delete()
+        category_summaries.delete()
+        VentaDiaria.objects.bulk_create(daily, batch_size=1000)
+        VentaDiariaCategoria.objects.bulk_create(categories, batch_size=1000)
+    return len(daily)
+
+
+def _refresh_pending_days() -> None:
+    connection = transaction.get_connection()
+    days = getattr(connection, 'pending_sales_days', None) or set()
+    connection.pending_sales_days = None
+    for day in sorted(days):
+        refresh_sales_day(day)
+
+
+def schedule_sales_refresh(*moments) -> None:
+    """
+    Programa el recálculo de los días de `moments` al confirmar la transacción
+
+    Un pedido guarda el pedido y todas sus líneas en la misma transacción: se
+    recalcula una sola vez cada día aunque lo pidan varias señales. Si la
+    transacción se revierte el resumen no se toca; fuera de una transacción el
+    recálculo es inmediato.
+    """
+    days = {timezone.localdate(moment) for moment in moments if moment is not None}
+    if not days:
+        return
+
+    connection = transaction.get_connection()
+    if not connection.in_atomic_block:
+        for day in sorted(days):
+            refresh_sales_day(day)
+        return
+    pending = getattr(connection, 'pending_sales_days', None)
+    if pending is None:
+        connection.pending_sales_days = pending = set()
+    pending.update(days)
+    # Cada llamada registra su callback: si se revierte un savepoint Django
+    # descarta solo los registrados dentro. El primero que corre vacía el
+    # conjunto y los demás no hacen nada; los días de una transacción revertida
+    # se recalculan con el siguiente commit (recalcular un día no cambia nada).
+    transaction.on_commit(_refresh_pending_days)
+
+
+def get_sales_by_period(periodo: str = 'all') -> Tuple[List[Dict], Dict]:
+    """
+    Ventas por categoría y estadísticas generales del período
+
+    Args:
+        periodo: 'all', 'today', 'week' o 'month'
+
+    Returns:
+        Tupla (ventas_por_categoria, estadisticas) con el formato del dashboard
+    """
+    from core.models import VentaDiaria, VentaDiariaCategoria
+
+    start = get_period_starts().get(periodo)
+    summaries = VentaDiaria.objects.all()
+    category_summaries = VentaDiariaCategoria.objects.all()
+    if start is not None:
+        summaries = summaries.filter(fecha__gte=start.date())
+        category_summaries = category_summaries.filter(fecha__gte=start.date())
+
+    ventas_por_categoria = [
+        {
+            'nombre': row['categoria'],
+            'total_ingresos': float(row['ingresos'] or 0),
+            'cantidad_productos': row['productos'] or 0,
+            'cantidad_pedidos': row['num_pedidos'] or 0,
+        }
+        for row in category_summaries.values('categoria').annotate(
+            ingresos=Sum('total_ingresos'),
+            productos=Sum('cantidad_productos'),
+            num_pedidos=Sum('cantidad_pedidos'),
+        ).order_by('-ingresos')
+    ]
+
+    totals = summaries.aggregate(
+        total_ventas=Sum('total_ingresos'),
+        total_productos=Sum('cantidad_productos'),
+        pedidos_totales=Sum('pedidos'),
+    )
+    total_ventas = float(totals['total_ventas'] or Decimal('0'))
+    pedidos_count = totals['pedidos_totales'] or 0
+
+    estadisticas = {
+        'total_ventas': total_ventas,
+        'total_productos': totals['total_productos'] or 0,
+        'pedidos_totales': pedidos_count,
+        'promedio_por_pedido': total_ventas / pedidos_count if pedidos_count > 0 else 0,
+    }
+    return ventas_por_categoria, estadisticas
+
+
+def get_top_products_by_category(limit: int = 5) -> Dict[str, Dict]:
+    """
+    Productos más vendidos de cada categoría (pedidos no cancelados), en dos consultas
+
+    Returns:
+        {nombre de categoría: {'productos': [{'nombre', 'cantidad'}] (los `limit`
+        con más unidades), 'productos_distintos': int}}
+    """
+    details = _sales_details().annotate(nombre=Coalesce('producto__category__nombre', Value(SIN_CATEGORIA)))
+
+    result: Dict[str, Dict] = {
+        row['nombre']: {'productos': [], 'productos_distintos': row['total']}
+        for row in details.values('nombre').annotate(total=Count('producto', distinct=True))
+    }
+    ranked = details.values('nombre', 'producto_id', 'producto__name').annotate(
+        cantidad=Sum('cantidad'),
+    ).annotate(
+        posicion=Window(RowNumber(), partition_by=[F('nombre')], order_by=[F('cantidad').desc(), F('producto_id')]),
+    ).filter(posicion__lte=limit).order_by('nombre', 'posicion')
+    for row in ranked:
+        result[row['nombre']]['productos'].append({'nombre': row['producto__name'], 'cantidad': row['cantidad']})
+    return result
@@ -0,0 +1,351 @@
+"""
+Servicio de búsqueda de productos con índice de texto completo
+Cada ProductStore tiene un documento normalizado (ProductSearchDocument) que
+se indexa con el motor disponible:
+
+- PostgreSQL: columna tsvector (diccionario 'spanish') con índice GIN y ts_rank
+- SQLite: tabla virtual FTS5 con bm25 y derivación ligera en español
+- Otros: búsqueda por palabras sobre el documento normalizado
+
+El texto se normaliza sin tildes tanto al indexar como al consultar, así
+"portátil" y "portatil" encuentran lo mismo.
+"""
+import logging
+import re
+import unicodedata
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+from django.db import connection, transaction
+from django.db.models import Case, IntegerField, Value, When
+from django.utils.html import strip_tags
+
+logger = logging.getLogger(__name__)
+
+DOCUMENT_TABLE = 'core_productsearchdocument'
+FTS_TABLE = 'core_productsearch_fts'
+
+# Peso de cada columna: nombre > categoría > descripción
+PG_WEIGHTS = (('name_text', 'A'), ('category_text', 'B'), ('body_text', 'C'))
+FTS_WEIGHTS = (10.0, 5.0, 1.0)
+
+MAX_RESULTS = 500
+MAX_QUERY_TOKENS = 8
+
+_NON_WORD = re.compile(r'[^a-z0-9ñ]+')
+_fts_available: Optional[bool] = None
+
+
+# ---------------------------------------------------------------------------
+# Normalización
+# ---------------------------------------------------------------------------
+
+def normalize_text(text: str) -> str:
+    """Minúsculas, sin tildes ni signos; conserva la ñ"""
+    if not text:
+        return ''
+    text = strip_tags(str(text)).lower().replace('ñ', '\x00')
+    text = unicodedata.normalize('NFKD', text)
+    text = ''.join(char for char in text if not unicodedata.combining(char))
+    text = text.replace('\x00', 'ñ')
+    return _NON_WORD.sub(' ', text).strip()
+
+
+def stem_word(word: str) -> str:
+    """
+    Derivación ligera para español: quita plurales y la vocal final de
+    género (computadoras -> computador, teclados -> teclad)
+    """
+    if len(word) > 4 and word.endswith('es') and word[-3] not in 'aeiou':
+        word = word[:-2]
+    elif len(word) > 3 and word.endswith('s'):
+        word = word[:-1]
+    if len(word) > 4 and word[-1] in 'aeo':
+        word = word[:-1]
+    return word
+
+
+def stem_text(text: str) -> str:
+    return ' '.join(stem_word(word) for word in text.split())
+
+
+def tokenize_query(query: str) -> List[str]:
+    """Palabras normalizadas de la consulta (sin duplicados, en orden)"""
+    tokens = []
+    for token in normalize_text(query).split():
+        if token not in tokens:
+            tokens.append(token)
+    return tokens[:MAX_QUERY_TOKENS]
+
+
+def build_document_fields(name: str, category: str, description: str) -> Dict[str, str]:
+    return {
+        'name_text': normalize_text(name),
+        'category_text': normalize_text(category),
+        'body_text': normalize_text(description),
+    }
+
+
+# ---------------------------------------------------------------------------
+# Motor de búsqueda según la base de datos
+# ---------------------------------------------------------------------------
+
+def get_backend(conn=None) -> str:
+    """'postgresql', 'fts5' o 'basic'"""
+    global _fts_available
+    conn = conn or connection
+
+    if conn.vendor == 'postgresql':
+        return 'postgresql'
+    if conn.vendor == 'sqlite':
+        if _fts_available is None:
+            with conn.cursor() as cursor:
+                cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = %s", [FTS_TABLE])
+                _fts_available = cursor.fetchone() is not None
+        if _fts_available:
+            return 'fts5'
+    return 'basic'
+
+
+def create_backend_structures(conn) -> None:
+    """Crea la columna tsvector + índice GIN (PostgreSQL) o la tabla FTS5 (SQLite)"""
+    global _fts_available
+
+    with conn.cursor() as cursor:
+        if conn.vendor == 'postgresql':
+            cursor.execute(f"ALTER TABLE {DOCUMENT_TABLE} ADD COLUMN IF NOT EXISTS search_vector tsvector")
+            cursor.execute(
+                f"CREATE INDEX IF NOT EXISTS core_productsearch_vector_gin "
+                f"ON {DOCUMENT_TABLE} USING gin(search_vector)"
+            )
+        elif conn.vendor == 'sqlite':
+            try:
+                cursor.execute(
+                    f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} "
+                    f"USING fts5(name, category, body, tokenize='unicode61 remove_diacritics 2')"
+                )
+            except Exception:
+                logger.warning("SQLite sin FTS5: la búsqueda usará el modo básico")
+    _fts_available = None
+
+
+def drop_backend_structures(conn) -> None:
+    global _fts_available
+
+    with conn.cursor() as cursor:
+        if conn.vendor == 'postgresql':
+            cursor.execute("DROP INDEX IF EXISTS core_productsearch_vector_gin")
+            cursor.execute(f"ALTER TABLE {DOCUMENT_TABLE} DROP COLUMN IF EXISTS search_vector")
+        elif conn.vendor == 'sqlite':
+            cursor.execute(f"DROP TABLE IF EXISTS {FTS_TABLE}")
+    _fts_available = None
+
+
+def sync_backend(rows: Sequence[Tuple[int, str, str, str]], conn=None) -> None:
+    """
+    Replica documentos ya guardados en el índice del motor
+
+    Args:
+        rows: Tuplas (product_id, name_text, category_text, body_text) de
+            productos que no están en el índice (ver remove_from_backend)
+    """
+    conn = conn or connection
+    if not rows:
+        return
+    backend = get_backend(conn)
+    with conn.cursor() as cursor:
+        if backend == 'postgresql':
+            vector = ' || '.join(
+                f"setweight(to_tsvector('spanish', coalesce({column}, '')), '{weight}')"
+                for column, weight in PG_WEIGHTS
+            )
+            cursor.execute(
+                f"UPDATE {DOCUMENT_TABLE} SET search_vector = {vector} WHERE product_id = ANY(%s)",
+                [[row[0] for row in rows]],
+            )
+        elif backend == 'fts5':
+            cursor.executemany(
+                f"INSERT INTO {FTS_TABLE} (rowid, name, category, body) VALUES (%s, %s, %s, %s)",
+                [(pid, stem_text(name), stem_text(category), stem_text(body)) for pid, name, category, body in rows],
+            )
+
+
+def remove_from_backend(product_ids: Optional[Iterable[int]], conn=None) -> None:
+    """Quita productos del índice del motor (None = vaciarlo por completo)"""
+    conn = conn or connection
+    if get_backend(conn) != 'fts5':
+        return  # En PostgreSQL el tsvector vive en la fila del documento
+
+    with conn.cursor() as cursor:
+        if product_ids is None:
+            cursor.execute(f"DELETE FROM {FTS_TABLE}")
+            return
+        ids = list(product_ids)
+        if ids:
+            placeholders = ','.join(['%s'] * len(ids))
+            cursor.execute(f"DELETE FROM {FTS_TABLE} WHERE rowid IN ({placeholders})", ids)
+
+
+# ---------------------------------------------------------------------------
+# Indexación
+# ---------------------------------------------------------------------------
+
+def index_products(product_ids: Optional[Iterable[int]] = None) -> int:
+    """
+    (Re)genera el documento de búsqueda de los productos indicados
+
+    Args:
+        product_ids: IDs a indexar (None = todo el catálogo)
+
+    Returns:
+        Número de documentos escritos
+    """
+    from core.models import ProductSearchDocument, ProductStore
+
+    products = ProductStore.objects.select_related('category').only(
+        'id', 'name', 'description', 'category__nombre'
+    )
+    if product_ids is not None:
+        product_ids = list(product_ids)
+        if not product_ids:
+            return 0
+        products = products.filter(id__in=product_ids)
+
+    documents = [
+        ProductSearchDocument(
+            product_id=product.id,
+            **build_document_fields(product.name, product.category.nombre if product.category else '', product.description),
+        )
+        for product in products.iterator()
+    ]
+
+    with transaction.atomic():
+        if product_ids is None:
+            ProductSearchDocument.objects.all().delete()
+        else:
+            ProductSearchDocument.objects.filter(product_id__in=product_ids).delete()
+        remove_from_backend(product_ids)
+        ProductSearchDocument.objects.bulk_create(documents, batch_size=500)
+        sync_backend([
+            (doc.product_id, doc.name_text, doc.category_text, doc.body_text) for doc in documents
+        ])
+    return len(documents)
+
+
+def index_product_if_changed(product) -> bool:
+    """
+    Reindexa un producto solo si cambió su texto buscable (nombre,
+    descripción o categoría); guardar stock o precio no toca el índice
+    """
+    from core.models import ProductSearchDocument
+
+    fields = build_document_fields(
+        product.name, product.category.nombre if product.category_id else '', product.description
+    )
+    current = ProductSearchDocument.objects.filter(product_id=product.pk).values(*fields.keys()).first()
+    if current == fields:
+        return False
+    index_products([product.pk])
+    return True
+
+
+def schedule_product_index(product) -> None:
+    """Reindexa el producto al confirmar la transacción sin romper el guardado si falla"""
+    def _run():
+        try:
+            index_product_if_changed(product)
+        except Exception:
+            logger.exception("Error indexando producto %s para búsqueda", product.pk)
+
+    transaction.on_commit(_run)
+
+
+def schedule_category_index(category) -> None:
+    """Reindexa los productos de una categoría (p. ej. al renombrarla)"""
+    def _run():
+        try:
+            index_products(category.products.values_list('id', flat=True))
+        except Exception:
+            logger.exception("Error reindexando la categoría %s", category.pk)
+
+    transaction.on_commit(_run)
+
+
+def remove_product(product_id: int) -> None:
+    """El documento se borra en cascada; aquí solo se limpia el índice del motor"""
+    remove_from_backend([product_id])
+
+
+# ---------------------------------------------------------------------------
+# Consultas
+# ---------------------------------------------------------------------------
+
+def search_product_ids(query: str, limit: int = MAX_RESULTS) -> List[int]:
+    """
+    IDs de productos que coinciden con todas las palabras, ordenados por relevancia
+    Cada palabra se busca como prefijo para soportar búsqueda mientras se escribe.
+    """
+    tokens = tokenize_query(query)
+    if not tokens:
+        return []
+
+    backend = get_backend()
+    with connection.cursor() as cursor:
+        if backend == 'postgresql':
+            ts_query = ' & '.join(f'{token}:*' for token in tokens)
+            cursor.execute(
+                f"SELECT product_id FROM {DOCUMENT_TABLE}, to_tsquery('spanish', %s) AS q "
+                f"WHERE search_vector @@ q "
+                f"ORDER BY ts_rank(search_vector, q) DESC, product_id LIMIT %s",
+                [ts_query, limit],
+            )
+            return [row[0] for row in cursor.fetchall()]
+
+        if backend == 'fts5':
+            match = ' '.join(f'"{stem_word(token)}"*' for token in tokens)
+            weights = ', '.join(str(weight) for weight in FTS_WEIGHTS)
+            cursor.execute(
+                f"SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s "
+                f"ORDER BY bm25({FTS_TABLE}, {weights}), rowid LIMIT %s",
+                [match, limit],
+            )
+            return [row[0] for row in cursor.fetchall()]
+
+    return _basic_search(tokens, limit)
+
+
+def _basic_search(tokens: List[str], limit: int) -> List[int]:
+    from django.db.models import Q
+    from core.models import ProductSearchDocument
+
+    documents = ProductSearchDocument.objects.all()
+    score = Value(0)
+    for token in tokens:
+        documents = documents.filter(
+            Q(name_text__contains=token) | Q(category_text__contains=token) | Q(body_text__contains=token)
+        )
+        score = score + Case(
+            When(name_text__contains=token, then=Value(3)),
+            When(category_text__contains=token, then=Value(2)),
+            default=Value(1),
+            output_field=IntegerField(),
+        )
+    documents = documents.annotate(search_score=score).order_by('-search_score', 'product_id')
+    return list(documents.values_list('product_id', flat=True)[:limit])
+
+
+def filter_by_search(queryset, query: str, limit: int = MAX_RESULTS):
+    """
+    Restringe un queryset de ProductStore a los resultados de la búsqueda
+    y lo anota con `search_rank` (0 = más relevante)
+
+    Para ordenar por relevancia: queryset.order_by('search_rank')
+    """
+    ids = search_product_ids(query, limit)
+    if not ids:
+        return queryset.none()
+    return queryset.filter(id__in=ids).annotate(
+        search_rank=Case(
+            *[When(id=pid, then=Value(position)) for position, pid in enumerate(ids)],
+            output_field=IntegerField(),
+        )
+    )
@@ -0,0 +1,259 @@
+"""
+Descuento y reserva de stock para el checkout
+Todas las líneas se descuentan con un UPDATE condicional por tabla
+(`SET stock = stock - CASE id ... END WHERE id IN (...) AND stock >= CASE ...`)
+en una sola transacción: si alguna no alcanza se revierte todo y no hay
+sobreventa aunque varios checkouts compitan por las mismas unidades. Los
+candados de fila duran solo lo que tardan esos UPDATE, no el pago.
+
+Con Wompi el stock se aparta al crear la transacción (StockReservation con
+vencimiento) y la reserva se confirma al crear el pedido o se libera si el
+pago falla, el cliente cierra el widget o vence (release_expired_reservations,
+`manage.py release_expired_reservations`).
+
+Los UPDATE no disparan las señales de ProductStore, así que aquí se programan
+los efectos que dependen del stock: versión del catálogo, pool de
+recomendaciones y avisos de "volvió a estar disponible".
+"""
+import logging
+from dataclasses import dataclass
+from datetime import timedelta
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, Value, When
+from django.utils import timezone
+
+from core.models import ProductStore, ProductVariant, StockReservation
+
+from .catalog_version import schedule_catalog_bump
+from .dashboard_metrics import schedule_metrics_push
+from .recommendation_pool import schedule_pool_invalidation
+
+logger = logging.getLogger(__name__)
+
+
+def get_reservation_ttl() -> int:
+    return getattr(settings, 'STOCK_RESERVATION', {}).get('TTL_SECONDS', 900)
+
+
+@dataclass(frozen=True)
+class StockLine:
+    """Unidades a descontar de un producto o de una de sus variantes"""
+    product_id: int
+    variant_id: Optional[int]
+    quantity: int
+    name: str = ''
+
+
+class InsufficientStock(Exception):
+    """Una o más líneas no tienen stock suficiente; no se descontó nada"""
+
+    def __init__(self, lines: List[StockLine]):
+        self.lines = lines
+        names = ', '.join(line.name or str(line.product_id) for line in lines)
+        super().__init__(f'Sin stock suficiente para: {names}')
+
+
+def lines_from_cart(items: Iterable) -> List[StockLine]:
+    """
+    Agrupa las líneas del carrito por producto/variante
+
+    Se ordenan por id para que dos checkouts simultáneos bloqueen las filas en
+    el mismo orden (sin interbloqueos)
+    """
+    grouped: Dict[Tuple[int, Optional[int]], List] = {}
+    for item in items:
+        key = (item.product.pk, item.variant.pk if item.variant else None)
+        entry = grouped.setdefault(key, [0, str(item.variant or item.product.name)])
+        entry[0] += item.quantity
+    return [
+        StockLine(product_id, variant_id, quantity, name)
+        for (product_id, variant_id), (quantity, name) in sorted(grouped.items(), key=lambda row: (row[0][0], row[0][1] or 0))
+    ]
+
+
+def _target(line: StockLine):
+    if line.variant_id:
+        return ProductVariant.objects.filter(pk=line.variant_id)
+    return ProductStore.objects.filter(pk=line.product_id)
+
+
+def _quantities(lines: List[StockLine]):
+    """[(modelo, {id: unidades})] para productos sin variante y para variantes"""
+    products = {line.product_id: line.quantity for line in lines if not line.variant_id}
+    variants = {line.variant_id: line.quantity for line in lines if line.variant_id}
+    return [(model, quantities) for model, quantities in ((ProductStore, products), (ProductVariant, variants))
+            if quantities]
+
+
+def _quantity_case(quantities: Dict[int, int]) -> Case:
+    return Case(*[When(pk=pk, then=Value(quantity)) for pk, quantity in quantities.items()],
+                output_field=IntegerField())
+
+
+class _Shortfall(Exception):
+    """Alguna fila del UPDATE en lote no tenía stock suficiente"""
+
+
+def _decrement(line: StockLine, allow_oversell: bool) -> bool:
+    if _target(line).filter(stock__gte=line.quantity).update(stock=F('stock') - line.quantity):
+        return True
+    if allow_oversell:
+        # Pago ya cobrado: el pedido se registra igual y el stock queda en 0
+        _target(line).update(stock=0)
+        logger.warning("⚠️ Sobreventa registrada - producto %s variante %s x%s",
+                       line.product_id, line.variant_id, line.quantity)
+        return True
+    return False
+
+
+def _after_stock_change(lines: List[StockLine], restored_ids: Iterable[int] = ()) -> None:
+    """Efectos que las señales de post_save harían con un save() normal"""
+    schedule_catalog_bump()
+    schedule_metrics_push()
+
+    product_ids = {line.product_id for line in lines if not line.variant_id}
+    restored_ids = set(restored_ids)
+    if restored_ids or ProductStore.objects.filter(pk__in=product_ids, stock=0).exists():
+        schedule_pool_invalidation()
+
+    if restored_ids:
+        def notify():
+            from core.signals import send_back_in_stock_notifications
+
+            for product in ProductStore.objects.filter(pk__in=restored_ids, stock__gt=0):
+                send_back_in_stock_notifications(product)
+
+        transaction.on_commit(notify)
+
+
+def consume_stock(lines: List[StockLine], allow_oversell: bool = False) -> None:
+    """
+    Descuenta todas las líneas o ninguna
+
+    Raises:
+        InsufficientStock: Si alguna línea no alcanza (y allow_oversell es False)
+    """
+    with transaction.atomic():
+        try:
+            with transaction.atomic():
+                for model, quantities in _quantities(lines):
+                    case = _quantity_case(quantities)
+                    updated = model.objects.filter(pk__in=list(quantities), stock__gte=case).update(
+                        stock=F('stock') - case
+                    )
+                    if updated != len(quantities):
+                        raise _Shortfall
+        except _Shortfall:
+            # Se revirtió el lote: línea por línea para saber cuáles no alcanzan
+            failed = [line for line in lines if not _decrement(line, allow_oversell)]
+            if failed:
+                raise InsufficientStock(failed)
+        _after_stock_change(lines)
+
+
+def restore_stock(lines: List[StockLine]) -> None:
+    """Devuelve unidades al stock (reserva liberada o vencida)"""
+    with transaction.atomic():
+        product_ids = [line.product_id for line in lines if not line.variant_id]
+        restored_ids = list(ProductStore.objects.filter(pk__in=product_ids, stock=0).values_list('pk', flat=True))
+        for model, quantities in _quantities(lines):
+            model.objects.filter(pk__in=list(quantities)).update(stock=F('stock') + _quantity_case(quantities))
+        _after_stock_change(lines, restored_ids)
+
+
+def reserve_stock(reference: str, lines: List[StockLine], ttl: Optional[int] = None) -> List[StockReservation]:
+    """
+    Aparta el stock de un pago en curso
+
+    Un segundo intento con la misma referencia reemplaza la reserva anterior.
+
+    Raises:
+        InsufficientStock: Si alguna línea no alcanza
+    """
+    release_expired_reservations()
+
+    expires_at = timezone.now() + timedelta(seconds=ttl or get_reservation_ttl())
+    with transaction.atomic():
+        release_reservation(reference)
+        consume_stock(lines)
+        return StockReservation.objects.bulk_create([
+            StockReservation(
+                reference=reference,
+                product_id=line.product_id,
+                variant_id=line.variant_id,
+                quantity=line.quantity,
+                expires_at=expires_at,
+            )
+            for line in lines
+        ])
+
+
+def _line_key(product_id: int, variant_id: Optional[int], quantity: int) -> Tuple[int, int, int]:
+    return product_id, variant_id or 0, quantity
+
+
+def commit_reservation(reference: str, lines: List[StockLine]) -> bool:
+    """
+    Confirma la reserva al crear el pedido (el stock ya estaba descontado)
+
+    Solo se confirma si lo apartado coincide con las líneas del pedido: si el
+    carrito cambió después de iniciar el pago la reserva se libera y el
+    llamador descuenta las líneas actuales.
+
+    Returns:
+        False si no hay reserva activa (vencida, liberada o inexistente) o si
+        no coincide con las líneas
+    """
+    if not reference:
+        return False
+    reserved = StockReservation.objects.select_for_update().filter(reference=reference, status='active')
+    held = sorted(_line_key(row.product_id, row.variant_id, row.quantity) for row in reserved)
+    if held != sorted(_line_key(line.product_id, line.variant_id, line.quantity) for line in lines):
+        if held:
+            logger.warning("⚠️ Reserva %s no coincide con el carrito: se libera", reference)
+            release_reservation(reference)
+        return False
+    return StockReservation.objects.filter(reference=reference, status='active').update(status='committed') > 0
+
+
+def release_reservation(reference: str, status: str = 'released') -> int:
+    """
+    Devuelve al stock las unidades de una reserva activa
+
+    Cada fila se marca con un UPDATE condicional antes de devolver sus
+    unidades, así dos liberaciones simultáneas no devuelven el stock dos veces.
+
+    Returns:
+        Unidades devueltas
+    """
+    if not reference:
+        return 0
+    with transaction.atomic():
+        released = []
+        for reservation in StockReservation.objects.filter(reference=reference, status='active'):
+            if StockReservation.objects.filter(pk=reservation.pk, status='active').update(status=status):
+                released.append(StockLine(reservation.product_id, reservation.variant_id, reservation.quantity))
+        if released:
+            restore_stock(released)
+    return sum(line.quantity for line in released)
+
+
+def release_expired_reservations(limit: int = 200) -> int:
+    """
+    Libera las reservas vencidas (índice parcial sobre las activas)
+
+    Returns:
+        Número de referencias liberadas
+    """
+    references = list(
+        StockReservation.objects.filter(status='active', expires_at__lt=timezone.now())
+        .values_list('reference', flat=True).distinct()[:limit]
+    )
+    for reference in references:
+        units = release_reservation(reference, status='expired')
+        if units:
+            logger.info("⏱️ Reserva %s vencida: %s unidades devueltas al stock", reference, units)
+    return len(references)
@@ -0,0 +1,47 @@
+"""
+Resolución visita -> producto para los listados de visitas
+StoreVisit.product es un FK sin constraint (las visitas se escriben en lote y
+conservan el id de productos ya eliminados). Los listados resuelven todos los
+productos de una vez en lugar de un ProductStore.objects.get por fila:
+
+- Visitas: with_visit_products agrega el producto al mismo SELECT
+  (LEFT JOIN; None si el producto ya no existe)
+- Filas agregadas ({'product_id', ...} de visit_rollups): hydrate_products
+  hace un solo in_bulk
+
+LISTING_QUERY_BUDGETS es el máximo de consultas de cada listado sin importar
+cuántas filas tenga; `manage.py benchmark_queries --budgets` lo verifica.
+"""
+from typing import Dict, Iterable, List, Optional
+
+from django.db.models import QuerySet
+
+from core.models import ProductStore
+
+LISTING_QUERY_BUDGETS = {
+    # Visitas con usuario y producto en un SELECT
+    'visitas_recientes': 1,
+    # Buckets de visit_rollups + in_bulk de los productos
+    'productos_mas_visitados': 2,
+}
+
+
+def with_visit_products(queryset: QuerySet) -> QuerySet:
+    """Visitas con su usuario y producto resueltos en la misma consulta"""
+    return queryset.select_related('user', 'product')
+
+
+def hydrate_products(rows: Iterable[Dict], products: Optional[QuerySet] = None) -> List[Dict]:
+    """
+    Agrega 'product' (o None si fue eliminado) a filas con 'product_id'
+
+    Args:
+        rows: dicts con 'product_id'
+        products: queryset base de ProductStore (p. ej. con select_related)
+    """
+    rows = list(rows)
+    products = ProductStore.objects.all() if products is None else products
+    by_id = products.in_bulk({row['product_id'] for row in rows if row['product_id']})
+    for row in rows:
+        row['product'] = by_id.get(row['product_id'])
+    return rows
@@ -0,0 +1,478 @@
+"""
+Retención de visitas: particiones por mes, archivo y poda de StoreVisit
+StoreVisit recibe una fila por página vista. Los meses anteriores a
+RETENTION_MONTHS se resumen en VisitRollup (buckets diarios, así los
+contadores del dashboard no cambian), se guardan en
+ARCHIVE_DIR/storevisit_AAAA-MM.csv.gz y se eliminan de la base:
+
+- PostgreSQL: la tabla está particionada por rango de `timestamp`, una
+  partición por mes local (core_storevisit_pAAAAMM) más una partición
+  default para filas fuera de rango. Las consultas por fecha solo leen las
+  particiones del rango y eliminar un mes es DETACH + DROP de su partición.
+- SQLite (desarrollo) o PostgreSQL sin convertir: los mismos meses se
+  calculan sobre la tabla y se eliminan con DELETE por lotes.
+
+La migración 0040 crea la tabla particionada vacía al lado de la actual,
+`manage.py partition_visits` copia las visitas por lotes y cambia las tablas,
+y `manage.py prune_visits` crea las particiones de los próximos meses y
+archiva los meses viejos. Los archivos tienen las columnas de ARCHIVE_HEADERS (fechas
+en ISO con zona horaria) y se pueden volver a cargar con COPY ... CSV HEADER.
+"""
+import csv
+import gzip
+import os
+import re
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models.functions import Coalesce, TruncMonth
+from django.utils import timezone
+
+from .visit_rollups import day_bucket, rebuild_visit_rollups
+
+VISIT_TABLE = 'core_storevisit'
+DEFAULT_PARTITION = f'{VISIT_TABLE}_default'
+PARTITION_NAME = re.compile(rf'^{VISIT_TABLE}_p(\d{{4}})(\d{{2}})$')
+
+ARCHIVE_CHUNK_SIZE = 5000
+DELETE_BATCH_SIZE = 5000
+ARCHIVE_FIELDS = (
+    'id', 'timestamp', 'visit_type', 'session_key', 'user_id', 'product_id', 'ip_address', 'city', 'country',
+    'tenant_id', 'user_agent_value',
+)
+ARCHIVE_HEADERS = ARCHIVE_FIELDS[:-1] + ('user_agent',)
+
+
+def get_retention_settings() -> Dict:
+    """Configuración de retención con valores por defecto"""
+    return {
+        'RETENTION_MONTHS': 6,
+        'PARTITIONS_AHEAD': 2,
+        'ARCHIVE_DIR': os.path.join(settings.BASE_DIR, 'backups_archive', 'visits'),
+        **getattr(settings, 'VISIT_RETENTION', {}),
+    }
+
+
+def month_start(moment) -> datetime:
+    """Inicio del mes local que contiene el instante"""
+    return day_bucket(moment).replace(day=1)
+
+
+def add_months(start: datetime, months: int) -> datetime:
+    year, month = divmod(start.month - 1 + months, 12)
+    return start.replace(year=start.year + year, month=month + 1)
+
+
+def _months_between(first, last) -> Iterator[datetime]:
+    start = month_start(first)
+    while start <= last:
+        yield start
+        start = add_months(start, 1)
+
+
+@dataclass(frozen=True)
+class VisitPartition:
+    """Un mes de visitas: [start, end) en hora local"""
+    start: datetime
+    end: datetime
+    # Partición física en PostgreSQL; None en el modo sin particiones
+    table: Optional[str] = None
+
+    @property
+    def label(self) -> str:
+        return self.start.strftime('%Y-%m')
+
+    def visits(self):
+        from core.models import StoreVisit
+
+        return StoreVisit.objects.filter(timestamp__gte=self.start, timestamp__lt=self.end)
+
+
+def partition_name(start: datetime) -> str:
+    return f'{VISIT_TABLE}_p{start:%Y%m}'
+
+
+# ---------------------------------------------------------------------------
+# Particiones (PostgreSQL)
+# ---------------------------------------------------------------------------
+
+def is_partitioned(conn=None) -> bool:
+    """Indica si StoreVisit es una tabla particionada de PostgreSQL"""
+    conn = conn or connection
+    if conn.vendor != 'postgresql':
+        return False
+    with conn.cursor() as cursor:
+        cursor.execute("SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass(%s)", [VISIT_TABLE])
+        return cursor.fetchone() is not None
+
+
+def _partition_tables(cursor, parent: str = VISIT_TABLE) -> List[str]:
+    cursor.execute(
+        "SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+        "WHERE i.inhparent = to_regclass(%s)",
+        [parent],
+    )
+    return [row[0] for row in cursor.fetchall()]
+
+
+def _create_partition(cursor, start: datetime, end: datetime, parent: str = VISIT_TABLE) -> str:
+    """
+    Crea la partición [start, end) moviendo a ella las filas de ese rango que
+    hayan caído en la partición default (ATTACH falla si quedan filas ahí)
+    """
+    name = partition_name(start)
+    cursor.execute(f'CREATE TABLE {name} (LIKE {parent} INCLUDING CONSTRAINTS)')
+    cursor.execute(
+        f'WITH moved AS (DELETE FROM {DEFAULT_PARTITION} WHERE "timestamp" >= %s AND "timestamp" < %s RETURNING *) '
+        f'INSERT INTO {name} SELECT * FROM moved',
+        [start, end],
+    )
+    cursor.execute(
+        f"ALTER TABLE {parent} ATTACH PARTITION {name} "
+        f"FOR VALUES FROM ('{start.isoformat()}') TO ('{end.isoformat()}')"
+    )
+    return name
+
+
+def ensure_partitions(months_ahead: Optional[int] = None, conn=None) -> List[str]:
+    """
+    Crea las particiones del mes actual y de los próximos `months_ahead`
+    meses, y las de los meses que tengan filas en la partición default
+
+    Returns:
+        Nombres de las particiones creadas (vacío si la tabla no está particionada)
+    """
+    conn = conn or connection
+    if not is_partitioned(conn):
+        return []
+    if months_ahead is None:
+        months_ahead = get_retention_settings()['PARTITIONS_AHEAD']
+
+    current = month_start(timezone.now())
+    months = {add_months(current, offset) for offset in range(months_ahead + 1)}
+    with conn.cursor() as cursor:
+        cursor.execute(f'SELECT MIN("timestamp"), MAX("timestamp") FROM {DEFAULT_PARTITION}')
+        oldest, newest = cursor.fetchone()
+        if oldest is not None:
+            months.update(_months_between(oldest, newest))
+        existing = set(_partition_tables(cursor))
+
+    created = []
+    for start in sorted(months):
+        if partition_name(start) in existing:
+            continue
+        with transaction.atomic(using=conn.alias), conn.cursor() as cursor:
+            created.append(_create_partition(cursor, start, add_months(start, 1)))
+    return created
+
+
+# ---------------------------------------------------------------------------
+# Conversión de la tabla (PostgreSQL): copia por lotes y cambio de tablas
+# ---------------------------------------------------------------------------
+#
+# La tabla nueva se llena al lado de la actual (SWAP_TABLE) en lotes de ids,
+# cada uno en su propia transacción, mientras la tienda sigue escribiendo
+# visitas. Al final swap_visit_table bloquea StoreVisit solo para copiar las
+# filas escritas durante la copia y renombrar tablas, índices y constraints.
+# Los índices y constraints de SWAP_TABLE llevan el sufijo SWAP_SUFFIX (o el
+# prefijo SWAP_TABLE) para no chocar con los de la tabla actual.
+
+SWAP_TABLE = f'{VISIT_TABLE}_swap'
+SWAP_SUFFIX = '_swap'
+COPY_BATCH_SIZE = 20000
+
+
+def _table_exists(cursor, table: str) -> bool:
+    cursor.execute("SELECT to_regclass(%s) IS NOT NULL", [table])
+    return cursor.fetchone()[0]
+
+
+def _is_partitioned_table(cursor, table: str) -> bool:
+    cursor.execute("SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass(%s)", [table])
+    return cursor.fetchone() is not None
+
+
+def get_swap_table(conn=None) -> Optional[Dict]:
+    """Estado de la tabla de cambio: None si no existe, o {'partitioned', 'rows', 'last_id'}"""
+    conn = conn or connection
+    if conn.vendor != 'postgresql':
+        return None
+    with conn.cursor() as cursor:
+        if not _table_exists(cursor, SWAP_TABLE):
+            return None
+        cursor.execute(f'SELECT COUNT(*), COALESCE(MAX(id), 0) FROM {SWAP_TABLE}')
+        rows, last_id = cursor.fetchone()
+        return {'partitioned': _is_partitioned_table(cursor, SWAP_TABLE), 'rows': rows, 'last_id': last_id}
+
+
+def _swap_name(name: str) -> str:
+    """Nombre del índice o constraint equivalente en SWAP_TABLE"""
+    if name.startswith(VISIT_TABLE):
+        return SWAP_TABLE + name[len(VISIT_TABLE):]
+    return name + SWAP_SUFFIX
+
+
+def _final_name(name: str) -> str:
+    """Nombre con el que queda un índice o constraint de SWAP_TABLE tras el cambio"""
+    if name.startswith(SWAP_TABLE):
+        return VISIT_TABLE + name[len(SWAP_TABLE):]
+    return name[:-len(SWAP_SUFFIX)] if name.endswith(SWAP_SUFFIX) else name
+
+
+def create_swap_table(partitioned: bool, conn=None) -> None:
+    """
+    Crea SWAP_TABLE vacía (particionada o no) con las columnas, índices y
+    foreign keys de la tabla de visitas actual. En una tabla particionada la
+    PK debe incluir la columna de partición: (id, timestamp).
+
+    La migración 0040 crea la versión particionada con su propio DDL; esta
+    función sirve para `partition_visits --undo` y para volver a particionar.
+    """
+    conn = conn or connection
+    with transaction.atomic(using=conn.alias), conn.cursor() as cursor:
+        cursor.execute(
+            "SELECT indexrelid::regclass::text, pg_get_indexdef(indexrelid) FROM pg_index "
+            "WHERE indrelid = to_regclass(%s) AND NOT indisprimary AND NOT indisunique",
+            [VISIT_TABLE],
+        )
+        indexes = cursor.fetchall()
+        cursor.execute(
+            "SELECT conname, pg_get_constraintdef(oid) FROM pg_constraint "
+            "WHERE conrelid = to_regclass(%s) AND contype = 'f'",
+            [VISIT_TABLE],
+        )
+        foreign_keys = cursor.fetchall()
+
+        partition_clause = ' PARTITION BY RANGE ("timestamp")' if partitioned else ''
+        cursor.execute(f'CREATE TABLE {SWAP_TABLE} (LIKE {VISIT_TABLE} INCLUDING CONSTRAINTS){partition_clause}')
+        if partitioned:
+            cursor.execute(f'CREATE TABLE {DEFAULT_PARTITION} PARTITION OF {SWAP_TABLE} DEFAULT')
+        primary_key = 'id, "timestamp"' if partitioned else 'id'
+        cursor.execute(f'ALTER TABLE {SWAP_TABLE} ADD CONSTRAINT {SWAP_TABLE}_pkey PRIMARY KEY ({primary_key})')
+        for name, definition in indexes:
+            # "CREATE INDEX nombre ON [ONLY] public.core_storevisit USING ..." sobre la tabla nueva
+            columns = definition[definition.index(' USING '):]
+            cursor.execute(f'CREATE INDEX {_swap_name(name.split(".")[-1])} ON {SWAP_TABLE}{columns}')
+        for name, definition in foreign_keys:
+            cursor.execute(f'ALTER TABLE {SWAP_TABLE} ADD CONSTRAINT {_swap_name(name)} {definition}')
+
+
+def drop_swap_table(conn=None) -> None:
+    """Descarta una copia a medias (la tabla de visitas no cambia)"""
+    conn = conn or connection
+    with conn.cursor() as cursor:
+        cursor.execute(f'DROP TABLE IF EXISTS {SWAP_TABLE}')
+
+
+def _swap_columns(cursor) -> str:
+    cursor.execute(
+        "SELECT attname FROM pg_attribute WHERE attrelid = to_regclass(%s) AND attnum > 0 AND NOT attisdropped "
+        "ORDER BY attnum",
+        [SWAP_TABLE],
+    )
+    return ', '.join(f'"{row[0]}"' for row in cursor.fetchall())
+
+
+def _copy_range(cursor, columns: str, after_id: int, until_id: Optional[int] = None) -> int:
+    condition = 'id > %s' if until_id is None else 'id > %s AND id <= %s'
+    params = [after_id] if until_id is None else [after_id, until_id]
+    cursor.execute(f'INSERT INTO {SWAP_TABLE} ({columns}) SELECT {columns} FROM {VISIT_TABLE} WHERE {condition}', params)
+    return cursor.rowcount
+
+
+def copy_to_swap_table(batch_size: int = COPY_BATCH_SIZE, conn=None) -> Iterator[Tuple[int, int]]:
+    """
+    Copia a SWAP_TABLE las visitas que aún no tiene, en lotes de ids con una
+    transacción por lote (se puede interrumpir y reanudar)
+
+    Solo copia hasta el último id existente al empezar: las visitas escritas
+    después las copia swap_visit_table con la tabla bloqueada.
+
+    Yields:
+        (filas copiadas en el lote, último id copiado)
+    """
+    conn = conn or connection
+    with conn.cursor() as cursor:
+        columns = _swap_columns(cursor)
+        cursor.execute(f'SELECT COALESCE(MAX(id), 0) FROM {SWAP_TABLE}')
+        last_id = cursor.fetchone()[0]
+        cursor.execute(f'SELECT MIN("timestamp"), COALESCE(MAX(id), 0) FROM {VISIT_TABLE}')
+        oldest, boundary = cursor.fetchone()
+
+        if _is_partitioned_table(cursor, SWAP_TABLE):
+            # Particiones de todos los meses con visitas y de los próximos meses
+            existing = set(_partition_tables(cursor, SWAP_TABLE))
+            last = add_months(month_start(timezone.now()), get_retention_settings()['PARTITIONS_AHEAD'])
+            for start in _months_between(oldest or timezone.now(), last):
+                if partition_name(start) not in existing:
+                    with transaction.atomic(using=conn.alias):
+                        _create_partition(cursor, start, add_months(start, 1), parent=SWAP_TABLE)
+
+        while last_id < boundary:
+            until_id = min(last_id + batch_size, boundary)
+            with transaction.atomic(using=conn.alias):
+                copied = _copy_range(cursor, columns, last_id, until_id)
+            last_id = until_id
+            yield copied, last_id
+
+
+def swap_visit_table(conn=None) -> int:
+    """
+    Reemplaza la tabla de visitas por SWAP_TABLE en una transacción corta:
+    bloquea StoreVisit, copia las visitas escritas durante copy_to_swap_table,
+    elimina la tabla anterior y renombra tabla, índices, constraints y la
+    secuencia de ids
+
+    Returns:
+        Visitas copiadas con la tabla bloqueada
+    """
+    conn = conn or connection
+    sequence = f'{VISIT_TABLE}_id_seq'
+    with transaction.atomic(using=conn.alias), conn.cursor() as cursor:
+        cursor.execute(f'LOCK TABLE {VISIT_TABLE} IN ACCESS EXCLUSIVE MODE')
+        columns = _swap_columns(cursor)
+        cursor.execute(f'SELECT COALESCE(MAX(id), 0) FROM {SWAP_TABLE}')
+        copied = _copy_range(cursor, columns, cursor.fetchone()[0])
+
+        cursor.execute(
+            "SELECT indexrelid::regclass::text FROM pg_index WHERE indrelid = to_regclass(%s) AND NOT indisprimary",
+            [SWAP_TABLE],
+        )
+        indexes = [row[0].split('.')[-1] for row in cursor.fetchall()]
+        cursor.execute("SELECT conname FROM pg_constraint WHERE conrelid = to_regclass(%s) AND contype IN ('p', 'f')",
+                       [SWAP_TABLE])
+        constraints = [row[0] for row in cursor.fetchall()]
+
+        # Elimina también las particiones y la secuencia de la tabla anterior
+        cursor.execute(f'DROP TABLE {VISIT_TABLE}')
+        cursor.execute(f'ALTER TABLE {SWAP_TABLE} RENAME TO {VISIT_TABLE}')
+        for name in indexes:
+            if _final_name(name) != name:
+                cursor.execute(f'ALTER INDEX {name} RENAME TO {_final_name(name)}')
+        for name in constraints:
+            if _final_name(name) != name:
+                cursor.execute(f'ALTER TABLE {VISIT_TABLE} RENAME CONSTRAINT {name} TO {_final_name(name)}')
+
+        cursor.execute(f'CREATE SEQUENCE {sequence} OWNED BY {VISIT_TABLE}.id')
+        cursor.execute(f"ALTER TABLE {VISIT_TABLE} ALTER COLUMN id SET DEFAULT nextval('{sequence}')")
+        cursor.execute(f"SELECT setval('{sequence}', COALESCE(MAX(id), 0) + 1, false) FROM {VISIT_TABLE}")
+    return copied
+
+
+# ---------------------------------------------------------------------------
+# Archivo y poda
+# ---------------------------------------------------------------------------
+
+def _partition_from_name(name: str) -> Optional[VisitPartition]:
+    match = PARTITION_NAME.match(name)
+    if not match:
+        return None
+    start = timezone.make_aware(datetime(int(match.group(1)), int(match.group(2)), 1))
+    return VisitPartition(start, add_months(start, 1), name)
+
+
+def list_partitions() -> List[VisitPartition]:
+    """Meses de visitas del más antiguo al más reciente (particiones o meses con filas)"""
+    from core.models import StoreVisit
+
+    if is_partitioned():
+        with connection.cursor() as cursor:
+            names = _partition_tables(cursor)
+        partitions = [partition for partition in map(_partition_from_name, names) if partition]
+        return sorted(partitions, key=lambda partition: partition.start)
+
+    months = StoreVisit.objects.annotate(month=TruncMonth('timestamp')).values_list(
+        'month', flat=True
+    ).distinct().order_by('month')
+    return [VisitPartition(month_start(month), add_months(month_start(month), 1)) for month in months]
+
+
+def drop_partition(partition: VisitPartition) -> None:
+    """Elimina las visitas del mes (DETACH + DROP o DELETE por lotes)"""
+    from core.models import StoreVisit
+
+    if partition.table:
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(f'ALTER TABLE {VISIT_TABLE} DETACH PARTITION {partition.table}')
+            cursor.execute(f'DROP TABLE {partition.table}')
+        return
+
+    visits = partition.visits()
+    while True:
+        ids = list(visits.values_list('id', flat=True)[:DELETE_BATCH_SIZE])
+        if not ids:
+            break
+        StoreVisit.objects.filter(id__in=ids).delete()
+
+
+def _archive_path(archive_dir: str, partition: VisitPartition) -> str:
+    """Ruta libre para el mes (un mes vuelto a crear no pisa el archivo anterior)"""
+    base = os.path.join(archive_dir, f'storevisit_{partition.label}')
+    path, suffix = f'{base}.csv.gz', 1
+    while os.path.exists(path):
+        path, suffix = f'{base}.{suffix}.csv.gz', suffix + 1
+    return path
+
+
+def _archive_value(value):
+    if value is None:
+        return ''
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return value
+
+
+def archive_partition(partition: VisitPartition, archive_dir: Optional[str] = None) -> Tuple[int, Optional[str]]:
+    """
+    Resume, archiva y elimina un mes de visitas
+
+    1. Reconstruye sus buckets diarios de VisitRollup desde las filas
+    2. Escribe las filas en ARCHIVE_DIR/storevisit_AAAA-MM.csv.gz (primero en
+       un .tmp que se renombra al terminar)
+    3. Elimina el mes solo si el archivo tiene todas sus filas
+
+    Returns:
+        Tupla (visitas archivadas, ruta del archivo o None si el mes estaba vacío)
+    """
+    expected = partition.visits().count()
+    if not expected:
+        drop_partition(partition)
+        return 0, None
+
+    archive_dir = archive_dir or get_retention_settings()['ARCHIVE_DIR']
+    os.makedirs(archive_dir, exist_ok=True)
+    rebuild_visit_rollups(since=partition.start, until=partition.end, granularity='day')
+
+    path = _archive_path(archive_dir, partition)
+    temporary = f'{path}.tmp'
+    written = 0
+    # Las visitas que backfill_visit_user_agents aún no enlazó conservan el texto
+    rows = partition.visits().annotate(
+        user_agent_value=Coalesce('user_agent__text', 'user_agent_text'),
+    ).order_by('id').values_list(*ARCHIVE_FIELDS)
+    with gzip.open(temporary, 'wt', encoding='utf-8', newline='') as handle:
+        writer = csv.writer(handle)
+        writer.writerow(ARCHIVE_HEADERS)
+        for row in rows.iterator(chunk_size=ARCHIVE_CHUNK_SIZE):
+            writer.writerow([_archive_value(value) for value in row])
+            written += 1
+
+    if written != expected:
+        os.remove(temporary)
+        raise RuntimeError(
+            f'El archivo de {partition.label} tiene {written} visitas y la base {expected}: el mes no se eliminó'
+        )
+    os.replace(temporary, path)
+    drop_partition(partition)
+    return written, path
+
+
+def get_expired_partitions(retention_months: Optional[int] = None) -> List[VisitPartition]:
+    """Meses que terminan antes del inicio de la ventana de retención"""
+    if retention_months is None:
+        retention_months = get_retention_settings()['RETENTION_MONTHS']
+    cutoff = add_months(month_start(timezone.now()), -retention_months)
+    return [partition for partition in list_partitions() if partition.end <= cutoff]
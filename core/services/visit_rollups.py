@@ -0,0 +1,248 @@
+"""
+Servicio de contadores pre-agregados de visitas (VisitRollup)
+Mantiene buckets por hora a medida que se escriben las visitas y responde
+las estadísticas del dashboard sin recorrer la tabla StoreVisit
+"""
+from collections import Counter
+from datetime import timedelta
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from django.db import IntegrityError, transaction
+from django.db.models import BooleanField, Case, Count, F, Q, Sum, Value, When
+from django.db.models.functions import Coalesce, TruncHour
+from django.utils import timezone
+
+VISIT_TYPES = ['home', 'store', 'product_detail', 'cart', 'checkout']
+
+
+def hour_bucket(moment):
+    """Inicio de la hora local que contiene el instante"""
+    return timezone.localtime(moment).replace(minute=0, second=0, microsecond=0)
+
+
+def day_bucket(moment):
+    """Inicio del día local que contiene el instante"""
+    return timezone.localtime(moment).replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def get_period_starts(now=None) -> Dict:
+    """Inicio de hoy, de la semana (lunes) y del mes en hora local"""
+    today_start = day_bucket(now or timezone.now())
+    return {
+        'today': today_start,
+        'week': today_start - timedelta(days=today_start.weekday()),
+        'month': today_start.replace(day=1),
+    }
+
+
+def _increment(key: Dict, amount: int) -> None:
+    from core.models import VisitRollup
+
+    if VisitRollup.objects.filter(**key).update(count=F('count') + amount):
+        return
+    try:
+        with transaction.atomic():
+            VisitRollup.objects.create(count=amount, **key)
+    except IntegrityError:
+        # Otro worker creó el bucket al mismo tiempo
+        VisitRollup.objects.filter(**key).update(count=F('count') + amount)
+
+
+def apply_visit_rollups(visits: Iterable) -> int:
+    """
+    Suma un lote de visitas recién escritas a los buckets por hora
+
+    Args:
+        visits: Instancias de StoreVisit (o cualquier objeto con timestamp,
+            visit_type, user_id y product_id)
+
+    Returns:
+        Número de buckets actualizados
+    """
+    counts: Counter = Counter()
+    for visit in visits:
+        counts[(
+            hour_bucket(visit.timestamp),
+            visit.visit_type,
+            visit.user_id is not None,
+            visit.product_id or 0,
+        )] += 1
+
+    for (bucket, visit_type, is_authenticated, product_id), amount in counts.items():
+        _increment({
+            'granularity': 'hour',
+            'bucket': bucket,
+            'visit_type': visit_type,
+            'is_authenticated': is_authenticated,
+            'product_id': product_id,
+        }, amount)
+    return len(counts)
+
+
+def get_rebuild_floor():
+    """
+    Inicio del mes local de la visita más antigua que sigue en StoreVisit
+
+    Los meses anteriores ya se archivaron (visit_retention): sus buckets
+    diarios son lo único que queda de ellos y no se pueden reconstruir.
+    None si no hay visitas.
+    """
+    from core.models import StoreVisit
+
+    oldest = StoreVisit.objects.order_by('timestamp').values_list('timestamp', flat=True).first()
+    return day_bucket(oldest).replace(day=1) if oldest is not None else None
+
+
+def rebuild_visit_rollups(since=None, until=None, granularity: str = 'hour') -> int:
+    """
+    Recalcula los buckets desde StoreVisit
+
+    Args:
+        since: Inicio de día local desde el cual reconstruir (None = todo lo
+            que sigue en StoreVisit); nunca antes de get_rebuild_floor()
+        until: Inicio de día local hasta el cual reconstruir, excluido (None = hasta hoy)
+        granularity: 'hour' o 'day' (meses que se van a archivar, ver visit_retention)
+
+    Returns:
+        Número de buckets creados
+    """
+    from core.models import StoreVisit, VisitRollup
+
+    floor = get_rebuild_floor()
+    if floor is None:
+        return 0
+    since = floor if since is None else max(since, floor)
+    if until is not None and until <= since:
+        return 0
+
+    visits = StoreVisit.objects.filter(timestamp__gte=since)
+    rollups = VisitRollup.objects.filter(bucket__gte=since)
+    if until is not None:
+        visits = visits.filter(timestamp__lt=until)
+        rollups = rollups.filter(bucket__lt=until)
+
+    grouped = visits.annotate(
+        hour=TruncHour('timestamp'),
+        authenticated=Case(
+            When(user__isnull=True, then=Value(False)),
+            default=Value(True),
+            output_field=BooleanField(),
+        ),
+        product_key=Coalesce('product_id', Value(0)),
+    ).values('hour', 'visit_type', 'authenticated', 'product_key').annotate(total=Count('id'))
+
+    to_bucket = day_bucket if granularity == 'day' else hour_bucket
+    counts: Counter = Counter()
+    for row in grouped.iterator():
+        counts[(to_bucket(row['hour']), row['visit_type'], row['authenticated'], row['product_key'])] += row['total']
+
+    rows = [
+        VisitRollup(
+            granularity=granularity,
+            bucket=bucket,
+            visit_type=visit_type,
+            is_authenticated=is_authenticated,
+            product_id=product_id,
+            count=amount,
+        )
+        for (bucket, visit_type, is_authenticated, product_id), amount in counts.items()
+    ]
+
+    with transaction.atomic():
+        rollups.delete()
+        VisitRollup.objects.bulk_create(rows, batch_size=1000)
+    return len(rows)
+
+
+def compact_visit_rollups(keep_hours_days: int = 2) -> Tuple[int, int]:
+    """
+    Fusiona los buckets por hora de días completos anteriores en buckets diarios
+
+    Args:
+        keep_hours_days: Días recientes que conservan el detalle por hora
+
+    Returns:
+        Tupla (buckets diarios escritos, buckets por hora eliminados)
+    """
+    from core.models import VisitRollup
+
+    cutoff = day_bucket(timezone.now()) - timedelta(days=keep_hours_days)
+    hourly = VisitRollup.objects.filter(granularity='hour', bucket__lt=cutoff)
+
+    daily: Counter = Counter()
+    for row in hourly.values('bucket', 'visit_type', 'is_authenticated', 'product_id', 'count').iterator():
+        daily[(day_bucket(row['bucket']), row['visit_type'], row['is_authenticated'], row['product_id'])] += row['count']
+
+    with transaction.atomic():
+        deleted, _ = hourly.delete()
+        for (bucket, visit_type, is_authenticated, product_id), amount in daily.items():
+            _increment({
+                'granularity': 'day',
+                'bucket': bucket,
+                'visit_type': visit_type,
+                'is_authenticated': is_authenticated,
+                'product_id': product_id,
+            }, amount)
+    return len(daily), deleted
+
+
+def build_visit_filter(period: str = 'all', user_filter: str = 'all', visit_type: str = 'all',
+                       starts: Optional[Dict] = None) -> Q:
+    """Traduce los filtros del dashboard a una condición sobre VisitRollup"""
+    starts = starts or get_period_starts()
+    condition = Q()
+    if period in starts:
+        condition &= Q(bucket__gte=starts[period])
+    if user_filter == 'auth':
+        condition &= Q(is_authenticated=True)
+    elif user_filter == 'anon':
+        condition &= Q(is_authenticated=False)
+    if visit_type in VISIT_TYPES:
+        condition &= Q(visit_type=visit_type)
+    return condition
+
+
+def get_visit_counters(period: str = 'all', user_filter: str = 'all', visit_type: str = 'all') -> Dict[str, int]:
+    """
+    Todos los contadores de visitas del dashboard en una sola consulta
+
+    Returns:
+        Diccionario con 'filtered', 'today', 'week', 'month', 'auth', 'anon',
+        'total' y una clave por cada tipo de visita
+    """
+    from core.models import VisitRollup
+
+    starts = get_period_starts()
+    aggregates = {
+        'filtered': Sum('count', filter=build_visit_filter(period, user_filter, visit_type, starts)),
+        'today': Sum('count', filter=Q(bucket__gte=starts['today'])),
+        'week': Sum('count', filter=Q(bucket__gte=starts['week'])),
+        'month': Sum('count', filter=Q(bucket__gte=starts['month'])),
+        'auth': Sum('count', filter=Q(is_authenticated=True)),
+        'anon': Sum('count', filter=Q(is_authenticated=False)),
+        'total': Sum('count'),
+    }
+    for name in VISIT_TYPES:
+        aggregates[name] = Sum('count', filter=Q(visit_type=name))
+
+    result = VisitRollup.objects.aggregate(**aggregates)
+    return {key: value or 0 for key, value in result.items()}
+
+
+def get_top_visited_products(period: str = 'all', limit: Optional[int] = None) -> List[Dict]:
+    """
+    Productos ordenados por número de visitas
+
+    Returns:
+        Lista de dicts {'product_id', 'total_visitas'}
+    """
+    from core.models import VisitRollup
+
+    rows = VisitRollup.objects.filter(
+        build_visit_filter(period, visit_type='product_detail'),
+        product_id__gt=0,
+    ).values('product_id').annotate(total_visitas=Sum('count')).order_by('-total_visitas', 'product_id')
+
+    if limit:
+        rows = rows[:limit]
+    return list(rows)
@@ -0,0 +1,366 @@
+"""
+Servicio de registro de visitas en lote
+Las vistas encolan eventos de visita en memoria y un hilo en segundo plano
+los escribe con bulk_create cada BATCH_SIZE eventos o cada FLUSH_INTERVAL_MS,
+de modo que la analítica no ocupa los workers que atienden páginas
+"""
+import atexit
+import hashlib
+import logging
+import os
+import threading
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from django.conf import settings
+from django.db import close_old_connections, connection, transaction
+from django.db.models import Max, Min
+from django.utils import timezone
+
+from .visit_rollups import apply_visit_rollups
+
+logger = logging.getLogger(__name__)
+
+# Geolocalización opcional - se aplica al escribir el lote, nunca en el request
+try:
+    from core.geolocation_helper import enrich_visit_with_location
+    GEOLOCATION_ENABLED = True
+except ImportError:
+    GEOLOCATION_ENABLED = False
+    enrich_visit_with_location = None
+
+
+DEFAULT_VISIT_BUFFER = {
+    'ENABLED': True,
+    'BATCH_SIZE': 50,
+    'FLUSH_INTERVAL_MS': 2000,
+    'MAX_SIZE': 5000,
+}
+
+# Bots conocidos que no deben contaminar las estadísticas
+BOT_IP_PREFIXES = (
+    '173.252.',  # Facebook/Meta
+    '69.171.',   # Facebook/Meta
+    '69.63.',    # Facebook/Meta
+    '66.220.',   # Facebook/Meta
+)
+
+BOT_USER_AGENTS = (
+    'facebookexternalhit',
+    'Facebot',
+    'Twitterbot',
+    'LinkedInBot',
+    'WhatsApp',
+    'Slackbot',
+    'TelegramBot',
+)
+
+
+def get_buffer_settings() -> Dict:
+    """Configuración del buffer con valores por defecto"""
+    return {**DEFAULT_VISIT_BUFFER, **getattr(settings, 'VISIT_BUFFER', {})}
+
+
+def is_bot(ip_address: str, user_agent: str) -> bool:
+    """Indica si la visita proviene de un bot conocido"""
+    if ip_address and ip_address.startswith(BOT_IP_PREFIXES):
+        return True
+    return any(bot in (user_agent or '') for bot in BOT_USER_AGENTS)
+
+
+# digest -> id de VisitUserAgent ya resueltos en este proceso
+_user_agent_ids: Dict[str, int] = {}
+USER_AGENT_CACHE_SIZE = 5000
+
+
+def user_agent_digest(text: str) -> str:
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+def resolve_user_agents(texts: Iterable[str]) -> Dict[str, int]:
+    """
+    Ids de VisitUserAgent de cada texto, creando los que no existen
+
+    Los ya vistos por el proceso salen de memoria; el resto se resuelve con
+    un SELECT y un bulk_create (ignore_conflicts por si otro worker los creó).
+
+    Returns:
+        Diccionario texto -> id (los textos vacíos no se incluyen)
+    """
+    from core.models import VisitUserAgent
+
+    digests = {text: user_agent_digest(text) for text in set(texts) if text}
+    missing = {digest: text for text, digest in digests.items() if digest not in _user_agent_ids}
+
+    found: Dict[str, int] = {}
+    if missing:
+        found = dict(VisitUserAgent.objects.filter(digest__in=missing).values_list('digest', 'id'))
+        new = [VisitUserAgent(digest=digest, text=text) for digest, text in missing.items() if digest not in found]
+        if new:
+            VisitUserAgent.objects.bulk_create(new, ignore_conflicts=True)
+            found.update(VisitUserAgent.objects.filter(
+                digest__in=[user_agent.digest for user_agent in new]
+            ).values_list('digest', 'id'))
+
+    resolved = {text: found[digest] if digest in found else _user_agent_ids[digest] for text, digest in digests.items()}
+    if len(_user_agent_ids) + len(found) > USER_AGENT_CACHE_SIZE:
+        _user_agent_ids.clear()
+    _user_agent_ids.update(found)
+    return resolved
+
+
+USER_AGENT_BACKFILL_BATCH = 20000
+
+
+def _link_user_agents_sql(cursor, table: str, first_id: int, last_id: int) -> int:
+    """PostgreSQL: tres sentencias por lote, el digest se calcula en la base"""
+    digest = "encode(sha256(convert_to({}, 'UTF8')), 'hex')"
+    cursor.execute(
+        f"INSERT INTO core_visituseragent (digest, text) "
+        f"SELECT {digest.format('user_agent_text')}, user_agent_text FROM {table} "
+        f"WHERE id BETWEEN %s AND %s AND user_agent_text <> '' GROUP BY user_agent_text "
+        f"ON CONFLICT (digest) DO NOTHING",
+        [first_id, last_id],
+    )
+    cursor.execute(
+        f"UPDATE {table} AS visit SET user_agent_id = ua.id, user_agent_text = NULL FROM core_visituseragent ua "
+        f"WHERE visit.id BETWEEN %s AND %s AND visit.user_agent_text <> '' "
+        f"AND ua.digest = {digest.format('visit.user_agent_text')}",
+        [first_id, last_id],
+    )
+    linked = cursor.rowcount
+    cursor.execute(
+        f"UPDATE {table} SET user_agent_text = NULL WHERE id BETWEEN %s AND %s AND user_agent_text = ''",
+        [first_id, last_id],
+    )
+    return linked
+
+
+def _link_user_agents_orm(first_id: int, last_id: int) -> int:
+    from core.models import StoreVisit
+
+    pending = StoreVisit.objects.filter(id__range=(first_id, last_id), user_agent_text__isnull=False)
+    user_agent_ids = resolve_user_agents(pending.values_list('user_agent_text', flat=True).distinct())
+    linked = 0
+    for text, user_agent_id in user_agent_ids.items():
+        linked += pending.filter(user_agent_text=text).update(user_agent_id=user_agent_id, user_agent_text=None)
+    pending.filter(user_agent_text='').update(user_agent_text=None)
+    return linked
+
+
+def backfill_user_agents(batch_size: int = USER_AGENT_BACKFILL_BATCH) -> Iterator[Tuple[int, int]]:
+    """
+    Enlaza con VisitUserAgent las visitas que solo tienen user_agent_text
+
+    Recorre la tabla en lotes de ids con una transacción corta por lote y
+    deja el texto en NULL al enlazarlo, así se puede interrumpir y reanudar.
+
+    Yields:
+        (visitas enlazadas en el lote, último id del lote)
+    """
+    from core.models import StoreVisit
+
+    bounds = StoreVisit.objects.filter(user_agent_text__isnull=False).aggregate(first=Min('id'), last=Max('id'))
+    if bounds['first'] is None:
+        return
+
+    table = StoreVisit._meta.db_table
+    for first_id in range(bounds['first'], bounds['last'] + 1, batch_size):
+        last_id = min(first_id + batch_size - 1, bounds['last'])
+        with transaction.atomic():
+            if connection.vendor == 'postgresql':
+                with connection.cursor() as cursor:
+                    linked = _link_user_agents_sql(cursor, table, first_id, last_id)
+            else:
+                linked = _link_user_agents_orm(first_id, last_id)
+        yield linked, last_id
+
+
+def _get_client_ip(request) -> str:
+    x_forwarded_for = request.META.get('HTTP_X_FORWARDED_FOR')
+    if x_forwarded_for:
+        return x_forwarded_for.split(',')[0].strip()
+    return request.META.get('REMOTE_ADDR', '')
+
+
+def write_visits(events: List[Dict]) -> int:
+    """
+    Escribe un lote de eventos de visita en una sola consulta
+
+    Enriquece con geolocalización (si está disponible), reemplaza el user
+    agent por su id en VisitUserAgent y descarta referencias a usuarios que
+    ya no existen para no invalidar el lote.
+
+    Returns:
+        Número de visitas creadas
+    """
+    from core.models import SimpleUser, StoreVisit
+
+    if not events:
+        return 0
+
+    user_ids = {event['user_id'] for event in events if event.get('user_id')}
+    valid_user_ids = set(
+        SimpleUser.objects.filter(id__in=user_ids).values_list('id', flat=True)
+    ) if user_ids else set()
+    user_agent_ids = resolve_user_agents(event.get('user_agent') for event in events)
+
+    visits = []
+    for event in events:
+        data = dict(event)
+        if data.get('user_id') not in valid_user_ids:
+            data['user_id'] = None
+        data['user_agent_id'] = user_agent_ids.get(data.pop('user_agent', None))
+
+        # Solo cachés y base local: las APIs externas las consulta enrich_visit_locations
+        if GEOLOCATION_ENABLED and data.get('ip_address'):
+            try:
+                data = enrich_visit_with_location(data, data['ip_address'], allow_network=False)
+            except Exception:
+                pass  # Continuar sin ubicación si falla
+
+        visits.append(StoreVisit(**data))
+
+    StoreVisit.objects.bulk_create(visits)
+
+    # Contadores pre-agregados del dashboard; si fallan se recuperan con
+    # `manage.py rollup_visits --backfill --days N` (los meses ya archivados
+    # conservan sus buckets diarios: el backfill no baja de la visita más antigua)
+    try:
+        apply_visit_rollups(visits)
+    except Exception:
+        logger.exception("Error actualizando contadores de visitas")
+
+    return len(visits)
+
+
+class VisitBuffer:
+    """
+    Cola en memoria de eventos de visita por proceso
+
+    Cada worker de gunicorn tiene su propio buffer y su propio hilo de
+    escritura; el hilo se crea al primer evento y se recrea si el proceso
+    fue bifurcado.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._events: List[Dict] = []
+        self._wakeup = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._pid: Optional[int] = None
+        self.dropped = 0
+
+    def push(self, event: Dict) -> None:
+        config = get_buffer_settings()
+        self._ensure_worker()
+
+        with self._lock:
+            if len(self._events) >= config['MAX_SIZE']:
+                # Nunca bloquear el request: si la base de datos no da abasto se descarta
+                self.dropped += 1
+                return
+            self._events.append(event)
+            pending = len(self._events)
+
+        if pending >= config['BATCH_SIZE']:
+            self._wakeup.set()
+
+    def flush(self) -> int:
+        """Escribe inmediatamente todos los eventos pendientes"""
+        with self._lock:
+            events, self._events = self._events, []
+
+        if not events:
+            return 0
+
+        try:
+            return write_visits(events)
+        except Exception:
+            logger.exception("Error escribiendo lote de %s visitas", len(events))
+            return 0
+
+    def pending(self) -> int:
+        with self._lock:
+            return len(self._events)
+
+    def _ensure_worker(self) -> None:
+        pid = os.getpid()
+        if self._thread is not None and self._thread.is_alive() and self._pid == pid:
+            return
+
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive() and self._pid == pid:
+                return
+            if self._pid != pid:
+                # Proceso bifurcado: los eventos heredados pertenecen al padre
+                self._events = []
+                self._wakeup = threading.Event()
+            self._pid = pid
+            self._thread = threading.Thread(target=self._run, name='visit-buffer-flusher', daemon=True)
+            self._thread.start()
+
+    def _run(self) -> None:
+        while True:
+            interval = get_buffer_settings()['FLUSH_INTERVAL_MS'] / 1000.0
+            self._wakeup.wait(timeout=interval)
+            self._wakeup.clear()
+            close_old_connections()
+            try:
+                self.flush()
+            finally:
+                close_old_connections()
+
+
+visit_buffer = VisitBuffer()
+atexit.register(visit_buffer.flush)
+
+
+def enqueue_visit(session_key, visit_type, user_id=None, product_id=None,
+                  ip_address=None, user_agent='') -> bool:
+    """
+    Encola un evento de visita (o lo escribe directo si el buffer está apagado)
+
+    Returns:
+        False si la visita se descartó por provenir de un bot
+    """
+    if is_bot(ip_address or '', user_agent):
+        return False
+
+    event = {
+        'session_key': session_key,
+        'user_id': user_id,
+        'visit_type': visit_type,
+        'product_id': product_id,
+        'ip_address': ip_address or None,
+        'user_agent': user_agent,
+        'timestamp': timezone.now(),
+    }
+
+    if get_buffer_settings()['ENABLED']:
+        visit_buffer.push(event)
+    else:
+        write_visits([event])
+    return True
+
+
+def record_visit(request, visit_type, user_obj=None, product_id=None) -> bool:
+    """
+    Registra la visita del request sin escribir en la base de datos
+
+    Args:
+        request: Django request object
+        visit_type: Tipo de visita ('home', 'store', 'product_detail', 'cart', 'checkout')
+        user_obj: SimpleUser autenticado (opcional)
+        product_id: ID del producto si es product_detail (opcional)
+    """
+    if not request.session.session_key:
+        request.session.create()
+
+    return enqueue_visit(
+        session_key=request.session.session_key,
+        visit_type=visit_type,
+        user_id=user_obj.id if user_obj else None,
+        product_id=product_id,
+        ip_address=_get_client_ip(request),
+        user_agent=request.META.get('HTTP_USER_AGENT', ''),
+    )
@@ -1,131 +1,67 @@
-from django.db.models.signals import post_save, pre_save
+from django.db.models.signals import post_delete, post_save
 from django.dispatch import receiver
 from django.core.mail import EmailMultiAlternatives
 from django.template.loader import render_to_string
 from django.conf import settings
-from .models import ProductStore, StockNotification, NotificationLog
+from .models import ProductStore, StockNotification, NotificationLog, Pedido, PedidoDetalle, Category, ProductVariant, Galeria, SimpleUser
+from .services.background_tasks import enqueue_back_in_stock_notifications
+from .services.catalog_version import schedule_catalog_bump
+from .services.config_registry import CONFIG_MODELS, config_registry
+from .services.dashboard_metrics import schedule_metrics_push
+from .services.notification_fanout import render_stock_available
+from .services.product_events import detect_changes, handle_changes, queue_price_drop_notifications
+from .services.recommendation_pool import schedule_pool_invalidation
+from .services.related_products import schedule_related_refresh
+from .services.sales_summary import schedule_sales_refresh
+from .services.search_service import remove_product, schedule_category_index, schedule_product_index
 import datetime
 import logging
 
 logger = logging.getLogger(__name__)
 
-class ProductStockTracker:
-    """Rastrea cambios en el stock de productos"""
-    _original_stock = {}
-
-@receiver(pre_save, sender=ProductStore)
-def store_original_stock(sender, instance, **kwargs):
-    """
-    Almacena el stock original antes de guardar
-    """
-    if instance.pk:  # Solo si el producto ya existe
-        try:
-            original = ProductStore.objects.get(pk=instance.pk)
-            ProductStockTracker._original_stock[instance.pk] = original.stock
-        except ProductStore.DoesNotExist:
-            ProductStockTracker._original_stock[instance.pk] = 0
-
 @receiver(post_save, sender=ProductStore)
 def check_stock_changes(sender, instance, created, **kwargs):
     """
-    Verifica cambios de stock y envía notificaciones automáticamente
+    Detecta cambios de stock y precio y encola las notificaciones
+    (los valores originales los guarda FieldTrackerMixin al cargar el producto)
     """
     if created:
         return  # No procesar productos nuevos
     
-    original_stock = ProductStockTracker._original_stock.get(instance.pk, 0)
-    current_stock = instance.stock
-    
-    # Verificar si el producto pasó de sin stock a tener stock
-    if original_stock == 0 and current_stock > 0:
-        logger.info(f"📦 Stock restored for {instance.name}: {original_stock} → {current_stock}")
-        
-        # Buscar notificaciones pendientes para este producto
-        notifications_to_send = StockNotification.objects.filter(
-            product=instance,
-            status='pending',
-            notification_type='stock_available'
-        )
-        
-        if notifications_to_send.exists():
-            logger.info(f"🔔 Sending {notifications_to_send.count()} stock notifications for {instance.name}")
-            
-            # Enviar notificaciones
-            for notification in notifications_to_send:
-                try:
-                    send_stock_notification_email(notification)
-                    
-                    # Marcar como enviada
-                    notification.status = 'sent'
-                    notification.sent_at = datetime.datetime.now()
-                    notification.save()
-                    
-                    # Log exitoso
-                    NotificationLog.objects.create(
-                        stock_notification=notification,
-                        success=True,
-                        email_subject=f'¡{instance.name} ya está disponible!'
-                    )
-                    
-                    logger.info(f"✅ Notification sent to {notification.email}")
-                    
-                except Exception as e:
-                    # Marcar como fallida
-                    notification.status = 'failed'
-                    notification.save()
-                    
-                    # Log del error
-                    NotificationLog.objects.create(
-                        stock_notification=notification,
-                        success=False,
-                        error_message=str(e),
-                        email_subject=f'Error: {instance.name}'
-                    )
-                    
-                    logger.error(f"❌ Failed to send notification to {notification.email}: {e}")
-        else:
-            logger.info(f"ℹ️ No pending notifications for {instance.name}")
-    
-    # Verificar bajadas de precio (si el precio cambió)
-    if hasattr(instance, '_original_price') and instance._original_price != instance.price:
-        check_price_drop_notifications(instance)
-    
-    # Limpiar el tracker
-    if instance.pk in ProductStockTracker._original_stock:
-        del ProductStockTracker._original_stock[instance.pk]
+    handle_changes(instance, detect_changes(instance))
+
+
+def send_back_in_stock_notifications(instance):
+    """
+    Encola los avisos pendientes de un producto que volvió a tener stock
+    (al guardarlo o al liberar una reserva de stock); los envía el worker
+
+    Returns:
+        La tarea encolada, o None si no hay suscripciones pendientes
+    """
+    job = enqueue_back_in_stock_notifications(instance)
+    if job is not None:
+        logger.info(f"🔔 Stock notifications queued for {instance.name} (job {job.pk})")
+    else:
+        logger.info(f"ℹ️ No pending notifications for {instance.name}")
+    return job
+
 
 def send_stock_notification_email(notification):
     """
-    Envía un email de notificación de stock disponible
+    Envía un email de notificación de stock disponible a un solo suscriptor
+    (los avisos al reponer stock salen en lote desde core.services.notification_fanout)
     """
     try:
-        # URL del producto
-        base_url = getattr(settings, 'BASE_URL', 'http://127.0.0.1:8000')
-        product_url = f"{base_url}/product_detail/{notification.product.id}/"
-        
-        # Contexto para la plantilla
-        context = {
-            'product': notification.product,
-            'email': notification.email,
-            'site_name': 'CompuEasys',
-            'year': datetime.datetime.now().year,
-            'base_url': base_url,
-            'product_url': product_url
-        }
-        
-        # Renderizar plantilla HTML
-        html_content = render_to_string('emails/stock_available.html', context)
-        
-        # Crear mensaje
-        subject = f'¡{notification.product.name} ya está disponible! 🎉'
+        email = render_stock_available(notification.product)
         
         msg = EmailMultiAlternatives(
-            subject=subject,
-            body=f'El producto {notification.product.name} ya está disponible en CompuEasys.',
+            subject=email.subject,
+            body=email.text,
             from_email=getattr(settings, 'DEFAULT_FROM_EMAIL', 'noreply@compueasys.com'),
             to=[notification.email]
         )
-        msg.attach_alternative(html_content, "text/html")
+        msg.attach_alternative(email.html, "text/html")
         
         # Enviar email
         msg.send()
@@ -138,33 +74,10 @@ def send_stock_notification_email(notification):
 
 def check_price_drop_notifications(product):
     """
-    Verifica y envía notificaciones de bajada de precio
+    Verifica y encola notificaciones de bajada de precio
     """
     try:
-        # Buscar notificaciones de precio pendientes
-        price_notifications = StockNotification.objects.filter(
-            product=product,
-            status='pending',
-            notify_price_drop=True
-        ).exclude(target_price__isnull=True)
-        
-        for notification in price_notifications:
-            # Verificar si el precio actual es menor o igual al objetivo
-            if product.price <= notification.target_price:
-                try:
-                    # Enviar notificación de precio
-                    send_price_drop_notification_email(notification)
-                    
-                    # Desactivar solo la notificación de precio, mantener stock si aplica
-                    notification.notify_price_drop = False
-                    notification.target_price = None
-                    notification.save()
-                    
-                    logger.info(f"💰 Price drop notification sent to {notification.email}")
-                    
-                except Exception as e:
-                    logger.error(f"❌ Error sending price notification: {e}")
-                    
+        queue_price_drop_notifications(product, product.price)
     except Exception as e:
         logger.error(f"❌ Error checking price drops: {e}")
 
@@ -206,4 +119,119 @@ def send_price_drop_notification_email(notification):
         
     except Exception as e:
         logger.error(f"❌ Error sending price drop email: {e}")
-        raise e
\ No newline at end of file
+        raise e
+
+
+@receiver(post_save, sender=Pedido)
+def refresh_sales_summary_for_order(sender, instance, created, **kwargs):
+    """
+    Mantiene al día el resumen diario de ventas cuando se crea un pedido o
+    cambia su estado (p. ej. cancelado) o su fecha (se recalculan ambos días)
+    """
+    if not created and not (instance.has_changed('estado') or instance.has_changed('fecha')):
+        return
+    schedule_sales_refresh(instance.get_original('fecha'), instance.fecha)
+
+
+@receiver(post_delete, sender=Pedido)
+def refresh_sales_summary_for_deleted_order(sender, instance, **kwargs):
+    schedule_sales_refresh(instance.fecha)
+
+
+@receiver(post_save, sender=PedidoDetalle)
+@receiver(post_delete, sender=PedidoDetalle)
+def refresh_sales_summary_for_detail(sender, instance, created=False, **kwargs):
+    """Recalcula el día del pedido al agregar, modificar o quitar un detalle"""
+    if kwargs['signal'] is post_save and not created and not instance.changed_fields():
+        return
+    try:
+        moments = [instance.pedido.fecha]
+    except Pedido.DoesNotExist:
+        return  # Borrado en cascada: el signal del pedido ya recalculó el día
+    original_pedido = instance.get_original('pedido_id', instance.pedido_id)
+    if original_pedido != instance.pedido_id:
+        # Línea movida a otro pedido: también cambia el día del pedido anterior
+        moments += Pedido.objects.filter(pk=original_pedido).values_list('fecha', flat=True)
+    schedule_sales_refresh(*moments)
+
+
+# Campos de ProductStore que forman el documento de búsqueda
+SEARCH_FIELDS = {'name', 'description', 'category', 'category_id'}
+
+
+@receiver(post_save, sender=ProductStore)
+def update_product_search_document(sender, instance, update_fields=None, **kwargs):
+    """Mantiene el índice de búsqueda al crear o editar un producto"""
+    if update_fields and not SEARCH_FIELDS.intersection(update_fields):
+        return  # p. ej. save(update_fields=['stock'])
+    schedule_product_index(instance)
+
+
+@receiver(post_delete, sender=ProductStore)
+def remove_product_search_document(sender, instance, **kwargs):
+    remove_product(instance.pk)
+
+
+@receiver(post_save, sender=Category)
+def update_category_search_documents(sender, instance, created, **kwargs):
+    """El nombre de la categoría forma parte del documento de sus productos"""
+    if not created:
+        schedule_category_index(instance)
+
+
+@receiver(post_save, sender=ProductStore)
+@receiver(post_delete, sender=ProductStore)
+@receiver(post_save, sender=ProductVariant)
+@receiver(post_delete, sender=ProductVariant)
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+@receiver(post_save, sender=Galeria)
+@receiver(post_delete, sender=Galeria)
+def bump_catalog_version_on_change(sender, **kwargs):
+    """Invalida los índices en memoria y fragmentos que dependen del catálogo"""
+    schedule_catalog_bump()
+
+
+@receiver(post_save, sender=ProductStore)
+def refresh_related_products_on_change(sender, instance, created, **kwargs):
+    """Recalcula los relacionados solo si cambió el nombre o la categoría"""
+    if not created and not (instance.has_changed('name') or instance.has_changed('category_id')):
+        return
+    schedule_related_refresh(instance.pk)
+
+
+@receiver(post_save, sender=ProductStore)
+def invalidate_recommendation_pool(sender, instance, created, **kwargs):
+    """El pool del carrito solo cambia si el producto entra o sale de stock o de categoría"""
+    if not created:
+        original_stock = instance.get_original('stock', instance.stock)
+        if (original_stock > 0) == (instance.stock > 0) and not instance.has_changed('category_id'):
+            return
+    schedule_pool_invalidation()
+
+
+@receiver(post_delete, sender=ProductStore)
+def invalidate_recommendation_pool_on_delete(sender, instance, **kwargs):
+    schedule_pool_invalidation()
+
+
+@receiver(post_save, sender=Pedido)
+@receiver(post_delete, sender=Pedido)
+@receiver(post_save, sender=ProductStore)
+@receiver(post_delete, sender=ProductStore)
+@receiver(post_save, sender=SimpleUser)
+@receiver(post_delete, sender=SimpleUser)
+def push_dashboard_metrics(sender, **kwargs):
+    """Envía los indicadores que cambiaron a los dashboards abiertos"""
+    schedule_metrics_push()
+
+
+def invalidate_config_snapshot(sender, **kwargs):
+    """Los workers recargan la configuración en su siguiente lectura"""
+    config_registry.schedule_invalidation(CONFIG_MODELS[sender._meta.label])
+
+
+# Referencias perezosas: los modelos viven en dashboard y billing
+for _label in CONFIG_MODELS:
+    post_save.connect(invalidate_config_snapshot, sender=_label, dispatch_uid=f'config_snapshot_save_{_label}')
+    post_delete.connect(invalidate_config_snapshot, sender=_label, dispatch_uid=f'config_snapshot_delete_{_label}')
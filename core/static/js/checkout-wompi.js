@@ -53,6 +53,7 @@ console.log('🚀 CHECKOUT v4.0 - SIN COMISIÓN WOMPI - Cargando...');
             wompi_public_key: wompiKey,
             urls: {
                 create_transaction: window.checkout_config?.create_transaction_url || '/api/create-wompi-transaction/',
+                release_reservation: window.checkout_config?.release_reservation_url || '/api/wompi-release-reservation/',
                 success: window.checkout_config?.success_url || window.location.origin + '/pago_exitoso/'
             },
             cart_total: window.checkout_config?.cart_total || 0
@@ -804,11 +805,13 @@ console.log('🚀 CHECKOUT v4.0 - SIN COMISIÓN WOMPI - Cargando...');
                         }
                     } else if (status === 'DECLINED') {
                         console.log('❌ Pago rechazado');
+                        releaseStockReservation();
                         showMessage('Tu tarjeta fue rechazada. Por favor verifica los datos o intenta con otra tarjeta.', 'error');
                         setButtonProcessing(false);
                         checkoutState.processing = false;
                     } else if (status === 'ERROR') {
                         console.log('❌ Error en el pago');
+                        releaseStockReservation();
                         showMessage('Hubo un error procesando el pago. Por favor intenta nuevamente.', 'error');
                         setButtonProcessing(false);
                         checkoutState.processing = false;
@@ -825,6 +828,7 @@ console.log('🚀 CHECKOUT v4.0 - SIN COMISIÓN WOMPI - Cargando...');
                     }
                 } else {
                     console.log('⚠️ Widget cerrado sin resultado');
+                    releaseStockReservation();
                     showMessage('Cancelaste el proceso de pago', 'warning');
                     setButtonProcessing(false);
                     checkoutState.processing = false;
@@ -845,6 +849,16 @@ console.log('🚀 CHECKOUT v4.0 - SIN COMISIÓN WOMPI - Cargando...');
         }
     }
     
+    function releaseStockReservation() {
+        // Devuelve el stock apartado al crear la transacción (pago no completado)
+        fetch(CONFIG.urls.release_reservation, {
+            method: 'POST',
+            headers: {
+                'X-CSRFToken': getCsrfToken() || window.checkout_config?.csrf_token || ''
+            }
+        }).catch(error => console.warn('⚠️ No se pudo liberar la reserva de stock:', error));
+    }
+    
     function addHiddenField(form, name, value) {
         let field = form.querySelector(`input[name="${name}"]`);
         if (!field) {
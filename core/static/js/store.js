@@ -16,7 +16,7 @@
       outOfStock: true,  // Por defecto mostrar productos agotados
       search: ''
     },
-    sort: 'name',
+    sort: 'relevance',
     view: 'grid',
     isLoading: false,
     searchTimeout: null,
@@ -523,6 +523,10 @@
           // Actualizar contador de resultados
           this.updateResultsCount(data.count);
           
+          // La paginación vuelve a la primera página con los nuevos filtros
+          StoreState.currentPage = 1;
+          PaginationManager.observe();
+          
           // Re-inicializar lazy loading para nuevas imágenes
           LazyLoadManager.observeImages();
           
@@ -1475,6 +1479,102 @@
     }
   };
 
+  // Gestor de paginación (scroll infinito y botones "Ver más")
+  // El servidor entrega en data-next-url la URL de la siguiente página
+  // (/api/store/products/ con cursor); aquí solo se pide y se agrega al grid.
+  const PaginationManager = {
+    init() {
+      console.log('📄 Initializing PaginationManager...');
+
+      // Botones "Ver más" por categoría (delegado: el grid se reemplaza por AJAX)
+      document.addEventListener('click', (e) => {
+        const button = e.target.closest('.load-more-btn');
+        if (button) {
+          e.preventDefault();
+          this.loadMore(button);
+        }
+      });
+
+      if ('IntersectionObserver' in window) {
+        this.observer = new IntersectionObserver((entries) => {
+          entries.forEach(entry => {
+            if (entry.isIntersecting) {
+              this.loadMore(entry.target);
+            }
+          });
+        }, {
+          rootMargin: '400px'
+        });
+      }
+
+      this.observe();
+    },
+
+    observe() {
+      const sentinel = document.querySelector('.load-more-sentinel');
+      StoreState.hasMore = Boolean(sentinel && sentinel.dataset.nextUrl);
+      if (sentinel && this.observer) {
+        this.observer.observe(sentinel);
+      }
+    },
+
+    async loadMore(trigger) {
+      const url = trigger.dataset.nextUrl;
+      const target = document.querySelector(trigger.dataset.target);
+      if (!url || !target || trigger.dataset.loading === 'true') return;
+
+      trigger.dataset.loading = 'true';
+      trigger.classList.add('loading');
+
+      try {
+        const response = await fetch(url, {
+          headers: {
+            'X-Requested-With': 'XMLHttpRequest'
+          }
+        });
+        if (!response.ok) {
+          throw new Error(`HTTP error! status: ${response.status}`);
+        }
+        const data = await response.json();
+        if (!data.success) {
+          throw new Error(data.error || 'Error desconocido');
+        }
+
+        target.insertAdjacentHTML('beforeend', data.html);
+
+        if (trigger.classList.contains('load-more-sentinel')) {
+          StoreState.currentPage += 1;
+          StoreState.hasMore = data.has_more;
+        }
+
+        if (data.has_more) {
+          trigger.dataset.nextUrl = data.next_url;
+          this.updateButtonLabel(trigger, target);
+        } else {
+          if (this.observer) this.observer.unobserve(trigger);
+          (trigger.closest('.load-more-container') || trigger).remove();
+        }
+
+        LazyLoadManager.observeImages();
+        FilterManager.reinitializeProductEvents();
+      } catch (error) {
+        console.error('Load more error:', error);
+        Utils.showToast('No se pudieron cargar más productos', 'error');
+      } finally {
+        trigger.dataset.loading = 'false';
+        trigger.classList.remove('loading');
+      }
+    },
+
+    updateButtonLabel(button, target) {
+      const label = button.querySelector('span');
+      if (label && button.dataset.total) {
+        const shown = target.querySelectorAll('[data-product-id]').length;
+        label.textContent = `Ver más (${shown} de ${button.dataset.total})`;
+      }
+    }
+  };
+
   // Gestor de gestos táctiles
   const GestureManager = {
     init() {
@@ -1758,6 +1858,7 @@
     SidebarManager.init();
     CartManager.init();
     LazyLoadManager.init();
+    PaginationManager.init();
     GestureManager.init();
     MobileMenuManager.init();
     ImageHoverManager.init();
@@ -1844,6 +1945,7 @@
     Sidebar: SidebarManager,
     Cart: CartManager,
     LazyLoad: LazyLoadManager,
+    Pagination: PaginationManager,
     Gesture: GestureManager,
     MobileMenu: MobileMenuManager,
     ImageHover: ImageHoverManager,
@@ -0,0 +1,11 @@
+from django import template
+
+from core.services.fragment_cache import render_product_card
+
+register = template.Library()
+
+
+@register.simple_tag(takes_context=True)
+def product_card(context, product, template_name):
+    """Tarjeta de producto desde el caché de fragmentos (core.services.fragment_cache)"""
+    return render_product_card(template_name, product, context.get('catalog_version'))
@@ -0,0 +1,40 @@
+"""
+CacheService: la versión del namespace no se consulta en cada clave
+"""
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import SimpleTestCase
+
+from shared.services import CacheService
+
+
+class NamespaceVersionTests(SimpleTestCase):
+
+    def setUp(self):
+        cache.clear()
+        CacheService.forget_versions()
+        self.addCleanup(CacheService.forget_versions)
+
+    def test_make_key_reuses_the_version_within_the_interval(self):
+        with mock.patch.object(CacheService, 'get_version', wraps=CacheService.get_version) as get_version:
+            keys = {CacheService.make_key('catalogo', 'producto', pk) for pk in range(50)}
+
+        self.assertEqual(len(keys), 50)
+        self.assertEqual(get_version.call_count, 1)
+
+    def test_invalidate_changes_the_keys_of_this_process_at_once(self):
+        CacheService.set('catalogo', 'producto', 1, value='viejo')
+
+        CacheService.invalidate('catalogo')
+
+        self.assertIsNone(CacheService.get('catalogo', 'producto', 1))
+
+    def test_other_workers_see_the_new_version_after_the_interval(self):
+        before = CacheService.make_key('catalogo', 'producto', 1)
+        # Otro worker invalida: solo cambia la versión en el caché compartido
+        CacheService.bump_version(CacheService.namespace_version_key('catalogo'))
+
+        self.assertEqual(CacheService.make_key('catalogo', 'producto', 1), before)
+        with mock.patch.object(CacheService, 'version_check_interval', 0):
+            self.assertNotEqual(CacheService.make_key('catalogo', 'producto', 1), before)
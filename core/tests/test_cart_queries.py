@@ -0,0 +1,57 @@
+"""
+El carrito se hidrata con un número fijo de consultas, sin importar cuántas líneas tenga
+"""
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import TestCase
+
+from core.models import Category, ProductStore, ProductVariant
+
+
+class CartQueryCountTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(nombre='Portátiles', slug='portatiles')
+        cls.products = ProductStore.objects.bulk_create([
+            ProductStore(name=f'Portátil {i}', description='d', price_buy=1, price=100 + i, stock=10, category=category)
+            for i in range(12)
+        ])
+        cls.variants = ProductVariant.objects.bulk_create([
+            ProductVariant(product=product, nombre=f'Color {i}', precio=150 + i, stock=10)
+            for i, product in enumerate(cls.products[:6])
+        ])
+
+    def setUp(self):
+        cache.clear()
+
+    def fill_cart(self, lines):
+        """Agrega `lines` líneas: la mitad con variante y la mitad sin ella"""
+        session = self.client.session
+        cart = {}
+        for i, product in enumerate(self.products[:lines]):
+            variant = self.variants[i] if i % 2 == 0 and i < len(self.variants) else None
+            key = f'{product.pk}-{variant.pk}' if variant else str(product.pk)
+            cart[key] = {'product_id': str(product.pk), 'variant_id': str(variant.pk) if variant else None, 'quantity': 1}
+        session['cart'] = cart
+        session.save()
+
+    def assert_cart_queries(self, url):
+        """Sesión + productos + variantes, con 12 líneas en el carrito"""
+        with mock.patch('core.views.record_visit'):
+            # La primera carga llena la caché de recomendaciones y configuración
+            self.fill_cart(1)
+            self.client.get(url)
+
+            self.fill_cart(len(self.products))
+            with self.assertNumQueries(3):
+                response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.context['cart_items']), len(self.products))
+
+    def test_cart_view(self):
+        self.assert_cart_queries('/cart/')
+
+    def test_checkout_view(self):
+        self.assert_cart_queries('/checkout/')
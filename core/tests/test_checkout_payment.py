@@ -0,0 +1,86 @@
+"""
+Checkout con Wompi: la reserva sale de la sesión y el pago se verifica con la API
+"""
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.test import TestCase, override_settings
+
+from core.models import Category, Pedido, ProductStore, StockReservation
+from core.services.stock_reservation import StockLine, reserve_stock
+
+CHECKOUT_FORM = {
+    'email': 'cliente@example.com', 'telefono': '3000000000', 'nombre': 'Cliente', 'direccion': 'Calle 1',
+    'ciudad': 'Bogotá', 'departament': 'Cundinamarca', 'codigo_postal': '110111', 'metodo_pago': 'wompi',
+}
+
+
+def wompi_transaction(status, reference):
+    return {'data': {'id': 'tx-1', 'status': status, 'reference': reference}}
+
+
+@override_settings(EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend', JOB_QUEUE={'EAGER': False},
+                   VISIT_BUFFER={'ENABLED': False})
+class WompiCheckoutTests(TestCase):
+
+    def setUp(self):
+        # Usuario de Django ya existente: contable.signals no se dispara con bulk_create
+        User.objects.bulk_create([User(username=CHECKOUT_FORM['email'], email=CHECKOUT_FORM['email'])])
+        category = Category.objects.create(nombre='Portátiles', slug='portatiles')
+        self.product = ProductStore.objects.create(
+            name='Portátil', description='d', price_buy=1, price=100, stock=5, category=category
+        )
+        self.client.post(f'/add-to-cart/{self.product.pk}/', {'quantity': 2})
+
+    def reserve(self, reference, quantity):
+        reserve_stock(reference, [StockLine(self.product.pk, None, quantity)])
+        session = self.client.session
+        session['stock_reservation'] = reference
+        session.save()
+
+    def checkout(self, response_data, **extra):
+        with mock.patch('core.wompi_client.WompiClient.get_transaction', return_value=response_data):
+            self.client.post('/pago_exitoso/', {**CHECKOUT_FORM, **extra})
+        self.product.refresh_from_db()
+        return Pedido.objects.first()
+
+    def test_verified_payment_commits_matching_reservation(self):
+        self.reserve('compueasys-1-a', 2)
+
+        pedido = self.checkout(wompi_transaction('APPROVED', 'compueasys-1-a'), wompi_transaction_id='tx-1')
+
+        self.assertEqual(pedido.estado_pago, 'completado')
+        self.assertEqual(self.product.stock, 3)
+        self.assertEqual(StockReservation.objects.get().status, 'committed')
+
+    def test_unverified_transaction_is_not_paid(self):
+        pedido = self.checkout(wompi_transaction('DECLINED', 'compueasys-1-a'), wompi_transaction_id='inventado')
+
+        self.assertEqual(pedido.estado_pago, 'pendiente')
+        self.assertEqual(self.product.stock, 3)
+
+    def test_unverified_transaction_does_not_oversell(self):
+        self.product.stock = 1
+        self.product.save()
+
+        self.checkout(wompi_transaction('APPROVED', 'otra-referencia'), wompi_transaction_id='tx-1')
+
+        self.assertFalse(Pedido.objects.exists())
+        self.assertEqual(self.product.stock, 1)
+
+    def test_reservation_not_matching_cart_is_released(self):
+        self.reserve('compueasys-1-a', 1)
+
+        self.checkout(wompi_transaction('APPROVED', 'compueasys-1-a'), wompi_transaction_id='tx-1')
+
+        self.assertEqual(self.product.stock, 3)
+        self.assertEqual(StockReservation.objects.get().status, 'released')
+
+    def test_posted_reference_of_another_session_is_ignored(self):
+        reserve_stock('compueasys-ajena', [StockLine(self.product.pk, None, 2)])
+
+        self.checkout(wompi_transaction('APPROVED', 'compueasys-ajena'), wompi_transaction_id='tx-1',
+                      wompi_reference='compueasys-ajena')
+
+        self.assertEqual(self.product.stock, 1)
+        self.assertEqual(StockReservation.objects.get().status, 'active')
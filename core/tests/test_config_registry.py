@@ -0,0 +1,52 @@
+"""
+Snapshots de configuración: sin consultas entre cambios y recarga al guardar
+"""
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import TestCase
+
+from core.models import WhatsAppConfig
+from core.services.config_registry import ConfigRegistry, config_registry, get_whatsapp_config
+
+
+class ConfigRegistryTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        config_registry.clear()
+        self.addCleanup(config_registry.clear)
+        WhatsAppConfig.objects.update_or_create(id=1, defaults={'admin_phone': '573000000001'})
+
+    def save_phone(self, phone):
+        with self.captureOnCommitCallbacks(execute=True):
+            config = WhatsAppConfig.get_config()
+            config.admin_phone = phone
+            config.save()
+
+    def test_snapshot_is_served_without_queries(self):
+        get_whatsapp_config()
+
+        with self.assertNumQueries(0):
+            snapshot = get_whatsapp_config()
+
+        self.assertEqual(snapshot.admin_phone, '573000000001')
+
+    def test_save_invalidates_the_snapshot_of_this_worker(self):
+        self.assertEqual(get_whatsapp_config().admin_phone, '573000000001')
+
+        self.save_phone('573000000002')
+
+        self.assertEqual(get_whatsapp_config().admin_phone, '573000000002')
+
+    def test_save_reaches_other_workers_through_the_version(self):
+        other_worker = ConfigRegistry()
+        other_worker.register('whatsapp', lambda: WhatsAppConfig.get_config().admin_phone)
+        self.assertEqual(other_worker.get('whatsapp'), '573000000001')
+
+        self.save_phone('573000000002')
+
+        # Dentro del intervalo sigue la copia local; después se compara la versión
+        self.assertEqual(other_worker.get('whatsapp'), '573000000001')
+        with mock.patch('core.services.config_registry.CHECK_INTERVAL', 0):
+            self.assertEqual(other_worker.get('whatsapp'), '573000000002')
@@ -0,0 +1,63 @@
+"""
+Indicadores del dashboard: guardar un pedido o cliente solo encola el envío
+(uno por ventana de METRICS_TTL) y no invalida las pestañas
+"""
+from unittest import mock
+
+from django.core.cache import cache
+from django.db import transaction
+from django.test import TestCase
+from django.utils import timezone
+
+from core.models import BackgroundJob, SimpleUser
+from core.services.dashboard_metrics import TABS_NAMESPACE, get_metrics, schedule_metrics_push
+from core.services.job_queue import claim_jobs, execute
+from shared.services import CacheService
+
+
+class MetricsPushTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        CacheService.forget_versions()
+        get_metrics()
+
+    def create_user(self, i):
+        with self.captureOnCommitCallbacks(execute=True):
+            SimpleUser.objects.create(email=f'cliente{i}@example.com', telefono='300', name='Cliente',
+                                      username=f'cliente{i}', password='x')
+
+    def jobs(self):
+        return list(BackgroundJob.objects.filter(task='dashboard.metrics_push').values_list('status', flat=True))
+
+    def test_saves_within_the_window_queue_a_single_push(self):
+        CacheService.set(TABS_NAMESPACE, 'ventas_por_categoria', value='cacheado')
+
+        with mock.patch('core.services.dashboard_metrics.time.time', return_value=1000.0), \
+                mock.patch('core.services.dashboard_metrics.compute_metrics') as compute:
+            self.create_user(1)
+            self.create_user(2)
+
+        compute.assert_not_called()
+        self.assertEqual(self.jobs(), ['queued'])
+        self.assertEqual(CacheService.get(TABS_NAMESPACE, 'ventas_por_categoria'), 'cacheado')
+
+    def test_order_transaction_queues_once(self):
+        with mock.patch('core.services.dashboard_metrics.queue_metrics_push') as queue_push:
+            with self.captureOnCommitCallbacks(execute=True), transaction.atomic():
+                for _ in range(3):
+                    schedule_metrics_push()
+
+        queue_push.assert_called_once_with()
+
+    def test_worker_pushes_the_changes_of_the_window(self):
+        self.create_user(1)
+        self.create_user(2)
+        BackgroundJob.objects.update(run_at=timezone.now())
+
+        with mock.patch('core.services.dashboard_metrics.diff_metrics', return_value={}) as diff:
+            for job in claim_jobs('test', tasks=['dashboard.metrics_push']):
+                execute(job)
+
+        self.assertEqual(self.jobs(), ['succeeded'])
+        self.assertEqual(diff.call_args.args[1]['usuarios']['total'], 2)
@@ -0,0 +1,73 @@
+"""
+Exportaciones del dashboard: libro XLSX legible, reanudación y CSV sin fórmulas
+"""
+import csv
+import io
+import zipfile
+from xml.etree import ElementTree
+
+from django.test import TestCase
+
+from core.models import StoreVisit
+from core.services.exports import parse_export_range, stream_export
+
+SHEET_NS = {'s': 'http://schemas.openxmlformats.org/spreadsheetml/2006/main'}
+
+
+def read_workbook(content):
+    """Filas de la primera hoja como listas de textos (celdas vacías como '')"""
+    with zipfile.ZipFile(io.BytesIO(content)) as book:
+        assert book.testzip() is None
+        sheet = ElementTree.fromstring(book.read('xl/worksheets/sheet1.xml'))
+    rows = []
+    for row in sheet.iterfind('s:sheetData/s:row', SHEET_NS):
+        values = {}
+        for cell in row.iterfind('s:c', SHEET_NS):
+            column = cell.get('r').rstrip('0123456789')
+            if cell.get('t') == 'inlineStr':
+                values[column] = cell.findtext('s:is/s:t', '', SHEET_NS)
+            else:
+                values[column] = cell.findtext('s:v', '', SHEET_NS)
+        width = max((ord(column) - 64 for column in values), default=0)
+        rows.append([values.get(chr(65 + index), '') for index in range(width)])
+    return rows
+
+
+class ExportTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        StoreVisit.objects.bulk_create([
+            StoreVisit(visit_type='store', session_key=f's{i}', ip_address='10.0.0.1', city=city, country='Colombia')
+            for i, city in enumerate(['Bogotá', '=HYPERLINK("http://x.example","clic")', '-2+3', '@SUM(A1)'])
+        ])
+        cls.visits = list(StoreVisit.objects.order_by('id'))
+
+    def export(self, fmt, **params):
+        chunks = stream_export('visitas', fmt, parse_export_range(params))
+        return b''.join(chunks) if fmt == 'xlsx' else ''.join(chunks)
+
+    def test_xlsx_workbook_has_header_and_one_row_per_visit(self):
+        rows = read_workbook(self.export('xlsx'))
+
+        self.assertEqual(rows[0][:3], ['Visita', 'Fecha', 'Tipo'])
+        self.assertEqual([row[0] for row in rows[1:]], [str(visit.id) for visit in self.visits])
+        # Las celdas inlineStr se muestran tal cual, sin evaluarse
+        self.assertEqual([row[8] for row in rows[1:]], [visit.city for visit in self.visits])
+
+    def test_xlsx_resumes_after_the_last_received_id(self):
+        last_received = self.visits[1].id
+
+        rows = read_workbook(self.export('xlsx', despues_de=str(last_received)))
+
+        self.assertEqual([row[0] for row in rows[1:]], [str(visit.id) for visit in self.visits[2:]])
+
+    def test_csv_prefixes_cells_that_start_like_a_formula(self):
+        content = self.export('csv')
+
+        rows = list(csv.reader(io.StringIO(content.lstrip('\ufeff'))))
+        self.assertEqual([row[8] for row in rows[1:]], [
+            'Bogotá', '\'=HYPERLINK("http://x.example","clic")', "'-2+3", "'@SUM(A1)",
+        ])
+        # Los números (ids) no se tocan
+        self.assertEqual([row[0] for row in rows[1:]], [str(visit.id) for visit in self.visits])
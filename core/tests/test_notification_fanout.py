@@ -0,0 +1,127 @@
+"""
+Avisos de stock disponible: un fallo al reconectar no pierde los ya enviados
+y una reposición posterior a un agotamiento vuelve a avisar
+"""
+from smtplib import SMTPServerDisconnected
+from unittest import mock
+
+from django.core import mail
+from django.test import TestCase
+from django.utils import timezone
+
+from core.models import BackgroundJob, Category, NotificationLog, ProductStore, StockNotification
+from core.services.job_queue import claim_jobs, execute
+from core.services.notification_fanout import fan_out_stock_available
+
+
+class FlakyConnection:
+    """Conexión SMTP falsa: falla al enviar a `fail_to` y no puede volver a abrirse"""
+
+    def __init__(self, fail_to):
+        self.fail_to = fail_to
+        self.opened = 0
+        self.outbox = []
+
+    def open(self):
+        self.opened += 1
+        if self.opened > 1:
+            raise SMTPServerDisconnected('Connection unexpectedly closed')
+
+    def close(self):
+        pass
+
+    def send_messages(self, messages):
+        if messages[0].to == [self.fail_to]:
+            raise SMTPServerDisconnected('Server not connected')
+        self.outbox.extend(messages)
+        return len(messages)
+
+
+class StockFanoutTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(nombre='Monitores', slug='monitores')
+        cls.product = ProductStore.objects.create(name='Monitor 27', description='d', price_buy=1, price=100,
+                                                  stock=5, category=category)
+        StockNotification.objects.bulk_create([
+            StockNotification(product=cls.product, email=f'cliente{i}@example.com') for i in range(4)
+        ])
+
+    def test_reconnect_failure_keeps_sent_and_leaves_the_rest_pending(self):
+        connection = FlakyConnection(fail_to='cliente1@example.com')
+        with mock.patch('core.services.notification_fanout.get_connection', return_value=connection):
+            result = fan_out_stock_available(self.product)
+
+        self.assertEqual((result.sent, result.failed), (1, 3))
+        self.assertEqual([message.to for message in connection.outbox], [['cliente0@example.com']])
+        self.assertEqual(
+            list(StockNotification.objects.order_by('pk').values_list('status', flat=True)),
+            ['sent', 'pending', 'pending', 'pending'],
+        )
+        self.assertEqual(NotificationLog.objects.filter(success=True).count(), 1)
+        self.assertEqual(NotificationLog.objects.filter(success=False).count(), 3)
+
+
+class RestockTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(nombre='Teclados', slug='teclados')
+        product = ProductStore.objects.create(name='Teclado', description='d', price_buy=1, price=100,
+                                              stock=0, category=category)
+        cls.product_id = product.pk
+        cls.subscription = StockNotification.objects.create(product=product, email='cliente@example.com')
+
+    def set_stock(self, stock):
+        product = ProductStore.objects.get(pk=self.product_id)
+        product.stock = stock
+        product.save()
+
+    def run_worker(self):
+        BackgroundJob.objects.filter(status='queued').update(run_at=timezone.now())
+        for job in claim_jobs('test', tasks=['notifications.back_in_stock']):
+            execute(job)
+
+    def jobs(self):
+        return list(BackgroundJob.objects.filter(task='notifications.back_in_stock').values_list('status', flat=True))
+
+    def test_sold_out_before_the_worker_waits_for_the_next_restock(self):
+        self.set_stock(5)
+        self.set_stock(0)
+        self.run_worker()
+
+        self.assertEqual(self.jobs(), ['queued'])
+        self.subscription.refresh_from_db()
+        self.assertEqual(self.subscription.status, 'pending')
+
+        self.set_stock(3)
+        self.assertEqual(self.jobs(), ['queued'])
+        self.run_worker()
+
+        self.subscription.refresh_from_db()
+        self.assertEqual(self.subscription.status, 'sent')
+        self.assertEqual([message.to for message in mail.outbox], [['cliente@example.com']])
+
+    def test_restock_after_a_finished_job_enqueues_again(self):
+        self.set_stock(5)
+        BackgroundJob.objects.filter(task='notifications.back_in_stock').update(max_attempts=1)
+        self.set_stock(0)
+        self.run_worker()
+        self.assertEqual(self.jobs(), ['dead'])
+
+        self.set_stock(2)
+        self.run_worker()
+
+        self.assertEqual(sorted(self.jobs()), ['dead', 'succeeded'])
+        self.subscription.refresh_from_db()
+        self.assertEqual(self.subscription.status, 'sent')
+
+    def test_cron_queues_products_with_stock_and_pending_subscriptions(self):
+        from core.views import send_stock_notifications
+
+        # Stock cambiado sin save(): ninguna señal encoló los avisos
+        ProductStore.objects.filter(pk=self.product_id).update(stock=4)
+
+        self.assertEqual(send_stock_notifications(), 1)
+        self.assertEqual(self.jobs(), ['queued'])
@@ -0,0 +1,75 @@
+"""
+ProfilingMiddleware: quién puede perfilar un request y presupuestos de consultas
+"""
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.test import TestCase, override_settings
+
+from core.models import Category, ProductStore
+from core.services.request_profiling import QueryBudgetExceeded, get_profiling_settings
+
+
+def profiling(**overrides):
+    return override_settings(PROFILING={**get_profiling_settings(), **overrides})
+
+
+@override_settings(DEBUG=True)
+@profiling(ENABLED=False, TOKEN='token-secreto')
+class ProfileHeaderAccessTests(TestCase):
+
+    def get_cart(self, header):
+        with mock.patch('core.views.record_visit'):
+            return self.client.get('/cart/', HTTP_X_PROFILE=header)
+
+    def test_header_without_token_is_ignored_even_in_debug(self):
+        self.assertNotIn('Server-Timing', self.get_cart('1'))
+
+    def test_header_with_token_profiles(self):
+        self.assertIn('Server-Timing', self.get_cart('token-secreto'))
+
+    def test_django_superuser_profiles(self):
+        # bulk_create: sin las señales de contable
+        User.objects.bulk_create([User(username='admin', is_superuser=True, is_staff=True)])
+        self.client.force_login(User.objects.get(username='admin'))
+
+        self.assertIn('Server-Timing', self.get_cart('1'))
+
+    def test_dashboard_superuser_session_profiles(self):
+        session = self.client.session
+        session['superuser_id'] = 1
+        session.save()
+
+        self.assertIn('Server-Timing', self.get_cart('1'))
+
+
+@profiling(ENABLED=True, ENFORCE_BUDGETS=True)
+class QueryBudgetEnforcementTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(nombre='Portátiles', slug='portatiles')
+        cls.products = ProductStore.objects.bulk_create([
+            ProductStore(name=f'Portátil {i}', description='d', price_buy=1, price=100, stock=10, category=category)
+            for i in range(10)
+        ])
+
+    def setUp(self):
+        patcher = mock.patch('core.views.record_visit')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        session = self.client.session
+        session['cart'] = {str(p.pk): {'product_id': str(p.pk), 'variant_id': None, 'quantity': 1} for p in self.products}
+        session.save()
+
+    def test_cart_within_budget(self):
+        response = self.client.get('/cart/')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('Server-Timing', response)
+
+    def test_cart_over_budget_raises(self):
+        budgets = {**get_profiling_settings()['QUERY_BUDGETS'], 'cart': 1}
+        with profiling(ENABLED=True, ENFORCE_BUDGETS=True, QUERY_BUDGETS=budgets):
+            with self.assertRaises(QueryBudgetExceeded):
+                self.client.get('/cart/')
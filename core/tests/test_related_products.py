@@ -0,0 +1,52 @@
+"""
+Productos relacionados: la vista no calcula listas y las listas no pasan de RELATED_LIMIT
+"""
+from django.test import TestCase
+
+from core.models import BackgroundJob, Category, ProductStore, RelatedProduct
+from core.services.related_products import (
+    RELATED_LIMIT, get_related_products, rebuild_related_products, refresh_related_products,
+)
+
+
+class RelatedProductsTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.category = Category.objects.create(nombre='Portátiles', slug='portatiles')
+        cls.products = ProductStore.objects.bulk_create([
+            ProductStore(name=f'Portátil Lenovo modelo {i}', description='d', price_buy=1, price=100, stock=5,
+                         category=cls.category)
+            for i in range(RELATED_LIMIT + 5)
+        ])
+
+    def test_missing_list_falls_back_to_category_and_enqueues_refresh(self):
+        product = self.products[0]
+
+        related = get_related_products(product)
+
+        self.assertEqual(len(related), RELATED_LIMIT)
+        self.assertNotIn(product, related)
+        self.assertFalse(RelatedProduct.objects.exists())
+        job = BackgroundJob.objects.get(task='catalog.related_products')
+        self.assertEqual(job.kwargs, {'product_id': product.pk})
+
+        # Otra visita antes del worker no encola de nuevo
+        get_related_products(product)
+        self.assertEqual(BackgroundJob.objects.filter(task='catalog.related_products').count(), 1)
+
+    def test_refresh_trims_neighbor_lists(self):
+        rebuild_related_products()
+        # Mismo puntaje que los demás; en empate gana el más nuevo
+        newcomer = ProductStore.objects.create(
+            name='Portátil Lenovo modelo 99', description='d', price_buy=1, price=100, stock=5, category=self.category
+        )
+
+        refresh_related_products([newcomer.pk])
+
+        neighbors = RelatedProduct.objects.filter(product=newcomer).values_list('related_id', flat=True)
+        self.assertEqual(len(neighbors), RELATED_LIMIT)
+        for product_id in neighbors:
+            links = RelatedProduct.objects.filter(product_id=product_id)
+            self.assertEqual(links.count(), RELATED_LIMIT)
+            self.assertTrue(links.filter(related=newcomer).exists())
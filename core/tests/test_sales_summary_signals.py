@@ -0,0 +1,86 @@
+"""
+Resumen diario de ventas: un recálculo por día y transacción, solo si cambia algo que cuenta
+"""
+from datetime import timedelta
+from unittest import mock
+
+from django.db import transaction
+from django.test import TestCase
+from django.utils import timezone
+
+from core.models import Category, Pedido, PedidoDetalle, ProductStore, SimpleUser
+
+
+class SalesSummarySignalTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = SimpleUser.objects.create(email='cliente@example.com', telefono='300', name='Cliente',
+                                             username='cliente', password='x')
+        category = Category.objects.create(nombre='Portátiles', slug='portatiles')
+        cls.products = ProductStore.objects.bulk_create([
+            ProductStore(name=f'Portátil {i}', description='d', price_buy=1, price=100, stock=10, category=category)
+            for i in range(3)
+        ])
+
+    def create_order_lines(self):
+        pedido = Pedido.objects.create(user=self.user, nombre='Cliente', direccion='Calle 1', ciudad='Bogotá',
+                                       departamento='Cundinamarca', total=300)
+        for product in self.products:
+            PedidoDetalle.objects.create(pedido=pedido, producto=product, cantidad=1, precio=100)
+        return pedido
+
+    def create_order(self):
+        with self.captureOnCommitCallbacks(execute=True), transaction.atomic():
+            pedido = self.create_order_lines()
+        return pedido
+
+    def refreshed_days(self, action):
+        with mock.patch('core.services.sales_summary.refresh_sales_day') as refresh:
+            with self.captureOnCommitCallbacks(execute=True):
+                action()
+        return [call.args[0] for call in refresh.call_args_list]
+
+    def test_order_with_lines_refreshes_its_day_once(self):
+        days = self.refreshed_days(self.create_order)
+
+        self.assertEqual(days, [timezone.localdate()])
+
+    def test_untracked_changes_do_not_refresh(self):
+        pedido = Pedido.objects.get(pk=self.create_order().pk)
+        detalle = PedidoDetalle.objects.filter(pedido=pedido).first()
+
+        def edit():
+            pedido.nota = 'Llamar antes de entregar'
+            pedido.save()
+            detalle.save()
+
+        self.assertEqual(self.refreshed_days(edit), [])
+
+    def test_status_change_refreshes(self):
+        pedido = Pedido.objects.get(pk=self.create_order().pk)
+
+        def cancel():
+            pedido.estado = 'cancelado'
+            pedido.save()
+
+        self.assertEqual(self.refreshed_days(cancel), [timezone.localdate()])
+
+    def test_date_change_refreshes_old_and_new_day(self):
+        pedido = Pedido.objects.get(pk=self.create_order().pk)
+        today = timezone.localdate()
+
+        def move():
+            pedido.fecha = pedido.fecha - timedelta(days=2)
+            pedido.save()
+
+        self.assertEqual(self.refreshed_days(move), [today - timedelta(days=2), today])
+
+    def test_rolled_back_order_does_not_block_the_next_refresh(self):
+        with mock.patch('core.services.sales_summary.refresh_sales_day') as refresh:
+            with self.assertRaises(RuntimeError), transaction.atomic():
+                self.create_order_lines()
+                raise RuntimeError('pago rechazado')
+            refresh.assert_not_called()
+
+        self.assertEqual(self.refreshed_days(self.create_order), [timezone.localdate()])
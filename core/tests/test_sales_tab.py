@@ -0,0 +1,63 @@
+"""
+Pestaña de ventas del dashboard: totales desde los resúmenes diarios y solo
+los 5 productos más vendidos de cada categoría
+"""
+from django.core.cache import cache
+from django.db import transaction
+from django.test import TestCase
+
+from core.models import Category, Pedido, PedidoDetalle, ProductStore, SimpleUser
+from core.services.dashboard_metrics import get_metrics
+from core.services.sales_summary import rebuild_sales_summary
+
+
+class SalesTabTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        user = SimpleUser.objects.create(email='cliente@example.com', telefono='300', name='Cliente',
+                                         username='cliente', password='x')
+        category = Category.objects.create(nombre='Monitores', slug='monitores')
+        products = ProductStore.objects.bulk_create([
+            ProductStore(name=f'Monitor {i}', description='d', price_buy=1, price=100, stock=10, category=category)
+            for i in range(8)
+        ])
+
+        def create_order(estado, quantities):
+            with transaction.atomic():
+                pedido = Pedido.objects.create(user=user, nombre='Cliente', direccion='Calle 1', ciudad='Bogotá',
+                                               departamento='Cundinamarca', total=0, estado=estado)
+                for product, cantidad in quantities:
+                    PedidoDetalle.objects.create(pedido=pedido, producto=product, cantidad=cantidad, precio=100)
+
+        # El monitor i se vende i + 1 veces; el pedido cancelado no cuenta
+        create_order('pendiente', [(product, i + 1) for i, product in enumerate(products)])
+        create_order('pendiente', [(products[0], 1)])
+        create_order('cancelado', [(products[1], 50)])
+        # setUpTestData no confirma la transacción: el resumen no se refrescó al guardar
+        rebuild_sales_summary()
+
+    def setUp(self):
+        cache.clear()
+        get_metrics()
+        session = self.client.session
+        session['superuser_id'] = 1
+        session.save()
+
+    def test_ventas_tab_reads_the_summaries_and_keeps_five_products(self):
+        # Sesión, categorías y totales del resumen, y los dos del ranking de productos
+        with self.assertNumQueries(5):
+            response = self.client.get('/dashboard/api/tab/ventas/')
+
+        data = response.json()['data']
+        categoria, = data['ventas_por_categoria']
+        self.assertEqual(categoria['nombre'], 'Monitores')
+        self.assertEqual(categoria['cantidad_productos'], 37)
+        self.assertEqual(categoria['total_ingresos'], 3700)
+        self.assertEqual(categoria['cantidad_pedidos'], 2)
+        self.assertEqual(categoria['productos_distintos'], 8)
+        self.assertEqual(
+            [(producto['nombre'], producto['cantidad']) for producto in categoria['productos_vendidos']],
+            [('Monitor 7', 8), ('Monitor 6', 7), ('Monitor 5', 6), ('Monitor 4', 5), ('Monitor 3', 4)],
+        )
+        self.assertEqual(data['total_ventas_general'], 3700)
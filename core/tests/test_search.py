@@ -0,0 +1,33 @@
+"""
+Búsqueda de productos sobre el índice que crea la migración 0032
+"""
+from django.test import TestCase
+
+from core.models import Category, ProductStore
+from core.services.search_service import get_backend, index_products, search_product_ids
+
+
+class ProductSearchTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(nombre='Computadores Portátiles', slug='portatiles')
+        cls.laptop = ProductStore.objects.create(
+            name='Portátil Lenovo IdeaPad', description='<p>Pantalla de 15"</p>', price_buy=1, price=100,
+            stock=3, category=category,
+        )
+        cls.mouse = ProductStore.objects.create(
+            name='Mouse inalámbrico', description='Batería recargable', price_buy=1, price=20, stock=3,
+            category=Category.objects.create(nombre='Accesorios', slug='accesorios'),
+        )
+        index_products()
+
+    def test_engine_structures_exist(self):
+        self.assertEqual(get_backend(), 'fts5')
+
+    def test_accents_and_plurals_match(self):
+        self.assertEqual(search_product_ids('portatiles'), [self.laptop.pk])
+        self.assertEqual(search_product_ids('INALAMBRICO'), [self.mouse.pk])
+
+    def test_category_text_is_searchable(self):
+        self.assertEqual(search_product_ids('computador'), [self.laptop.pk])
@@ -0,0 +1,84 @@
+"""
+Los listados de visitas del dashboard respetan LISTING_QUERY_BUDGETS con muchas
+visitas, incluidas visitas de productos ya eliminados
+"""
+from datetime import timedelta
+
+from django.core.cache import cache
+from django.test import TestCase
+from django.utils import timezone
+
+from core.models import Category, ProductStore, SimpleUser, StoreVisit
+from core.services.dashboard_metrics import get_metrics
+from core.services.visit_products import LISTING_QUERY_BUDGETS
+from core.services.visit_rollups import rebuild_visit_rollups
+
+# Consultas de la vista fuera del listado: la sesión y los contadores de visit_rollups
+SESSION_QUERIES = 1
+COUNTER_QUERIES = 1
+
+
+class VisitListingQueryTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(nombre='Portátiles', slug='portatiles')
+        products = ProductStore.objects.bulk_create([
+            ProductStore(name=f'Portátil {i}', description='d', price_buy=1, price=100 + i, stock=10, category=category)
+            for i in range(20)
+        ])
+        users = SimpleUser.objects.bulk_create([
+            SimpleUser(email=f'cliente{i}@example.com', telefono='300', name=f'Cliente {i}', username=f'c{i}', password='x')
+            for i in range(5)
+        ])
+        # Las visitas conservan el id de productos eliminados: ids sin fila en ProductStore
+        product_ids = [product.pk for product in products] + [products[-1].pk + i for i in range(1, 5)]
+        now = timezone.now()
+        visits = []
+        for i in range(300):
+            visits.append(StoreVisit(
+                timestamp=now - timedelta(minutes=i),
+                session_key=f'sesion-{i % 40}',
+                user=users[i % len(users)] if i % 3 == 0 else None,
+                visit_type='product_detail' if i % 2 == 0 else 'store',
+                product_id=product_ids[i % len(product_ids)] if i % 2 == 0 else None,
+            ))
+        StoreVisit.objects.bulk_create(visits)
+        rebuild_visit_rollups()
+
+    def setUp(self):
+        cache.clear()
+        get_metrics()  # Los KPIs del encabezado se sirven de la caché
+        session = self.client.session
+        session['superuser_id'] = 1
+        session.save()
+
+    def get_json(self, url, budget):
+        with self.assertNumQueries(budget):
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_visitas_tab(self):
+        # La pestaña incluye también el ranking de productos más visitados
+        budget = (SESSION_QUERIES + COUNTER_QUERIES + LISTING_QUERY_BUDGETS['visitas_recientes']
+                  + LISTING_QUERY_BUDGETS['productos_mas_visitados'])
+        data = self.get_json('/dashboard/api/tab/visitas/', budget)
+
+        self.assertEqual(len(data['data']['visitas_recientes']), 300)
+
+    def test_visitas_live(self):
+        budget = SESSION_QUERIES + COUNTER_QUERIES + LISTING_QUERY_BUDGETS['visitas_recientes']
+        data = self.get_json('/dashboard/api/visitas-live/', budget)
+
+        self.assertEqual(len(data['visitas']), 300)
+        deleted = [visita for visita in data['visitas'] if visita['product_id'] and not visita['product_name']]
+        self.assertTrue(deleted)
+
+    def test_productos_mas_visitados(self):
+        budget = SESSION_QUERIES + LISTING_QUERY_BUDGETS['productos_mas_visitados']
+        data = self.get_json('/dashboard/api/productos-mas-visitados/?limit=30', budget)
+
+        self.assertEqual(len(data['productos']), 12)
+        deleted = [producto for producto in data['productos'] if producto['product_name'].endswith('(eliminado)')]
+        self.assertEqual(len(deleted), 2)
@@ -0,0 +1,72 @@
+"""
+Escritura de visitas en lote (core.services.visit_service) y reconstrucción
+de sus contadores (core.services.visit_rollups)
+"""
+from datetime import timedelta
+from unittest import mock
+
+from django.test import TestCase
+from django.utils import timezone
+
+from core.models import StoreVisit, VisitRollup, VisitUserAgent
+from core.services.visit_rollups import day_bucket, rebuild_visit_rollups
+from core.services.visit_service import backfill_user_agents, write_visits
+
+
+class WriteVisitsTests(TestCase):
+
+    def test_geolocation_never_calls_external_apis(self):
+        event = {
+            'session_key': 'sesion', 'user_id': None, 'visit_type': 'home', 'product_id': None,
+            'ip_address': '181.49.0.1', 'user_agent': 'Mozilla/5.0', 'timestamp': timezone.now(),
+        }
+        location = {'city': 'Bogotá', 'country': 'Colombia'}
+        with mock.patch('core.geolocation_helper.get_location_from_ip', return_value=location) as lookup:
+            self.assertEqual(write_visits([event]), 1)
+
+        lookup.assert_called_once_with('181.49.0.1', allow_network=False)
+        self.assertEqual(StoreVisit.objects.get().city, 'Bogotá')
+
+    def test_backfill_links_old_user_agents_in_batches(self):
+        texts = ['Mozilla/5.0 (X11)', 'Mozilla/5.0 (iPhone)', 'Mozilla/5.0 (X11)', '', None]
+        StoreVisit.objects.bulk_create([StoreVisit(visit_type='home', user_agent_text=text) for text in texts])
+
+        batches = list(backfill_user_agents(batch_size=2))
+
+        self.assertEqual(len(batches), 2)
+        self.assertEqual(sum(linked for linked, _last_id in batches), 3)
+        self.assertFalse(StoreVisit.objects.filter(user_agent_text__isnull=False).exists())
+        self.assertEqual(
+            list(StoreVisit.objects.order_by('id').values_list('user_agent__text', flat=True)),
+            ['Mozilla/5.0 (X11)', 'Mozilla/5.0 (iPhone)', 'Mozilla/5.0 (X11)', None, None],
+        )
+        self.assertEqual(VisitUserAgent.objects.count(), 2)
+        # Reanudar no encuentra nada pendiente
+        self.assertEqual(list(backfill_user_agents()), [])
+
+
+class RebuildVisitRollupsTests(TestCase):
+
+    def test_backfill_keeps_the_daily_buckets_of_archived_months(self):
+        this_month = day_bucket(timezone.now()).replace(day=1)
+        archived_day = day_bucket(this_month - timedelta(days=40))
+        VisitRollup.objects.create(granularity='day', bucket=archived_day, visit_type='store',
+                                   is_authenticated=False, product_id=0, count=120)
+        # Contador viejo del mes vigente: se recalcula desde las visitas
+        VisitRollup.objects.create(granularity='hour', bucket=this_month, visit_type='store',
+                                   is_authenticated=False, product_id=0, count=99)
+        StoreVisit.objects.bulk_create([
+            StoreVisit(timestamp=this_month + timedelta(minutes=i), visit_type='store') for i in range(3)
+        ])
+
+        rebuild_visit_rollups()
+
+        self.assertEqual(VisitRollup.objects.get(granularity='day', bucket=archived_day).count, 120)
+        self.assertEqual(VisitRollup.objects.get(granularity='hour', bucket=this_month).count, 3)
+
+    def test_backfill_without_visits_keeps_every_bucket(self):
+        VisitRollup.objects.create(granularity='day', bucket=day_bucket(timezone.now() - timedelta(days=90)),
+                                   visit_type='home', is_authenticated=False, product_id=0, count=7)
+
+        self.assertEqual(rebuild_visit_rollups(), 0)
+        self.assertEqual(VisitRollup.objects.count(), 1)
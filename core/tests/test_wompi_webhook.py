@@ -0,0 +1,64 @@
+"""
+Webhook de Wompi: solo los eventos con checksum válido tocan pedidos y reservas
+"""
+import hashlib
+import json
+
+from django.test import TestCase, override_settings
+
+from core.models import Category, ProductStore, StockReservation
+from core.services.stock_reservation import StockLine, reserve_stock
+
+EVENTS_SECRET = 'test_events_secret'
+
+
+def transaction_event(status, reference, secret=EVENTS_SECRET):
+    transaction = {'id': 'tx-1', 'status': status, 'reference': reference, 'amount_in_cents': 10000}
+    timestamp = 1530291411
+    values = f"{transaction['id']}{transaction['status']}{transaction['amount_in_cents']}"
+    return {
+        'event': 'transaction.updated',
+        'data': {'transaction': transaction},
+        'timestamp': timestamp,
+        'signature': {
+            'properties': ['transaction.id', 'transaction.status', 'transaction.amount_in_cents'],
+            'checksum': hashlib.sha256(f'{values}{timestamp}{secret}'.encode()).hexdigest(),
+        },
+    }
+
+
+@override_settings(WOMPI_EVENTS_SECRET=EVENTS_SECRET)
+class WompiWebhookTests(TestCase):
+
+    def setUp(self):
+        category = Category.objects.create(nombre='Portátiles', slug='portatiles')
+        self.product = ProductStore.objects.create(
+            name='Portátil', description='d', price_buy=1, price=100, stock=5, category=category
+        )
+        reserve_stock('compueasys-1-a', [StockLine(self.product.pk, None, 2)])
+
+    def post_event(self, event):
+        return self.client.post('/api/wompi-webhook/', json.dumps(event), content_type='application/json')
+
+    def test_signed_declined_event_releases_reservation(self):
+        response = self.post_event(transaction_event('DECLINED', 'compueasys-1-a'))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(StockReservation.objects.get().status, 'released')
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.stock, 5)
+
+    def test_forged_event_is_rejected(self):
+        response = self.post_event(transaction_event('DECLINED', 'compueasys-1-a', secret='otro'))
+
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(StockReservation.objects.get().status, 'active')
+
+    def test_tampered_event_is_rejected(self):
+        event = transaction_event('APPROVED', 'compueasys-1-a')
+        event['data']['transaction']['status'] = 'VOIDED'
+
+        response = self.post_event(event)
+
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(StockReservation.objects.get().status, 'active')
@@ -7,8 +7,8 @@ from core.views import (
     mis_pedidos, remove_from_cart, store, auctions, services, contactUs, 
     aboutUs, cart, register_user, login, product_detail, checkout, 
     update_cart, logout_view, search_suggestions, 
-    filter_products_ajax, get_categories_ajax, cart_count_api, cart_preview, register_stock_notification,
-    create_wompi_transaction, wompi_webhook, wompi_test, wompi_widget_test, validate_discount_code,
+    filter_products_ajax, store_products_api, get_categories_ajax, cart_count_api, cart_preview, register_stock_notification,
+    create_wompi_transaction, release_wompi_reservation, wompi_webhook, wompi_test, wompi_widget_test, validate_discount_code,
     send_verification_email, verify_code, resend_verification_code,
     order_details, cancel_order, start_conversation, get_conversations,
     get_conversation, send_message, wompi_check_transaction, download_receipt
@@ -45,6 +45,7 @@ urlpatterns = [
     # Endpoints AJAX para store moderno
     path('api/search-suggestions/', search_suggestions, name='search_suggestions'),
     path('api/filter-products/', filter_products_ajax, name='filter_products_ajax'),
+    path('api/store/products/', store_products_api, name='store_products_api'),
     path('api/categories/', get_categories_ajax, name='get_categories_ajax'),
     path('api/validate-discount-code/', validate_discount_code, name='validate_discount_code'),
     path('api/cart-count/', cart_count_api, name='cart_count_api'),
@@ -54,6 +55,7 @@ urlpatterns = [
     # Endpoints de Wompi para pagos
     path('api/create-wompi-transaction/', create_wompi_transaction, name='create_wompi_transaction'),
     path('api/wompi-webhook/', wompi_webhook, name='wompi_webhook'),
+    path('api/wompi-release-reservation/', release_wompi_reservation, name='release_wompi_reservation'),
     
     # Test de Wompi
     path('wompi-test/', wompi_test, name='wompi_test'),
@@ -10,28 +10,23 @@ try:
 except Exception as e:
     print(f"[WOMPI CONFIG] No se pudo cargar configuración global: {e}")
 from django.shortcuts import render, redirect
+from django.urls import reverse
 from django.http import HttpResponse
 from django.db.models import Q, Sum
 from django.db import models
 from django.http import JsonResponse
 
-# Geolocalización opcional - puede ser removido sin afectar funcionalidad
-try:
-    from .geolocation_helper import create_visit_with_location
-    GEOLOCATION_ENABLED = True
-except ImportError:
-    GEOLOCATION_ENABLED = False
-    create_visit_with_location = None
-from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.csrf import csrf_exempt, ensure_csrf_cookie
 from django.views.decorators.http import require_http_methods
-from django.core.mail import send_mail  
 from django.contrib.auth.models import User
 from django.contrib.auth import authenticate, login, logout
 from django.contrib import messages
+from django.utils.safestring import mark_safe
 import urllib.parse
+from collections import defaultdict
 from django.http import JsonResponse, HttpResponseRedirect
 from dashboard.models import register_superuser
-from .models import Category, StoreVisit, Type, Galeria, SimpleUser, Pedido, ProductVariant, ProductStore as Product, PedidoDetalle, BonoDescuento, Conversation, ConversationMessage, StockNotification, NotificationLog
+from .models import Category, Type, Galeria, SimpleUser, Pedido, ProductVariant, ProductStore as Product, PedidoDetalle, BonoDescuento, Conversation, ConversationMessage, StockNotification, NotificationLog
 
 # Importar modelos temporalmente definidos en views hasta que se haga la migración
 class VerificationToken:
@@ -61,21 +56,28 @@ from django.conf import settings
 import json
 import requests
 import logging
+import secrets
 import time
-from .wompi_client import WompiClient
+from .wompi_client import WompiClient, verify_event_checksum
+from .services.background_tasks import enqueue_email, enqueue_welcome_email
+from .services.cart_service import get_request_cart
+from .services.catalog_pagination import (
+    CATEGORY_PREVIEW, MAX_PAGE_SIZE, NO_CATEGORY, PAGE_SIZE, category_previews, filter_store_products,
+    filters_querystring, get_page, parse_store_filters,
+)
+from .services.autocomplete import suggest
+from .services.fragment_cache import cached_grid
+from .services.recommendation_pool import get_recommended_products
+from .services.related_products import get_related_products
+from .services.search_service import filter_by_search
+from .services.order_writer import CustomerData, EmptyCart, place_order
+from .services.stock_reservation import InsufficientStock, lines_from_cart, release_reservation, reserve_stock
+from .services.visit_service import record_visit
 
 logger = logging.getLogger(__name__)
 
 # Create your views here.
 def home(request):
-    # Registrar visita a la tienda principal
-    from core.models import StoreVisit
-    
-    # Obtener o crear session_key
-    if not request.session.session_key:
-        request.session.create()
-    
-    session_key = request.session.session_key
     user_obj = None
     
     # Verificar si hay usuario autenticado
@@ -86,71 +88,14 @@ def home(request):
         except SimpleUser.DoesNotExist:
             pass
     
-    # Obtener información del cliente
-    def get_client_ip(request):
-        x_forwarded_for = request.META.get('HTTP_X_FORWARDED_FOR')
-        if x_forwarded_for:
-            ip = x_forwarded_for.split(',')[0]
-        else:
-            ip = request.META.get('REMOTE_ADDR')
-        return ip
-    
-    # Registrar visita con geolocalización opcional
-    if GEOLOCATION_ENABLED and create_visit_with_location:
-        try:
-            create_visit_with_location(request, 'home', user_obj)
-        except:
-            # Fallback: registrar sin geolocalización
-            StoreVisit.objects.create(
-                session_key=session_key,
-                user=user_obj,
-                visit_type='home'
-            )
-    else:
-        # Sin geolocalización (normal)
-        StoreVisit.objects.create(
-            session_key=session_key,
-            user=user_obj,
-            visit_type='home'
-        )
+    # Registrar visita (se escribe en lote, fuera del request)
+    record_visit(request, 'home', user_obj)
     
     # Procesar carrito para el sidebar
-    cart = request.session.get('cart', {})
-    cart_count = sum([item['quantity'] if isinstance(item, dict) else item for item in cart.values()])
-    
-    cart_items = []
-    cart_total = Decimal(0)
-    for key, item in cart.items():
-        if '-' in str(key):
-            product_id_cart, variant_id = str(key).split('-')
-        else:
-            product_id_cart = str(key)
-            variant_id = None
-
-        quantity = item['quantity'] if isinstance(item, dict) else item
-
-        try:
-            product_cart = Product.objects.get(id=product_id_cart)
-        except Product.DoesNotExist:
-            continue
-
-        variant = None
-        if variant_id:
-            try:
-                variant = ProductVariant.objects.get(id=variant_id)
-            except ProductVariant.DoesNotExist:
-                variant = None
-
-        price = variant.precio if variant else product_cart.price
-        subtotal = price * quantity
-        cart_items.append({
-            'product': product_cart,
-            'variant': variant,
-            'quantity': quantity,
-            'price': price,
-            'subtotal': subtotal,
-        })
-        cart_total += subtotal
+    cart_summary = get_request_cart(request)
+    cart_count = cart_summary.count
+    cart_items = cart_summary.items
+    cart_total = cart_summary.total
     
     context = {
         'cart_count': cart_count,
@@ -287,18 +232,84 @@ def login_user(request):
         
     return render(request, 'login_user.html')
 
+STORE_CARD_TEMPLATES = {
+    'grid': 'partials/product_card.html',
+    'categorized': 'partials/product_card_categorized.html',
+    'store': 'partials/store_product_card.html',
+}
+
+
+def _store_more_url(filters, layout, cursor, category_id='', size=PAGE_SIZE):
+    """URL de la siguiente página para el botón "Ver más" / scroll infinito"""
+    if not cursor:
+        return ''
+    params = filters_querystring(filters)
+    if category_id != '':
+        params['category'] = NO_CATEGORY if category_id is None else category_id
+    if size != PAGE_SIZE:
+        params['size'] = size
+    params.update(layout=layout, cursor=cursor)
+    return f"{reverse('store_products_api')}?{urllib.parse.urlencode(params)}"
+
+
+@require_GET
+def store_products_api(request):
+    """
+    API JSON de paginación de la tienda (scroll infinito y "Ver más")
+    Devuelve solo las tarjetas de la página pedida y el cursor de la siguiente.
+    
+    Parámetros: los filtros de /store, `cursor`, `layout` (grid, categorized,
+    store) y `size` (máximo MAX_PAGE_SIZE)
+    """
+    filters = parse_store_filters(request.GET)
+    cursor = request.GET.get('cursor', '')
+    layout = request.GET.get('layout', 'grid')
+    if layout not in STORE_CARD_TEMPLATES:
+        layout = 'grid'
+    try:
+        size = min(max(int(request.GET.get('size', PAGE_SIZE)), 1), MAX_PAGE_SIZE)
+    except (ValueError, TypeError):
+        size = PAGE_SIZE
+    
+    def build_page(version):
+        products = filter_store_products(filters, Product.objects.select_related('category'))
+        if layout == 'store':
+            products = products.prefetch_related('galeria')
+        page_products, next_cursor = get_page(products, filters, cursor, size)
+        html = render_to_string('partials/product_cards.html', {
+            'products': page_products,
+            'card_template': STORE_CARD_TEMPLATES[layout],
+            'catalog_version': version,
+        })
+        return {
+            'html': html,
+            'returned': len(page_products),
+            'count': None if cursor else products.count(),
+            'next_cursor': next_cursor,
+            'next_url': _store_more_url(filters, layout, next_cursor, size=size),
+        }
+    
+    page = cached_grid(
+        'partials/product_cards.html',
+        dict(filters, cursor=cursor, layout=layout, size=size),
+        build_page,
+    )
+    return JsonResponse({
+        'success': True,
+        'html': page['html'],
+        'returned': page['returned'],
+        'count': page['count'],
+        'next_cursor': page['next_cursor'],
+        'next_url': page['next_url'],
+        'has_more': page['next_cursor'] is not None,
+    })
+
+
+@ensure_csrf_cookie
 def store(request):
     """
     Vista principal de la tienda con filtros modernos y AJAX
     """
-    # Registrar visita a la tienda
-    from core.models import StoreVisit
-    
-    # Obtener o crear session_key
-    if not request.session.session_key:
-        request.session.create()
-    
-    session_key = request.session.session_key
     user_obj = None
     
     # Verificar si hay usuario autenticado (soportar ambos nombres de sesión)
@@ -309,146 +320,84 @@ def store(request):
         except SimpleUser.DoesNotExist:
             pass
     
-    # Registrar visita con geolocalización opcional
-    if GEOLOCATION_ENABLED and create_visit_with_location:
-        try:
-            create_visit_with_location(request, 'store', user_obj)
-        except:
-            StoreVisit.objects.create(session_key=session_key, user=user_obj, visit_type='store')
-    else:
-        StoreVisit.objects.create(session_key=session_key, user=user_obj, visit_type='store')
+    # Registrar visita (se escribe en lote, fuera del request)
+    record_visit(request, 'store', user_obj)
     
     # Obtener parámetros de filtro
-    query = request.GET.get('q', '')
-    print(query)
-    category_id = request.GET.get('category', '')
-    price_min = request.GET.get('price_min', '')
-    price_max = request.GET.get('price_max', '')
-    in_stock = request.GET.get('in_stock', 'true')
-    out_of_stock = request.GET.get('out_of_stock', 'true')  # Cambiar a 'true' para mostrar agotados
-    sort_by = request.GET.get('sort', 'name')
-    page = request.GET.get('page', 1)
+    filters = parse_store_filters(request.GET)
+    query = filters['q']
+    category_id = filters['category']
+    price_min = filters['price_min']
+    price_max = filters['price_max']
+    sort_by = filters['sort']
+    in_stock = 'true' if filters['in_stock'] else 'false'
+    out_of_stock = 'true' if filters['out_of_stock'] else 'false'
+    cursor = request.GET.get('cursor', '')
 
-    # Base queryset: prefetch galeria to evitar N+1 y acelerar /store
-    products = Product.objects.all().select_related('category').prefetch_related('galeria')
     categories = Category.objects.all().order_by('nombre')
+    is_ajax = request.headers.get('X-Requested-With') == 'XMLHttpRequest'
     
-    # Aplicar filtros
-    if query:
-        products = products.filter(
-            Q(name__icontains=query) |
-            Q(description__icontains=query) |
-            Q(category__nombre__icontains=query)
+    def build_products(version):
+        """Consulta y render del grid; solo corre en un fallo del caché de fragmentos"""
+        # prefetch galeria para las imágenes del carrusel de cada tarjeta
+        products = filter_store_products(
+            filters, Product.objects.select_related('category').prefetch_related('galeria')
         )
-    
-    if category_id:
-        products = products.filter(category_id=category_id)
-    
-    if price_min:
-        try:
-            products = products.filter(price__gte=int(price_min))
-        except (ValueError, TypeError):
-            pass
-    
-    if price_max:
-        try:
-            products = products.filter(price__lte=int(price_max))
-        except (ValueError, TypeError):
-            pass
-    
-    # Filtro de stock
-    stock_filters = []
-    if in_stock == 'true':
-        stock_filters.append(Q(stock__gt=0))
-    if out_of_stock == 'true':
-        stock_filters.append(Q(stock=0))
-    
-    if stock_filters:
-        stock_query = stock_filters[0]
-        for filter_q in stock_filters[1:]:
-            stock_query |= filter_q
-        products = products.filter(stock_query)
-    
-    # Ordenamiento
-    if sort_by == 'price_asc':
-        products = products.order_by('price')
-    elif sort_by == 'price_desc':
-        products = products.order_by('-price')
-    elif sort_by == 'name':
-        products = products.order_by('name')
-    elif sort_by == 'newest':
-        products = products.order_by('-id')
-    elif sort_by == 'stock':
-        products = products.order_by('-stock')
-    
-    # Procesar carrito completo para el sidebar
-    cart = request.session.get('cart', {})
-    cart_count = sum([item['quantity'] if isinstance(item, dict) else item for item in cart.values()])
-    
-    cart_items = []
-    cart_total = Decimal(0)
-    for key, item in cart.items():
-        if '-' in str(key):
-            product_id_cart, variant_id = str(key).split('-')
-        else:
-            product_id_cart = str(key)
-            variant_id = None
-
-        quantity = item['quantity'] if isinstance(item, dict) else item
-
-        try:
-            product_cart = Product.objects.get(id=product_id_cart)
-        except Product.DoesNotExist:
-            continue
-
-        variant = None
-        if variant_id:
-            try:
-                variant = ProductVariant.objects.get(id=variant_id)
-            except ProductVariant.DoesNotExist:
-                variant = None
-
-        price = variant.precio if variant else product_cart.price
-        subtotal = price * quantity
-        cart_items.append({
-            'product': product_cart,
-            'variant': variant,
-            'quantity': quantity,
-            'price': price,
-            'subtotal': subtotal,
+        
+        if is_ajax:
+            # Primera página (o la indicada por el cursor) en grid simple
+            page_products, next_cursor = get_page(products, filters, cursor)
+            html = render_to_string('partials/products_grid.html', {
+                'products': page_products,
+                'next_url': _store_more_url(filters, 'grid', next_cursor),
+                'catalog_version': version,
+            })
+            return {
+                'html': html,
+                'count': None if cursor else products.count(),
+                'next_cursor': next_cursor,
+            }
+        
+        # Vista agrupada: los primeros de cada categoría con "Ver más"
+        per_category = PAGE_SIZE if category_id else CATEGORY_PREVIEW
+        groups = category_previews(products, filters, per_category)
+        for group in groups:
+            group['more_url'] = _store_more_url(filters, 'store', group['next_cursor'], group['category_id'])
+        
+        html = render_to_string('partials/store_products.html', {
+            'category_groups': groups,
+            'query': query,
+            'catalog_version': version,
         })
-        cart_total += subtotal
-    
-    # Agrupar productos por categoría
-    from collections import defaultdict
-    products_by_category = defaultdict(list)
-    
-    # Evaluar el queryset y agrupar
-    products_list = list(products)
+        return {'html': html, 'count': sum(group['total'] for group in groups)}
     
-    for product in products_list:
-        category_name = product.category.nombre if product.category else 'Sin categoría'
-        products_by_category[category_name].append(product)
+    grid = cached_grid(
+        'partials/products_grid.html' if is_ajax else 'partials/store_products.html',
+        dict(filters, cursor=cursor),
+        build_products,
+    )
     
-    # Para requests AJAX, devolver JSON
-    if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
-        from django.template.loader import render_to_string
-        
-        products_html = render_to_string('partials/products_grid.html', {
-            'products': products,
-        }, request)
-        
+    # Para requests AJAX, devolver JSON (sin procesar el carrito completo)
+    if is_ajax:
         return JsonResponse({
             'success': True,
-            'html': products_html,
-            'count': products.count(),
-            'cart_count': cart_count
+            'html': grid['html'],
+            'count': grid['count'],
+            'next_cursor': grid['next_cursor'],
+            'has_more': grid['next_cursor'] is not None,
+            'cart_count': get_request_cart(request).count
         })
     
+    # Procesar carrito completo para el sidebar
+    cart_summary = get_request_cart(request)
+    cart_count = cart_summary.count
+    cart_items = cart_summary.items
+    cart_total = cart_summary.total
+    
     # Context para template
     context = {
-        'products': products_list,
-        'products_by_category': dict(products_by_category),
+        'products_html': mark_safe(grid['html']),
+        'products_count': grid['count'],
         'categories': categories,
         'cart_count': cart_count,
         'cart_items': cart_items,
@@ -483,7 +432,7 @@ def store_modern(request):
     price_max = request.GET.get('price_max', '')
     in_stock = request.GET.get('in_stock', 'true')
     out_of_stock = request.GET.get('out_of_stock', 'false')
-    sort_by = request.GET.get('sort', 'name')
+    sort_by = request.GET.get('sort', 'relevance')
     page = request.GET.get('page', 1)
 
     # Base queryset
@@ -492,11 +441,8 @@ def store_modern(request):
     
     # Aplicar filtros
     if query:
-        products = products.filter(
-            Q(name__icontains=query) |
-            Q(description__icontains=query) |
-            Q(category__nombre__icontains=query)
-        )
+        # Índice de texto completo con ranking (core.services.search_service)
+        products = filter_by_search(products, query)
     
     if category_id:
         products = products.filter(category_id=category_id)
@@ -526,8 +472,10 @@ def store_modern(request):
             stock_query |= filter_q
         products = products.filter(stock_query)
     
-    # Ordenamiento
-    if sort_by == 'price_asc':
+    # Ordenamiento (relevancia solo aplica cuando hay búsqueda)
+    if sort_by == 'relevance':
+        products = products.order_by('search_rank') if query else products.order_by('name')
+    elif sort_by == 'price_asc':
         products = products.order_by('price')
     elif sort_by == 'price_desc':
         products = products.order_by('-price')
@@ -580,14 +528,6 @@ def store_modern(request):
     return render(request, 'store_modern.html', context)
    
 def product_detail(request, product_id):
-    # Registrar visita al producto
-    from core.models import StoreVisit
-    
-    # Obtener o crear session_key
-    if not request.session.session_key:
-        request.session.create()
-    
-    session_key = request.session.session_key
     user_obj = None
     
     # Verificar si hay usuario autenticado
@@ -598,159 +538,22 @@ def product_detail(request, product_id):
         except SimpleUser.DoesNotExist:
             pass
     
-    # Obtener información del cliente
-    def get_client_ip(request):
-        x_forwarded_for = request.META.get('HTTP_X_FORWARDED_FOR')
-        if x_forwarded_for:
-            ip = x_forwarded_for.split(',')[0]
-        else:
-            ip = request.META.get('REMOTE_ADDR')
-        return ip
-    
-    ip_address = get_client_ip(request)
-    user_agent = request.META.get('HTTP_USER_AGENT', '')
-    
-    # Registrar visita con geolocalización opcional
-    if GEOLOCATION_ENABLED and create_visit_with_location:
-        try:
-            create_visit_with_location(request, 'product_detail', user_obj, product_id=product_id)
-        except:
-            StoreVisit.objects.create(
-                session_key=session_key,
-                user=user_obj,
-                visit_type='product_detail',
-                product_id=product_id,
-                ip_address=ip_address,
-                user_agent=user_agent
-            )
-    else:
-        StoreVisit.objects.create(
-            session_key=session_key,
-            user=user_obj,
-            visit_type='product_detail',
-            product_id=product_id,
-            ip_address=ip_address,
-            user_agent=user_agent
-        )
+    # Registrar visita (se escribe en lote, fuera del request)
+    record_visit(request, 'product_detail', user_obj, product_id=product_id)
     
     try:
         product = Product.objects.get(id=product_id)        
         Galeria_images = product.galeria.all()
-        cart = request.session.get('cart', {})
-        cart_count = sum([item['quantity'] if isinstance(item, dict) else item for item in cart.values()])
         
         # Procesar items del carrito con información completa
-        cart_items = []
-        cart_total = Decimal(0)
-        for key, item in cart.items():
-            # Soporta claves tipo "17-1" o solo "17"
-            if '-' in str(key):
-                product_id_cart, variant_id = str(key).split('-')
-            else:
-                product_id_cart = str(key)
-                variant_id = None
-
-            quantity = item['quantity'] if isinstance(item, dict) else item
-
-            try:
-                product_cart = Product.objects.get(id=product_id_cart)
-            except Product.DoesNotExist:
-                continue
-
-            variant = None
-            if variant_id:
-                try:
-                    variant = ProductVariant.objects.get(id=variant_id)
-                except ProductVariant.DoesNotExist:
-                    variant = None
-
-            price = variant.precio if variant else product_cart.price
-            subtotal = price * quantity
-            cart_items.append({
-                'product': product_cart,
-                'variant': variant,
-                'quantity': quantity,
-                'price': price,
-                'subtotal': subtotal,
-            })
-            cart_total += subtotal
-        
-        # Obtener productos relacionados con lógica mejorada
-        # ORDEN EXACTO: 1) Nombre similar, 2) Misma categoría, 3) Todas las categorías
-        # CADA GRUPO: Primero con stock, luego agotados
-        related_products = []
-        used_ids = [product.id]
+        cart_summary = get_request_cart(request)
+        cart_count = cart_summary.count
+        cart_items = cart_summary.items
+        cart_total = cart_summary.total
         
-        # ===== PASO 1: Productos relacionados por NOMBRE =====
-        product_words = [word.lower() for word in product.name.split() if len(word) > 3]
-        
-        if product_words:
-            name_query = Q()
-            for word in product_words:
-                name_query |= Q(name__icontains=word)
-            
-            # 1A) Con stock - nombres similares
-            name_with_stock = list(Product.objects.filter(
-                name_query, stock__gt=0
-            ).exclude(id__in=used_ids).order_by('-created_at')[:5])
-            
-            for p in name_with_stock:
-                related_products.append(p)
-                used_ids.append(p.id)
-            
-            # 1B) Agotados - nombres similares
-            name_no_stock = list(Product.objects.filter(
-                name_query, stock=0
-            ).exclude(id__in=used_ids).order_by('-created_at')[:3])
-            
-            for p in name_no_stock:
-                related_products.append(p)
-                used_ids.append(p.id)
-        
-        # ===== PASO 2: Productos de la MISMA CATEGORÍA =====
-        if product.category:
-            # 2A) Con stock - misma categoría
-            category_with_stock = list(Product.objects.filter(
-                category=product.category, stock__gt=0
-            ).exclude(id__in=used_ids).order_by('-created_at')[:8])
-            
-            for p in category_with_stock:
-                related_products.append(p)
-                used_ids.append(p.id)
-            
-            # 2B) Agotados - misma categoría
-            category_no_stock = list(Product.objects.filter(
-                category=product.category, stock=0
-            ).exclude(id__in=used_ids).order_by('-created_at')[:4])
-            
-            for p in category_no_stock:
-                related_products.append(p)
-                used_ids.append(p.id)
-        
-        # ===== PASO 3: TODAS las demás categorías =====
-        # 3A) Con stock - todas las categorías
-        all_with_stock = list(Product.objects.filter(
-            stock__gt=0
-        ).exclude(id__in=used_ids).order_by('category', '-created_at')[:15])
-        
-        for p in all_with_stock:
-            related_products.append(p)
-            used_ids.append(p.id)
-        
-        # 3B) Agotados - todas las categorías
-        all_no_stock = list(Product.objects.filter(
-            stock=0
-        ).exclude(id__in=used_ids).order_by('category', '-created_at')[:15])
-        
-        for p in all_no_stock:
-            related_products.append(p)
-            used_ids.append(p.id)
-        
-        # Fallback: Si no hay productos relacionados
-        if len(related_products) == 0:
-            related_products = list(Product.objects.exclude(
-                id=product.id
-            ).order_by('-stock', '-created_at')[:30])
+        # Productos relacionados precalculados (nombre, categoría, compras y
+        # visitas conjuntas); con stock primero
+        related_products = get_related_products(product)
         
         # Preparar URLs de galería de forma segura para JavaScript
         import json
@@ -777,14 +580,21 @@ def product_detail(request, product_id):
     except Product.DoesNotExist:
         return HttpResponse("Product not found", status=404)
 
+def _verify_wompi_payment(transaction_id, reference):
+    """Confirma con la API de Wompi que la transacción se aprobó para la reserva de la sesión"""
+    if not transaction_id or not reference:
+        return False
+    try:
+        from core.services.config_registry import get_wompi_config
+        wompi_config = get_wompi_config()
+        wompi_client = WompiClient(wompi_config) if wompi_config else WompiClient()
+        return wompi_client.get_approved_transaction(transaction_id, reference) is not None
+    except Exception as e:
+        logger.error(f"❌ WOMPI: no se pudo verificar la transacción {transaction_id}: {e}")
+        return False
+
+
 def checkout(request, note=None):
-    # Registrar visita al checkout
-    from core.models import StoreVisit
-    
-    if not request.session.session_key:
-        request.session.create()
-    
-    session_key = request.session.session_key
     user_obj = None
     # Verificar si hay usuario autenticado (soportar ambos nombres de sesión)
     user_id = request.session.get('user_id') or request.session.get('simple_user_id')
@@ -794,77 +604,16 @@ def checkout(request, note=None):
         except SimpleUser.DoesNotExist:
             pass
     
-    def get_client_ip(request):
-        x_forwarded_for = request.META.get('HTTP_X_FORWARDED_FOR')
-        if x_forwarded_for:
-            ip = x_forwarded_for.split(',')[0]
-        else:
-            ip = request.META.get('REMOTE_ADDR')
-        return ip
-    
-    ip_address = get_client_ip(request)
-    user_agent = request.META.get('HTTP_USER_AGENT', '')
-    
-    # Registrar visita con geolocalización opcional
-    if GEOLOCATION_ENABLED and create_visit_with_location:
-        try:
-            create_visit_with_location(request, 'checkout', user_obj)
-        except:
-            StoreVisit.objects.create(
-                session_key=session_key,
-                user=user_obj,
-                visit_type='checkout',
-                ip_address=ip_address,
-                user_agent=user_agent
-            )
-    else:
-        StoreVisit.objects.create(
-            session_key=session_key,
-            user=user_obj,
-            visit_type='checkout',
-            ip_address=ip_address,
-            user_agent=user_agent
-        )
+    # Registrar visita (se escribe en lote, fuera del request)
+    record_visit(request, 'checkout', user_obj)
     
     saved = request.session.get('saved_checkout', {})   
     departament_selected = saved.get('departamento', '') 
     city_selected = saved.get('ciudad', '')
     nota = request.GET.get('note', '') 
-    cart = request.session.get('cart', {})
-    cart_items = []
-    cart_total = Decimal(0)
-    for key, item in cart.items():
-        # Soporta claves tipo "17-1" o solo "17"
-        if '-' in str(key):
-            product_id, variant_id = str(key).split('-')
-        else:
-            product_id = str(key)
-            variant_id = None
-
-        quantity = item['quantity'] if isinstance(item, dict) else item
-
-        try:
-            product = Product.objects.get(id=product_id)
-        except Product.DoesNotExist:
-            continue
-
-        variant = None
-        if variant_id:
-            try:
-                variant = ProductVariant.objects.get(id=variant_id)
-            except ProductVariant.DoesNotExist:
-                variant = None
-
-        price = variant.precio if variant else product.price
-        subtotal = price * quantity
-        cart_items.append({
-            'product': product,
-            'variant': variant,
-            'quantity': quantity,
-            'subtotal': subtotal,
-            
-        })
-        cart_total += subtotal
+    cart_summary = get_request_cart(request)
+    cart_items = cart_summary.items
+    cart_total = cart_summary.total
 
     saved = request.session.get('saved_checkout', {})
     departament_selected = saved.get('departament', '')
@@ -914,7 +663,7 @@ def checkout(request, note=None):
         'departament_selected': departament_selected,
         'departamentos': DEPARTAMENTOS_CIUDADES,
         'ciudades': ciudades,
-        'cart_count': sum([item['quantity'] if isinstance(item, dict) else item for item in cart.values()]),
+        'cart_count': cart_summary.count,
         'saved': saved,
         'wompi_public_key': settings.WOMPI_PUBLIC_KEY,
         'user_data': user_data,
@@ -933,6 +682,11 @@ def pago_exitoso(request):
         departamento = request.POST.get('departament')
         codigo_postal = request.POST.get('codigo_postal')
         
+        # Obtener carrito (productos y variantes en lote)
+        cart_summary = get_request_cart(request)
+        cart_items = cart_summary.items
+        cart_subtotal = cart_summary.total
+        
         # Obtener información de descuento y pago
         discount_code = request.POST.get('discount_applied', '').strip()
         discount_amount_frontend = Decimal(str(request.POST.get('discount_amount', 0)))
@@ -946,12 +700,6 @@ def pago_exitoso(request):
                 # Buscar el bono por código
                 bono = BonoDescuento.objects.get(codigo__iexact=discount_code)
                 
-                # Calcular total del carrito sin descuento
-                cart_subtotal = sum(
-                    Decimal(str(item['variant'].precio if item['variant'] else item['product'].price)) * int(item['quantity'])
-                    for item in cart_items
-                )
-                
                 # Validar si el bono puede ser usado
                 if bono.can_be_used(cart_subtotal):
                     # Calcular descuento real
@@ -978,9 +726,12 @@ def pago_exitoso(request):
         metodo_pago = request.POST.get('metodo_pago', 'contraentrega')
         forma_entrega = request.POST.get('forma_entrega', 'domicilio')
         
-        # Obtener información adicional de Wompi
+        # Obtener información adicional de Wompi: la referencia es la de la
+        # reserva de esta sesión (nunca la del formulario) y el pago solo
+        # cuenta si la API de Wompi confirma la transacción para esa referencia
         wompi_transaction_id = request.POST.get('wompi_transaction_id', '').strip()
-        wompi_reference = request.POST.get('wompi_reference', '').strip()
+        wompi_reference = request.session.get('stock_reservation', '')
+        wompi_paid = _verify_wompi_payment(wompi_transaction_id, wompi_reference)
         
         # Si hay transacción de Wompi, usarla como transaction_id principal
         if wompi_transaction_id:
@@ -991,75 +742,6 @@ def pago_exitoso(request):
         if wompi_transaction_id:
             print(f"💳 Pago Wompi - Transaction ID: {wompi_transaction_id}, Reference: {wompi_reference}")
 
-        # Crear o actualizar SimpleUser con todos los datos del checkout
-        user, created = SimpleUser.objects.get_or_create(
-            email=email, 
-            defaults={
-                'telefono': telefono,
-                'name': nombre,
-                'username': email,
-                'password': telefono,  # Temporal
-                'address': direccion,
-                'city': ciudad,
-                'departamento': departamento,
-                'codigo_postal': codigo_postal
-            }
-        )
-        
-        # Si el usuario ya existe, actualizar sus datos con la info del checkout
-        if not created:
-            user.telefono = telefono
-            user.name = nombre
-            user.address = direccion
-            user.city = ciudad
-            user.departamento = departamento
-            user.codigo_postal = codigo_postal
-            user.save()
-            print(f"✅ Datos de usuario {email} actualizados con información del checkout")
-
-        # Crear usuario Django si no existe
-        if not User.objects.filter(username=email).exists():
-            user_django = User.objects.create_user(
-                username=email,
-                email=email,
-                password=telefono,  # El celular como contraseña temporal
-                first_name=nombre
-            )
-        else:
-            user_django = User.objects.get(username=email)
-
-        # Obtener carrito y calcular total
-        cart = request.session.get('cart', {})
-        cart_items = []
-        cart_subtotal = Decimal(0)
-        detalles = ""
-        for key, item in cart.items():
-            # Soporta claves tipo "17-1" o solo "17"
-            if '-' in str(key):
-                product_id, variant_id = str(key).split('-')
-            else:
-                product_id = str(key)
-                variant_id = None
-
-            quantity = item['quantity'] if isinstance(item, dict) else item
-
-            try:
-                product = Product.objects.get(id=product_id)
-            except Product.DoesNotExist:
-                continue
-
-            variant = None
-            if variant_id:
-                try:
-                    variant = ProductVariant.objects.get(id=variant_id)
-                except ProductVariant.DoesNotExist:
-                    variant = None
-
-            price = variant.precio if variant else product.price
-            subtotal = price * quantity
-            cart_items.append({'product': product, 'variant': variant, 'quantity': quantity, 'subtotal': subtotal})
-            cart_subtotal += subtotal
-
         # Calcular envío según forma de entrega
         print(f"💰 Calculando envío - Forma entrega: {forma_entrega}, Subtotal: ${cart_subtotal}")
         if forma_entrega == 'tienda':
@@ -1074,13 +756,13 @@ def pago_exitoso(request):
         # Organiza el detalle de productos para WhatsApp/email
         detalles = ""
         for item in cart_items:
-            linea = f"- {item['product'].name}"
-            if item['variant']:
-                if item['variant'].color:
-                    linea += f" | Color: {item['variant'].color}"
-                if item['variant'].talla:
-                    linea += f" | Talla: {item['variant'].talla}"
-            linea += f" | Cantidad: {item['quantity']} | Subtotal: ${item['subtotal']}\n"
+            linea = f"- {item.product.name}"
+            if item.variant:
+                if item.variant.color:
+                    linea += f" | Color: {item.variant.color}"
+                if item.variant.talla:
+                    linea += f" | Talla: {item.variant.talla}"
+            linea += f" | Cantidad: {item.quantity} | Subtotal: ${item.subtotal}\n"
             detalles += linea
         
         # Agregar información de descuento al detalle si aplica
@@ -1100,92 +782,19 @@ def pago_exitoso(request):
 
         # Determinar estado inicial del pago
         estado_pago_inicial = 'pendiente'
-        if metodo_pago in ['tarjeta', 'wompi', 'wompi_tarjeta'] and transaction_id:
+        if metodo_pago in ['tarjeta', 'wompi', 'wompi_tarjeta'] and wompi_paid:
             estado_pago_inicial = 'completado'
         
         # Construir nota con información de Wompi si aplica
         nota_final = nota if nota else ''
         if wompi_reference:
             nota_final = f"{nota_final} | Referencia Wompi: {wompi_reference}".strip('| ')
-        if wompi_transaction_id:
+        if wompi_paid:
             nota_final = f"{nota_final} | PAGADO - Wompi Transaction: {wompi_transaction_id}".strip('| ')
+        elif wompi_transaction_id:
+            nota_final = f"{nota_final} | Wompi Transaction sin verificar: {wompi_transaction_id}".strip('| ')
 
-        # Guardar pedido con toda la información nueva
-        pedido = Pedido.objects.create(
-            user=user,
-            nombre=nombre,
-            email=email,  # Agregar email
-            telefono=telefono,  # Agregar teléfono
-            direccion=direccion,
-            ciudad=ciudad,
-            departamento=departamento,
-            codigo_postal=codigo_postal,
-            subtotal=cart_subtotal,  # Agregar subtotal
-            envio=shipping_cost,  # Agregar envío
-            descuento=discount_amount,  # Agregar descuento
-            total=cart_total,
-            detalles=detalles,
-            nota=nota_final,  # Nota con información de Wompi
-            estado='pendiente',  # Estado inicial
-            metodo_pago=metodo_pago,  # Método de pago correcto
-            forma_entrega=forma_entrega,  # Forma de entrega
-            estado_pago=estado_pago_inicial,  # Estado de pago
-            transaction_id=transaction_id if transaction_id else None,  # Transaction ID
-            codigo_descuento=discount_code if discount_code else None,  # Código descuento
-        )
-
-        # USAR EL BONO SI FUE APLICADO EXITOSAMENTE
-        if bono_aplicado and discount_amount > 0:
-            try:
-                bono_aplicado.usar_bono()
-                print(f"✅ Bono {bono_aplicado.codigo} usado exitosamente. Usos: {bono_aplicado.usos_realizados}/{bono_aplicado.usos_maximos}")
-            except Exception as e:
-                print(f"❌ Error al usar bono {bono_aplicado.codigo}: {e}")
-
-        # Guardar cada item en el detalle del pedido y descontar stock (¡DENTRO DEL CICLO!)
-        for item in cart_items:
-            PedidoDetalle.objects.create(
-                pedido=pedido,
-                producto=item['product'],
-                variante=item['variant'],
-                cantidad=item['quantity'],
-                precio=item['variant'].precio if item['variant'] else item['product'].price,
-            )
-            # Descontar stock
-            if item['variant']:
-                variant = item['variant']
-                # Asegúrate de tener la instancia real
-                if not hasattr(variant, 'save'):
-                    variant = ProductVariant.objects.get(id=variant.id)
-                variant.stock = max(0, variant.stock - item['quantity'])
-                variant.save()
-            else:
-                product = item['product']
-                if not hasattr(product, 'save'):
-                    product = Product.objects.get(id=product.id)
-                product.stock = max(0, product.stock - item['quantity'])
-                product.save()
-
-        # Guardar info para futuros checkouts
-        if request.POST.get('save_info'):
-            request.session['saved_checkout'] = {
-                'email': email,
-                'nombre': nombre,
-                'cedula': request.POST.get('cedula'),
-                'direccion': direccion,
-                'departament': departamento,
-                'ciudad': ciudad,
-                'codigo_postal': codigo_postal,
-                'telefono': telefono,
-            }
-        else:
-            request.session.pop('saved_checkout', None)
-        # Limpiar carrito
-        if 'cart' in request.session:
-            del request.session['cart']
-            request.session.modified = True
-
-        # Enviar correo al usuario con información de descuento
+        # Correo de confirmación: se envía solo si el pedido quedó guardado
         subject = "Confirmación de tu compra en CompuEasys"
         
         # Construir resumen de totales
@@ -1209,16 +818,68 @@ def pago_exitoso(request):
             f"Puedes cambiarla cuando quieras desde la tienda.\n\n"
             f"¡Gracias por confiar en nosotros!"
         )
-        # Remitente seguro: DEFAULT_FROM_EMAIL o EMAIL_HOST_USER
-        from_email = getattr(settings, 'DEFAULT_FROM_EMAIL', None) or getattr(settings, 'EMAIL_HOST_USER', None)
-        if not from_email:
-            logger.error("No se ha configurado DEFAULT_FROM_EMAIL ni EMAIL_HOST_USER en settings.py")
+
+        def send_confirmation_email(pedido):
+            enqueue_email(subject, message, [email], idempotency_key=f'order-confirmation:{pedido.pk}')
+
+        # Cliente, stock, pedido, detalles y bono en una sola transacción: con
+        # Wompi se confirma la reserva hecha al iniciar el pago; si venció o es
+        # contraentrega el stock se descuenta ahora con UPDATE condicionales
+        try:
+            place_order(
+                cart=cart_summary,
+                customer=CustomerData(
+                    email=email,
+                    telefono=telefono,
+                    nombre=nombre,
+                    direccion=direccion,
+                    ciudad=ciudad,
+                    departamento=departamento,
+                    codigo_postal=codigo_postal,
+                ),
+                order_fields={
+                    'subtotal': cart_subtotal,
+                    'envio': shipping_cost,
+                    'descuento': discount_amount,
+                    'total': cart_total,
+                    'detalles': detalles,
+                    'nota': nota_final,  # Nota con información de Wompi
+                    'estado': 'pendiente',
+                    'metodo_pago': metodo_pago,
+                    'forma_entrega': forma_entrega,
+                    'estado_pago': estado_pago_inicial,
+                    'transaction_id': transaction_id if transaction_id else None,
+                    'codigo_descuento': discount_code if discount_code else None,
+                },
+                wompi_reference=wompi_reference,
+                # Si el pago ya se cobró el pedido se registra aunque falte stock
+                paid=wompi_paid,
+                bono=bono_aplicado if discount_amount > 0 else None,
+                on_commit=[send_confirmation_email],
+            )
+        except (EmptyCart, InsufficientStock) as e:
+            messages.error(request, f'{e}. Actualiza tu carrito e intenta de nuevo.')
+            return redirect('cart')
+        request.session.pop('stock_reservation', None)
+
+        # Guardar info para futuros checkouts
+        if request.POST.get('save_info'):
+            request.session['saved_checkout'] = {
+                'email': email,
+                'nombre': nombre,
+                'cedula': request.POST.get('cedula'),
+                'direccion': direccion,
+                'departament': departamento,
+                'ciudad': ciudad,
+                'codigo_postal': codigo_postal,
+                'telefono': telefono,
+            }
         else:
-            try:
-                send_mail(subject, message, from_email, [email], fail_silently=False)
-            except Exception as e:
-                logger.exception("Error enviando correo de confirmación: %s", e)
-                # no interrumpir flujo, solo loggear; opcionalmente notificar al admin
+            request.session.pop('saved_checkout', None)
+        # Limpiar carrito
+        if 'cart' in request.session:
+            del request.session['cart']
+            request.session.modified = True
 
         # Generar link de WhatsApp ORDENADO con información de descuento
         total_line = f"*Subtotal:* ${cart_subtotal:,.0f}\n"
@@ -1274,66 +935,13 @@ def aboutUs(request):
 
 def send_welcome_email(email, username):
     """
-    Envía email de bienvenida a usuarios recién registrados
+    Encola el email de bienvenida a usuarios recién registrados
+    (lo envía el worker de core.services.job_queue)
     """
     try:
-        from django.template.loader import render_to_string
-        from django.core.mail import EmailMultiAlternatives
-        from django.conf import settings
-        import datetime
-        
-        # Obtener BASE_URL dinámicamente
-        # En producción será https://compueasys.onrender.com
-        # En desarrollo será http://127.0.0.1:8000
-        base_url = getattr(settings, 'BASE_URL', 'https://compueasys.onrender.com')
-        
-        # Contexto para la plantilla
-        context = {
-            'username': username,
-            'email': email,
-            'site_name': 'CompuEasys',
-            'year': datetime.datetime.now().year,
-            'base_url': base_url
-        }
-        
-        # Renderizar plantilla HTML
-        html_content = render_to_string('emails/welcome.html', context)
-        
-        # Crear mensaje
-        subject = f'¡Bienvenido a CompuEasys, {username}! 🎉'
-        
-        # Mensaje de texto plano como fallback
-        text_content = f"""
-        ¡Hola {username}!
-        
-        ¡Bienvenido a CompuEasys! Tu cuenta ha sido creada exitosamente.
-        
-        Ahora puedes:
-        • Explorar nuestros productos tecnológicos
-        • Recibir notificaciones cuando los productos estén disponibles
-        • Realizar compras de forma segura
-        • Acceder a ofertas exclusivas
-        
-        ¡Gracias por unirte a nuestra comunidad!
-        
-        El equipo de CompuEasys
-        """
-        
-        msg = EmailMultiAlternatives(
-            subject=subject,
-            body=text_content,
-            from_email=getattr(settings, 'DEFAULT_FROM_EMAIL', 'noreply@compueasys.com'),
-            to=[email]
-        )
-        msg.attach_alternative(html_content, "text/html")
-        
-        # Enviar email
-        msg.send()
-        
-        logger.info(f"✅ Welcome email sent to {email}")
-        
+        enqueue_welcome_email(email, username)
     except Exception as e:
-        logger.error(f"❌ Error sending welcome email to {email}: {e}")
+        logger.error(f"❌ Error queueing welcome email to {email}: {e}")
 
 def register_user(request):
     if request.method == 'POST':       
@@ -1404,14 +1012,6 @@ def index(request):
 
 # ...existing code...
 def cart(request):
-    # Registrar visita al carrito
-    from core.models import StoreVisit
-    
-    # Obtener o crear session_key
-    if not request.session.session_key:
-        request.session.create()
-    
-    session_key = request.session.session_key
     user_obj = None
     
     # Verificar si hay usuario autenticado
@@ -1422,102 +1022,20 @@ def cart(request):
         except SimpleUser.DoesNotExist:
             pass
     
-    # Obtener información del cliente
-    def get_client_ip(request):
-        x_forwarded_for = request.META.get('HTTP_X_FORWARDED_FOR')
-        if x_forwarded_for:
-            ip = x_forwarded_for.split(',')[0]
-        else:
-            ip = request.META.get('REMOTE_ADDR')
-        return ip
+    # Registrar visita (se escribe en lote, fuera del request)
+    record_visit(request, 'cart', user_obj)
     
-    ip_address = get_client_ip(request)
-    user_agent = request.META.get('HTTP_USER_AGENT', '')
-    
-    # Registrar visita con geolocalización opcional
-    if GEOLOCATION_ENABLED and create_visit_with_location:
-        try:
-            create_visit_with_location(request, 'cart', user_obj)
-        except:
-            StoreVisit.objects.create(
-                session_key=session_key,
-                user=user_obj,
-                visit_type='cart',
-                ip_address=ip_address,
-                user_agent=user_agent
-            )
-    else:
-        StoreVisit.objects.create(
-            session_key=session_key,
-            user=user_obj,
-            visit_type='cart',
-            ip_address=ip_address,
-            user_agent=user_agent
-        )
-    
-    cart = request.session.get('cart', {})
-    cart_items = []
-    cart_total = Decimal(0)
-    removed_keys = []
-
-    for key, item in list(cart.items()):
-        # Normalizar formato del item
-        if isinstance(item, int):
-            product_id = key
-            quantity = item
-            variant = None
-        else:
-            product_id = item.get('product_id', key)
-            quantity = item.get('quantity', 1)
-            variant_id = item.get('variant_id')
-            variant = None
-            if variant_id:
-                try:
-                    variant = ProductVariant.objects.get(id=variant_id)
-                except ProductVariant.DoesNotExist:
-                    variant = None
-
-        # Intentar obtener el producto; si no existe, eliminar la entrada del carrito y continuar
-        try:
-            product = Product.objects.get(id=product_id)
-        except Product.DoesNotExist:
-            removed_keys.append(key)
-            continue
-
-        price = variant.precio if variant else product.price
-        subtotal = price * quantity
-        cart_items.append({
-            'product': product,
-            'variant': variant,
-            'quantity': quantity,
-            'subtotal': subtotal,
-        })
-        cart_total += subtotal
-
-    # Limpiar items inválidos del session cart
-    if removed_keys:
-        for k in removed_keys:
-            if k in cart:
-                del cart[k]
-        request.session['cart'] = cart
-        request.session.modified = True
-
-    # recalcular contador de carrito seguro
-    cart_count = 0
-    for v in cart.values():
-        if isinstance(v, dict):
-            cart_count += v.get('quantity', 0)
-        else:
-            try:
-                cart_count += int(v)
-            except Exception:
-                pass
+    # Hidratar carrito; las entradas de productos eliminados se limpian de la sesión
+    cart_summary = get_request_cart(request, prune_missing=True)
+    cart_items = cart_summary.items
+    cart_total = cart_summary.total
+    cart_count = cart_summary.count
 
     # Obtener productos relacionados para mostrar en el carrito
-    # Productos aleatorios de diferentes categorías
-    related_products = Product.objects.filter(
-        stock__gt=0
-    ).order_by('?')[:12]  # 12 productos aleatorios para el slider
+    # Muestra aleatoria ponderada de diferentes categorías (sin ORDER BY RANDOM())
+    related_products = get_recommended_products(
+        12, exclude={item.product.id for item in cart_items}
+    )  # 12 productos para el slider
     
     context = {
         'cart_items': cart_items,
@@ -1571,42 +1089,9 @@ def update_cart(request, product_id):
             subtotal = price * quantity            
          
             # Calcula total del carrito y cantidad total
-            cart_total = Decimal(0)
-            cart_count = 0
-            
-            for k, v in cart.items():
-                if isinstance(v, dict):
-                    q = v['quantity']
-                    if v.get('variant_id'):
-                        try:
-                            pv = ProductVariant.objects.get(id=v['variant_id'])
-                            p = pv.precio
-                        except:
-                            p = 0
-                    else:
-                        try:
-                            p = Product.objects.get(id=v['product_id']).price
-                        except:
-                            p = 0
-                else:
-                    # Formato antiguo: k puede ser "product_id" o "product_id-variant_id"
-                    q = v
-                    try:
-                        if '-' in k:
-                            # Tiene variante
-                            parts = k.split('-')
-                            variant_id = parts[1]
-                            pv = ProductVariant.objects.get(id=variant_id)
-                            p = pv.precio
-                        else:
-                            # Solo producto
-                            p = Product.objects.get(id=k).price
-                    except:
-                        p = 0
-                
-                item_total = p * q
-                cart_total += item_total
-                cart_count += q
+            cart_summary = get_request_cart(request)
+            cart_total = cart_summary.total
+            cart_count = cart_summary.count
 
             return JsonResponse({
                 'success': True,
@@ -1719,33 +1204,9 @@ def remove_from_cart(request, product_id):
         # Si es una petición AJAX, devolver JSON
         if request.headers.get('x-requested-with') == 'XMLHttpRequest':
             # Calcular nuevo total del carrito
-            cart_total = Decimal(0)
-            cart_count = 0
-            for k, v in cart.items():
-                if isinstance(v, dict):
-                    quantity = v['quantity']
-                    if v.get('variant_id'):
-                        try:
-                            variant = ProductVariant.objects.get(id=v['variant_id'])
-                            price = variant.precio
-                        except ProductVariant.DoesNotExist:
-                            price = 0
-                    else:
-                        try:
-                            product = Product.objects.get(id=v['product_id'])
-                            price = product.price
-                        except Product.DoesNotExist:
-                            price = 0
-                else:
-                    quantity = v
-                    try:
-                        product = Product.objects.get(id=k)
-                        price = product.price
-                    except Product.DoesNotExist:
-                        price = 0
-                
-                cart_total += price * quantity
-                cart_count += quantity
+            cart_summary = get_request_cart(request)
+            cart_total = cart_summary.total
+            cart_count = cart_summary.count
             
             return JsonResponse({
                 'success': True,
@@ -2099,9 +1560,9 @@ def enviarEmail(request):
     recipient_list = [getattr(settings, 'CONTACT_EMAIL', from_email)]
 
     try:
-        send_mail(subject, message, from_email, recipient_list, fail_silently=False)
+        enqueue_email(subject, message, recipient_list, from_email=from_email)
     except Exception as e:
-        logger.exception("Error enviando email de contacto")
+        logger.exception("Error encolando email de contacto")
         return JsonResponse({'success': False, 'message': 'Error enviando correo.', 'error': str(e)}, status=500)
 
     return JsonResponse({'success': True, 'message': 'Correo enviado exitosamente.'})
@@ -2154,22 +1615,13 @@ def search_suggestions(request):
         return JsonResponse({'suggestions': []})
     
     try:
-        # Búsqueda en productos
-        product_names = Product.objects.filter(
-            name__icontains=query
-        ).values_list('name', flat=True).distinct()[:5]
-        
-        # Búsqueda en categorías
-        category_names = Category.objects.filter(
-            nombre__icontains=query
-        ).values_list('nombre', flat=True).distinct()[:3]
-        
-        # Combinar sugerencias
-        suggestions = list(product_names) + list(category_names)
+        # Productos y categorías por prefijo desde el índice en memoria,
+        # ordenados por popularidad (no consulta la base de datos)
+        suggestions = suggest(query, limit=8)  # Máximo 8 sugerencias
         
         return JsonResponse({
             'success': True,
-            'suggestions': suggestions[:8]  # Máximo 8 sugerencias
+            'suggestions': suggestions
         })
         
     except Exception as e:
@@ -2187,91 +1639,43 @@ def filter_products_ajax(request):
     
     try:
         # Obtener filtros
-        query = request.GET.get('q', '')
-        category_id = request.GET.get('category', '')
-        price_min = request.GET.get('price_min', '')
-        price_max = request.GET.get('price_max', '')
-        in_stock = request.GET.get('in_stock', 'true') == 'true'
-        out_of_stock = request.GET.get('out_of_stock', 'false') == 'true'
-        sort_by = request.GET.get('sort', 'name')
-        
-        # Base queryset
-        products = Product.objects.all().select_related('category')
-        
-        # Aplicar filtros
-        if query:
-            products = products.filter(
-                Q(name__icontains=query) |
-                Q(description__icontains=query) |
-                Q(category__nombre__icontains=query)
-            )
-        
-        if category_id:
-            products = products.filter(category_id=category_id)
-        
-        if price_min:
-            try:
-                products = products.filter(price__gte=int(price_min))
-            except (ValueError, TypeError):
-                pass
+        filters = parse_store_filters(request.GET, out_of_stock_default='false')
+        category_id = filters['category']
         
-        if price_max:
-            try:
-                products = products.filter(price__lte=int(price_max))
-            except (ValueError, TypeError):
-                pass
-        
-        # Filtro de stock - Respetar selecciones del usuario
-        if in_stock and out_of_stock:
-            # Mostrar ambos: productos con stock y sin stock
-            pass  # No aplicar filtro, mostrar todos
-        elif in_stock and not out_of_stock:
-            # Solo productos con stock
-            products = products.filter(stock__gt=0)
-        elif not in_stock and out_of_stock:
-            # Solo productos sin stock (agotados)
-            products = products.filter(stock=0)
-        elif not in_stock and not out_of_stock:
-            # Usuario desmarcó ambos - no mostrar productos
-            products = products.none()
-        
-        # Ordenamiento
-        if sort_by == 'price_asc':
-            products = products.order_by('price')
-        elif sort_by == 'price_desc':
-            products = products.order_by('-price')
-        elif sort_by == 'name':
-            products = products.order_by('name')
-        elif sort_by == 'newest':
-            products = products.order_by('-id')
-        elif sort_by == 'stock':
-            products = products.order_by('-stock')
-        
-        # Contar productos antes del slice
-        total_count = products.count()
-        
-        # Limitar resultados para mejor rendimiento
-        products = products[:50]
-        
-        # Renderizar HTML de productos
-        from django.template.loader import render_to_string
-        from collections import defaultdict
-        
-        # Si NO hay filtro de categoría, agrupar por categorías
-        if not category_id:
-            products_by_category = defaultdict(list)
-            for product in products:
-                category_name = product.category.nombre if product.category else 'Sin categoría'
-                products_by_category[category_name].append(product)
+        def build_products(version):
+            """Consulta y render del grid; solo corre en un fallo del caché de fragmentos"""
+            products = filter_store_products(filters, Product.objects.select_related('category'))
+            total_count = products.count()
             
-            products_html = render_to_string('partials/products_grid_categorized.html', {
-                'products_by_category': dict(products_by_category),
-            }, request)
-        else:
-            # Si hay filtro de categoría, mostrar productos simples
-            products_html = render_to_string('partials/products_grid.html', {
-                'products': products,
-            }, request)
+            # Si NO hay filtro de categoría, agrupar por categorías (primeros de cada una)
+            if not category_id:
+                groups = category_previews(products, filters)
+                for group in groups:
+                    group['more_url'] = _store_more_url(
+                        filters, 'categorized', group['next_cursor'], group['category_id']
+                    )
+                html = render_to_string('partials/products_grid_categorized.html', {
+                    'category_groups': groups,
+                    'catalog_version': version,
+                })
+                next_cursor = None
+            else:
+                # Si hay filtro de categoría, primera página en grid simple
+                page_products, next_cursor = get_page(products, filters)
+                html = render_to_string('partials/products_grid.html', {
+                    'products': page_products,
+                    'next_url': _store_more_url(filters, 'grid', next_cursor),
+                    'catalog_version': version,
+                })
+            return {'html': html, 'count': total_count, 'next_cursor': next_cursor}
+        
+        grid = cached_grid(
+            'partials/products_grid.html' if category_id else 'partials/products_grid_categorized.html',
+            filters,
+            build_products,
+        )
+        products_html = grid['html']
+        total_count = grid['count']
         
         # Contar carrito
         cart = request.session.get('cart', {})
@@ -2281,6 +1685,8 @@ def filter_products_ajax(request):
             'success': True,
             'html': products_html,
             'count': total_count,
+            'next_cursor': grid['next_cursor'],
+            'has_more': grid['next_cursor'] is not None,
             'cart_count': cart_count,
             'message': f'Se encontraron {total_count} productos'
         })
@@ -2318,50 +1724,10 @@ def cart_preview(request):
     try:
         from django.template.loader import render_to_string
         
-        cart = request.session.get('cart', {})
-        cart_items = []
-        cart_total = 0
-        cart_count = 0
-        
-        print(f"🛒 Cart session data: {cart}")  # Debug
-        
-        for product_id, item_data in cart.items():
-            try:
-                product = Product.objects.get(id=product_id)
-                
-                if isinstance(item_data, dict):
-                    quantity = item_data.get('quantity', 1)
-                    variant_id = item_data.get('variant_id')
-                    
-                    variant = None
-                    if variant_id:
-                        try:
-                            variant = ProductVariant.objects.get(id=variant_id)
-                        except ProductVariant.DoesNotExist:
-                            pass
-                    
-                    price = variant.price if variant else product.price
-                else:
-                    quantity = item_data
-                    variant = None
-                    price = product.price
-                
-                subtotal = price * quantity
-                cart_total += subtotal
-                cart_count += quantity  # Sumar la cantidad de cada producto
-                
-                cart_items.append({
-                    'product': product,
-                    'variant': variant,
-                    'quantity': quantity,
-                    'price': price,
-                    'subtotal': subtotal
-                })
-                
-                print(f"✅ Producto agregado: {product.name}, cantidad: {quantity}")  # Debug
-            except Product.DoesNotExist:
-                print(f"⚠️ Producto {product_id} no encontrado")  # Debug
-                continue
+        cart_summary = get_request_cart(request)
+        cart_items = cart_summary.items
+        cart_total = cart_summary.total
+        cart_count = cart_summary.count
         
         print(f"📊 Total items: {len(cart_items)}, Total count: {cart_count}, Total: {cart_total}")  # Debug
         
@@ -2378,12 +1744,12 @@ def cart_preview(request):
         cart_items_json = []
         for item in cart_items:
             cart_items_json.append({
-                'id': item['product'].id,
-                'name': item['product'].name,
-                'quantity': item['quantity'],
-                'price': f'${item["price"]:,.0f}',
-                'subtotal': f'${item["subtotal"]:,.0f}',
-                'image': item['variant'].imagen.url if item['variant'] and item['variant'].imagen else (item['product'].imagen.url if item['product'].imagen else None)
+                'id': item.product.id,
+                'name': item.product.name,
+                'quantity': item.quantity,
+                'price': f'${item.price:,.0f}',
+                'subtotal': f'${item.subtotal:,.0f}',
+                'image': item.variant.imagen.url if item.variant and item.variant.imagen else (item.product.imagen.url if item.product.imagen else None)
             })
         
         return JsonResponse({
@@ -2443,8 +1809,8 @@ def register_stock_notification(request):
             
             # Obtener producto
             try:
-                product = ProductStore.objects.get(id=product_id)
-            except ProductStore.DoesNotExist:
+                product = Product.objects.get(id=product_id)
+            except Product.DoesNotExist:
                 return JsonResponse({
                     'success': False,
                     'message': 'Producto no encontrado'
@@ -2511,150 +1877,40 @@ def register_stock_notification(request):
 
 def send_stock_notifications(product_id, notification_type='stock_available'):
     """
-    Enviar notificaciones automáticas cuando un producto vuelve a estar en stock
+    Encolar las notificaciones automáticas de un producto (las envía el worker)
     """
     try:
-        from django.core.mail import send_mail
-        from django.template.loader import render_to_string
-        from django.utils import timezone
-        
-        product = ProductStore.objects.get(id=product_id)
-        
-        # Obtener notificaciones pendientes
-        notifications = StockNotification.objects.filter(
-            product=product,
-            notification_type=notification_type,
-            status='pending'
-        )
-        
-        sent_count = 0
-        failed_count = 0
-        
-        for notification in notifications:
-            try:
-                # Personalizar mensaje según tipo de notificación
-                if notification_type == 'stock_available':
-                    subject = f'¡{product.name} ya está disponible! - CompuEasys'
-                    template = 'emails/stock_available.html'
-                elif notification_type == 'price_drop':
-                    subject = f'¡Precio reducido en {product.name}! - CompuEasys'
-                    template = 'emails/price_drop.html'
-                elif notification_type == 'back_in_stock':
-                    subject = f'¡{product.name} regresó al stock! - CompuEasys'
-                    template = 'emails/back_in_stock.html'
-                else:
-                    subject = f'Notificación de {product.name} - CompuEasys'
-                    template = 'emails/generic_notification.html'
-                
-                # Obtener BASE_URL dinámicamente
-                from django.conf import settings
-                base_url = getattr(settings, 'BASE_URL', 'https://compueasys.onrender.com')
-                product_url = f'{base_url}/product/{product.id}/'
-                
-                # Renderizar email HTML
-                html_message = render_to_string(template, {
-                    'product': product,
-                    'notification': notification,
-                    'product_url': product_url,
-                    'base_url': base_url
-                })
-                
-                # Mensaje de texto plano como fallback
-                text_message = f"""
-¡Hola!
-
-Te notificamos que {product.name} ya está disponible.
+        from .signals import send_back_in_stock_notifications
 
-Precio: ${product.price:,.0f} COP
-Stock: {product.stock} unidades
+        product = Product.objects.get(id=product_id)
 
-Ver producto: {product_url}
+        if notification_type == 'price_drop':
+            from .services.product_events import queue_price_drop_notifications
+            return {'queued': queue_price_drop_notifications(product, product.price)}
 
-¡No te lo pierdas!
+        job = send_back_in_stock_notifications(product)
+        return {'queued': 1 if job is not None else 0}
 
-Equipo CompuEasys
-                """.strip()
-                
-                # Enviar email
-                send_mail(
-                    subject=subject,
-                    message=text_message,
-                    from_email='notificaciones@compueasys.com',
-                    recipient_list=[notification.email],
-                    html_message=html_message,
-                    fail_silently=False,
-                )
-                
-                # Marcar como enviada
-                notification.status = 'sent'
-                notification.sent_at = timezone.now()
-                notification.save()
-                
-                # Crear log exitoso
-                NotificationLog.objects.create(
-                    stock_notification=notification,
-                    success=True,
-                    email_subject=subject
-                )
-                
-                sent_count += 1
-                
-            except Exception as email_error:
-                # Marcar como fallida
-                notification.status = 'failed'
-                notification.save()
-                
-                # Crear log de error
-                NotificationLog.objects.create(
-                    stock_notification=notification,
-                    success=False,
-                    error_message=str(email_error),
-                    email_subject=subject
-                )
-                
-                failed_count += 1
-                print(f"Error enviando notificación a {notification.email}: {email_error}")
-        
-        print(f"Notificaciones enviadas: {sent_count}, Fallidas: {failed_count}")
-        return {'sent': sent_count, 'failed': failed_count}
-        
     except Exception as e:
         print(f"Error in send_stock_notifications: {e}")
-        return {'sent': 0, 'failed': 0, 'error': str(e)}
+        return {'queued': 0, 'error': str(e)}
 
 def check_and_send_price_drop_notifications(product_id, old_price, new_price):
     """
-    Verificar y enviar notificaciones de bajada de precio
+    Verificar y encolar notificaciones de bajada de precio
     """
     try:
-        product = ProductStore.objects.get(id=product_id)
-        
-        # Buscar notificaciones de precio
-        price_notifications = StockNotification.objects.filter(
-            product=product,
-            notification_type='price_drop',
-            status='pending',
-            notify_price_drop=True
-        )
-        
-        notifications_to_send = []
-        
-        for notification in price_notifications:
-            # Si tiene precio objetivo y el nuevo precio es menor o igual
-            if notification.target_price and new_price <= notification.target_price:
-                notifications_to_send.append(notification)
-            # Si no tiene precio objetivo pero el precio bajó
-            elif not notification.target_price and new_price < old_price:
-                notifications_to_send.append(notification)
-        
-        if notifications_to_send:
-            return send_stock_notifications(product_id, 'price_drop')
-        
-        return {'sent': 0, 'failed': 0}
+        from .services.product_events import queue_price_drop_notifications
+
+        if new_price >= old_price:
+            return {'queued': 0}
+
+        product = Product.objects.get(id=product_id)
+        return {'queued': queue_price_drop_notifications(product, new_price)}
         
     except Exception as e:
         print(f"Error in check_and_send_price_drop_notifications: {e}")
-        return {'sent': 0, 'failed': 0, 'error': str(e)}
+        return {'queued': 0, 'error': str(e)}
 
 def get_categories_ajax(request):
     """
@@ -2720,8 +1976,8 @@ def create_wompi_transaction(request):
         
         # Crear cliente Wompi con manejo de errores
         try:
-            from dashboard.models import WompiConfig
-            wompi_config = WompiConfig.objects.first()
+            from core.services.config_registry import get_wompi_config
+            wompi_config = get_wompi_config()
             if wompi_config:
                 wompi_client = WompiClient(wompi_config)
             else:
@@ -2786,8 +2042,24 @@ def create_wompi_transaction(request):
         
         # Convertir a centavos para Wompi
         amount_in_cents = int(amount * 100)
-        reference = f"compueasys-{int(time.time())}"
+        # Sufijo aleatorio: dos checkouts en el mismo segundo no comparten reserva
+        reference = f"compueasys-{int(time.time())}-{secrets.token_hex(4)}"
         currency = 'COP'
+
+        # Apartar el stock del carrito mientras el cliente paga
+        cart_summary = get_request_cart(request)
+        if cart_summary.items:
+            # Un intento anterior sin pagar de esta sesión ya no se usará
+            release_reservation(request.session.pop('stock_reservation', ''))
+            try:
+                reserve_stock(reference, lines_from_cart(cart_summary.items))
+            except InsufficientStock as e:
+                print(f"❌ WOMPI Error: {e}")
+                return JsonResponse({
+                    'error': str(e),
+                    'error_type': 'insufficient_stock',
+                }, status=409)
+            request.session['stock_reservation'] = reference
         
         print(f"💰 WOMPI Final data - Cents: {amount_in_cents}, Reference: {reference}")
         
@@ -2850,6 +2122,11 @@ def wompi_webhook(request):
         
         # Log del evento recibido
         logger.info(f"Wompi webhook received: {data}")
+
+        # Sin checksum válido no se toca ningún pedido ni reserva
+        if not verify_event_checksum(data):
+            logger.warning(f"⚠️ WOMPI: evento con checksum inválido ignorado: {data.get('event')}")
+            return JsonResponse({'status': 'error', 'message': 'Invalid checksum'}, status=401)
         
         # Verificar que es un evento de transacción
         if data.get('event') == 'transaction.updated':
@@ -2891,8 +2168,12 @@ def wompi_webhook(request):
                 except Exception as e:
                     logger.error(f"Error actualizando estado del pedido: {e}")
                     
-            elif status == 'DECLINED' or status == 'ERROR':
+            elif status in ('DECLINED', 'ERROR', 'VOIDED'):
                 logger.warning(f"Transaction {transaction_id} fue {status}")
+                # Devolver el stock apartado al iniciar el pago
+                released = release_reservation(reference)
+                if released:
+                    logger.info(f"Reserva {reference} liberada: {released} unidades devueltas al stock")
                 
         else:
             logger.info(f"Evento no manejado: {data.get('event')}")
@@ -2907,6 +2188,17 @@ def wompi_webhook(request):
         return JsonResponse({'status': 'error'}, status=500)
 
 
+@require_http_methods(["POST"])
+def release_wompi_reservation(request):
+    """
+    Libera el stock apartado cuando el pago se rechaza o el cliente cierra el
+    widget de Wompi. Solo libera la reserva guardada en la sesión.
+    """
+    reference = request.session.pop('stock_reservation', '')
+    released = release_reservation(reference)
+    return JsonResponse({'success': True, 'released': released})
+
+
 @csrf_exempt
 @require_http_methods(["POST"])
 def validate_discount_code(request):
@@ -2997,7 +2289,6 @@ def validate_discount_code(request):
 import random
 import string
 from datetime import timedelta
-from django.core.mail import send_mail
 from django.template.loader import render_to_string
 from django.contrib.auth import update_session_auth_hash
 from django.contrib.auth.hashers import check_password
@@ -3058,13 +2349,7 @@ def send_verification_email(request):
         Equipo CompuEasys
         """
         
-        send_mail(
-            subject,
-            message,
-            'noreply@compueasys.com',
-            [request.user.email],
-            fail_silently=False,
-        )
+        enqueue_email(subject, message, [request.user.email], from_email='noreply@compueasys.com')
         
         return JsonResponse({
             'success': True,
@@ -3210,13 +2495,7 @@ def resend_verification_code(request):
         Equipo CompuEasys
         """
         
-        send_mail(
-            subject,
-            message,
-            'noreply@compueasys.com',
-            [request.user.email],
-            fail_silently=False,
-        )
+        enqueue_email(subject, message, [request.user.email], from_email='noreply@compueasys.com')
         
         return JsonResponse({
             'success': True,
@@ -3637,162 +2916,29 @@ def register_stock_notification(request):
 
 def send_stock_notifications():
     """
-    Función para enviar notificaciones de stock
-    Se puede llamar desde un cron job o tarea programada
+    Función para encolar notificaciones de stock
+    Se puede llamar desde un cron job o tarea programada; los correos los
+    envía el worker (`manage.py run_jobs`)
     """
-    from django.template.loader import render_to_string
-    from django.core.mail import EmailMultiAlternatives
-    import datetime
+    from .signals import send_back_in_stock_notifications
     
     try:
-        # Buscar productos que ahora tienen stock y tienen notificaciones pendientes
-        notifications_to_send = StockNotification.objects.filter(
-            status='pending',
-            notification_type='stock_available',
-            product__stock__gt=0
-        )
+        # Productos que ahora tienen stock y tienen notificaciones pendientes
+        products = Product.objects.filter(
+            stock__gt=0,
+            stock_notifications__status='pending',
+            stock_notifications__notification_type='stock_available'
+        ).distinct()
         
-        sent_count = 0
-        
-        for notification in notifications_to_send:
-            try:
-                # Renderizar email HTML
-                context = {
-                    'product': notification.product,
-                    'email': notification.email,
-                    'site_name': 'CompuEasys',
-                    'year': datetime.datetime.now().year
-                }
-                
-                html_content = render_to_string('emails/stock_available.html', context)
-                
-                # Crear email
-                subject = f'¡{notification.product.name} ya está disponible!'
-                
-                msg = EmailMultiAlternatives(
-                    subject=subject,
-                    body=f'El producto {notification.product.name} ya está disponible en CompuEasys.',
-                    from_email=settings.DEFAULT_FROM_EMAIL,
-                    to=[notification.email]
-                )
-                msg.attach_alternative(html_content, "text/html")
-                
-                # Enviar email
-                msg.send()
-                
-                # Marcar notificación como enviada
-                notification.status = 'sent'
-                notification.sent_at = datetime.datetime.now()
-                notification.save()
-                
-                # Registrar en log
-                NotificationLog.objects.create(
-                    stock_notification=notification,
-                    success=True,
-                    email_subject=subject
-                )
-                
-                sent_count += 1
-                
-            except Exception as e:
-                # Registrar error en log
-                NotificationLog.objects.create(
-                    stock_notification=notification,
-                    success=False,
-                    error_message=str(e),
-                    email_subject=f'Error: {notification.product.name}'
-                )
-                
-                logger.error(f"Error sending notification for {notification.product.name}: {e}")
+        queued_count = sum(1 for product in products if send_back_in_stock_notifications(product) is not None)
         
-        logger.info(f"Stock notifications sent: {sent_count}")
-        return sent_count
+        logger.info(f"Stock notifications queued: {queued_count} products")
+        return queued_count
         
     except Exception as e:
         logger.error(f"Error in send_stock_notifications: {e}")
         return 0
 
-def check_price_drops():
-    """
-    Verificar y notificar bajadas de precio
-    """
-    from django.template.loader import render_to_string
-    from django.core.mail import EmailMultiAlternatives
-    import datetime
-    
-    try:
-        # Buscar notificaciones de precio activas
-        price_notifications = StockNotification.objects.filter(
-            status='pending',
-            notify_price_drop=True,
-            product__stock__gt=0
-        ).exclude(target_price__isnull=True)
-        
-        sent_count = 0
-        
-        for notification in price_notifications:
-            # Verificar si el precio actual es menor al objetivo
-            if notification.product.price <= notification.target_price:
-                try:
-                    # Renderizar email HTML
-                    context = {
-                        'product': notification.product,
-                        'target_price': notification.target_price,
-                        'current_price': notification.product.price,
-                        'email': notification.email,
-                        'site_name': 'CompuEasys',
-                        'year': datetime.datetime.now().year
-                    }
-                    
-                    html_content = render_to_string('emails/price_drop.html', context)
-                    
-                    # Crear email
-                    subject = f'¡{notification.product.name} bajó de precio!'
-                    
-                    msg = EmailMultiAlternatives(
-                        subject=subject,
-                        body=f'{notification.product.name} ahora cuesta ${notification.product.price:,.0f}',
-                        from_email=settings.DEFAULT_FROM_EMAIL,
-                        to=[notification.email]
-                    )
-                    msg.attach_alternative(html_content, "text/html")
-                    
-                    # Enviar email
-                    msg.send()
-                    
-                    # Marcar notificación como enviada (solo para precio)
-                    notification.notify_price_drop = False
-                    notification.target_price = None
-                    notification.save()
-                    
-                    # Registrar en log
-                    NotificationLog.objects.create(
-                        stock_notification=notification,
-                        success=True,
-                        email_subject=subject
-                    )
-                    
-                    sent_count += 1
-                    
-                except Exception as e:
-                    # Registrar error en log
-                    NotificationLog.objects.create(
-                        stock_notification=notification,
-                        success=False,
-                        error_message=str(e),
-                        email_subject=f'Error precio: {notification.product.name}'
-                    )
-                    
-                    logger.error(f"Error sending price notification for {notification.product.name}: {e}")
-        
-        logger.info(f"Price drop notifications sent: {sent_count}")
-        return sent_count
-        
-    except Exception as e:
-        logger.error(f"Error in check_price_drops: {e}")
-        return 0
-
-
 # ============================================
 # VISTAS PÚBLICAS DE PROYECTOS
 # ============================================
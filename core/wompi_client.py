@@ -1,11 +1,41 @@
 import requests
 from django.conf import settings
+import hashlib
+import hmac
 import json
 import time
 import logging
 
 logger = logging.getLogger(__name__)
 
+
+def verify_event_checksum(event, secret=None):
+    """
+    Valida el checksum de un evento de Wompi
+
+    Wompi firma cada evento con SHA256 de los valores de data indicados en
+    signature.properties, seguidos del timestamp y del secreto de eventos.
+    """
+    secret = secret if secret is not None else getattr(settings, 'WOMPI_EVENTS_SECRET', '')
+    signature = event.get('signature') or {}
+    checksum = signature.get('checksum')
+    properties = signature.get('properties')
+    if not secret or not checksum or not isinstance(properties, list):
+        return False
+
+    values = []
+    for path in properties:
+        value = event.get('data') or {}
+        for key in str(path).split('.'):
+            value = value.get(key) if isinstance(value, dict) else None
+        if value is None:
+            return False
+        values.append(str(value))
+
+    expected = hashlib.sha256(f"{''.join(values)}{event.get('timestamp', '')}{secret}".encode()).hexdigest()
+    return hmac.compare_digest(expected, str(checksum).lower())
+
+
 class WompiClient:
     """Cliente para interactuar con la API de Wompi"""
     def __init__(self, config=None):
@@ -139,6 +169,23 @@ class WompiClient:
         url = f"{self.base_url}/transactions/{transaction_id}"
         return self._make_request('get', url)
     
+    def get_approved_transaction(self, transaction_id, reference):
+        """
+        Transacción consultada en la API solo si está APPROVED y es de la referencia
+
+        El id que envía el navegador no prueba el pago: se confirma aquí antes
+        de marcar el pedido como pagado. Retorna None si no se puede verificar.
+        """
+        if not transaction_id or not reference:
+            return None
+        result = self.get_transaction(transaction_id)
+        transaction_data = result.get('data') or {}
+        if transaction_data.get('status') != 'APPROVED' or transaction_data.get('reference') != reference:
+            logger.warning(f"⚠️ WOMPI: transacción {transaction_id} no verificada para {reference}: "
+                           f"{transaction_data.get('status') or result.get('error')}")
+            return None
+        return transaction_data
+
     def get_acceptance_token(self):
         """Obtener el token de aceptación (términos y condiciones)"""
         url = f"{self.base_url}/merchants/{self.public_key}"
@@ -162,11 +209,9 @@ class WompiClient:
             logger.error(f"❌ Exception obteniendo acceptance token: {str(e)}")
             return None
     
-    def validate_webhook_signature(self, payload, signature, timestamp):
-        """Validar la firma del webhook de Wompi"""
-        # Implementar validación de firma si Wompi la proporciona
-        # Por ahora retorna True para permitir el procesamiento
-        return True
+    def validate_webhook_signature(self, event, secret=None):
+        """Validar la firma (checksum) de un evento de Wompi"""
+        return verify_event_checksum(event, secret)
     
     def create_pse_transaction(self, amount_in_cents, customer_email, bank_code, user_type, user_legal_id, reference=None):
         """Crear una transacción PSE"""
@@ -1,6 +1,9 @@
 /* ========================================
    DASHBOARD AUTO-REFRESH SYSTEM
    Sistema de actualización automática cada 15 segundos
+   En el inicio los indicadores llegan por el websocket del dashboard
+   (solo los valores que cambian); la consulta periódica solo se usa
+   mientras el socket está desconectado
    ======================================== */
 
 (function() {
@@ -9,6 +12,10 @@
     const REFRESH_INTERVAL = 15000; // 15 segundos
     let refreshTimer = null;
     let lastPedidosCount = null;
+    let liveUpdates = false;
+    let dashboardActive = false;
+    // Última foto completa de los indicadores; los deltas del socket se mezclan aquí
+    let lastStats = {};
 
     // Utilidades
     function getCookie(name) {
@@ -89,6 +96,7 @@
             console.log('✅ Datos recibidos:', data);
             
             if (data.success && data.stats) {
+                lastStats = data.stats;
                 updateStatsUI(data.stats);
             } else {
                 console.error('❌ Respuesta sin success o stats:', data);
@@ -106,10 +114,10 @@
         if (stats.diarias) {
             console.log('  📅 Diarias:', stats.diarias);
             updateValue('pedidos-hoy', stats.diarias.pedidos_hoy);
-            updateValue('ventas-hoy', '$' + formatNumber(stats.diarias.ventas_hoy));
+            updateMoney('ventas-hoy', stats.diarias.ventas_hoy);
             updateValue('productos-vendidos-hoy', stats.diarias.productos_vendidos_hoy);
-            updateValue('ingresos-pendientes-hoy', '$' + formatNumber(stats.diarias.ingresos_pendientes_hoy || 0));
-            updateValue('nuevos-clientes-hoy', stats.diarias.nuevos_clientes_hoy || 0);
+            updateMoney('ingresos-pendientes-hoy', stats.diarias.ingresos_pendientes_hoy);
+            updateValue('nuevos-clientes-hoy', stats.diarias.nuevos_clientes_hoy);
         }
 
         // Estadísticas de pedidos
@@ -121,8 +129,8 @@
 
         // Estadísticas de finanzas
         if (stats.finanzas) {
-            updateValue('ingresos-totales', '$' + formatNumber(stats.finanzas.ingresos_totales));
-            updateValue('ingresos-pendientes', '$' + formatNumber(stats.finanzas.ingresos_pendientes));
+            updateMoney('ingresos-totales', stats.finanzas.ingresos_totales);
+            updateMoney('ingresos-pendientes', stats.finanzas.ingresos_pendientes);
         }
 
         // Estadísticas de productos
@@ -149,7 +157,9 @@
     }
 
     // Actualizar un valor individual con animación
+    // (undefined = el delta no trae ese indicador: se deja el valor mostrado)
     function updateValue(statName, newValue) {
+        if (newValue === undefined) return;
         const element = document.querySelector(`[data-stat="${statName}"]`);
         if (!element) {
             // No mostrar advertencia - el elemento simplemente no está en la página actual
@@ -157,7 +167,7 @@
         }
 
         const oldValue = element.textContent.trim();
-        const newValueStr = String(newValue);
+        const newValueStr = String(newValue ?? 0);
 
         // Solo logear si el valor cambió realmente
         if (oldValue !== newValueStr) {
@@ -173,6 +183,11 @@
         }
     }
 
+    function updateMoney(statName, amount) {
+        if (amount === undefined) return;
+        updateValue(statName, '$' + formatNumber(amount || 0));
+    }
+
     // Mostrar notificación flotante
     function showRealtimeNotification(title, message, type = 'info') {
         // Remover notificaciones anteriores
@@ -223,14 +238,48 @@
 
     // Iniciar auto-refresh para dashboard home
     function startDashboardAutoRefresh() {
+        dashboardActive = true;
+
         // Primera carga
         updateDashboardStats();
 
-        // Configurar intervalo
+        // Con el websocket conectado no hace falta consultar periódicamente
+        if (!liveUpdates) {
+            startStatsPolling();
+        }
+    }
+
+    function startStatsPolling() {
+        if (refreshTimer) return;
         refreshTimer = setInterval(updateDashboardStats, REFRESH_INTERVAL);
         console.log('✅ Auto-refresh de dashboard iniciado (15s)');
     }
 
+    // El websocket del dashboard avisa si está conectado
+    function setLiveUpdates(connected) {
+        const wasLive = liveUpdates;
+        liveUpdates = connected;
+        if (!dashboardActive) return;
+
+        if (connected) {
+            stopAutoRefresh();
+            // Al reconectar se recupera lo que cambió mientras estuvo caído
+            if (!wasLive) updateDashboardStats();
+        } else {
+            startStatsPolling();
+        }
+    }
+
+    // Aplicar los indicadores que cambiaron (mensaje stats_delta del socket)
+    // sobre la última foto completa, para no pintar los que no vienen
+    function applyStatsDelta(delta) {
+        if (!dashboardActive || !delta) return;
+        Object.keys(delta).forEach(section => {
+            lastStats[section] = Object.assign({}, lastStats[section], delta[section]);
+        });
+        updateStatsUI(lastStats);
+    }
+
     // Detener auto-refresh
     function stopAutoRefresh() {
         if (refreshTimer) {
@@ -262,7 +311,9 @@
         startDashboard: startDashboardAutoRefresh,
         stop: stopAutoRefresh,
         refresh: checkPedidosChanges,
-        refreshStats: updateDashboardStats
+        refreshStats: updateDashboardStats,
+        setLiveUpdates: setLiveUpdates,
+        applyStatsDelta: applyStatsDelta
     };
 
     // Inicializar cuando el DOM esté listo
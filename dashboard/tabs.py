@@ -0,0 +1,549 @@
+"""
+Datos de cada pestaña del dashboard (`?view=`)
+dashboard_home solo arma el "shell" (menú, indicadores del inicio y
+formularios de configuración); los datos de cada pestaña salen de las
+secciones registradas aquí con @tab_section y solo se calculan para la
+pestaña pedida. Abrir "ventas" ya no carga todos los usuarios ni las
+últimas 1.000 visitas.
+
+Las mismas secciones se sirven como JSON en /dashboard/api/tab/<tab>/
+(dashboard.views.dashboard_tab_data), cacheadas TAB_CACHE_TTL segundos en el
+namespace TABS_NAMESPACE. Guardar un pedido, producto o cliente no las
+invalida: un dato de una pestaña puede tardar hasta TAB_CACHE_TTL segundos en
+aparecer (los indicadores del inicio se envían por websocket,
+core.services.dashboard_metrics).
+"""
+from datetime import datetime
+from typing import Callable, Dict, List
+
+from django.core.paginator import EmptyPage, Page, PageNotAnInteger, Paginator
+from django.db.models import Count, Model, Q, QuerySet, Sum
+from django.db.models.fields.files import FieldFile
+
+from core.models import BonoDescuento, Category, Conversation, ConversationMessage, Pedido, \
+    ProductStore, SimpleUser, StockNotification, StoreVisit, Type, proveedor
+from core.services.dashboard_metrics import TABS_NAMESPACE
+from core.services.sales_summary import get_sales_by_period, get_top_products_by_category
+from core.services.visit_products import hydrate_products, with_visit_products
+from core.services.visit_rollups import get_period_starts, get_top_visited_products, get_visit_counters
+from dashboard.models import register_superuser
+from shared.services import CacheService
+
+TAB_CACHE_TTL = 30
+
+# pestaña -> secciones que necesita, en orden de registro
+TAB_SECTIONS: Dict[str, List[Callable]] = {}
+
+
+def tab_section(*tabs: str):
+    """Registra una función que arma parte del contexto de una o varias pestañas"""
+    def decorator(func):
+        for tab in tabs:
+            TAB_SECTIONS.setdefault(tab, []).append(func)
+        return func
+    return decorator
+
+
+def get_default_context() -> Dict:
+    """Valores vacíos de todas las variables de pestaña que usa dashboard_home.html"""
+    return {
+        'productos': [],
+        'productos_page': None,
+        'total_valor_inventario': 0,
+        'total_stock_inventario': 0,
+        'categorias': [],
+        'tipos': [],
+        'proveedores': [],
+        'usuarios': [],
+        'bonos': [],
+        'pedidos': [],
+        'pedidos_count': 0,
+        'pedidos_pendientes_count': 0,
+        'pedidos_enviados_count': 0,
+        'pedidos_entregados_count': 0,
+        'inventario_all': [],
+        'inventario_by_category': [],
+        'resumen_inventario': {
+            'valor_invertido': 0,
+            'valor_productos': 0,
+            'margen_ganancia': 0,
+            'cantidad_productos_stock': 0,
+        },
+        'selected_category': None,
+        'ventas_por_categoria': [],
+        'total_ventas_general': 0,
+        'estadisticas_ventas': {
+            'pedidos_totales': 0,
+            'productos_vendidos': 0,
+            'promedio_por_pedido': 0,
+            'categoria_mas_vendida': None,
+            'categoria_mayor_ingresos': None,
+        },
+        'conversations': [],
+        'conversations_stats': {
+            'total_conversations': 0,
+            'pending_conversations': 0,
+            'today_messages': 0,
+            'active_conversations': 0,
+        },
+        'visitas_recientes': [],
+        'visitas_count': 0,
+        'visitas_count_today': 0,
+        'visitas_count_week': 0,
+        'visitas_count_month': 0,
+        'visitas_count_auth': 0,
+        'visitas_count_anon': 0,
+        'visitas_count_total': 0,
+        'visitas_count_home': 0,
+        'visitas_count_store': 0,
+        'visitas_count_product': 0,
+        'visitas_count_cart': 0,
+        'visitas_count_checkout': 0,
+        'productos_mas_visitados': [],
+        'productos_visitados_page': None,
+        'stock_notifications': [],
+        'stock_notifications_page': None,
+        'stock_notifications_stats': {},
+    }
+
+
+def build_tab_data(tab: str, params, metricas: Dict) -> Dict:
+    """
+    Variables que arman las secciones de una pestaña
+
+    Args:
+        tab: valor de `?view=` ('ventas' para el inicio)
+        params: request.GET
+        metricas: indicadores de core.services.dashboard_metrics.get_metrics
+    """
+    data = {}
+    for section in TAB_SECTIONS.get(tab, []):
+        data.update(section(params, metricas))
+    return data
+
+
+def build_tab_context(tab: str, params, metricas: Dict) -> Dict:
+    """Contexto de dashboard_home.html: valores vacíos más los datos de la pestaña"""
+    context = get_default_context()
+    context.update(build_tab_data(tab, params, metricas))
+    return context
+
+
+def serialize_tab_data(value):
+    """
+    Convierte los datos de una pestaña a tipos de JSON (DjangoJSONEncoder
+    se encarga de Decimal y fechas): modelos con sus campos, páginas con sus
+    elementos y archivos con su URL
+    """
+    if isinstance(value, Model):
+        deferred = value.get_deferred_fields()
+        return {
+            field.attname: serialize_tab_data(getattr(value, field.attname))
+            for field in value._meta.concrete_fields
+            if field.attname not in deferred
+        }
+    if isinstance(value, FieldFile):
+        return value.url if value else None
+    if isinstance(value, Page):
+        return {
+            'items': serialize_tab_data(value.object_list),
+            'number': value.number,
+            'num_pages': value.paginator.num_pages,
+            'count': value.paginator.count,
+        }
+    if isinstance(value, dict):
+        return {str(key): serialize_tab_data(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple, set, QuerySet)):
+        return [serialize_tab_data(item) for item in value]
+    return value
+
+
+def _paginate(items, per_page: int, page_number):
+    paginator = Paginator(items, per_page)
+    try:
+        return paginator.page(page_number)
+    except PageNotAnInteger:
+        return paginator.page(1)
+    except EmptyPage:
+        return paginator.page(paginator.num_pages)
+
+
+# ---------------------------------------------------------------------------
+# Catálogo
+# ---------------------------------------------------------------------------
+
+@tab_section('productos', 'inventario', 'categoria', 'tipos', 'proveedores', 'mi_perfil')
+def catalog_section(params, metricas) -> Dict:
+    return {
+        'categorias': Category.objects.all(),
+        'tipos': Type.objects.all(),
+        'proveedores': proveedor.objects.all(),
+    }
+
+
+@tab_section('productos')
+def products_section(params, metricas) -> Dict:
+    categoria_filter = params.get('categoria_filter', '')
+    search_query = params.get('search', '')
+
+    productos_queryset = ProductStore.objects.select_related('category', 'proveedor', 'type').all().order_by('-id')
+
+    if categoria_filter:
+        try:
+            productos_queryset = productos_queryset.filter(category_id=int(categoria_filter))
+        except (ValueError, TypeError):
+            pass
+
+    if search_query:
+        productos_queryset = productos_queryset.filter(
+            Q(name__icontains=search_query) |
+            Q(description__icontains=search_query)
+        )
+
+    productos_page = _paginate(productos_queryset, 10, params.get('page', 1))
+
+    # Estadísticas de inventario (sobre todos los productos, no solo la página actual)
+    inventario_stats = productos_queryset.aggregate(
+        total_valor=Sum('price'),
+        total_stock=Sum('stock')
+    )
+    return {
+        'productos': productos_page.object_list,
+        'productos_page': productos_page,
+        'total_valor_inventario': inventario_stats['total_valor'] or 0,
+        'total_stock_inventario': inventario_stats['total_stock'] or 0,
+    }
+
+
+def _calcular_inventario(queryset):
+    items = []
+    by_cat = {}
+    total_invertido = 0.0
+    total_productos = 0.0
+    total_cantidad = 0
+    for p in queryset:
+        stock = int(getattr(p, 'stock', 0) or 0)
+        price_buy = float(getattr(p, 'price_buy', 0) or 0)
+        price_sell = float(getattr(p, 'price', 0) or 0)
+        subtotal_buy = price_buy * stock
+        subtotal_sell = price_sell * stock
+        cat = getattr(p, 'category', None)
+        if cat:
+            cat_id = cat.id
+            cat_name = getattr(cat, 'nombre', None) or str(cat)
+        else:
+            cat_id = 'sin-categoria'
+            cat_name = 'Sin categoría'
+        item = {
+            'product_id': p.id,
+            'product_name': p.name,
+            'stock': stock,
+            'price_buy': price_buy,
+            'price': price_sell,
+            'subtotal_buy': subtotal_buy,
+            'subtotal_sell': subtotal_sell,
+            'category_id': cat_id,
+            'category_name': cat_name,
+        }
+        items.append(item)
+        grp = by_cat.setdefault(cat_id, {
+            'category_id': cat_id,
+            'category_name': cat_name,
+            'items': [],
+            'valor_invertido': 0.0,
+            'valor_productos': 0.0,
+            'cantidad_stock': 0
+        })
+        grp['items'].append(item)
+        grp['valor_invertido'] += subtotal_buy
+        grp['valor_productos'] += subtotal_sell
+        grp['cantidad_stock'] += stock
+        total_invertido += subtotal_buy
+        total_productos += subtotal_sell
+        total_cantidad += stock
+    resumen = {
+        'valor_invertido': total_invertido,
+        'valor_productos': total_productos,
+        'margen_ganancia': total_productos - total_invertido,
+        'cantidad_productos_stock': total_cantidad,
+    }
+    inventario_by_category_list = sorted(by_cat.values(), key=lambda x: x['category_name'])
+    return resumen, items, inventario_by_category_list
+
+
+@tab_section('inventario')
+def inventory_section(params, metricas) -> Dict:
+    selected_category = params.get('inventory_category')
+    try:
+        selected_category = int(selected_category) if selected_category not in (None, '', 'None') else None
+    except (ValueError, TypeError):
+        selected_category = None
+
+    qs = ProductStore.objects.select_related('category').only(
+        'id', 'name', 'stock', 'price', 'price_buy', 'category__id', 'category__nombre'
+    )
+    if selected_category:
+        qs = qs.filter(category_id=selected_category)
+
+    resumen_inventario, inventario_items, inventario_by_category = _calcular_inventario(qs)
+    return {
+        'inventario_all': [resumen_inventario] + inventario_items,
+        'inventario_by_category': inventario_by_category,
+        'resumen_inventario': resumen_inventario,
+        'selected_category': selected_category,
+    }
+
+
+# ---------------------------------------------------------------------------
+# Usuarios y bonos
+# ---------------------------------------------------------------------------
+
+@tab_section('usuarios')
+def users_section(params, metricas) -> Dict:
+    # Lista combinada de SimpleUser y register_superuser con información de tipo
+    all_users = []
+
+    for user in SimpleUser.objects.all():
+        all_users.append({
+            'id': user.id,
+            'name': user.name,
+            'email': user.email,
+            'phone': getattr(user, 'telefono', ''),
+            'address': getattr(user, 'address', ''),
+            'city': getattr(user, 'city', ''),
+            'date_joined': getattr(user, 'created_at', 'N/A'),
+            'username': getattr(user, 'username', ''),
+            'is_admin': False,
+            'user_type': 'simple',
+            'model_type': 'SimpleUser'
+        })
+
+    for user in register_superuser.objects.all():
+        all_users.append({
+            'id': user.id,
+            'name': getattr(user, 'username', ''),  # register_superuser usa username como name
+            'email': user.email,
+            'phone': getattr(user, 'phone', ''),
+            'address': getattr(user, 'address', ''),
+            'city': getattr(user, 'city', ''),
+            'date_joined': user.created_at,
+            'username': user.username,
+            'is_admin': True,
+            'user_type': 'admin',
+            'model_type': 'register_superuser'
+        })
+
+    return {'usuarios': all_users}
+
+
+@tab_section('bonos')
+def bonos_section(params, metricas) -> Dict:
+    return {'bonos': BonoDescuento.objects.all().order_by('-fecha_creacion')}
+
+
+# ---------------------------------------------------------------------------
+# Pedidos y ventas
+# ---------------------------------------------------------------------------
+
+@tab_section('pedidos')
+def orders_section(params, metricas) -> Dict:
+    pedidos = Pedido.objects.select_related('user').all().order_by('-fecha')
+
+    estado_filter = params.get('estado_filter', '')
+    metodo_filter = params.get('metodo_filter', '')
+    search_pedidos = params.get('search', '')
+
+    if estado_filter:
+        pedidos = pedidos.filter(estado=estado_filter)
+    if metodo_filter:
+        pedidos = pedidos.filter(metodo_pago=metodo_filter)
+    if search_pedidos:
+        pedidos = pedidos.filter(
+            Q(nombre__icontains=search_pedidos) |
+            Q(user__email__icontains=search_pedidos) |
+            Q(id__icontains=search_pedidos) |
+            Q(transaction_id__icontains=search_pedidos)
+        )
+
+    # Total y contadores por estado en una sola consulta
+    conteos = pedidos.order_by().aggregate(
+        total=Count('pk'),
+        pendientes=Count('pk', filter=Q(estado='pendiente')),
+        enviados=Count('pk', filter=Q(estado__in=['enviado', 'llegando'])),
+        entregados=Count('pk', filter=Q(estado='entregado')),
+    )
+    return {
+        'pedidos': pedidos,
+        'pedidos_count': conteos['total'],
+        'pedidos_pendientes_count': conteos['pendientes'],
+        'pedidos_enviados_count': conteos['enviados'],
+        'pedidos_entregados_count': conteos['entregados'],
+    }
+
+
+def _build_sales_by_category() -> Dict:
+    """
+    Ventas (pedidos no cancelados) por categoría desde los resúmenes diarios
+    (core.services.sales_summary) más los 5 productos más vendidos de cada una
+    """
+    ventas_por_categoria, estadisticas = get_sales_by_period('all')
+    top_products = get_top_products_by_category(limit=5)
+
+    for categoria_data in ventas_por_categoria:
+        top = top_products.get(categoria_data['nombre'], {})
+        categoria_data['productos_vendidos'] = top.get('productos', [])
+        categoria_data['productos_distintos'] = top.get('productos_distintos', 0)
+
+    return {
+        'ventas_por_categoria': ventas_por_categoria,
+        'total_ventas_general': estadisticas['total_ventas'],
+        'productos_vendidos': estadisticas['total_productos'],
+    }
+
+
+@tab_section('ventas', 'proveedores')
+def sales_section(params, metricas) -> Dict:
+    """Inicio y pestaña de ventas; el agrupado se cachea hasta que cambie un pedido"""
+    ventas = CacheService.get_or_set(TABS_NAMESPACE, 'ventas_por_categoria',
+                                     builder=_build_sales_by_category, timeout=TAB_CACHE_TTL)
+    ventas_por_categoria = ventas['ventas_por_categoria']
+    total_ventas_general = ventas['total_ventas_general']
+
+    # EXCLUYE PEDIDOS CANCELADOS
+    pedidos_totales = metricas['pedidos']['activos']
+    promedio_por_pedido = total_ventas_general / pedidos_totales if pedidos_totales > 0 else 0
+
+    categoria_mas_vendida = None
+    categoria_mayor_ingresos = None
+    if ventas_por_categoria:
+        categoria_mas_vendida = max(ventas_por_categoria, key=lambda x: x['cantidad_productos'])
+        categoria_mayor_ingresos = ventas_por_categoria[0]  # Ya está ordenada por ingresos
+
+    return {
+        'ventas_por_categoria': ventas_por_categoria,
+        'total_ventas_general': total_ventas_general,
+        'estadisticas_ventas': {
+            'pedidos_totales': pedidos_totales,
+            'productos_vendidos': ventas['productos_vendidos'],
+            'promedio_por_pedido': round(promedio_por_pedido, 2),
+            'categoria_mas_vendida': categoria_mas_vendida,
+            'categoria_mayor_ingresos': categoria_mayor_ingresos,
+        },
+    }
+
+
+# ---------------------------------------------------------------------------
+# Visitas
+# ---------------------------------------------------------------------------
+
+@tab_section('visitas')
+def visits_section(params, metricas) -> Dict:
+    visitas_filter = params.get('visitas_filter', 'all')
+    visitas_user_filter = params.get('visitas_user', 'all')
+    visitas_type_filter = params.get('visitas_type', 'all')
+    period_starts = get_period_starts()
+
+    visitas_qs = StoreVisit.objects.all()
+    if visitas_filter in ('today', 'week', 'month'):
+        visitas_qs = visitas_qs.filter(timestamp__gte=period_starts[visitas_filter])
+
+    if visitas_user_filter == 'auth':
+        visitas_qs = visitas_qs.exclude(user=None)
+    elif visitas_user_filter == 'anon':
+        visitas_qs = visitas_qs.filter(user=None)
+
+    if visitas_type_filter in ('home', 'store', 'product_detail', 'cart', 'checkout'):
+        visitas_qs = visitas_qs.filter(visit_type=visitas_type_filter)
+
+    # Todos los contadores salen de los buckets pre-agregados en una sola consulta
+    counters = get_visit_counters(visitas_filter, visitas_user_filter, visitas_type_filter)
+
+    # Visitas filtradas (sin paginación, la tabla usa scroll) con usuario y
+    # producto en la misma consulta
+    visitas_recientes = with_visit_products(visitas_qs).order_by('-timestamp')[:1000]
+
+    return {
+        'visitas_recientes': visitas_recientes,
+        'visitas_count': counters['filtered'],
+        'visitas_count_today': counters['today'],
+        'visitas_count_week': counters['week'],
+        'visitas_count_month': counters['month'],
+        'visitas_count_auth': counters['auth'],
+        'visitas_count_anon': counters['anon'],
+        'visitas_count_total': counters['total'],
+        'visitas_count_home': counters['home'],
+        'visitas_count_store': counters['store'],
+        'visitas_count_product': counters['product_detail'],
+        'visitas_count_cart': counters['cart'],
+        'visitas_count_checkout': counters['checkout'],
+    }
+
+
+@tab_section('visitas')
+def top_visited_section(params, metricas) -> Dict:
+    productos_stats = hydrate_products(
+        get_top_visited_products(params.get('periodo_productos', 'all')),
+        ProductStore.objects.select_related('category'),
+    )
+    # Los productos eliminados no se listan
+    productos_mas_visitados = [item for item in productos_stats if item['product']]
+
+    return {
+        'productos_mas_visitados': productos_mas_visitados,
+        'productos_visitados_page': _paginate(productos_mas_visitados, 12, params.get('productos_page', 1)),
+    }
+
+
+# ---------------------------------------------------------------------------
+# Mensajes y notificaciones de stock
+# ---------------------------------------------------------------------------
+
+@tab_section('mensajes')
+def conversations_section(params, metricas) -> Dict:
+    conversations_queryset = Conversation.objects.select_related('user').prefetch_related(
+        'messages__user',
+        'messages__admin_user'
+    ).order_by('-created_at')
+
+    conteos = Conversation.objects.aggregate(
+        total=Count('pk'),
+        pendientes=Count('pk', filter=Q(status='open')),
+        activas=Count('pk', filter=Q(status='in_progress')),
+    )
+    today_messages = ConversationMessage.objects.filter(created_at__date=datetime.now().date()).count()
+
+    return {
+        'conversations': _paginate(conversations_queryset, 10, params.get('page', 1)),
+        'conversations_stats': {
+            'total_conversations': conteos['total'],
+            'pending_conversations': conteos['pendientes'],
+            'today_messages': today_messages,
+            'active_conversations': conteos['activas'],
+        },
+    }
+
+
+@tab_section('notificaciones_stock')
+def stock_notifications_section(params, metricas) -> Dict:
+    notifications = StockNotification.objects.select_related('product', 'user').order_by('-created_at')
+
+    status_filter = params.get('status_filter', '')
+    notification_type_filter = params.get('type_filter', '')
+    if status_filter:
+        notifications = notifications.filter(status=status_filter)
+    if notification_type_filter:
+        notifications = notifications.filter(notification_type=notification_type_filter)
+
+    page = _paginate(notifications, 20, params.get('page', 1))
+
+    stats = StockNotification.objects.aggregate(
+        total=Count('pk'),
+        pending=Count('pk', filter=Q(status='pending')),
+        sent=Count('pk', filter=Q(status='sent')),
+        today=Count('pk', filter=Q(created_at__date=datetime.now().date())),
+    )
+    return {
+        'stock_notifications': page.object_list,
+        'stock_notifications_page': page,
+        'stock_notifications_stats': stats,
+    }
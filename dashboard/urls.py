@@ -119,11 +119,16 @@ urlpatterns = [
     
     # URLs para auto-actualización de estadísticas del home
     path('api/dashboard-stats/', views.dashboard_stats, name='dashboard_stats'),
+    path('api/tab/<str:tab>/', views.dashboard_tab_data, name='dashboard_tab_data'),
     
     # URLs para visitas en tiempo real
     path('api/visitas-live/', views.visitas_live_data, name='visitas_live_data'),
     path('api/productos-mas-visitados/', views.productos_mas_visitados, name='productos_mas_visitados'),
     path('api/ventas-por-periodo/', views.ventas_por_periodo, name='ventas_por_periodo'),
+    path('profiling/', views.profiling_stats, name='profiling_stats'),
+
+    # Exportaciones CSV/XLSX por streaming
+    path('exportar/<str:dataset>/<str:formato>/', views.exportar_datos, name='exportar_datos'),
 
     # Nuevas URLs para gestión de usuarios
     path('usuario/editar/', edit_user, name='edit_user'),
@@ -33,12 +33,20 @@ def wompi_config_view(request):
     return render(request, 'dashboard/wompi_config.html', {'config': config})
 from django.contrib.auth.decorators import login_required, permission_required
 from core.models import ProductStore, Pedido, SimpleUser, Category, Type, proveedor, Galeria, ProductVariant, PedidoDetalle, BonoDescuento, Conversation, ConversationMessage, StockNotification
+from core.services.dashboard_metrics import TABS_NAMESPACE, get_metrics
+from core.services.exports import CONTENT_TYPES, EXPORT_DATASETS, export_filename, parse_export_range, stream_export
+from core.services.sales_summary import get_sales_by_period
+from core.services.visit_products import hydrate_products, with_visit_products
+from core.services.visit_rollups import get_period_starts, get_top_visited_products, get_visit_counters
 from django.contrib.auth.models import User
 from dashboard.models import register_superuser
+from dashboard.tabs import TAB_CACHE_TTL, TAB_SECTIONS, build_tab_context, build_tab_data, serialize_tab_data
+from shared.services import CacheService
 from django.db.models.signals import post_delete
 from django.dispatch import receiver
 from django.views.decorators.csrf import csrf_exempt
-from django.http import JsonResponse
+from django.views.decorators.cache import cache_control
+from django.http import JsonResponse, StreamingHttpResponse
 from django.db.models import Sum, Count, Q, F
 from datetime import datetime, timedelta
 from django.utils import timezone
@@ -63,9 +71,6 @@ def superuser_required(view_func):
 
 @superuser_required
 def dashboard_home(request):
-    from core.models import StoreVisit
-    Pedidos = [];
-    categorias = [];
     crear_producto_url = f"{reverse('dashboard_home')}?view=productos"
     
     # Obtener información del usuario autenticado
@@ -209,245 +214,10 @@ def dashboard_home(request):
                 messages.error(request, f'Error al actualizar el perfil: {str(e)}')
                 return redirect(f"{reverse('dashboard_home')}?view=mi_perfil")
 
-    # Obtener filtros para productos
-    categoria_filter = request.GET.get('categoria_filter', '')
-    search_query = request.GET.get('search', '')
-    page_number = request.GET.get('page', 1)
-
-    # Base queryset para productos
-    productos_queryset = ProductStore.objects.select_related('category', 'proveedor', 'type').all().order_by('-id')
-
-    # Aplicar filtros
-    if categoria_filter:
-        try:
-            categoria_filter_id = int(categoria_filter)
-            productos_queryset = productos_queryset.filter(category_id=categoria_filter_id)
-        except (ValueError, TypeError):
-            pass
-
-    if search_query:
-        productos_queryset = productos_queryset.filter(
-            Q(name__icontains=search_query) |
-            Q(description__icontains=search_query)
-        )
-
-    # Paginación para productos
-    productos_paginator = Paginator(productos_queryset, 10)  # 10 productos por página
-    try:
-        productos_page = productos_paginator.page(page_number)
-    except PageNotAnInteger:
-        productos_page = productos_paginator.page(1)
-    except EmptyPage:
-        productos_page = productos_paginator.page(productos_paginator.num_pages)
-
-    # Para compatibilidad con el código existente
-    productos = productos_page.object_list
-
-    # Estadísticas de inventario (sobre todos los productos, no solo la página actual)
-    from django.db.models import Sum
-    inventario_stats = productos_queryset.aggregate(
-        total_valor=Sum('price'),
-        total_stock=Sum('stock')
-    )
-    total_valor_inventario = inventario_stats['total_valor'] or 0
-    total_stock_inventario = inventario_stats['total_stock'] or 0
-
-    categorias = Category.objects.all()
-    tipos = Type.objects.all()
-    proveedores = proveedor.objects.all()
-
-    # Obtener todos los usuarios: SimpleUser y register_superuser combinados
-    simple_users = SimpleUser.objects.all()
-    admin_users = register_superuser.objects.all()
-
-    # Crear una lista combinada de usuarios con información de tipo
-    all_users = []
-
-    # Agregar usuarios simples
-    for user in simple_users:
-        all_users.append({
-            'id': user.id,
-            'name': user.name,
-            'email': user.email,
-            'phone': getattr(user, 'telefono', ''),  # Corregido: telefono en lugar de phone
-            'address': getattr(user, 'address', ''),
-            'city': getattr(user, 'city', ''),
-            'date_joined': getattr(user, 'created_at', 'N/A'),
-            'username': getattr(user, 'username', ''),
-            'is_admin': False,
-            'user_type': 'simple',
-            'model_type': 'SimpleUser'
-        })
-
-    # Agregar usuarios administradores
-    for user in admin_users:
-        all_users.append({
-            'id': user.id,
-            'name': getattr(user, 'username', ''),  # register_superuser usa username como name
-            'email': user.email,
-            'phone': getattr(user, 'phone', ''),
-            'address': getattr(user, 'address', ''),
-            'city': getattr(user, 'city', ''),
-            'date_joined': getattr(user, 'created_at', user.created_at),
-            'username': user.username,
-            'is_admin': True,
-            'user_type': 'admin',
-            'model_type': 'register_superuser'
-        })
-
-    userSimples = all_users  # Mantenemos el nombre para compatibilidad
-    bonos = BonoDescuento.objects.all().order_by('-fecha_creacion')
-
-    # Obtener pedidos con filtros
-    pedidos_queryset = Pedido.objects.select_related('user').all().order_by('-fecha')
-
-    # VISITAS RECIENTES Y RESUMEN
-    visitas_recientes = StoreVisit.objects.select_related('user').order_by('-timestamp')[:20]
-
-    # Filtros de visitas
-    visitas_filter = request.GET.get('visitas_filter', 'all')
-    visitas_user_filter = request.GET.get('visitas_user', 'all')
-    visitas_type_filter = request.GET.get('visitas_type', 'all')
-    now = datetime.now()
-    today_start = now.replace(hour=0, minute=0, second=0, microsecond=0)
-    week_start = today_start - timedelta(days=today_start.weekday())
-    month_start = today_start.replace(day=1)
-
-    visitas_qs = StoreVisit.objects.all()
-    if visitas_filter == 'today':
-        visitas_qs = visitas_qs.filter(timestamp__gte=today_start)
-    elif visitas_filter == 'week':
-        visitas_qs = visitas_qs.filter(timestamp__gte=week_start)
-    elif visitas_filter == 'month':
-        visitas_qs = visitas_qs.filter(timestamp__gte=month_start)
-
-    if visitas_user_filter == 'auth':
-        visitas_qs = visitas_qs.exclude(user=None)
-    elif visitas_user_filter == 'anon':
-        visitas_qs = visitas_qs.filter(user=None)
-    
-    if visitas_type_filter == 'home':
-        visitas_qs = visitas_qs.filter(visit_type='home')
-    elif visitas_type_filter == 'store':
-        visitas_qs = visitas_qs.filter(visit_type='store')
-    elif visitas_type_filter == 'product_detail':
-        visitas_qs = visitas_qs.filter(visit_type='product_detail')
-    elif visitas_type_filter == 'cart':
-        visitas_qs = visitas_qs.filter(visit_type='cart')
-    elif visitas_type_filter == 'checkout':
-        visitas_qs = visitas_qs.filter(visit_type='checkout')
-
-    visitas_count = visitas_qs.count()
-    visitas_count_today = StoreVisit.objects.filter(timestamp__gte=today_start).count()
-    visitas_count_week = StoreVisit.objects.filter(timestamp__gte=week_start).count()
-    visitas_count_month = StoreVisit.objects.filter(timestamp__gte=month_start).count()
-    visitas_count_auth = StoreVisit.objects.exclude(user=None).count()
-    visitas_count_anon = StoreVisit.objects.filter(user=None).count()
-    visitas_count_total = StoreVisit.objects.count()
-    visitas_count_home = StoreVisit.objects.filter(visit_type='home').count()
-    visitas_count_store = StoreVisit.objects.filter(visit_type='store').count()
-    visitas_count_product = StoreVisit.objects.filter(visit_type='product_detail').count()
-    visitas_count_cart = StoreVisit.objects.filter(visit_type='cart').count()
-    visitas_count_checkout = StoreVisit.objects.filter(visit_type='checkout').count()
-    
-    # Obtener todas las visitas filtradas (sin paginación, usar scroll)
-    # Incluir producto para mostrar el nombre cuando visit_type='product_detail'
-    visitas_recientes = visitas_qs.select_related('user').order_by('-timestamp')[:1000]  # Mostrar hasta 1000 visitas con scroll
-    
-    # Agregar información del producto a cada visita
-    for visita in visitas_recientes:
-        if visita.visit_type == 'product_detail' and visita.product_id:
-            try:
-                visita.product = ProductStore.objects.get(id=visita.product_id)
-            except ProductStore.DoesNotExist:
-                visita.product = None
-        else:
-            visita.product = None
-    
-    # ESTADÍSTICAS DE PRODUCTOS MÁS VISITADOS
-    from django.db.models import Count
-    productos_mas_visitados = []
-    productos_visitados_page = None
-    if view_param == 'visitas':
-        periodo_productos = request.GET.get('periodo_productos', 'all')
-        visitas_productos_qs = StoreVisit.objects.filter(
-            visit_type='product_detail',
-            product_id__isnull=False
-        )
-        
-        if periodo_productos == 'today':
-            visitas_productos_qs = visitas_productos_qs.filter(timestamp__gte=today_start)
-        elif periodo_productos == 'week':
-            visitas_productos_qs = visitas_productos_qs.filter(timestamp__gte=week_start)
-        elif periodo_productos == 'month':
-            visitas_productos_qs = visitas_productos_qs.filter(timestamp__gte=month_start)
-        
-        productos_stats = visitas_productos_qs.values('product_id').annotate(
-            total_visitas=Count('id')
-        ).order_by('-total_visitas')
-        
-        # Construir lista completa de productos visitados
-        for item in productos_stats:
-            try:
-                product = ProductStore.objects.get(id=item['product_id'])
-                productos_mas_visitados.append({
-                    'product': product,
-                    'total_visitas': item['total_visitas']
-                })
-            except ProductStore.DoesNotExist:
-                pass
-        
-        # Aplicar paginación a productos visitados
-        productos_page_num = request.GET.get('productos_page', 1)
-        productos_paginator = Paginator(productos_mas_visitados, 12)  # 12 productos por página
-        try:
-            productos_visitados_page = productos_paginator.page(productos_page_num)
-        except PageNotAnInteger:
-            productos_visitados_page = productos_paginator.page(1)
-        except EmptyPage:
-            productos_visitados_page = productos_paginator.page(productos_paginator.num_pages)
-    
-    # Aplicar filtros para pedidos
-    if view_param == 'pedidos':
-        estado_filter = request.GET.get('estado_filter', '')
-        metodo_filter = request.GET.get('metodo_filter', '')
-        search_pedidos = request.GET.get('search', '')
-        
-        if estado_filter:
-            pedidos_queryset = pedidos_queryset.filter(estado=estado_filter)
-        if metodo_filter:
-            pedidos_queryset = pedidos_queryset.filter(metodo_pago=metodo_filter)
-        if search_pedidos:
-            pedidos_queryset = pedidos_queryset.filter(
-                Q(nombre__icontains=search_pedidos) |
-                Q(user__email__icontains=search_pedidos) |
-                Q(id__icontains=search_pedidos) |
-                Q(transaction_id__icontains=search_pedidos)
-            )
-    
-    Pedidos = pedidos_queryset
-    
-    # Estadísticas de pedidos
-    pedidos_pendientes_count = Pedidos.filter(estado='pendiente').count() if view_param == 'pedidos' else 0
-    pedidos_enviados_count = Pedidos.filter(estado__in=['enviado', 'llegando']).count() if view_param == 'pedidos' else 0
-    pedidos_entregados_count = Pedidos.filter(estado='entregado').count() if view_param == 'pedidos' else 0
-    show_create_product_form = request.GET.get('view') == 'productos' and request.GET.get('crear') == '1'
+    show_create_product_form = view_param == 'productos' and request.GET.get('crear') == '1'
     editar_id = request.GET.get('editar')
-    show_edit_product_form = request.GET.get('view') == 'productos' and bool(editar_id)
+    show_edit_product_form = view_param == 'productos' and bool(editar_id)
     producto_to_edit = None
-    
-    # Variables para análisis de ventas
-    ventas_por_categoria = []
-    total_ventas_general = 0
-    estadisticas_ventas = {
-        'pedidos_totales': 0,
-        'productos_vendidos': 0,
-        'promedio_por_pedido': 0,
-        'categoria_mas_vendida': None,
-        'categoria_mayor_ingresos': None,
-    }
-    
-   
     if editar_id:
         # Obtener producto con todas sus relaciones (galería y variantes)
         producto_to_edit = ProductStore.objects.prefetch_related(
@@ -455,101 +225,6 @@ def dashboard_home(request):
             'variants'
         ).filter(id=editar_id).first()
 
-        inventario_all = []
-        inventario_by_category = []
-        resumen_inventario = {
-         'valor_invertido': 0,
-         'valor_productos': 0,
-         'margen_ganancia': 0,
-         'cantidad_productos_stock': 0,
-     }
-      # Inicializar variables usadas en el contexto para evitar UnboundLocalError
-   
-    message = ''
-    inventario_all = []
-    inventario_by_category = []
-    resumen_inventario = {
-        'valor_invertido': 0,
-        'valor_productos': 0,
-        'margen_ganancia': 0,
-        'cantidad_productos_stock': 0,
-    }
-
-    def _calcular_inventario(queryset):
-        items = []
-        by_cat = {}
-        total_invertido = 0.0
-        total_productos = 0.0
-        total_cantidad = 0
-        for p in queryset:
-            stock = int(getattr(p, 'stock', 0) or 0)
-            price_buy = float(getattr(p, 'price_buy', 0) or 0)
-            price_sell = float(getattr(p, 'price', 0) or 0)
-            subtotal_buy = price_buy * stock
-            subtotal_sell = price_sell * stock
-            cat = getattr(p, 'category', None) or getattr(p, 'categoria', None)
-            if cat:
-                cat_id = getattr(cat, 'id', 'sin-categoria')
-                cat_name = getattr(cat, 'nombre', None) or getattr(cat, 'name', None) or str(cat)
-            else:
-                cat_id = 'sin-categoria'
-                cat_name = 'Sin categoría'
-            item = {
-                'product_id': p.id,
-                'product_name': getattr(p, 'name', None) or getattr(p, 'nombre', ''),
-                'stock': stock,
-                'price_buy': price_buy,
-                'price': price_sell,
-                'subtotal_buy': subtotal_buy,
-                'subtotal_sell': subtotal_sell,
-                'category_id': cat_id,
-                'category_name': cat_name,
-            }
-            items.append(item)
-            grp = by_cat.setdefault(cat_id, {
-                'category_id': cat_id,
-                'category_name': cat_name,
-                'items': [],
-                'valor_invertido': 0.0,
-                'valor_productos': 0.0,
-                'cantidad_stock': 0
-            })
-            grp['items'].append(item)
-            grp['valor_invertido'] += subtotal_buy
-            grp['valor_productos'] += subtotal_sell
-            grp['cantidad_stock'] += stock
-            total_invertido += subtotal_buy
-            total_productos += subtotal_sell
-            total_cantidad += stock
-        resumen = {
-            'valor_invertido': total_invertido,
-            'valor_productos': total_productos,
-            'margen_ganancia': total_productos - total_invertido,
-            'cantidad_productos_stock': total_cantidad,
-        }
-        inventario_by_category_list = sorted(by_cat.values(), key=lambda x: x['category_name'])
-        return resumen, items, inventario_by_category_list
-
-    # si hay filtro GET (inventory_category) o si el view es 'inventario' calculamos para GET
-    selected_category = request.GET.get('inventory_category')
-    try:
-        selected_category = int(selected_category) if selected_category not in (None, '', 'None') else None
-    except Exception:
-        selected_category = None
-     
-    if request.method != 'POST':
-        qs = ProductStore.objects.all()
-        if selected_category:
-            qs = ProductStore.objects.filter(category_id=selected_category) if ProductStore.objects.filter(category_id=selected_category).exists() else ProductStore.objects.filter(categoria_id=selected_category)
-        try:
-            resumen_inventario, inventario_items, inventario_by_category = _calcular_inventario(qs)
-            inventario_all = [resumen_inventario] + inventario_items
-        except Exception:
-            inventario_all = []
-            inventario_by_category = []
-            resumen_inventario = resumen_inventario  # mantiene valores iniciales
-
-
     # POST: crear o actualizar según product_id
     if request.method == 'POST' and (show_create_product_form or show_edit_product_form):
         # recoger campos
@@ -565,22 +240,6 @@ def dashboard_home(request):
 
 
         
-        productos_all = ProductStore.objects.all()
-        total_productos_stock = sum(p.stock for p in productos_all)
-        productos_comprados = sum(p.price_buy * p.stock for p in productos_all)
-        valor_productos = sum(p.price * p.stock for p in productos_all)
-        margen_ganancia = valor_productos - productos_comprados
-        inventario_all = []
-        inventario_by_category = []
-        inventario_all.append({
-            'nombre': 'Todos los productos',
-            'valor_invertido': productos_comprados,
-            'valor_productos': valor_productos,
-            'margen_ganancia': margen_ganancia,
-            'cantidad_productos_stock': total_productos_stock,
-        })      
-        
-
         # Proveedor / Categoria / Tipo (opcional)
         proveedor_id = request.POST.get('proveedor')
         proveedor_obj = None
@@ -941,272 +600,46 @@ def dashboard_home(request):
                 messages.error(request, f'Error al eliminar bono: {str(e)}')
                 return redirect(f"{reverse('dashboard_home')}?view=bonos")
 
-    # Calcular estadísticas de ventas por categorías (siempre, para usar en home)
-    view_param = request.GET.get('view', 'ventas')  # 'ventas' por defecto
-    
-    # Obtener todas las ventas (pedidos confirmados) - EXCLUIR CANCELADOS
-    ventas_detalles = PedidoDetalle.objects.select_related(
-        'producto', 'producto__category', 'pedido'
-    ).exclude(
-        pedido__estado='cancelado'
-    ).all()
-    
-    # Calcular ventas por categoría
-    ventas_por_categoria_dict = {}
-    total_ventas_general = 0
-    total_productos_vendidos = 0
-    
-    for detalle in ventas_detalles:
-        categoria = detalle.producto.category
-        categoria_nombre = categoria.nombre if categoria else 'Sin Categoría'
-        precio_total = float(detalle.precio) * int(detalle.cantidad)
-        
-        if categoria_nombre not in ventas_por_categoria_dict:
-            ventas_por_categoria_dict[categoria_nombre] = {
-                'nombre': categoria_nombre,
-                'total_ingresos': 0,
-                'cantidad_productos': 0,
-                'cantidad_pedidos': 0,
-                'productos_vendidos': [],
-                'pedidos_ids': set(),
-            }
-        
-        ventas_por_categoria_dict[categoria_nombre]['total_ingresos'] += precio_total
-        ventas_por_categoria_dict[categoria_nombre]['cantidad_productos'] += int(detalle.cantidad)
-        ventas_por_categoria_dict[categoria_nombre]['pedidos_ids'].add(detalle.pedido.id)
-        
-        # Agregar producto vendido si no está ya en la lista
-        producto_info = {
-            'nombre': detalle.producto.name,
-            'cantidad': int(detalle.cantidad),
-            'precio_unitario': float(detalle.precio),
-            'total': precio_total
-        }
-        ventas_por_categoria_dict[categoria_nombre]['productos_vendidos'].append(producto_info)
-        
-        total_ventas_general += precio_total
-        total_productos_vendidos += int(detalle.cantidad)
-    
-    # Convertir a lista y agregar cantidad de pedidos
-    ventas_por_categoria = []
-    for categoria_data in ventas_por_categoria_dict.values():
-        categoria_data['cantidad_pedidos'] = len(categoria_data['pedidos_ids'])
-        del categoria_data['pedidos_ids']  # Remover el set que no es serializable
-        ventas_por_categoria.append(categoria_data)
-    
-    # Ordenar por total de ingresos descendente
-    ventas_por_categoria.sort(key=lambda x: x['total_ingresos'], reverse=True)
-    
-    # Calcular estadísticas generales - EXCLUIR PEDIDOS CANCELADOS
-    pedidos_totales = Pedido.objects.exclude(estado='cancelado').count()
-    promedio_por_pedido = total_ventas_general / pedidos_totales if pedidos_totales > 0 else 0
-    
-    categoria_mas_vendida = None
-    categoria_mayor_ingresos = None
-    
-    if ventas_por_categoria:
-        # Categoría con más productos vendidos
-        categoria_mas_vendida = max(ventas_por_categoria, key=lambda x: x['cantidad_productos'])
-        # Categoría con mayores ingresos
-        categoria_mayor_ingresos = ventas_por_categoria[0]  # Ya está ordenada por ingresos
-    
-    # Calcular estadísticas diarias
-
-    from django.utils import timezone
-    
-    hoy = timezone.now().date()
-    inicio_dia = datetime.combine(hoy, datetime.min.time())
-    if timezone.is_aware(timezone.now()):
-        inicio_dia = timezone.make_aware(inicio_dia)
-    
-    pedidos_hoy = Pedido.objects.filter(fecha__gte=inicio_dia).exclude(estado='cancelado')
-    pedidos_diarios = pedidos_hoy.count()
-    
-    ventas_diarias = pedidos_hoy.filter(
-        Q(estado_pago='completado') | Q(estado='entregado')
-    ).aggregate(total=Sum('total'))['total'] or 0
-    
-    productos_vendidos_hoy = PedidoDetalle.objects.filter(
-        pedido__fecha__gte=inicio_dia,
-        pedido__estado__in=['pendiente', 'confirmado', 'enviado', 'llegando', 'entregado']
-    ).aggregate(total=Sum('cantidad'))['total'] or 0
-    
-    estadisticas_ventas = {
-        'pedidos_totales': pedidos_totales,
-        'productos_vendidos': total_productos_vendidos,
-        'promedio_por_pedido': round(promedio_por_pedido, 2),
-        'categoria_mas_vendida': categoria_mas_vendida,
-        'categoria_mayor_ingresos': categoria_mayor_ingresos,
-    }
-    
+    # Indicadores del inicio y del menú (core.services.dashboard_metrics): una
+    # consulta por modelo, cacheados unos segundos
+    metricas = get_metrics()
     estadisticas_diarias = {
-        'pedidos_hoy': pedidos_diarios,
-        'ventas_hoy': float(ventas_diarias),
-        'productos_vendidos_hoy': productos_vendidos_hoy,
+        'pedidos_hoy': metricas['diarias']['pedidos_hoy'],
+        'ventas_hoy': metricas['diarias']['ventas_hoy'],
+        'productos_vendidos_hoy': metricas['diarias']['productos_vendidos_hoy'],
     }
-    
 
+    # Solo se arman los datos de la pestaña pedida (dashboard.tabs)
+    context = build_tab_context(view_param, request.GET, metricas)
+    pedidos_count = context['pedidos_count'] if view_param == 'pedidos' else metricas['pedidos']['total']
 
-    # Datos para la sección de mensajes
-    conversations = []
-    conversations_stats = {
-        'total_conversations': 0,
-        'pending_conversations': 0,
-        'today_messages': 0,
-        'active_conversations': 0,
-    }
-    
-    if view_param == 'mensajes':
-        # Obtener conversaciones con paginación
-        conversations_queryset = Conversation.objects.select_related('user').prefetch_related(
-            'messages__user',
-            'messages__admin_user'
-        ).order_by('-created_at')
-        
-        # Paginación de conversaciones
-        conversations_paginator = Paginator(conversations_queryset, 10)  # 10 conversaciones por página
-        conversations_page_number = request.GET.get('page', 1)
-        
-        try:
-            conversations = conversations_paginator.page(conversations_page_number)
-        except PageNotAnInteger:
-            conversations = conversations_paginator.page(1)
-        except EmptyPage:
-            conversations = conversations_paginator.page(conversations_paginator.num_pages)
-        
-        # Calcular estadísticas
-        total_conversations = Conversation.objects.count()
-        pending_conversations = Conversation.objects.filter(status='open').count()
-        active_conversations = Conversation.objects.filter(status='in_progress').count()
-        
-        # Mensajes de hoy
-        today = datetime.now().date()
-        today_messages = ConversationMessage.objects.filter(
-            created_at__date=today
-        ).count()
-        
-        conversations_stats = {
-            'total_conversations': total_conversations,
-            'pending_conversations': pending_conversations,
-            'today_messages': today_messages,
-            'active_conversations': active_conversations,
-        }
-    
-    # Vista de Notificaciones de Stock
-    stock_notifications = []
+    # Pendientes para el badge del menú (la pestaña de notificaciones ya trae sus estadísticas)
     stock_notifications_count = 0
-    stock_notifications_stats = {}
-    
-    if view_param == 'notificaciones_stock':
-        # Obtener notificaciones con paginación
-        stock_notifications_queryset = StockNotification.objects.select_related(
-            'product', 'user'
-        ).order_by('-created_at')
-        
-        # Filtros
-        status_filter = request.GET.get('status_filter', '')
-        notification_type_filter = request.GET.get('type_filter', '')
-        
-        if status_filter:
-            stock_notifications_queryset = stock_notifications_queryset.filter(status=status_filter)
-        
-        if notification_type_filter:
-            stock_notifications_queryset = stock_notifications_queryset.filter(notification_type=notification_type_filter)
-        
-        # Paginación
-        stock_notifications_paginator = Paginator(stock_notifications_queryset, 20)
-        stock_notifications_page_number = request.GET.get('page', 1)
-        
-        try:
-            stock_notifications_page = stock_notifications_paginator.page(stock_notifications_page_number)
-        except PageNotAnInteger:
-            stock_notifications_page = stock_notifications_paginator.page(1)
-        except EmptyPage:
-            stock_notifications_page = stock_notifications_paginator.page(stock_notifications_paginator.num_pages)
-        
-        stock_notifications = stock_notifications_page.object_list
-        
-        # Estadísticas
-        total_notifications = StockNotification.objects.count()
-        pending_notifications = StockNotification.objects.filter(status='pending').count()
-        sent_notifications = StockNotification.objects.filter(status='sent').count()
-        
-        # Notificaciones de hoy
-        today = datetime.now().date()
-        today_notifications = StockNotification.objects.filter(
-            created_at__date=today
-        ).count()
-        
-        stock_notifications_stats = {
-            'total': total_notifications,
-            'pending': pending_notifications,
-            'sent': sent_notifications,
-            'today': today_notifications,
-        }
-    else:
-        # Contar notificaciones pendientes para el badge en sidebar
+    if view_param != 'notificaciones_stock':
         stock_notifications_count = StockNotification.objects.filter(status='pending').count()
 
-# ...existing code...
-    return render(request, 'dashboard/dashboard_home.html', {
-        'productos': productos,
-        'productos_page': productos_page,
-        'total_valor_inventario': total_valor_inventario,
-        'total_stock_inventario': total_stock_inventario,
-        'categorias': categorias,
-        'tipos': tipos,
-        'proveedores': proveedores,
-        'usuarios': userSimples,
-        'bonos': bonos,
+    context.update({
         'show_create_product_form': show_create_product_form,
         'show_edit_product_form': show_edit_product_form,
-        'producto_to_edit': producto_to_edit,       
-        'inventario_all': inventario_all,
-        'inventario_by_category': inventario_by_category,
-        'resumen_inventario': resumen_inventario,
-        'pedidos': Pedidos,
-        'pedidos_pendientes_count': pedidos_pendientes_count,
-        'pedidos_enviados_count': pedidos_enviados_count,
-        'pedidos_entregados_count': pedidos_entregados_count,
-        'ventas_por_categoria': ventas_por_categoria,
-        'total_ventas_general': total_ventas_general,
-        'estadisticas_ventas': estadisticas_ventas,
+        'producto_to_edit': producto_to_edit,
         'estadisticas_diarias': estadisticas_diarias,
-        'categoria_filter': categoria_filter,
-        'search_query': search_query,
-        'conversations': conversations,
-        'conversations_stats': conversations_stats,
-        'visitas_recientes': visitas_recientes,  # Ya contiene las visitas filtradas
-        'visitas_count': visitas_count,
-        'visitas_count_today': visitas_count_today,
-        'visitas_count_week': visitas_count_week,
-        'visitas_count_month': visitas_count_month,
-        'visitas_count_auth': visitas_count_auth,
-        'visitas_count_anon': visitas_count_anon,
-        'visitas_count_home': visitas_count_home,
-        'visitas_count_store': visitas_count_store,
-        'visitas_count_product': visitas_count_product,
-        'visitas_count_cart': visitas_count_cart,
-        'visitas_count_checkout': visitas_count_checkout,
-        'productos_mas_visitados': productos_mas_visitados,
-        'productos_visitados_page': productos_visitados_page,
+        'metricas': metricas,
+        'categoria_filter': request.GET.get('categoria_filter', ''),
+        'search_query': request.GET.get('search', ''),
         'view': view_param,
         'current_user': current_user,
         'is_superuser': is_superuser,
         'is_staff': is_staff,
         'superuser_username': current_user.username if current_user else '',
         'superuser_email': current_user.email if current_user else '',
-        'pedidos_totales': Pedidos.count() if hasattr(Pedidos, 'count') else len(Pedidos),
-        'selected_category': selected_category,
+        'pedidos_count': pedidos_count,
+        'pedidos_totales': pedidos_count,
         'config': config,
         'whatsapp_config': whatsapp_config,
         'store_config': store_config,
-        'stock_notifications': stock_notifications,
-        'stock_notifications_page': stock_notifications_page if view_param == 'notificaciones_stock' else None,
         'stock_notifications_count': stock_notifications_count,
-        'stock_notifications_stats': stock_notifications_stats,
-
     })
+    return render(request, 'dashboard/dashboard_home.html', context)
 # ...existing code...
 
 
@@ -2522,130 +1955,75 @@ def pedidos_list(request):
         })
 
 
+@superuser_required
+@cache_control(private=True, max_age=TAB_CACHE_TTL)
+def dashboard_tab_data(request, tab):
+    """
+    API con los datos de una pestaña del dashboard (dashboard.tabs)
+    Mismos filtros por GET que `?view=<tab>`; la respuesta se cachea
+    TAB_CACHE_TTL segundos por combinación de filtros y se invalida cuando
+    cambia un pedido, producto o cliente.
+    """
+    if tab not in TAB_SECTIONS:
+        return JsonResponse({'success': False, 'error': f'Pestaña "{tab}" no encontrada'}, status=404)
+
+    filtros = '&'.join(sorted(request.GET.urlencode().split('&')))
+    data = CacheService.get_or_set(
+        TABS_NAMESPACE, 'api', tab, filtros,
+        builder=lambda: serialize_tab_data(build_tab_data(tab, request.GET, get_metrics())),
+        timeout=TAB_CACHE_TTL,
+    )
+    return JsonResponse({
+        'success': True,
+        'tab': tab,
+        'data': data,
+        'timestamp': timezone.now().isoformat(),
+    })
+
+
 @superuser_required
 def dashboard_stats(request):
-    """API para obtener estadísticas actualizadas del dashboard home"""
+    """
+    API para obtener estadísticas actualizadas del dashboard home
+    Los indicadores vienen de core.services.dashboard_metrics (cacheados unos
+    segundos); los cambios posteriores llegan por el websocket del dashboard.
+    """
     try:
-        from django.db.models import Sum, Count
-        from decimal import Decimal
-
-        from django.utils import timezone
-        
-        # Obtener fecha de hoy
-        hoy = timezone.now().date()
-        inicio_dia = datetime.combine(hoy, datetime.min.time())
-        if timezone.is_aware(timezone.now()):
-            inicio_dia = timezone.make_aware(inicio_dia)
-        
-        # ===== ESTADÍSTICAS GENERALES =====
-        total_pedidos = Pedido.objects.count()
-        pedidos_pendientes = Pedido.objects.filter(estado='pendiente').count()
-        pedidos_completados = Pedido.objects.filter(estado='entregado').count()
-        
-        # Estadísticas financieras generales
-        ingresos_totales = Pedido.objects.filter(
-            estado_pago='completado'
-        ).aggregate(total=Sum('total'))['total'] or Decimal(0)
-        
-        ingresos_pendientes = Pedido.objects.filter(
-            Q(estado_pago='pendiente') | Q(estado_pago='procesando')
-        ).aggregate(total=Sum('total'))['total'] or Decimal(0)
-        
-        # ===== ESTADÍSTICAS DIARIAS =====
-        pedidos_hoy = Pedido.objects.filter(fecha__gte=inicio_dia)
-        
-        # Pedidos de hoy
-        pedidos_diarios = pedidos_hoy.count()
-        
-        # Ventas de hoy (solo pedidos completados o con pago completado)
-        ventas_diarias = pedidos_hoy.filter(
-            Q(estado_pago='completado') | Q(estado='entregado')
-        ).aggregate(total=Sum('total'))['total'] or Decimal(0)
-        
-        # Productos vendidos hoy
-        from core.models import PedidoDetalle
-        productos_vendidos_hoy = PedidoDetalle.objects.filter(
-            pedido__fecha__gte=inicio_dia
-        ).aggregate(total=Sum('cantidad'))['total'] or 0
-        
-        # Ingresos pendientes de hoy
-        ingresos_pendientes_hoy = pedidos_hoy.filter(
-            Q(estado_pago='pendiente') | Q(estado_pago='procesando')
-        ).aggregate(total=Sum('total'))['total'] or Decimal(0)
-        
-        # Nuevos clientes hoy
-        nuevos_clientes_hoy = SimpleUser.objects.filter(
-            created_at__gte=inicio_dia
-        ).count() if hasattr(SimpleUser, 'created_at') else 0
-        
-        # ===== PRODUCTOS =====
-        total_productos = ProductStore.objects.count()
-        productos_sin_stock = ProductStore.objects.filter(stock=0).count()
-        productos_bajo_stock = ProductStore.objects.filter(stock__lte=5, stock__gt=0).count()
-        
-        # ===== USUARIOS =====
-        total_usuarios = SimpleUser.objects.count()
+        stats = dict(get_metrics())
         
         # Pedidos recientes (últimos 5)
-        pedidos_recientes = Pedido.objects.select_related('user').order_by('-fecha')[:5]
-        pedidos_data = []
-        for pedido in pedidos_recientes:
-            pedidos_data.append({
+        pedidos_recientes = Pedido.objects.order_by('-fecha')[:5]
+        stats['pedidos_recientes'] = [
+            {
                 'id': pedido.id,
                 'nombre': pedido.nombre,
                 'total': float(pedido.total),
                 'estado': pedido.estado,
                 'estado_display': pedido.get_estado_display(),
                 'fecha': pedido.fecha.strftime('%d/%m/%Y %H:%M')
-            })
+            }
+            for pedido in pedidos_recientes
+        ]
         
         # Productos más vendidos (top 5)
-        from core.models import PedidoDetalle
         productos_vendidos = PedidoDetalle.objects.values(
             'producto__id', 'producto__name'
         ).annotate(
             total_vendido=Sum('cantidad')
         ).order_by('-total_vendido')[:5]
-        
-        productos_top = []
-        for item in productos_vendidos:
-            productos_top.append({
+        stats['productos_top'] = [
+            {
                 'id': item['producto__id'],
                 'nombre': item['producto__name'],
                 'cantidad': item['total_vendido']
-            })
+            }
+            for item in productos_vendidos
+        ]
+        stats['timestamp'] = timezone.now().isoformat()
         
         return JsonResponse({
             'success': True,
-            'stats': {
-                'pedidos': {
-                    'total': total_pedidos,
-                    'pendientes': pedidos_pendientes,
-                    'completados': pedidos_completados
-                },
-                'finanzas': {
-                    'ingresos_totales': float(ingresos_totales),
-                    'ingresos_pendientes': float(ingresos_pendientes)
-                },
-                'diarias': {
-                    'pedidos_hoy': pedidos_diarios,
-                    'ventas_hoy': float(ventas_diarias),
-                    'productos_vendidos_hoy': productos_vendidos_hoy,
-                    'ingresos_pendientes_hoy': float(ingresos_pendientes_hoy),
-                    'nuevos_clientes_hoy': nuevos_clientes_hoy
-                },
-                'productos': {
-                    'total': total_productos,
-                    'sin_stock': productos_sin_stock,
-                    'bajo_stock': productos_bajo_stock
-                },
-                'usuarios': {
-                    'total': total_usuarios
-                },
-                'pedidos_recientes': pedidos_data,
-                'productos_top': productos_top,
-                'timestamp': timezone.now().isoformat()
-            }
+            'stats': stats
         })
         
     except Exception as e:
@@ -2863,14 +2241,15 @@ def visitas_live_data(request):
     visitas_type_filter = request.GET.get('visitas_type', 'all')
     limit = int(request.GET.get('limit', 1000))  # Cambiado de 20 a 1000 para mostrar todas las visitas
     
-    # Calcular rangos de tiempo
+    # Calcular rangos de tiempo (hora local)
     now = timezone.now()
-    today_start = now.replace(hour=0, minute=0, second=0, microsecond=0)
-    week_start = today_start - timedelta(days=today_start.weekday())
-    month_start = today_start.replace(day=1)
+    period_starts = get_period_starts(now)
+    today_start = period_starts['today']
+    week_start = period_starts['week']
+    month_start = period_starts['month']
     
-    # Base queryset
-    visitas_qs = StoreVisit.objects.select_related('user').all()
+    # Base queryset (usuario y producto en la misma consulta)
+    visitas_qs = with_visit_products(StoreVisit.objects.all())
     
     # Aplicar filtros de tiempo
     if visitas_filter == 'today':
@@ -2904,20 +2283,12 @@ def visitas_live_data(request):
     # Serializar visitas
     visitas_data = []
     for visita in visitas_recientes:
-        product_name = None
-        if visita.product_id:
-            try:
-                product = ProductStore.objects.get(id=visita.product_id)
-                product_name = product.name
-            except ProductStore.DoesNotExist:
-                pass
-        
         visitas_data.append({
             'id': visita.id,
             'timestamp': visita.timestamp.strftime('%d/%m/%Y %H:%M:%S'),
             'visit_type': visita.visit_type,
             'product_id': visita.product_id,
-            'product_name': product_name,
+            'product_name': visita.product.name if visita.product else None,
             'user_name': visita.user.name if visita.user else None,
             'user_email': visita.user.email if visita.user else None,
             'is_authenticated': visita.user is not None,
@@ -2926,20 +2297,21 @@ def visitas_live_data(request):
             'ip_address': visita.ip_address,
         })
     
-    # Calcular estadísticas
+    # Calcular estadísticas desde los contadores pre-agregados (una consulta)
+    counters = get_visit_counters(visitas_filter, visitas_user_filter, visitas_type_filter)
     stats = {
-        'total_filtrado': visitas_qs.count(),
-        'total_hoy': StoreVisit.objects.filter(timestamp__gte=today_start).count(),
-        'total_semana': StoreVisit.objects.filter(timestamp__gte=week_start).count(),
-        'total_mes': StoreVisit.objects.filter(timestamp__gte=month_start).count(),
-        'total_autenticados': StoreVisit.objects.exclude(user=None).count(),
-        'total_anonimos': StoreVisit.objects.filter(user=None).count(),
-        'total_home': StoreVisit.objects.filter(visit_type='home').count(),
-        'total_tienda': StoreVisit.objects.filter(visit_type='store').count(),
-        'total_productos': StoreVisit.objects.filter(visit_type='product_detail').count(),
-        'total_carrito': StoreVisit.objects.filter(visit_type='cart').count(),
-        'total_checkout': StoreVisit.objects.filter(visit_type='checkout').count(),
-        'total_general': StoreVisit.objects.count(),
+        'total_filtrado': counters['filtered'],
+        'total_hoy': counters['today'],
+        'total_semana': counters['week'],
+        'total_mes': counters['month'],
+        'total_autenticados': counters['auth'],
+        'total_anonimos': counters['anon'],
+        'total_home': counters['home'],
+        'total_tienda': counters['store'],
+        'total_productos': counters['product_detail'],
+        'total_carrito': counters['cart'],
+        'total_checkout': counters['checkout'],
+        'total_general': counters['total'],
     }
     
     return JsonResponse({
@@ -2955,44 +2327,26 @@ def productos_mas_visitados(request):
     """
     Endpoint API para obtener estadísticas de productos más visitados
     """
-    from core.models import StoreVisit, ProductStore
-    from django.db.models import Count
+    from core.models import ProductStore
     from django.utils import timezone
     
     # Obtener parámetros
     periodo = request.GET.get('periodo', 'all')  # all, today, week, month
     limit = int(request.GET.get('limit', 10))
-    
-    # Calcular rangos de tiempo
     now = timezone.now()
-    today_start = now.replace(hour=0, minute=0, second=0, microsecond=0)
-    week_start = today_start - timedelta(days=today_start.weekday())
-    month_start = today_start.replace(day=1)
     
-    # Base queryset - solo visitas a productos
-    visitas_qs = StoreVisit.objects.filter(
-        visit_type='product_detail',
-        product_id__isnull=False
+    # Visitas por producto desde los contadores pre-agregados, con los
+    # productos resueltos en un solo in_bulk
+    productos_visitados = hydrate_products(
+        get_top_visited_products(periodo, limit),
+        ProductStore.objects.select_related('category'),
     )
     
-    # Aplicar filtro de periodo
-    if periodo == 'today':
-        visitas_qs = visitas_qs.filter(timestamp__gte=today_start)
-    elif periodo == 'week':
-        visitas_qs = visitas_qs.filter(timestamp__gte=week_start)
-    elif periodo == 'month':
-        visitas_qs = visitas_qs.filter(timestamp__gte=month_start)
-    
-    # Agrupar por producto y contar visitas
-    productos_visitados = visitas_qs.values('product_id').annotate(
-        total_visitas=Count('id')
-    ).order_by('-total_visitas')[:limit]
-    
     # Enriquecer con datos del producto
     productos_data = []
     for item in productos_visitados:
-        try:
-            product = ProductStore.objects.select_related('category').get(id=item['product_id'])
+        product = item['product']
+        if product:
             productos_data.append({
                 'product_id': product.id,
                 'product_name': product.name,
@@ -3002,7 +2356,7 @@ def productos_mas_visitados(request):
                 'product_image': product.imagen.url if product.imagen else None,
                 'total_visitas': item['total_visitas'],
             })
-        except ProductStore.DoesNotExist:
+        else:
             # Producto eliminado pero con visitas
             productos_data.append({
                 'product_id': item['product_id'],
@@ -3022,6 +2376,29 @@ def productos_mas_visitados(request):
     })
 
 
+@superuser_required
+def exportar_datos(request, dataset, formato):
+    """
+    Descarga de pedidos, visitas o ventas en CSV o XLSX (core.services.exports)
+    Las filas se leen y se envían por partes: la memoria no depende del rango.
+    Parámetros GET: periodo, desde, hasta y despues_de para reanudar.
+    """
+    if dataset not in EXPORT_DATASETS or formato not in CONTENT_TYPES:
+        return JsonResponse({'success': False, 'error': f'Exportación "{dataset}.{formato}" no disponible'}, status=404)
+
+    try:
+        export_range = parse_export_range(request.GET)
+    except ValueError as e:
+        return JsonResponse({'success': False, 'error': str(e)}, status=400)
+
+    response = StreamingHttpResponse(stream_export(dataset, formato, export_range),
+                                     content_type=CONTENT_TYPES[formato])
+    response['Content-Disposition'] = f'attachment; filename="{export_filename(dataset, formato, export_range)}"'
+    # Que nginx entregue cada parte en lugar de acumular la respuesta
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
 @superuser_required
 def ventas_por_periodo(request):
     """
@@ -3030,92 +2407,47 @@ def ventas_por_periodo(request):
     - periodo: 'all', 'today', 'week', 'month'
     """
     from django.utils import timezone
-    from django.db.models import Count
-    from datetime import datetime, timedelta
     
     periodo = request.GET.get('periodo', 'all')
-    
-    # Calcular rangos de tiempo
     now = timezone.now()
-    today_start = now.replace(hour=0, minute=0, second=0, microsecond=0)
-    week_start = today_start - timedelta(days=today_start.weekday())
-    month_start = today_start.replace(day=1)
     
-    # Base queryset - excluir pedidos cancelados
-    ventas_qs = PedidoDetalle.objects.select_related(
-        'producto', 'producto__category', 'pedido'
-    ).exclude(pedido__estado='cancelado')
-    
-    # Aplicar filtro de período
-    if periodo == 'today':
-        ventas_qs = ventas_qs.filter(pedido__fecha__gte=today_start)
-    elif periodo == 'week':
-        ventas_qs = ventas_qs.filter(pedido__fecha__gte=week_start)
-    elif periodo == 'month':
-        ventas_qs = ventas_qs.filter(pedido__fecha__gte=month_start)
-    
-    # Calcular ventas por categoría
-    ventas_por_categoria_dict = {}
-    total_ventas = 0
-    total_productos = 0
-    
-    for detalle in ventas_qs:
-        categoria = detalle.producto.category
-        categoria_nombre = categoria.nombre if categoria else 'Sin Categoría'
-        precio_total = float(detalle.precio) * int(detalle.cantidad)
-        
-        if categoria_nombre not in ventas_por_categoria_dict:
-            ventas_por_categoria_dict[categoria_nombre] = {
-                'nombre': categoria_nombre,
-                'total_ingresos': 0,
-                'cantidad_productos': 0,
-                'cantidad_pedidos': 0,
-                'pedidos_ids': set(),
-            }
-        
-        ventas_por_categoria_dict[categoria_nombre]['total_ingresos'] += precio_total
-        ventas_por_categoria_dict[categoria_nombre]['cantidad_productos'] += int(detalle.cantidad)
-        ventas_por_categoria_dict[categoria_nombre]['pedidos_ids'].add(detalle.pedido.id)
-        
-        total_ventas += precio_total
-        total_productos += int(detalle.cantidad)
-    
-    # Convertir a lista
-    ventas_por_categoria = []
-    for categoria_data in ventas_por_categoria_dict.values():
-        categoria_data['cantidad_pedidos'] = len(categoria_data['pedidos_ids'])
-        del categoria_data['pedidos_ids']
-        ventas_por_categoria.append(categoria_data)
-    
-    # Ordenar por ingresos
-    ventas_por_categoria.sort(key=lambda x: x['total_ingresos'], reverse=True)
-    
-    # Estadísticas generales
-    pedidos_totales = Pedido.objects.exclude(estado='cancelado')
-    if periodo == 'today':
-        pedidos_totales = pedidos_totales.filter(fecha__gte=today_start)
-    elif periodo == 'week':
-        pedidos_totales = pedidos_totales.filter(fecha__gte=week_start)
-    elif periodo == 'month':
-        pedidos_totales = pedidos_totales.filter(fecha__gte=month_start)
-    
-    pedidos_count = pedidos_totales.count()
-    promedio_pedido = total_ventas / pedidos_count if pedidos_count > 0 else 0
+    # Sumas por categoría y totales desde los resúmenes diarios materializados
+    ventas_por_categoria, estadisticas = get_sales_by_period(periodo)
     
     return JsonResponse({
         'success': True,
         'periodo': periodo,
         'ventas_por_categoria': ventas_por_categoria,
-        'estadisticas': {
-            'total_ventas': total_ventas,
-            'total_productos': total_productos,
-            'pedidos_totales': pedidos_count,
-            'promedio_por_pedido': promedio_pedido,
-        },
+        'estadisticas': estadisticas,
         'timestamp': now.strftime('%Y-%m-%d %H:%M:%S')
     })
 
 
+# ========================================
+# PERFILADO DE REQUESTS
+# ========================================
+
+@superuser_required
+def profiling_stats(request):
+    """
+    Consultas SQL y tiempos promedio por vista (core.middleware.ProfilingMiddleware)
+    Las cifras son del worker que atiende este request.
+    """
+    from core.services.request_profiling import get_stats_context, profile_stats
+    from shared.services import CacheService
+
+    if request.method == 'POST' and request.POST.get('action') == 'reset':
+        profile_stats.reset()
+        CacheService.reset_stats()
+        messages.success(request, 'Estadísticas de perfilado reiniciadas.')
+        return redirect('profiling_stats')
+
+    context = get_stats_context()
+    if request.GET.get('format') == 'json':
+        return JsonResponse(context)
+    return render(request, 'dashboard/profiling_stats.html', context)
+
+
 # ========================================
 # VISTAS PARA NOTIFICACIONES DE STOCK
 # ========================================
@@ -8,6 +8,7 @@ __all__ = [
     'TimeStampedMixin',
     'OrganizationMixin',
     'SoftDeleteMixin',
+    'FieldTrackerMixin',
     'validate_phone',
     'validate_email_custom',
 ]
@@ -101,3 +101,52 @@ class OrderMixin(models.Model):
     class Meta:
         abstract = True
         ordering = ['order']
+
+
+class FieldTrackerMixin(models.Model):
+    """
+    Mixin que recuerda los valores de TRACKED_FIELDS tal como se cargaron
+    Se capturan en from_db (sin consultas extra en pre_save) y se renuevan
+    después de cada save(). Los campos diferidos o las instancias que no
+    salieron de la base de datos no tienen valor original: no cuentan como
+    cambiados.
+    """
+    TRACKED_FIELDS = ()  # attnames: 'price', 'category_id'...
+
+    class Meta:
+        abstract = True
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._snapshot_tracked_fields()
+        return instance
+
+    def _snapshot_tracked_fields(self, fields=None):
+        deferred = self.get_deferred_fields()
+        loaded = getattr(self, '_loaded_values', {})
+        for field in fields or self.TRACKED_FIELDS:
+            if field in self.TRACKED_FIELDS and field not in deferred:
+                loaded[field] = getattr(self, field)
+        self._loaded_values = loaded
+
+    def refresh_from_db(self, using=None, fields=None):
+        super().refresh_from_db(using=using, fields=fields)
+        self._snapshot_tracked_fields(fields)
+
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        self._snapshot_tracked_fields()
+
+    def is_tracked(self, field):
+        return field in getattr(self, '_loaded_values', {})
+
+    def get_original(self, field, default=None):
+        """Valor cargado de la base de datos (default si no se conoce)"""
+        return getattr(self, '_loaded_values', {}).get(field, default)
+
+    def has_changed(self, field):
+        return self.is_tracked(field) and self._loaded_values[field] != getattr(self, field)
+
+    def changed_fields(self):
+        return [field for field in self.TRACKED_FIELDS if self.has_changed(field)]
@@ -1,10 +1,12 @@
 """
 Services - Servicios compartidos
 """
+from .cache_service import CacheService
 from .email_service import EmailService
 from .file_service import FileService
 
 __all__ = [
+    'CacheService',
     'EmailService',
     'FileService',
 ]
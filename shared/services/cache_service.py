@@ -0,0 +1,261 @@
+"""
+Servicio de caché compartido
+Capa sobre el caché de Django (settings.CACHES: Redis en producción, archivos
+o memoria en desarrollo) con:
+
+- Claves con namespace y versión: invalidar un namespace es incrementar su
+  versión; las claves viejas dejan de leerse y expiran solas. Cada proceso
+  reutiliza la versión leída durante `version_check_interval` segundos, así
+  que una invalidación llega a los demás workers con ese retraso máximo
+- Protección contra estampidas: expiración temprana probabilística (XFetch)
+  y un solo cálculo a la vez por clave (candado en el caché + candado local)
+- Métricas de aciertos/fallos por namespace (por proceso)
+"""
+import hashlib
+import logging
+import math
+import random
+import threading
+import time
+from collections import defaultdict
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from django.core.cache import caches
+
+logger = logging.getLogger(__name__)
+
+# Valor centinela: distingue "no está en caché" de un None cacheado
+_MISSING = object()
+
+
+class CacheService:
+    """Caché con namespaces, invalidación por versión y protección contra estampidas"""
+
+    alias = 'default'
+    default_timeout = 300
+    # Mayor beta => recalcula antes de expirar con más probabilidad
+    early_expiry_beta = 1.0
+    lock_timeout = 30
+    lock_wait = 5.0
+    # Segundos que se reutiliza la versión de un namespace sin consultar el caché
+    version_check_interval = 1.0
+
+    # namespace -> (versión, momento de la lectura)
+    _namespace_versions: Dict[str, Tuple[int, float]] = {}
+    _stats: Dict[str, Dict[str, int]] = defaultdict(lambda: defaultdict(int))
+    _stats_lock = threading.Lock()
+    _local_locks: Dict[str, threading.Lock] = {}
+    _local_locks_guard = threading.Lock()
+
+    @classmethod
+    def backend(cls):
+        return caches[cls.alias]
+
+    # ------------------------------------------------------------------
+    # Versiones
+    # ------------------------------------------------------------------
+
+    @classmethod
+    def get_version(cls, key: str) -> int:
+        """
+        Contador de versión guardado en el caché
+        Valor inicial basado en el reloj: si el caché se vacía, la nueva
+        versión nunca coincide con una anterior
+        """
+        backend = cls.backend()
+        version = backend.get(key)
+        if version is None:
+            backend.add(key, int(time.time()), timeout=None)
+            version = backend.get(key, 0)
+        return version
+
+    @classmethod
+    def bump_version(cls, key: str) -> int:
+        backend = cls.backend()
+        try:
+            return backend.incr(key)
+        except ValueError:
+            version = int(time.time())
+            backend.set(key, version, timeout=None)
+            return version
+
+    @classmethod
+    def namespace_version_key(cls, namespace: str) -> str:
+        return f'ns:{namespace}:version'
+
+    @classmethod
+    def namespace_version(cls, namespace: str) -> int:
+        """Versión del namespace, leída del caché como máximo cada version_check_interval"""
+        now = time.monotonic()
+        entry = cls._namespace_versions.get(namespace)
+        if entry is not None and now - entry[1] < cls.version_check_interval:
+            return entry[0]
+        version = cls.get_version(cls.namespace_version_key(namespace))
+        cls._namespace_versions[namespace] = (version, now)
+        return version
+
+    @classmethod
+    def invalidate(cls, namespace: str) -> int:
+        """Invalida todas las claves del namespace (en este proceso, de inmediato)"""
+        cls._count(namespace, 'invalidations')
+        version = cls.bump_version(cls.namespace_version_key(namespace))
+        cls._namespace_versions[namespace] = (version, time.monotonic())
+        return version
+
+    @classmethod
+    def forget_versions(cls) -> None:
+        """Descarta las versiones recordadas (p. ej. después de vaciar el caché)"""
+        cls._namespace_versions.clear()
+
+    # ------------------------------------------------------------------
+    # Claves
+    # ------------------------------------------------------------------
+
+    @classmethod
+    def make_key(cls, namespace: str, *parts) -> str:
+        """
+        Clave `namespace:v<versión>:<partes>`
+        Las partes largas o con caracteres no válidos para memcached/Redis se
+        reemplazan por su hash
+        """
+        version = cls.namespace_version(namespace)
+        raw = ':'.join(str(part) for part in parts)
+        if len(raw) > 120 or any(char.isspace() for char in raw):
+            raw = hashlib.sha1(raw.encode('utf-8')).hexdigest()
+        return f'{namespace}:v{version}:{raw}'
+
+    # ------------------------------------------------------------------
+    # Lectura y escritura
+    # ------------------------------------------------------------------
+
+    @classmethod
+    def get(cls, namespace: str, *parts, default=None):
+        entry = cls.backend().get(cls.make_key(namespace, *parts), _MISSING)
+        if entry is _MISSING:
+            cls._count(namespace, 'misses')
+            return default
+        cls._count(namespace, 'hits')
+        return entry[0]
+
+    @classmethod
+    def set(cls, namespace: str, *parts, value, timeout: Optional[int] = None) -> None:
+        timeout = cls.default_timeout if timeout is None else timeout
+        cls._store(cls.make_key(namespace, *parts), value, 0.0, timeout)
+
+    @classmethod
+    def delete(cls, namespace: str, *parts) -> None:
+        cls.backend().delete(cls.make_key(namespace, *parts))
+
+    @classmethod
+    def get_or_set(cls, namespace: str, *parts, builder: Callable[[], Any],
+                   timeout: Optional[int] = None, beta: Optional[float] = None):
+        """
+        Valor cacheado o calculado con `builder`
+
+        - Antes de expirar, cada lectura decide al azar si recalcula; la
+          probabilidad crece al acercarse la expiración y con lo que tardó el
+          último cálculo (XFetch), así que los recálculos no coinciden
+        - Solo un proceso/hilo calcula a la vez: los demás devuelven el valor
+          anterior si existe o esperan hasta `lock_wait` segundos
+        """
+        timeout = cls.default_timeout if timeout is None else timeout
+        beta = cls.early_expiry_beta if beta is None else beta
+        key = cls.make_key(namespace, *parts)
+        backend = cls.backend()
+
+        entry = backend.get(key, _MISSING)
+        if entry is not _MISSING and not cls._should_refresh(entry, beta):
+            cls._count(namespace, 'hits')
+            return entry[0]
+
+        previous = entry
+        stale = entry[0] if entry is not _MISSING else _MISSING
+        cls._count(namespace, 'misses' if stale is _MISSING else 'early_refreshes')
+
+        with cls._local_lock(key):
+            # Otro hilo de este proceso pudo recalcularlo mientras esperábamos
+            entry = backend.get(key, _MISSING)
+            if entry is not _MISSING and (previous is _MISSING or entry[2] != previous[2]):
+                return entry[0]
+
+            lock_key = f'lock:{key}'
+            if not backend.add(lock_key, 1, timeout=cls.lock_timeout):
+                if stale is not _MISSING:
+                    cls._count(namespace, 'stale_served')
+                    return stale
+                value = cls._wait_for(key)
+                if value is not _MISSING:
+                    cls._count(namespace, 'waited')
+                    return value
+                # El otro cálculo no terminó a tiempo: calcular igual
+
+            try:
+                started = time.monotonic()
+                value = builder()
+                cls._store(key, value, time.monotonic() - started, timeout)
+                cls._count(namespace, 'builds')
+                return value
+            finally:
+                backend.delete(lock_key)
+
+    @classmethod
+    def _store(cls, key: str, value, delta: float, timeout: Optional[int]) -> None:
+        # (valor, segundos que tomó calcularlo, momento de expiración)
+        expires_at = time.time() + timeout if timeout else None
+        cls.backend().set(key, (value, delta, expires_at), timeout)
+
+    @staticmethod
+    def _should_refresh(entry, beta: float) -> bool:
+        _value, delta, expires_at = entry
+        if not expires_at or not beta or not delta:
+            return False
+        # random() puede devolver 0.0: log(0) no está definido
+        return time.time() - delta * beta * math.log(random.random() or 1e-12) >= expires_at
+
+    @classmethod
+    def _wait_for(cls, key: str):
+        deadline = time.monotonic() + cls.lock_wait
+        backend = cls.backend()
+        while time.monotonic() < deadline:
+            time.sleep(0.05)
+            entry = backend.get(key, _MISSING)
+            if entry is not _MISSING:
+                return entry[0]
+        return _MISSING
+
+    @classmethod
+    def _local_lock(cls, key: str) -> threading.Lock:
+        with cls._local_locks_guard:
+            lock = cls._local_locks.get(key)
+            if lock is None:
+                # Acotado: las claves viejas (versiones anteriores) se descartan
+                if len(cls._local_locks) > 1000:
+                    cls._local_locks = {k: v for k, v in cls._local_locks.items() if v.locked()}
+                lock = cls._local_locks[key] = threading.Lock()
+            return lock
+
+    # ------------------------------------------------------------------
+    # Métricas
+    # ------------------------------------------------------------------
+
+    @classmethod
+    def _count(cls, namespace: str, metric: str) -> None:
+        with cls._stats_lock:
+            cls._stats[namespace][metric] += 1
+
+    @classmethod
+    def stats(cls) -> Dict[str, Dict[str, Any]]:
+        """Aciertos, fallos y tasa de aciertos por namespace (este proceso)"""
+        with cls._stats_lock:
+            result = {}
+            for namespace, metrics in cls._stats.items():
+                metrics = dict(metrics)
+                reads = metrics.get('hits', 0) + metrics.get('misses', 0) + metrics.get('early_refreshes', 0)
+                metrics['hit_rate'] = round(metrics.get('hits', 0) / reads, 3) if reads else None
+                result[namespace] = metrics
+            return result
+
+    @classmethod
+    def reset_stats(cls) -> None:
+        with cls._stats_lock:
+            cls._stats.clear()